@@ -4,6 +4,8 @@ __author__ = "Dimitris Karkalousos"
 import argparse
 
 from atommic.cli.launch import register_cli_subcommand
+from atommic.cli.nifti_converter import register_cli_subcommand as register_nifti_converter_subcommand
+from atommic.cli.preprocessing_cache import register_cli_subcommand as register_preprocessing_cache_subcommand
 
 
 def main():
@@ -15,6 +17,8 @@ def main():
     subparser.dest = "subcommand"
 
     register_cli_subcommand(subparser)
+    register_preprocessing_cache_subcommand(subparser)
+    register_nifti_converter_subcommand(subparser)
 
     args = parser.parse_args()
     args.func(args)
@@ -0,0 +1,157 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import importlib
+import os
+import re
+import subprocess  # nosec
+import sys
+from importlib.metadata import entry_points
+from typing import Dict, List, Tuple, Type
+
+from atommic.utils import logging
+
+# Group of the entry points under which external packages can register models, e.g. in their setup.py
+# entry_points={"atommic.models": ["MYNET = my_package.nn.mynet:MyNet"]}
+MODELS_ENTRY_POINT_GROUP = "atommic.models"
+
+# The models of atommic, keyed by the upper-cased ``model_name`` of the config, as "module:class" paths, so that only
+# the module of the requested model is imported.
+MODELS: Dict[str, str] = {
+    "CASCADENET": "atommic.collections.reconstruction.nn.ccnn:CascadeNet",
+    "CIRIM": "atommic.collections.reconstruction.nn.cirim:CIRIM",
+    "CRNNET": "atommic.collections.reconstruction.nn.crnn:CRNNet",
+    "DUNET": "atommic.collections.reconstruction.nn.dunet:DUNet",
+    "E2EVN": "atommic.collections.reconstruction.nn.varnet:VarNet",
+    "IDSLR": "atommic.collections.multitask.rs.nn.idslr:IDSLR",
+    "IDSLRUNET": "atommic.collections.multitask.rs.nn.idslr_unet:IDSLRUNet",
+    "JOINTICNET": "atommic.collections.reconstruction.nn.jointicnet:JointICNet",
+    "KIKINET": "atommic.collections.reconstruction.nn.kikinet:KIKINet",
+    "LPDNET": "atommic.collections.reconstruction.nn.lpd:LPDNet",
+    "MODL": "atommic.collections.reconstruction.nn.modl:MoDL",
+    "MTLRS": "atommic.collections.multitask.rs.nn.mtlrs:MTLRS",
+    "MULTIDOMAINNET": "atommic.collections.reconstruction.nn.multidomainnet:MultiDomainNet",
+    "PROXIMALGRADIENT": "atommic.collections.reconstruction.nn.proximal_gradient:ProximalGradient",
+    "QCIRIM": "atommic.collections.quantitative.nn.qcirim:qCIRIM",
+    "QVN": "atommic.collections.quantitative.nn.qvarnet:qVarNet",
+    "QZF": "atommic.collections.quantitative.nn.qzf:qZF",
+    "RECSEGNET": "atommic.collections.multitask.rs.nn.recseg_unet:RecSegUNet",
+    "RVN": "atommic.collections.reconstruction.nn.recurrentvarnet:RecurrentVarNet",
+    "SEGMENTATIONATTENTIONUNET": "atommic.collections.segmentation.nn.attentionunet:SegmentationAttentionUNet",
+    "SEGMENTATIONDYNUNET": "atommic.collections.segmentation.nn.dynunet:SegmentationDYNUNet",
+    "SEGMENTATIONLAMBDAUNET": "atommic.collections.segmentation.nn.lambdaunet:SegmentationLambdaUNet",
+    "SEGMENTATIONUNET": "atommic.collections.segmentation.nn.unet:SegmentationUNet",
+    "SEGMENTATIONUNETR": "atommic.collections.segmentation.nn.unetr:SegmentationUNetR",
+    "SEGMENTATION3DUNET": "atommic.collections.segmentation.nn.unet3d:Segmentation3DUNet",
+    "SEGMENTATIONVNET": "atommic.collections.segmentation.nn.vnet:SegmentationVNet",
+    "SEGNET": "atommic.collections.multitask.rs.nn.segnet:SegNet",
+    "SERANET": "atommic.collections.multitask.rs.nn.seranet:SERANet",
+    "UNET": "atommic.collections.reconstruction.nn.unet:UNet",
+    "VN": "atommic.collections.reconstruction.nn.varnet:VarNet",
+    "VSNET": "atommic.collections.reconstruction.nn.vsnet:VSNet",
+    "XPDNET": "atommic.collections.reconstruction.nn.xpdnet:XPDNet",
+    "ZF": "atommic.collections.reconstruction.nn.zf:ZF",
+}
+
+
+def _models() -> Dict[str, str]:
+    """Returns the models of atommic and the models registered by external packages under the ``atommic.models``
+    entry point group. The entry points are only read, their modules are not imported."""
+    models = dict(MODELS)
+    for entry_point in entry_points(group=MODELS_ENTRY_POINT_GROUP):
+        models.setdefault(entry_point.name.upper(), entry_point.value)
+    return models
+
+
+def get_model_path(model_name: str) -> str:
+    """Returns the "module:class" path of a model.
+
+    Parameters
+    ----------
+    model_name : str
+        Name of the model, as in the ``model_name`` of the config. Case-insensitive.
+
+    Returns
+    -------
+    str
+        The "module:class" path of the model.
+    """
+    model_name = model_name.upper()
+    if model_name in MODELS:
+        return MODELS[model_name]
+    models = _models()
+    if model_name not in models:
+        raise NotImplementedError(f"{model_name} is not implemented in atommic.")
+    return models[model_name]
+
+
+def get_model_class(model_name: str) -> Type:
+    """Imports and returns the class of a model. Only the module of the model is imported.
+
+    Parameters
+    ----------
+    model_name : str
+        Name of the model, as in the ``model_name`` of the config. Case-insensitive.
+
+    Returns
+    -------
+    Type
+        The class of the model.
+
+    Examples
+    --------
+    >>> from atommic.cli.model_registry import get_model_class
+    >>> get_model_class("cirim")
+    <class 'atommic.collections.reconstruction.nn.cirim.CIRIM'>
+    """
+    module_name, class_name = get_model_path(model_name).split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def profile_startup(model_name: str, top: int = 25) -> List[Tuple[str, int, int]]:
+    """Reports the time spent importing every module when a job of a model starts.
+
+    The imports of the CLI and of the model run in a fresh interpreter with ``-X importtime``, so the report matches
+    the startup of a new job, regardless of what the current process has already imported.
+
+    Parameters
+    ----------
+    model_name : str
+        Name of the model, as in the ``model_name`` of the config.
+    top : int, optional
+        Number of modules with the longest cumulative import time to log. Default is ``25``.
+
+    Returns
+    -------
+    List[Tuple[str, int, int]]
+        The imported modules, with their self and cumulative import times in microseconds, in import order.
+    """
+    code = (
+        "import atommic.cli; from atommic.cli.model_registry import get_model_class; "
+        f"get_model_class({model_name!r})"
+    )
+    result = subprocess.run(  # nosec
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, sys.path))},
+        check=False,
+    )
+    if result.returncode != 0:
+        logging.warning(f"Could not profile the startup of {model_name}:\n{result.stderr[-2000:]}")
+        return []
+
+    modules = []
+    pattern = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+    for line in result.stderr.splitlines():
+        match = pattern.match(line)
+        if match is not None:
+            modules.append((match.group(3), int(match.group(1)), int(match.group(2))))
+
+    total = sum(self_time for _, self_time, _ in modules)
+    report = [f"Startup imports of {model_name}: {len(modules)} modules in {total / 1e6:.2f} s"]
+    report.append(f"{'self [ms]':>12} {'cumulative [ms]':>16}  module")
+    for name, self_time, cumulative_time in sorted(modules, key=lambda module: module[2], reverse=True)[:top]:
+        report.append(f"{self_time / 1e3:12.1f} {cumulative_time / 1e3:16.1f}  {name}")
+    logging.info("\n".join(report))
+    return modules
@@ -0,0 +1,100 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import argparse
+import json
+from pathlib import Path
+
+from atommic.utils import logging
+
+DATASET_FORMATS = ["brats2023adultglioma", "isles2022subacutestroke"]
+
+
+def register_cli_subcommand(parser: argparse._SubParsersAction):
+    """Register parser for the NIfTI conversion command."""
+    parser_convert = parser.add_parser(
+        "convert",
+        help="Convert a NIfTI segmentation dataset to uncompressed HDF5 files, chunked per slice and with the one-hot "
+        "segmentation precomputed, e.g. atommic convert -f brats2023adultglioma -d /path/to/images "
+        "-s /path/to/segmentations -o /path/to/output -w 8",
+    )
+    parser_convert.add_argument(
+        "-f",
+        "--dataset-format",
+        required=True,
+        type=str,
+        choices=DATASET_FORMATS,
+        help="Format of the dataset, as the dataset_format of the configuration file.",
+    )
+    parser_convert.add_argument(
+        "-d",
+        "--data-path",
+        required=True,
+        type=str,
+        help="Directory of the NIfTI images, or a json file that lists them.",
+    )
+    parser_convert.add_argument(
+        "-s",
+        "--segmentations-path",
+        type=str,
+        default=None,
+        help="Directory of the NIfTI segmentations, named as the images with a -seg.nii.gz suffix.",
+    )
+    parser_convert.add_argument(
+        "-o",
+        "--output-path",
+        required=True,
+        type=str,
+        help="Directory of the HDF5 files, to set as the data_path of the configuration file.",
+    )
+    parser_convert.add_argument(
+        "-w",
+        "--num-workers",
+        type=int,
+        default=0,
+        help="Number of worker processes that convert the files in parallel.",
+    )
+    parser_convert.set_defaults(func=main)
+
+
+def main(args: argparse.Namespace):
+    """Converts the NIfTI images, and their segmentations, of a dataset to HDF5 files.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        The command line arguments.
+    """
+    # imported here, so that the other commands of the cli do not pay for importing the datasets
+    # pylint: disable=import-outside-toplevel
+    from atommic.collections.common.data.nifti_volumes import convert_nifti_dataset
+    from atommic.collections.segmentation.data.mri_segmentation_loader import (
+        BraTS2023AdultGliomaSegmentationMRIDataset,
+        ISLES2022SubAcuteStrokeSegmentationMRIDataset,
+    )
+
+    dataset = {
+        "brats2023adultglioma": BraTS2023AdultGliomaSegmentationMRIDataset,
+        "isles2022subacutestroke": ISLES2022SubAcuteStrokeSegmentationMRIDataset,
+    }[args.dataset_format]
+
+    if args.data_path.endswith(".json"):
+        with open(args.data_path, "r") as f:  # pylint: disable=unspecified-encoding
+            files = [Path(example) for example in json.load(f)]
+    else:
+        files = sorted(fname for fname in Path(args.data_path).iterdir() if fname.name.endswith((".nii.gz", ".nii")))
+
+    segmentation_files = None
+    if args.segmentations_path is not None:
+        segmentation_files = [
+            Path(args.segmentations_path) / fname.name.replace(".nii.gz", "-seg.nii.gz") for fname in files
+        ]
+
+    logging.info(f"Converting {len(files)} volumes of {args.dataset_format} to {args.output_path}.")
+    convert_nifti_dataset(
+        files,
+        args.output_path,
+        segmentation_files=segmentation_files,
+        segmentation_one_hot=dataset.segmentation_one_hot,
+        num_workers=args.num_workers,
+    )
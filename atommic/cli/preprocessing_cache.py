@@ -0,0 +1,76 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import argparse
+
+from omegaconf import OmegaConf
+
+from atommic.utils import logging
+
+
+def register_cli_subcommand(parser: argparse._SubParsersAction):
+    """Register parser for the preprocessing cache command."""
+    parser_cache = parser.add_parser(
+        "cache",
+        help="Prebuild the preprocessing cache of the datasets of a reconstruction configuration (yaml) file, e.g. "
+        "atommic cache -c /path/to/config.yaml -w 8",
+    )
+    parser_cache.add_argument(
+        "-c",
+        "--config-path",
+        required=True,
+        type=str,
+        help="Path to the configuration file.",
+    )
+    parser_cache.add_argument(
+        "-d",
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory of the cache. Overrides the preprocessing_cache_dir of the datasets.",
+    )
+    parser_cache.add_argument(
+        "-s",
+        "--splits",
+        nargs="+",
+        default=["train", "validation", "test"],
+        choices=["train", "validation", "test"],
+        help="Datasets to build the cache for.",
+    )
+    parser_cache.add_argument(
+        "-w",
+        "--num-workers",
+        type=int,
+        default=0,
+        help="Number of worker processes that build the cache in parallel.",
+    )
+    parser_cache.set_defaults(func=main)
+
+
+def main(args: argparse.Namespace):
+    """Builds the preprocessing cache of every dataset of the configuration file.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        The command line arguments.
+    """
+    # imported here, so that the other commands of the cli do not pay for importing the reconstruction models
+    # pylint: disable=import-outside-toplevel
+    from atommic.collections.common.data.preprocessing_cache import build_preprocessing_cache
+    from atommic.collections.common.parts.utils import is_none
+    from atommic.collections.reconstruction.nn.base import BaseMRIReconstructionModel
+
+    cfg = OmegaConf.load(args.config_path)
+    for split in args.splits:
+        ds_cfg = cfg.model.get(f"{split}_ds", None)
+        if ds_cfg is None:
+            continue
+        if args.cache_dir is not None:
+            ds_cfg.preprocessing_cache_dir = args.cache_dir
+        if is_none(ds_cfg.get("preprocessing_cache_dir", None)):
+            logging.warning(f"No preprocessing_cache_dir is set for the {split} dataset, skipping it.")
+            continue
+        dataset = BaseMRIReconstructionModel._setup_dataloader_from_config(ds_cfg).dataset
+        logging.info(f"Building the {split} preprocessing cache: {dataset.transform.preprocessing_cache}")
+        build_preprocessing_cache(dataset, num_workers=args.num_workers)
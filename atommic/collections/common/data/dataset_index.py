@@ -0,0 +1,443 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import hashlib
+import json
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from torch.utils.data import get_worker_info
+from tqdm import tqdm
+
+from atommic.utils.get_rank import is_global_rank_zero
+
+# Metadata keys that hold tuples. JSON stores them as lists, so they are restored on decoding.
+_TUPLE_METADATA_KEYS = ("encoding_size", "recon_size")
+
+
+def _json_default(obj):
+    """Serializes numpy scalars and arrays, which are returned by ``h5py`` and ``nibabel`` headers."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable.")
+
+
+def _file_mtime(fname: Union[str, Path]) -> int:
+    """Returns the modification time of a file in nanoseconds, or ``-1`` if it does not exist."""
+    try:
+        return os.stat(fname).st_mtime_ns
+    except OSError:
+        return -1
+
+
+class VolumeIndex(Sequence):
+    """A compact, columnar index of the slices of an MRI dataset.
+
+    The index stores one row per volume, holding the filename, the range of slices to load, the modification time of
+    the file and its metadata. Slices are looked up through an offsets array, so the metadata of a volume is stored
+    once instead of once per slice. Indexing returns the same ``(fname, slice_ind, metadata)`` tuples as the list of
+    examples built by :class:`atommic.collections.common.data.mri_loader.MRIDataset`.
+
+    The index is saved as a single structured ``.npy`` file, which is memory-mapped on loading, so that it is shared
+    between :class:`torch.utils.data.DataLoader` workers instead of being copied into each one.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.data.dataset_index import VolumeIndex
+    >>> index = VolumeIndex.from_rows([("file1.h5", 0, 3, {"num_slices": 3}), ("file2.h5", 1, 2, {"num_slices": 3})])
+    >>> len(index)
+    4
+    >>> index[3]
+    (PosixPath('file2.h5'), 1, {'num_slices': 3})
+    """
+
+    def __init__(self, table: np.ndarray):
+        """Inits :class:`VolumeIndex`.
+
+        Parameters
+        ----------
+        table : np.ndarray
+            Structured array with the fields ``fname``, ``slice_start``, ``slice_stop``, ``mtime`` and ``metadata``,
+            one row per volume.
+        """
+        self.table = table
+        num_slices = np.maximum(np.asarray(table["slice_stop"]) - np.asarray(table["slice_start"]), 0)
+        self.offsets = np.concatenate([[0], np.cumsum(num_slices)]).astype(np.int64)
+        # decoded metadata is shared by all slices of a volume, as in the list of examples
+        self._metadata: Dict[int, Dict] = {}
+        self._fnames: Dict[int, Path] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[Union[str, Path], int, int, Dict]]) -> "VolumeIndex":
+        """Builds the index from one ``(fname, slice_start, slice_stop, metadata)`` row per volume.
+
+        Parameters
+        ----------
+        rows : List[Tuple[Union[str, Path], int, int, Dict]]
+            The volumes of the dataset. ``slice_stop`` is exclusive.
+
+        Returns
+        -------
+        VolumeIndex
+            The index.
+        """
+        fnames = [str(row[0]) for row in rows]
+        metadata = [json.dumps(row[3], default=_json_default) for row in rows]
+        table = np.zeros(
+            len(rows),
+            dtype=[
+                ("fname", f"U{max([len(x) for x in fnames] + [1])}"),
+                ("slice_start", np.int64),
+                ("slice_stop", np.int64),
+                ("mtime", np.int64),
+                ("metadata", f"U{max([len(x) for x in metadata] + [1])}"),
+            ],
+        )
+        for i, (fname, slice_start, slice_stop, _) in enumerate(rows):
+            table[i] = (fnames[i], slice_start, max(slice_start, slice_stop), _file_mtime(fname), metadata[i])
+        index = cls(table)
+        # keep the original metadata objects, so no decoding is needed when the index is built in this process
+        index._metadata = {i: row[3] for i, row in enumerate(rows)}  # pylint: disable=protected-access
+        return index
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "VolumeIndex":
+        """Memory-maps an index saved with :meth:`save`.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the ``.npy`` file.
+
+        Returns
+        -------
+        VolumeIndex
+            The index.
+        """
+        return cls(np.load(path, mmap_mode="r", allow_pickle=False))
+
+    def save(self, path: Union[str, Path]):
+        """Saves the index as a structured ``.npy`` file.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the ``.npy`` file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so that concurrent readers never see a partial index
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(self.table), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    @property
+    def num_volumes(self) -> int:
+        """Number of volumes in the index."""
+        return len(self.table)
+
+    def __len__(self) -> int:
+        """Number of slices in the index."""
+        return int(self.offsets[-1])
+
+    def volume_fname(self, volume: int) -> Path:
+        """Returns the filename of a volume."""
+        fname = self._fnames.get(volume, None)
+        if fname is None:
+            fname = Path(str(self.table["fname"][volume]))
+            self._fnames[volume] = fname
+        return fname
+
+    def volume_metadata(self, volume: int) -> Dict:
+        """Returns the metadata of a volume."""
+        metadata = self._metadata.get(volume, None)
+        if metadata is None:
+            metadata = json.loads(str(self.table["metadata"][volume]))
+            for key in _TUPLE_METADATA_KEYS:
+                if isinstance(metadata.get(key, None), list):
+                    metadata[key] = tuple(metadata[key])
+            self._metadata[volume] = metadata
+        return metadata
+
+    def volume_slices(self, volume: int) -> range:
+        """Returns the range of dataset indices that belong to a volume."""
+        return range(int(self.offsets[volume]), int(self.offsets[volume + 1]))
+
+    def volume_of(self, i: int) -> int:
+        """Returns the volume that the i-th slice of the index belongs to."""
+        return int(np.searchsorted(self.offsets, i, side="right")) - 1
+
+    def __getitem__(self, i):
+        """Returns the ``(fname, slice_ind, metadata)`` tuple of the i-th slice."""
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(f"Index {i} is out of range for a dataset index of {len(self)} slices.")
+        volume = self.volume_of(i)
+        slice_ind = int(self.table["slice_start"][volume]) + i - int(self.offsets[volume])
+        return self.volume_fname(volume), slice_ind, self.volume_metadata(volume)
+
+    def select_volumes(self, volumes: Sequence[int]) -> "VolumeIndex":
+        """Returns a new index that holds only the given volumes.
+
+        Parameters
+        ----------
+        volumes : Sequence[int]
+            Indices of the volumes to keep, in the order they should appear.
+
+        Returns
+        -------
+        VolumeIndex
+            The subset of the index.
+        """
+        volumes = [int(v) for v in volumes]
+        index = VolumeIndex(np.asarray(self.table)[volumes])
+        index._metadata = {  # pylint: disable=protected-access
+            j: self._metadata[v] for j, v in enumerate(volumes) if v in self._metadata
+        }
+        return index
+
+    def is_valid(self, files: Sequence[Union[str, Path]]) -> bool:
+        """Checks whether the index still describes the given files.
+
+        The index is invalid if files were added or removed, or if any file was modified after the index was built.
+
+        Parameters
+        ----------
+        files : Sequence[Union[str, Path]]
+            The files of the dataset.
+
+        Returns
+        -------
+        bool
+            Whether the index is valid.
+        """
+        fnames = sorted(str(fname) for fname in files)
+        indexed = [str(fname) for fname in self.table["fname"]]
+        if sorted(set(indexed)) != sorted(set(fnames)):
+            return False
+        mtimes = {fname: _file_mtime(fname) for fname in fnames}
+        return all(mtimes[str(row["fname"])] == int(row["mtime"]) for row in self.table)
+
+
+def dataset_index_path(
+    dataset_cache_file: Optional[Union[str, Path]], root: Union[str, Path], signature: str = ""
+) -> Optional[Path]:
+    """Returns the path of the binary index of a dataset.
+
+    Each dataset root gets its own index next to the configured cache file, so that several datasets can share the same
+    ``dataset_cache_file`` setting. If no cache file is given, the index is stored in the atommic cache directory, keyed
+    by the absolute path of the root, and not in the root itself, where it would be listed as a data file.
+
+    Parameters
+    ----------
+    dataset_cache_file : Optional[Union[str, Path]]
+        The configured cache file.
+    root : Union[str, Path]
+        The dataset root, either a directory or a json file listing the files.
+    signature : str, optional
+        Extra string that distinguishes datasets that index the same root differently, e.g. the dataset class.
+
+    Returns
+    -------
+    Optional[Path]
+        The path to the ``.npy`` index.
+    """
+    if dataset_cache_file is None:
+        # imported here, since the model utilities import the collections
+        from atommic.utils.model_utils import resolve_cache_dir  # pylint: disable=import-outside-toplevel
+
+        digest = hashlib.sha1(f"{signature}:{Path(root).resolve()}".encode("utf-8")).hexdigest()[:16]  # nosec
+        return resolve_cache_dir() / "dataset_index" / f"dataset_index.{digest}.npy"
+    digest = hashlib.sha1(f"{signature}:{root}".encode("utf-8")).hexdigest()[:16]  # nosec
+    dataset_cache_file = Path(dataset_cache_file)
+    return dataset_cache_file.with_name(f"{dataset_cache_file.stem}.{digest}.npy")
+
+
+def load_dataset_index(path: Optional[Path], files: Sequence[Union[str, Path]]) -> Optional[VolumeIndex]:
+    """Loads a binary dataset index, if it exists and is still valid for the given files.
+
+    Parameters
+    ----------
+    path : Optional[Path]
+        Path to the ``.npy`` index.
+    files : Sequence[Union[str, Path]]
+        The files of the dataset.
+
+    Returns
+    -------
+    Optional[VolumeIndex]
+        The index, or ``None`` if it has to be rebuilt.
+    """
+    if path is None or not path.exists():
+        return None
+    try:
+        index = VolumeIndex.load(path)
+    except (OSError, ValueError) as e:
+        logging.warning("Could not load dataset cache from %s: %s. Rebuilding it.", path, e)
+        return None
+    if not index.is_valid(files):
+        logging.info("Dataset cache %s is outdated. Rebuilding it.", path)
+        return None
+    return index
+
+
+def subsample_examples(
+    examples: Union[VolumeIndex, List[Tuple[Path, int, Dict]]],
+    sample_rate: float = 1.0,
+    volume_sample_rate: float = 1.0,
+    num_cols: Optional[Sequence[int]] = None,
+) -> Union[VolumeIndex, List[Tuple[Path, int, Dict]]]:
+    """Subsamples the examples of a dataset by slice, by volume, or by number of columns.
+
+    Volume-level selections keep the examples as a :class:`VolumeIndex`. Sampling by slice returns a shuffled list.
+
+    Parameters
+    ----------
+    examples : Union[VolumeIndex, List[Tuple[Path, int, Dict]]]
+        The examples of the dataset.
+    sample_rate : float, optional
+        Fraction of the slices to keep. Default is ``1.0``.
+    volume_sample_rate : float, optional
+        Fraction of the volumes to keep. Only used if ``sample_rate`` is ``1.0``. Default is ``1.0``.
+    num_cols : Optional[Sequence[int]], optional
+        If provided, only slices with the desired number of columns are kept. Default is ``None``.
+
+    Returns
+    -------
+    Union[VolumeIndex, List[Tuple[Path, int, Dict]]]
+        The subsampled examples.
+    """
+    if sample_rate < 1.0:  # sample by slice
+        examples = list(examples)
+        random.shuffle(examples)
+        num_examples = round(len(examples) * sample_rate)
+        examples = examples[:num_examples]
+    elif volume_sample_rate < 1.0:  # sample by volume
+        if isinstance(examples, VolumeIndex):
+            stems = [examples.volume_fname(v).stem for v in range(examples.num_volumes)]
+        else:
+            stems = [f[0].stem for f in examples]
+        vol_names = sorted(set(stems))
+        random.shuffle(vol_names)
+        num_volumes = round(len(vol_names) * volume_sample_rate)
+        sampled_vols = set(vol_names[:num_volumes])
+        if isinstance(examples, VolumeIndex):
+            examples = examples.select_volumes([v for v, stem in enumerate(stems) if stem in sampled_vols])
+        else:
+            examples = [example for example in examples if example[0].stem in sampled_vols]
+
+    if num_cols:
+        if isinstance(examples, VolumeIndex):
+            examples = examples.select_volumes(
+                [v for v in range(examples.num_volumes) if examples.volume_metadata(v)["encoding_size"][1] in num_cols]
+            )
+        else:
+            examples = [ex for ex in examples if ex[2]["encoding_size"][1] in num_cols]
+
+    return examples
+
+
+def scan_metadata(
+    retrieve_metadata: Callable[[Union[str, Path]], Tuple[Dict, int]],
+    files: Sequence[Union[str, Path]],
+    num_workers: int = 0,
+    scan_mode: str = "thread",
+) -> List[Tuple[Dict, int]]:
+    """Retrieves the metadata of all files of a dataset, optionally in parallel.
+
+    The results are returned in the order of ``files``, regardless of the order in which the workers finish, so the
+    dataset index is deterministic.
+
+    Parameters
+    ----------
+    retrieve_metadata : Callable[[Union[str, Path]], Tuple[Dict, int]]
+        Function that returns the metadata dictionary and the number of slices of a file, e.g. the
+        ``_retrieve_metadata`` method of a dataset. For ``scan_mode="process"`` it must be picklable.
+    files : Sequence[Union[str, Path]]
+        The files to scan.
+    num_workers : int, optional
+        Number of parallel workers. ``0`` or ``1`` scans the files serially in the current process. ``-1`` uses all
+        available cores. Default is ``0``.
+    scan_mode : str, optional
+        ``"thread"`` or ``"process"``. Threads avoid pickling the dataset, but header parsing holds the GIL, so
+        ``"process"`` scales better with the number of cores. Default is ``"thread"``.
+
+    Returns
+    -------
+    List[Tuple[Dict, int]]
+        The metadata and number of slices of every file.
+    """
+    if num_workers is None:
+        num_workers = 0
+    if num_workers < 0:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(files))
+
+    if num_workers <= 1:
+        return [retrieve_metadata(fname) for fname in files]
+
+    if scan_mode == "thread":
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        chunksize = 1
+    elif scan_mode == "process":
+        executor = ProcessPoolExecutor(max_workers=num_workers)  # type: ignore
+        chunksize = max(1, len(files) // (num_workers * 16))
+    else:
+        raise ValueError(f"Unknown metadata scan mode {scan_mode}. Supported modes are 'thread' and 'process'.")
+
+    # the progress of parallel scans is only shown once, by the main process of the global rank zero
+    progress = {
+        "total": len(files),
+        "desc": "Scanning dataset metadata",
+        "unit": "file",
+        "leave": False,
+        "disable": not is_global_rank_zero() or get_worker_info() is not None,
+    }
+    with executor:
+        return list(tqdm(executor.map(retrieve_metadata, files, chunksize=chunksize), **progress))
+
+
+def load_noise_index(noise_root: Union[str, Path, os.PathLike]) -> Dict[str, List]:
+    """Loads the noise levels of a dataset into a filename-keyed index.
+
+    The noise file is a JSON-lines file with one ``{"fname": ..., "noise": ...}`` record per slice. It is streamed line
+    by line, so only the parsed noise levels are kept in memory, and every file is looked up in constant time when the
+    dataset index is built.
+
+    Parameters
+    ----------
+    noise_root : Union[str, Path, os.PathLike]
+        Path to the noise JSON-lines file.
+
+    Returns
+    -------
+    Dict[str, List]
+        The noise levels of each file, keyed by the file name and in the order of the records.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.data.dataset_index import load_noise_index
+    >>> load_noise_index("noise.json")
+    {'file1.h5': [0.01, 0.02], 'file2.h5': [0.03]}
+    """
+    noise_index: Dict[str, List] = {}
+    with open(noise_root, "r") as f:  # pylint: disable=unspecified-encoding
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            noise_index.setdefault(record["fname"], []).append(record["noise"])
+    return noise_index
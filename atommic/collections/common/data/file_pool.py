@@ -0,0 +1,168 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import contextlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Union
+
+import h5py
+import torch
+
+from atommic.collections.common.data.nifti_volumes import NiftiVolumeCache
+from atommic.collections.common.data.slice_window import SliceWindowCache
+
+
+class HDF5FilePool:
+    """A per-process LRU pool of open read-only :class:`h5py.File` handles.
+
+    Repeated slice reads from the same volume reuse a single handle instead of opening and closing the file, and
+    parsing its metadata, for every slice. The pool is bound to the process that created its handles. After a fork,
+    e.g. when a :class:`torch.utils.data.DataLoader` spawns its workers, the inherited handles are dropped and every
+    worker lazily opens its own.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.data.file_pool import HDF5FilePool
+    >>> pool = HDF5FilePool(capacity=4)
+    >>> with pool.open("file.h5") as hf:
+    ...     kspace = hf["kspace"][0]
+    >>> len(pool)
+    1
+    """
+
+    def __init__(self, capacity: int = 16):
+        """Inits :class:`HDF5FilePool`.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of handles kept open at the same time. When the pool is full, the least recently used
+            handle is closed. Set to ``0`` to disable pooling and open/close the file on every access. Default is
+            ``16``.
+        """
+        if capacity is None or capacity < 0:
+            raise ValueError(f"HDF5 file pool capacity must be >= 0, got {capacity}.")
+        self.capacity = int(capacity)
+        self._handles: OrderedDict = OrderedDict()
+        self._pid = os.getpid()
+
+    def __len__(self) -> int:
+        """Number of currently open handles."""
+        return len(self._handles)
+
+    def __contains__(self, fname: Union[str, Path, os.PathLike]) -> bool:
+        """Whether a handle for the given file is currently open."""
+        return str(fname) in self._handles
+
+    def __getstate__(self):
+        """Open handles cannot be pickled, so only the configuration is sent to spawned workers."""
+        return {"capacity": self.capacity}
+
+    def __setstate__(self, state):
+        """Restores the pool configuration with no open handles."""
+        self.__init__(state["capacity"])
+
+    def __del__(self):
+        """Closes the open handles when the pool is garbage collected."""
+        with contextlib.suppress(Exception):
+            self.close()
+
+    def _check_pid(self):
+        """Drops handles inherited from a parent process."""
+        if self._pid != os.getpid():
+            self.reset()
+
+    def get(self, fname: Union[str, Path, os.PathLike]) -> h5py.File:
+        """Returns an open read-only handle for the given file, opening it if needed.
+
+        Parameters
+        ----------
+        fname : Union[str, Path, os.PathLike]
+            Path to the HDF5 file.
+
+        Returns
+        -------
+        h5py.File
+            The open handle. It is owned by the pool and must not be closed by the caller.
+        """
+        self._check_pid()
+        key = str(fname)
+        hf = self._handles.get(key, None)
+        if hf is not None and hf.id.valid:
+            self._handles.move_to_end(key)
+            return hf
+
+        hf = h5py.File(fname, "r")
+        self._handles[key] = hf
+        while len(self._handles) > self.capacity:
+            _, oldest = self._handles.popitem(last=False)
+            with contextlib.suppress(Exception):
+                oldest.close()
+        return hf
+
+    @contextlib.contextmanager
+    def open(self, fname: Union[str, Path, os.PathLike]) -> Iterator[h5py.File]:
+        """Context manager that is a drop-in replacement for ``h5py.File(fname, "r")``.
+
+        The handle is kept open in the pool on exit. If the pool is disabled (``capacity == 0``), the file is opened
+        and closed as usual.
+
+        Parameters
+        ----------
+        fname : Union[str, Path, os.PathLike]
+            Path to the HDF5 file.
+
+        Yields
+        ------
+        h5py.File
+            The open handle.
+        """
+        if self.capacity == 0:
+            with h5py.File(fname, "r") as hf:
+                yield hf
+        else:
+            yield self.get(fname)
+
+    def close(self):
+        """Closes all handles owned by the current process."""
+        if self._pid == os.getpid():
+            for hf in self._handles.values():
+                with contextlib.suppress(Exception):
+                    hf.close()
+        self._handles.clear()
+
+    def reset(self):
+        """Forgets all handles without closing them and binds the pool to the current process.
+
+        Handles inherited through ``fork`` share their file descriptors with the parent, so they are dropped rather
+        than closed.
+        """
+        self._handles = OrderedDict()
+        self._pid = os.getpid()
+
+
+def worker_init_fn(worker_id: int):  # pylint: disable=unused-argument
+    """Re-initializes the per-worker state of an MRI dataset in a :class:`torch.utils.data.DataLoader` worker.
+
+    Every worker gets a fresh :class:`HDF5FilePool`, so no handle is shared between processes, and empty NIfTI volume
+    and slice window caches.
+
+    Parameters
+    ----------
+    worker_id : int
+        The id of the worker, as passed by :class:`torch.utils.data.DataLoader`.
+    """
+    worker_info = torch.utils.data.get_worker_info()
+    if worker_info is None:
+        return
+    file_pool = getattr(worker_info.dataset, "file_pool", None)
+    if isinstance(file_pool, HDF5FilePool):
+        file_pool.reset()
+    volume_cache = getattr(worker_info.dataset, "volume_cache", None)
+    if isinstance(volume_cache, NiftiVolumeCache):
+        volume_cache.reset()
+    slice_window_cache = getattr(worker_info.dataset, "slice_window_cache", None)
+    if isinstance(slice_window_cache, SliceWindowCache):
+        slice_window_cache.reset()
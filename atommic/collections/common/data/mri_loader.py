@@ -6,14 +6,24 @@ import logging
 import os
 import random
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
 
 import h5py
 import numpy as np
-import yaml  # type: ignore
 from defusedxml.ElementTree import fromstring
 from torch.utils.data import Dataset
 
+from atommic.collections.common.data.dataset_index import (
+    VolumeIndex,
+    dataset_index_path,
+    load_dataset_index,
+    load_noise_index,
+    scan_metadata,
+    subsample_examples,
+)
+from atommic.collections.common.data.file_pool import HDF5FilePool
+from atommic.collections.common.data.nifti_volumes import NiftiVolumeCache
+from atommic.collections.common.data.slice_window import SliceWindowCache, read_consecutive_slices
 from atommic.collections.common.parts import utils
 
 
@@ -71,6 +81,11 @@ class MRIDataset(Dataset):
         complex_target: bool = False,
         log_images_rate: Optional[float] = 1.0,
         transform: Optional[Callable] = None,
+        file_handle_pool_size: int = 16,
+        nifti_volume_cache_size: int = 4,
+        slice_window_cache_size: int = 8,
+        metadata_scan_workers: int = 0,
+        metadata_scan_mode: str = "thread",
         **kwargs,  # pylint: disable=unused-argument
     ):
         """Inits :class:`MRIDataset`.
@@ -99,10 +114,11 @@ class MRIDataset(Dataset):
             subsampled datasets either set sample_rates (sample by slices) or volume_sample_rates (sample by volumes)
             but not both.
         use_dataset_cache : bool, optional
-            Whether to cache dataset metadata. This is very useful for large datasets.
+            Whether to cache dataset metadata. This is very useful for large datasets. The cache is a memory-mapped
+            binary index with one row per volume. It is rebuilt when files are added, removed or modified.
         dataset_cache_file : Union[str, Path, os.PathLike, none], optional
             A file in which to cache dataset information for faster load times. If not provided, the cache will be
-            stored in the dataset root.
+            stored in the atommic cache directory.
         num_cols : Optional[Tuple[int]], optional
             If provided, only slices with the desired number of columns will be considered.
         consecutive_slices : int, optional
@@ -123,18 +139,35 @@ class MRIDataset(Dataset):
             should take ``kspace``, ``coil sensitivity maps``, ``quantitative maps``, ``mask``, ``initial prediction``,
             ``target``, ``attributes``, ``filename``, and ``slice number`` as inputs. ``target`` may be null for test
             data. Default is ``None``.
+        file_handle_pool_size : int, optional
+            Number of HDF5 files that are kept open per worker, so that consecutive reads from the same volume reuse
+            one handle. Set to ``0`` to open and close the files on every read. Default is ``16``.
+        nifti_volume_cache_size : int, optional
+            Number of decoded NIfTI volumes that are kept in memory per worker, for the datasets stored as NIfTI
+            files, so that a compressed volume is decoded once rather than for every slice. Set to ``0`` to decode the
+            volume on every read. Default is ``4``.
+        slice_window_cache_size : int, optional
+            Number of HDF5 datasets, e.g. the ``kspace`` of a volume, whose last window of consecutive slices is kept
+            per worker when ``consecutive_slices`` > 1, so that the slices shared by the windows of adjacent slices are
+            read once. Set to ``0`` to read every window from the file. Default is ``8``.
+        metadata_scan_workers : int, optional
+            Number of workers used to read the metadata of the files when the dataset index is built. ``0`` reads the
+            files serially, ``-1`` uses all available cores. Default is ``0``.
+        metadata_scan_mode : str, optional
+            Whether the metadata is read by a pool of ``'thread'`` or ``'process'`` workers. Default is ``'thread'``.
         **kwargs
             Additional keyword arguments.
         """
         super().__init__()
         self.coil_sensitivity_maps_root = coil_sensitivity_maps_root
         self.mask_root = mask_root
-
-        if str(noise_root).endswith(".json"):
-            with open(noise_root, "r") as f:  # type: ignore  # pylint: disable=unspecified-encoding
-                noise_root = [json.loads(line) for line in f.readlines()]  # type: ignore
-        else:
-            noise_root = None
+        self.file_pool = HDF5FilePool(capacity=0 if utils.is_none(file_handle_pool_size) else file_handle_pool_size)
+        self.volume_cache = NiftiVolumeCache(
+            capacity=0 if utils.is_none(nifti_volume_cache_size) else nifti_volume_cache_size
+        )
+        self.slice_window_cache = SliceWindowCache(
+            capacity=0 if utils.is_none(slice_window_cache_size) else slice_window_cache_size
+        )
 
         self.initial_predictions_root = initial_predictions_root
         self.dataset_format = dataset_format
@@ -156,12 +189,6 @@ class MRIDataset(Dataset):
             None if utils.is_none(dataset_cache_file) else Path(dataset_cache_file)  # type: ignore
         )
 
-        if self.dataset_cache_file is not None and self.dataset_cache_file.exists() and use_dataset_cache:
-            with open(self.dataset_cache_file, "rb") as f:
-                dataset_cache = yaml.safe_load(f)
-        else:
-            dataset_cache = {}
-
         if consecutive_slices < 1:
             raise ValueError(f"Consecutive slices {consecutive_slices} is out of range, must be > 0.")
         self.consecutive_slices = consecutive_slices
@@ -170,16 +197,27 @@ class MRIDataset(Dataset):
         self.data_saved_per_slice = data_saved_per_slice
 
         self.recons_key = "reconstruction"
-        self.examples = []
+
+        if str(root).endswith(".json"):
+            with open(root, "r") as f:  # pylint: disable=unspecified-encoding
+                examples = json.load(f)
+            files = [Path(example) for example in examples]
+        else:
+            files = list(Path(root).iterdir())
+
+        dataset_index_file = (
+            dataset_index_path(
+                self.dataset_cache_file, root, f"{type(self).__name__}:{consecutive_slices}:{data_saved_per_slice}"
+            )
+            if use_dataset_cache
+            else None
+        )
+        self.examples = load_dataset_index(dataset_index_file, files)
 
         # Check if our dataset is in the cache. If yes, use that metadata, if not, then regenerate the metadata.
-        if dataset_cache.get(root) is None or not use_dataset_cache:
-            if str(root).endswith(".json"):
-                with open(root, "r") as f:  # pylint: disable=unspecified-encoding
-                    examples = json.load(f)
-                files = [Path(example) for example in examples]
-            else:
-                files = list(Path(root).iterdir())
+        if self.examples is None:
+            volumes = []
+            noise_index = load_noise_index(noise_root) if str(noise_root).endswith(".json") else None
 
             if n2r_supervised_rate != 0.0:
                 # randomly select a subset of files for N2R supervised loss based on n2r_supervised_rate
@@ -187,10 +225,11 @@ class MRIDataset(Dataset):
                     files, int(np.round(n2r_supervised_rate * len(files)))  # type: ignore
                 )
 
-            for fname in sorted(files):
-                metadata, num_slices = self._retrieve_metadata(fname)
+            files = sorted(files)
+            scanned = scan_metadata(self._retrieve_metadata, files, metadata_scan_workers, metadata_scan_mode)
+            for fname, (metadata, num_slices) in zip(files, scanned):
                 metadata["noise_levels"] = (
-                    self.__parse_noise__(noise_root, fname) if noise_root is not None else []  # type: ignore
+                    self.__parse_noise__(noise_index, fname) if noise_index is not None else []  # type: ignore
                 )
                 metadata["n2r_supervised"] = False
                 if n2r_supervised_rate != 0.0:
@@ -199,31 +238,20 @@ class MRIDataset(Dataset):
                     if fname in n2r_supervised_files:
                         metadata["n2r_supervised"] = True
 
-                self.examples += [(fname, slice_ind, metadata) for slice_ind in range(num_slices)]
+                volumes.append((fname, 0, num_slices, metadata))
 
-            if dataset_cache.get(root) is None and use_dataset_cache:
-                dataset_cache[root] = self.examples
-                logging.info("Saving dataset cache to %s.", self.dataset_cache_file)
-                with open(self.dataset_cache_file, "wb") as f:  # type: ignore
-                    yaml.dump(dataset_cache, f)
+            self.examples = VolumeIndex.from_rows(volumes)
+
+            if dataset_index_file is not None:
+                logging.info("Saving dataset cache to %s.", dataset_index_file)
+                self.examples.save(dataset_index_file)
         else:
-            logging.info("Using dataset cache from %s.", self.dataset_cache_file)
-            self.examples = dataset_cache[root]
+            logging.info("Using dataset cache from %s.", dataset_index_file)
 
         # subsample if desired
-        if sample_rate < 1.0:  # sample by slice
-            random.shuffle(self.examples)
-            num_examples = round(len(self.examples) * sample_rate)
-            self.examples = self.examples[:num_examples]
-        elif volume_sample_rate < 1.0:  # sample by volume
-            vol_names = sorted(list({f[0].stem for f in self.examples}))
-            random.shuffle(vol_names)
-            num_volumes = round(len(vol_names) * volume_sample_rate)
-            sampled_vols = vol_names[:num_volumes]
-            self.examples = [example for example in self.examples if example[0].stem in sampled_vols]
-
-        if num_cols and not utils.is_none(num_cols):
-            self.examples = [ex for ex in self.examples if ex[2]["encoding_size"][1] in num_cols]
+        self.examples = subsample_examples(
+            self.examples, sample_rate, volume_sample_rate, None if utils.is_none(num_cols) else num_cols
+        )
 
         self.indices_to_log = np.random.choice(
             len(self.examples), int(log_images_rate * len(self.examples)), replace=False  # type: ignore
@@ -301,13 +329,14 @@ class MRIDataset(Dataset):
         return metadata, num_slices
 
     @staticmethod
-    def __parse_noise__(noise: str, fname: Path) -> List[str]:
+    def __parse_noise__(noise: Dict[str, List], fname: Path) -> List[str]:
         """Parse noise type from filename.
 
         Parameters
         ----------
-        noise : str
-            json string of noise type.
+        noise : Dict[str, List]
+            Noise levels keyed by filename, as loaded by
+            :func:`atommic.collections.common.data.dataset_index.load_noise_index`.
         fname : Path
             Filename to parse noise type from.
 
@@ -316,7 +345,7 @@ class MRIDataset(Dataset):
         List[str]
             List of noise values.
         """
-        return [noise[i]["noise"] for i in range(len(noise)) if noise[i]["fname"] == fname.name]  # type: ignore
+        return list(noise.get(fname.name, []))
 
     def get_consecutive_slices(self, data: Dict, key: str, dataslice: int) -> np.ndarray:
         """Get consecutive slices from a given data dictionary.
@@ -335,7 +364,8 @@ class MRIDataset(Dataset):
         np.ndarray
             Array of consecutive slices. If ``self.consecutive_slices`` is > 1, then the array will have shape
             ``(self.consecutive_slices, *data[key].shape[1:])``. Otherwise, the array will have shape
-            ``data[key].shape[1:]``.
+            ``data[key].shape[1:]``. Windows at the edges of the volume are padded with zero slices of the same
+            dtype.
 
         Examples
         --------
@@ -359,51 +389,52 @@ class MRIDataset(Dataset):
                 return x[dataslice]
             return x
 
-        # get consecutive slices
-        num_slices = x.shape[0]
-
-        # If the number of consecutive slices is greater than or equal to the total slices, return the entire stack
-        if self.consecutive_slices >= num_slices:
-            # pad left and right with zero slices to match the desired number of slices
-            slices_to_add_start = (self.consecutive_slices - num_slices) // 2
-            slices_to_add_end = self.consecutive_slices - num_slices - slices_to_add_start
-            if slices_to_add_start > 0:
-                zero_slices = np.zeros((slices_to_add_start, *x.shape[1:]))
-                x = np.concatenate((zero_slices, x), axis=0)
-            if slices_to_add_end > 0:
-                zero_slices = np.zeros((slices_to_add_end, *x.shape[1:]))
-                x = np.concatenate((x, zero_slices), axis=0)
-            return x
+        return read_consecutive_slices(x, dataslice, self.consecutive_slices, window_cache=self.slice_window_cache)
 
-        # Calculate half of the consecutive slices to determine the middle position
-        half_slices = self.consecutive_slices // 2
+    def get_noise_prewhitening_reference(
+        self, data: Dict, key: str, fname: str, dataslice: int, volume: Optional[Hashable] = None
+    ) -> Optional[np.ndarray]:
+        """Get the reference slice of a volume, on which the transform searches the noise prewhitening patch of the
+        volume.
 
-        # Determine the start and end slices based on the middle position
-        start_slice = dataslice - half_slices
-        end_slice = dataslice + half_slices + 1
+        The reference is the middle slice, so that the patch does not depend on which slice of the volume is loaded
+        first. It is only read while the transform has not searched the patch of the volume, and not when the
+        prewhitened kspace of the slice is loaded from the preprocessing cache of the transform.
 
-        # Handle edge cases
-        slices_to_add_start = 0
-        slices_to_add_end = 0
-        if start_slice < 0:
-            slices_to_add_start = abs(start_slice)
-            start_slice = 0
-
-        if end_slice > (num_slices - 1):
-            slices_to_add_end = end_slice - num_slices
-            extracted_slices = x[start_slice:]
-        else:
-            extracted_slices = x[start_slice:end_slice]
+        Parameters
+        ----------
+        data : dict
+            Data to extract the reference slice from.
+        key : str
+            Key to extract the reference slice from.
+        fname : str
+            The file name, as passed to the transform.
+        dataslice : int
+            The loaded slice.
+        volume : Hashable, optional
+            The volume, as identified by the noise prewhitening of the transform. If ``None``, the file name. Default
+            is ``None``.
 
-        # Add slices to the start and end if needed
-        if slices_to_add_start > 0:
-            zero_slices = np.zeros((slices_to_add_start, *extracted_slices.shape[1:]))
-            extracted_slices = np.concatenate((zero_slices, extracted_slices), axis=0)
-        if slices_to_add_end > 0:
-            zero_slices = np.zeros((slices_to_add_end, *extracted_slices.shape[1:]))
-            extracted_slices = np.concatenate((extracted_slices, zero_slices), axis=0)
+        Returns
+        -------
+        np.ndarray, optional
+            The consecutive slices around the middle slice, as returned by :meth:`get_consecutive_slices`, or ``None``
+            if no reference is needed.
+        """
+        prewhitening = getattr(self.transform, "prewhitening", None)
+        if prewhitening is None or not prewhitening.needs_reference(fname if volume is None else volume):
+            return None
+        preprocessing_cache = getattr(self.transform, "preprocessing_cache", None)
+        if preprocessing_cache is not None and preprocessing_cache.path(fname, dataslice, "kspace").exists():
+            return None
 
-        return extracted_slices
+        if self.consecutive_slices == 1:
+            return self.get_consecutive_slices(data, key, data[key].shape[0] // 2)
+        x = data[key]
+        if self.data_saved_per_slice:
+            x = np.expand_dims(x, axis=0)
+        # not read through the slice window cache, which buffers the windows of the loaded slices
+        return read_consecutive_slices(x, x.shape[0] // 2, self.consecutive_slices)
 
     def __len__(self):
         """Length of :class:`MRIDataset`."""
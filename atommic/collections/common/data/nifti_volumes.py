@@ -0,0 +1,235 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import contextlib
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Union
+
+import h5py
+import nibabel as nib
+import numpy as np
+from tqdm import tqdm
+
+
+def read_nifti_volume(fname: Union[str, Path, os.PathLike]) -> np.ndarray:
+    """Reads the data of a NIfTI file in its stored dtype.
+
+    Unlike ``nib.load(fname).get_fdata()``, which always returns float64, integer images and label maps are returned
+    as stored, e.g. as int16 or uint8. Only scaled data, i.e. with a ``scl_slope``, is returned as floating point.
+
+    Parameters
+    ----------
+    fname : Union[str, Path, os.PathLike]
+        Path to the NIfTI file.
+
+    Returns
+    -------
+    np.ndarray
+        The data of the file.
+    """
+    return np.asanyarray(nib.load(fname).dataobj)
+
+
+class NiftiVolumeCache:
+    """A per-process LRU cache of decoded NIfTI volumes.
+
+    A ``.nii.gz`` file cannot be read partially, so reading one slice decompresses the whole volume. The cache keeps
+    the last decoded volumes, in their stored dtype, so that the slices of a volume are decoded once per worker rather
+    than once per slice. The volumes are read-only, since they are shared by all the slices that are read from them.
+    Like :class:`atommic.collections.common.data.file_pool.HDF5FilePool`, the cache is bound to the process that
+    filled it, and every :class:`torch.utils.data.DataLoader` worker fills its own.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.data.nifti_volumes import NiftiVolumeCache
+    >>> cache = NiftiVolumeCache(capacity=2)
+    >>> cache.get("volume.nii.gz").shape
+    (240, 240, 155)
+    >>> "volume.nii.gz" in cache
+    True
+    """
+
+    def __init__(self, capacity: int = 4):
+        """Inits :class:`NiftiVolumeCache`.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of volumes kept decoded at the same time. When the cache is full, the least recently used
+            volume is dropped. Set to ``0`` to disable caching and decode the file on every access. Default is ``4``.
+        """
+        if capacity is None or capacity < 0:
+            raise ValueError(f"NIfTI volume cache capacity must be >= 0, got {capacity}.")
+        self.capacity = int(capacity)
+        self._volumes: OrderedDict = OrderedDict()
+        self._pid = os.getpid()
+
+    def __len__(self) -> int:
+        """Number of currently cached volumes."""
+        return len(self._volumes)
+
+    def __contains__(self, fname: Union[str, Path, os.PathLike]) -> bool:
+        """Whether the volume of the given file is currently cached."""
+        return str(fname) in self._volumes
+
+    def __getstate__(self):
+        """Only the configuration is sent to spawned workers, not the decoded volumes."""
+        return {"capacity": self.capacity}
+
+    def __setstate__(self, state):
+        """Restores the cache configuration with no cached volumes."""
+        self.__init__(state["capacity"])
+
+    def get(self, fname: Union[str, Path, os.PathLike]) -> np.ndarray:
+        """Returns the decoded volume of a NIfTI file, decoding it if needed.
+
+        Parameters
+        ----------
+        fname : Union[str, Path, os.PathLike]
+            Path to the NIfTI file.
+
+        Returns
+        -------
+        np.ndarray
+            The read-only volume, in its stored dtype, see :func:`read_nifti_volume`.
+        """
+        if self._pid != os.getpid():
+            self.reset()
+        key = str(fname)
+        volume = self._volumes.get(key, None)
+        if volume is not None:
+            self._volumes.move_to_end(key)
+            return volume
+
+        volume = read_nifti_volume(fname)
+        volume.flags.writeable = False
+        if self.capacity > 0:
+            self._volumes[key] = volume
+            while len(self._volumes) > self.capacity:
+                self._volumes.popitem(last=False)
+        return volume
+
+    def reset(self):
+        """Drops all cached volumes and binds the cache to the current process."""
+        self._volumes = OrderedDict()
+        self._pid = os.getpid()
+
+
+def convert_nifti_volume(
+    fname: Union[str, Path, os.PathLike],
+    output_fname: Union[str, Path, os.PathLike],
+    segmentation_fname: Optional[Union[str, Path, os.PathLike]] = None,
+    segmentation_one_hot: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+):
+    """Converts a NIfTI volume, and optionally its segmentation, to an uncompressed HDF5 file chunked per slice.
+
+    The last (slice) dimension of the NIfTI data is moved first, as the datasets read it, and every slice is stored
+    as one contiguous chunk, so that reading a slice reads only that slice. The image is stored under ``target`` in
+    its stored dtype. The segmentation labels are stored one-hot under ``segmentation``, as uint8, with shape
+    ``[n_slices, n_classes, ...]``.
+
+    Parameters
+    ----------
+    fname : Union[str, Path, os.PathLike]
+        Path to the NIfTI file of the image.
+    output_fname : Union[str, Path, os.PathLike]
+        Path to the HDF5 file to write.
+    segmentation_fname : Union[str, Path, os.PathLike], optional
+        Path to the NIfTI file of the segmentation labels. Default is ``None``.
+    segmentation_one_hot : Callable[[np.ndarray], np.ndarray], optional
+        Function that converts the labels to one-hot classes stacked at the first dimension, e.g. the
+        ``segmentation_one_hot`` method of a dataset. Required if ``segmentation_fname`` is given. Default is
+        ``None``.
+    """
+    output_fname = Path(output_fname)
+    output_fname.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file and rename, so that a partially written file is never read
+    fd, tmp_fname = tempfile.mkstemp(suffix=".h5", dir=output_fname.parent)
+    os.close(fd)
+    try:
+        with h5py.File(tmp_fname, "w") as hf:
+            target = np.moveaxis(read_nifti_volume(fname), -1, 0)
+            hf.create_dataset("target", data=target, chunks=(1, *target.shape[1:]))
+            if segmentation_fname is not None:
+                if segmentation_one_hot is None:
+                    raise ValueError("segmentation_one_hot is required to convert the segmentation labels.")
+                labels = np.moveaxis(read_nifti_volume(segmentation_fname), -1, 0)
+                segmentation = np.moveaxis(segmentation_one_hot(labels), 0, 1).astype(np.uint8)
+                hf.create_dataset("segmentation", data=segmentation, chunks=(1, *segmentation.shape[1:]))
+        os.replace(tmp_fname, output_fname)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_fname)
+        raise
+
+
+def _converted_fname(fname: Union[str, Path, os.PathLike], output_dir: Union[str, Path, os.PathLike]) -> Path:
+    """Returns the path of the HDF5 file a NIfTI file is converted to, e.g. ``output_dir/name.h5`` for
+    ``name.nii.gz``."""
+    name = Path(fname).name
+    for suffix in (".nii.gz", ".nii"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    return Path(output_dir) / f"{name}.h5"
+
+
+def convert_nifti_dataset(
+    files: Sequence[Union[str, Path, os.PathLike]],
+    output_dir: Union[str, Path, os.PathLike],
+    segmentation_files: Optional[Sequence[Union[str, Path, os.PathLike]]] = None,
+    segmentation_one_hot: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    num_workers: int = 0,
+) -> List[Path]:
+    """Converts the NIfTI volumes of a dataset to HDF5 files with :func:`convert_nifti_volume`, optionally in
+    parallel.
+
+    Parameters
+    ----------
+    files : Sequence[Union[str, Path, os.PathLike]]
+        The NIfTI files of the images.
+    output_dir : Union[str, Path, os.PathLike]
+        Directory of the HDF5 files, which are named after the images, e.g. ``name.h5`` for ``name.nii.gz``.
+    segmentation_files : Sequence[Union[str, Path, os.PathLike]], optional
+        The NIfTI files of the segmentation labels, in the order of ``files``. Default is ``None``.
+    segmentation_one_hot : Callable[[np.ndarray], np.ndarray], optional
+        Function that converts the labels to one-hot classes, see :func:`convert_nifti_volume`. It must be picklable
+        for ``num_workers > 1``. Default is ``None``.
+    num_workers : int, optional
+        Number of worker processes. ``0`` or ``1`` converts the files serially in the current process. ``-1`` uses all
+        available cores. Default is ``0``.
+
+    Returns
+    -------
+    List[Path]
+        The converted files, in the order of ``files``.
+    """
+    if segmentation_files is None:
+        segmentation_files = [None] * len(files)
+    if len(segmentation_files) != len(files):
+        raise ValueError(f"Got {len(segmentation_files)} segmentation files for {len(files)} files.")
+    output_fnames = [_converted_fname(fname, output_dir) for fname in files]
+    if num_workers is None:
+        num_workers = 0
+    if num_workers < 0:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(files))
+    progress = {"total": len(files), "desc": "Converting NIfTI volumes", "unit": "file"}
+
+    if num_workers <= 1:
+        for fname, output_fname, segmentation_fname in tqdm(zip(files, output_fnames, segmentation_files), **progress):
+            convert_nifti_volume(fname, output_fname, segmentation_fname, segmentation_one_hot)
+        return output_fnames
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(convert_nifti_volume, fname, output_fname, segmentation_fname, segmentation_one_hot)
+            for fname, output_fname, segmentation_fname in zip(files, output_fnames, segmentation_files)
+        ]
+        for future in tqdm(as_completed(futures), **progress):
+            future.result()
+    return output_fnames
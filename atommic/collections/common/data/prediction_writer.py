@@ -0,0 +1,192 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import h5py
+import numpy as np
+
+
+class StreamingPredictionWriter:
+    """Writes test predictions to HDF5 files, one file per volume, while testing runs.
+
+    Slices are handed to a background thread, which writes each of them into a chunked dataset of the volume as soon
+    as it arrives, so that predictions do not accumulate in host memory until the end of the epoch. Datasets are
+    preallocated, with one chunk per slice, and grow geometrically when more slices arrive than allocated. A volume is
+    flushed, trimmed to its number of slices and sorted by slice index when the slices of another volume start
+    arriving, which is when it is complete for a sequential test dataloader, or when the writer is closed. If slices
+    of a flushed volume arrive later, the file is reopened and extended.
+
+    The written files hold the same data as stacking the slices of each volume in slice order. The memory of the
+    slices that are queued but not yet written is bounded by ``max_in_flight_bytes``, above which :meth:`write` blocks.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.data.prediction_writer import StreamingPredictionWriter
+    >>> import numpy as np
+    >>> with StreamingPredictionWriter("predictions", compression="gzip") as writer:
+    ...     for slice_idx in range(3):
+    ...         writer.write("file.h5", slice_idx, {"reconstruction": np.ones((1, 320, 320), dtype=np.complex64)})
+    >>> import h5py
+    >>> h5py.File("predictions/file.h5", "r")["reconstruction"].shape
+    (3, 1, 320, 320)
+    """
+
+    def __init__(
+        self,
+        out_dir: Union[str, Path, os.PathLike],
+        compression: Optional[str] = None,
+        compression_opts: Optional[int] = None,
+        max_in_flight_bytes: int = 512 * 1024**2,
+        initial_num_slices: int = 64,
+    ):
+        """Inits :class:`StreamingPredictionWriter`.
+
+        Parameters
+        ----------
+        out_dir : Union[str, Path, os.PathLike]
+            Directory to write the predictions to. It is created if it does not exist.
+        compression : str, optional
+            HDF5 compression filter of the datasets, e.g. ``gzip`` or ``lzf``. Default is ``None``.
+        compression_opts : int, optional
+            Options of the compression filter, e.g. the ``gzip`` level. Default is ``None``.
+        max_in_flight_bytes : int, optional
+            Maximum number of bytes of slices queued for writing. A single slice larger than the budget is still
+            written. Default is ``512`` MiB.
+        initial_num_slices : int, optional
+            Number of slices for which the datasets of a volume are preallocated. Default is ``64``.
+        """
+        if max_in_flight_bytes <= 0:
+            raise ValueError(f"max_in_flight_bytes must be > 0, got {max_in_flight_bytes}.")
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(exist_ok=True, parents=True)
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.max_in_flight_bytes = int(max_in_flight_bytes)
+        self.initial_num_slices = max(int(initial_num_slices), 1)
+
+        self._queue: queue.Queue = queue.Queue()
+        self._condition = threading.Condition()
+        self._in_flight_bytes = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+
+        # state of the writer thread
+        self._volume: Optional[str] = None
+        self._hf: Optional[h5py.File] = None
+        self._slice_nums: Dict[str, List[int]] = {}
+
+        self._thread = threading.Thread(target=self._run, name="StreamingPredictionWriter", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "StreamingPredictionWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, fname: str, slice_num: int, outputs: Dict[str, np.ndarray]):
+        """Queues the predictions of a slice for writing.
+
+        Parameters
+        ----------
+        fname : str
+            Filename of the volume, relative to the output directory.
+        slice_num : int
+            Index of the slice in the volume, by which the slices are sorted.
+        outputs : Dict[str, np.ndarray]
+            Predictions of the slice, keyed by the name of the dataset to write them to.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot write to a closed StreamingPredictionWriter.")
+        outputs = {name: np.asarray(output) for name, output in outputs.items()}
+        nbytes = sum(output.nbytes for output in outputs.values())
+        with self._condition:
+            while (
+                self._error is None
+                and self._in_flight_bytes > 0
+                and self._in_flight_bytes + nbytes > self.max_in_flight_bytes
+            ):
+                self._condition.wait()
+            self._raise_error()
+            self._in_flight_bytes += nbytes
+        self._queue.put((str(fname), int(slice_num), outputs, nbytes))
+
+    def close(self):
+        """Flushes all volumes and waits for the writes to finish."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        """Re-raises in the calling thread an error of the writer thread."""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Failed to write the predictions.") from error
+
+    def _run(self):
+        """Writes the queued slices, in the writer thread."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    self._flush()
+                    return
+                if self._error is None:
+                    self._write_slice(*item[:3])
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e
+            finally:
+                with self._condition:
+                    if item is not None:
+                        self._in_flight_bytes -= item[3]
+                    self._condition.notify_all()
+
+    def _write_slice(self, fname: str, slice_num: int, outputs: Dict[str, np.ndarray]):
+        """Writes a slice into the next row of the datasets of its volume."""
+        if fname != self._volume:
+            self._flush()
+            # a volume that was flushed before is extended, instead of overwritten
+            self._hf = h5py.File(self.out_dir / fname, "r+" if fname in self._slice_nums else "w")
+            self._volume = fname
+        slice_nums = self._slice_nums.setdefault(fname, [])
+        row = len(slice_nums)
+        for name, output in outputs.items():
+            if name not in self._hf:
+                self._hf.create_dataset(
+                    name,
+                    shape=(self.initial_num_slices,) + output.shape,
+                    maxshape=(None,) + output.shape,
+                    chunks=(1,) + output.shape if output.ndim > 0 else True,
+                    dtype=output.dtype,
+                    compression=self.compression,
+                    compression_opts=self.compression_opts,
+                )
+            dataset = self._hf[name]
+            if row >= dataset.shape[0]:
+                dataset.resize(max(2 * dataset.shape[0], row + 1), axis=0)
+            dataset[row] = output
+        slice_nums.append(slice_num)
+
+    def _flush(self):
+        """Trims the datasets of the current volume to its slices, sorts them by slice index and closes the file."""
+        if self._hf is None:
+            return
+        slice_nums = self._slice_nums[self._volume]  # type: ignore
+        order = np.argsort(slice_nums, kind="stable")
+        for name in self._hf:
+            dataset = self._hf[name]
+            dataset.resize(len(slice_nums), axis=0)
+            if np.any(order != np.arange(len(order))):
+                dataset[...] = dataset[...][order]
+        self._slice_nums[self._volume] = [slice_nums[i] for i in order]  # type: ignore
+        self._hf.close()
+        self._hf = None
+        self._volume = None
@@ -0,0 +1,185 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import torch
+from omegaconf import DictConfig, ListConfig
+from torch.utils.data import DataLoader, Dataset
+from tqdm import tqdm
+
+# Bump when the cached stages change, so that caches written by older versions are not reused.
+PREPROCESSING_CACHE_VERSION = 3
+
+
+def _canonical(value: Any) -> Any:
+    """Converts a config value to a json serializable value, so that equal configs hash equally."""
+    if isinstance(value, (dict, DictConfig)):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, ListConfig)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return repr(value)
+
+
+def hash_config(config: Dict) -> str:
+    """Hashes the config of the deterministic preprocessing transforms.
+
+    Parameters
+    ----------
+    config : Dict
+        The arguments of the deterministic transforms.
+
+    Returns
+    -------
+    str
+        The hex digest of the config.
+    """
+    config = {"version": PREPROCESSING_CACHE_VERSION, **_canonical(config)}
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]  # nosec
+
+
+class PreprocessingCache:
+    """An on-disk cache of the results of the deterministic preprocessing transforms.
+
+    Noise prewhitening, coil compression, zero-filling and the estimation of the coil sensitivity maps give the same
+    result for a slice on every epoch, so they are computed once and stored. The cache is content-addressed: every
+    config of the deterministic transforms gets its own directory, named by the hash of the config, and every
+    intermediate result is stored as a ``.npy`` file keyed by the file name and the slice index. Results are read
+    memory-mapped, and written atomically, so that the workers of a :class:`torch.utils.data.DataLoader` can fill the
+    cache concurrently.
+
+    .. note::
+        Files are keyed by name, so a cache directory must not be shared by datasets that hold different files with
+        the same name.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.data.preprocessing_cache import PreprocessingCache
+    >>> import torch
+    >>> cache = PreprocessingCache("cache", {"apply_gcc": True, "gcc_virtual_coils": 10})
+    >>> cache.load("file.h5", 0, "kspace") is None
+    True
+    >>> cache.save("file.h5", 0, "kspace", torch.ones(10, 320, 320, 2))
+    >>> cache.load("file.h5", 0, "kspace").shape
+    torch.Size([10, 320, 320, 2])
+    """
+
+    def __init__(self, cache_dir: Union[str, Path, os.PathLike], config: Dict):
+        """Inits :class:`PreprocessingCache`.
+
+        Parameters
+        ----------
+        cache_dir : Union[str, Path, os.PathLike]
+            Root directory of the cache.
+        config : Dict
+            The arguments of the deterministic transforms, which address the cached results.
+        """
+        self.config_hash = hash_config(config)
+        self.cache_dir = Path(cache_dir) / self.config_hash
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        config_file = self.cache_dir / "config.json"
+        if not config_file.exists():
+            with open(config_file, "w", encoding="utf-8") as f:
+                json.dump(_canonical(config), f, indent=2, sort_keys=True)
+
+    def __repr__(self) -> str:
+        """Representation of :class:`PreprocessingCache`."""
+        return f"PreprocessingCache(cache_dir={self.cache_dir})"
+
+    def path(self, fname: str, slice_idx: int, name: str) -> Path:
+        """Returns the path of a cached result.
+
+        Parameters
+        ----------
+        fname : str
+            The file name.
+        slice_idx : int
+            The slice index.
+        name : str
+            The name of the result, e.g. ``kspace`` or ``sensitivity_map``.
+
+        Returns
+        -------
+        Path
+            The path of the ``.npy`` file of the result.
+        """
+        return self.cache_dir / Path(fname).name / f"{int(slice_idx)}_{name}.npy"
+
+    def load(self, fname: str, slice_idx: int, name: str) -> Optional[torch.Tensor]:
+        """Loads a cached result.
+
+        Parameters
+        ----------
+        fname : str
+            The file name.
+        slice_idx : int
+            The slice index.
+        name : str
+            The name of the result.
+
+        Returns
+        -------
+        Optional[torch.Tensor]
+            The cached result, or ``None`` if it is not cached. The tensor is backed by a copy-on-write memory map of
+            the file, so only the pages that are read are loaded, and writing to it does not change the cache.
+        """
+        path = self.path(fname, slice_idx, name)
+        if not path.exists():
+            return None
+        return torch.from_numpy(np.load(path, mmap_mode="c"))
+
+    def save(self, fname: str, slice_idx: int, name: str, data: torch.Tensor):
+        """Stores a result.
+
+        Parameters
+        ----------
+        fname : str
+            The file name.
+        slice_idx : int
+            The slice index.
+        name : str
+            The name of the result.
+        data : torch.Tensor
+            The result.
+        """
+        path = self.path(fname, slice_idx, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and rename, so that concurrent readers never see a partially written file
+        fd, tmp_path = tempfile.mkstemp(suffix=".npy", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, data.detach().cpu().numpy())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def _discard(batch: Any):  # pylint: disable=unused-argument
+    """Collates nothing, since only the side effect of filling the cache is needed."""
+    return None
+
+
+def build_preprocessing_cache(dataset: Dataset, num_workers: int = 0):
+    """Fills the preprocessing cache of a dataset, by loading every sample once.
+
+    Parameters
+    ----------
+    dataset : torch.utils.data.Dataset
+        The dataset, whose transforms have a :class:`PreprocessingCache`.
+    num_workers : int, optional
+        Number of worker processes that load the samples in parallel. Default is ``0``.
+    """
+    dataloader = DataLoader(dataset, batch_size=None, shuffle=False, num_workers=num_workers, collate_fn=_discard)
+    for _ in tqdm(dataloader, total=len(dataset), desc="Building the preprocessing cache", unit="slice"):
+        pass
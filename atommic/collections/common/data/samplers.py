@@ -0,0 +1,296 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import math
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import Dataset, DistributedSampler, Sampler
+
+from atommic.collections.common.data.dataset_index import VolumeIndex
+
+
+def volume_slice_indices(dataset: Dataset) -> List[np.ndarray]:
+    """Returns the dataset indices of the slices of every volume of an MRI dataset, in slice order.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset, with its examples as a :class:`atommic.collections.common.data.dataset_index.VolumeIndex` or as
+        a list of ``(fname, slice_ind, metadata)`` tuples, e.g. an
+        :class:`atommic.collections.common.data.mri_loader.MRIDataset`.
+
+    Returns
+    -------
+    List[np.ndarray]
+        The indices of the slices of every volume.
+    """
+    examples = getattr(dataset, "examples", None)
+    if examples is None:
+        raise ValueError(f"The slices of {type(dataset).__name__} cannot be grouped by volume, it has no examples.")
+    if isinstance(examples, VolumeIndex):
+        return [
+            np.arange(examples.offsets[volume], examples.offsets[volume + 1], dtype=np.int64)
+            for volume in range(examples.num_volumes)
+            if examples.offsets[volume + 1] > examples.offsets[volume]
+        ]
+    # e.g. subsampled by slice, in which case the examples are a shuffled list
+    volumes: Dict[str, List[Tuple[int, int]]] = {}
+    for i, (fname, slice_ind, _) in enumerate(examples):
+        volumes.setdefault(str(fname), []).append((slice_ind, i))
+    return [np.asarray([i for _, i in sorted(slices)], dtype=np.int64) for slices in volumes.values()]
+
+
+def _split_volumes(volumes: Sequence[np.ndarray], num_splits: int) -> List[List[np.ndarray]]:
+    """Splits the volumes in splits of about the same number of slices, assigning every volume, in the given order,
+    to the split with the fewest slices so far."""
+    splits: List[List[np.ndarray]] = [[] for _ in range(num_splits)]
+    sizes = np.zeros(num_splits, dtype=np.int64)
+    for volume in volumes:
+        split = int(np.argmin(sizes))
+        splits[split].append(volume)
+        sizes[split] += len(volume)
+    return splits
+
+
+def _concatenate(volumes: Sequence[np.ndarray]) -> np.ndarray:
+    """Concatenates the slices of the volumes."""
+    return np.concatenate(volumes) if len(volumes) > 0 else np.empty(0, dtype=np.int64)
+
+
+class VolumeSampler(Sampler):
+    """Samples the slices of an MRI dataset volume by volume, so that every volume is read by one worker.
+
+    A :class:`torch.utils.data.RandomSampler` sends every worker of a :class:`torch.utils.data.DataLoader` slices of
+    random volumes, so the workers cannot reuse their open files, e.g. of
+    :class:`atommic.collections.common.data.file_pool.HDF5FilePool`, or their decoded volumes, e.g. of
+    :class:`atommic.collections.common.data.nifti_volumes.NiftiVolumeCache`. Instead, every epoch the volumes are
+    shuffled, and the slices of every volume are shuffled in blocks of ``slice_block_size`` consecutive slices. The
+    volumes are then split among the workers, and, since the :class:`torch.utils.data.DataLoader` sends the batches to
+    its workers in turn, the batches of every worker are interleaved, so that every worker reads its volumes one
+    after the other.
+
+    .. note::
+        The slices of a batch come from the same volume, except at the end of an epoch.
+
+    Examples
+    --------
+    >>> from torch.utils.data import DataLoader
+    >>> from atommic.collections.common.data.samplers import VolumeSampler
+    >>> sampler = VolumeSampler(dataset, slice_block_size=4, num_workers=4, batch_size=2)
+    >>> dataloader = DataLoader(dataset, batch_size=2, sampler=sampler, num_workers=4)
+    """
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self,
+        dataset: Dataset,
+        shuffle: bool = True,
+        slice_block_size: Optional[int] = None,
+        num_workers: int = 0,
+        batch_size: int = 1,
+        seed: Optional[int] = None,
+    ):
+        """Inits :class:`VolumeSampler`.
+
+        Parameters
+        ----------
+        dataset : Dataset
+            The dataset, see :func:`volume_slice_indices`.
+        shuffle : bool, optional
+            Whether to shuffle the volumes, and the blocks of slices of every volume. If ``False``, the volumes and
+            their slices are sampled in order. Default is ``True``.
+        slice_block_size : int, optional
+            Number of consecutive slices that are kept in order when the slices of a volume are shuffled. If ``None``,
+            the slices of every volume are sampled in order. Default is ``None``.
+        num_workers : int, optional
+            Number of workers of the :class:`torch.utils.data.DataLoader`. Default is ``0``.
+        batch_size : int, optional
+            Batch size of the :class:`torch.utils.data.DataLoader`. Default is ``1``.
+        seed : int, optional
+            Seed of the order of the epoch, which is combined with the epoch set by :meth:`set_epoch`. If ``None``,
+            every epoch is shuffled randomly. Default is ``None``.
+        """
+        if slice_block_size is not None and slice_block_size < 1:
+            raise ValueError(f"Slice block size {slice_block_size} is out of range, must be > 0.")
+        self.dataset = dataset
+        self.volumes = volume_slice_indices(dataset)
+        self.shuffle = shuffle
+        self.slice_block_size = slice_block_size
+        self.num_workers = max(int(num_workers or 0), 0)
+        self.batch_size = max(int(batch_size or 1), 1)
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """Sets the epoch, which seeds the order of the slices together with ``seed``.
+
+        Parameters
+        ----------
+        epoch : int
+            The epoch.
+        """
+        self.epoch = epoch
+
+    def _generator(self) -> torch.Generator:
+        """Returns the random number generator of the current epoch."""
+        generator = torch.Generator()
+        if self.seed is None:
+            generator.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+        else:
+            generator.manual_seed(self.seed + self.epoch)
+        return generator
+
+    def _shuffle_volumes(self, generator: torch.Generator) -> List[np.ndarray]:
+        """Returns the volumes in the order of the epoch, with the blocks of slices of every volume in the order of the
+        epoch."""
+        if not self.shuffle:
+            return list(self.volumes)
+        volumes = []
+        for volume in torch.randperm(len(self.volumes), generator=generator).tolist():
+            slices = self.volumes[volume]
+            if self.slice_block_size is not None and len(slices) > self.slice_block_size:
+                blocks = np.split(slices, range(self.slice_block_size, len(slices), self.slice_block_size))
+                slices = np.concatenate([blocks[b] for b in torch.randperm(len(blocks), generator=generator).tolist()])
+            volumes.append(slices)
+        return volumes
+
+    def _interleave_workers(self, volumes: Sequence[np.ndarray]) -> np.ndarray:
+        """Splits the volumes among the workers, and interleaves the batches of the workers in the order in which the
+        :class:`torch.utils.data.DataLoader` sends the batches to its workers."""
+        if self.num_workers <= 1:
+            return _concatenate(volumes)
+        streams = [_concatenate(split) for split in _split_volumes(volumes, self.num_workers)]
+        # every worker gets a batch in turn, for as long as all workers have a full batch left
+        num_rounds = min(len(stream) for stream in streams) // self.batch_size
+        length = num_rounds * self.batch_size
+        interleaved = np.stack(
+            [stream[:length].reshape(num_rounds, self.batch_size) for stream in streams], axis=1
+        ).reshape(-1)
+        return np.concatenate([interleaved, *[stream[length:] for stream in streams]])
+
+    def _indices(self) -> np.ndarray:
+        """Returns the indices of the slices of the epoch."""
+        return self._interleave_workers(self._shuffle_volumes(self._generator()))
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterates over the indices of the slices of the epoch."""
+        return iter(self._indices().tolist())
+
+    def __len__(self) -> int:
+        """Number of slices of an epoch."""
+        return sum(len(volume) for volume in self.volumes)
+
+
+class DistributedVolumeSampler(VolumeSampler, DistributedSampler):
+    """A :class:`VolumeSampler` that splits the volumes among the processes of distributed training.
+
+    Every process gets whole volumes, of about the same number of slices in total, and the same shuffling seed, so the
+    processes agree on the split of every epoch. As in :class:`torch.utils.data.DistributedSampler`, every process
+    samples the same number of slices, so the last slices of the processes with more slices are moved to the processes
+    with fewer, and some slices are repeated if needed.
+
+    The number of processes and the rank are resolved when the sampler is iterated, so that the sampler can be created
+    before the process group is initialized, e.g. with the model. Since it is a
+    :class:`torch.utils.data.DistributedSampler`, PyTorch Lightning does not replace it. Without a process group, it
+    is a :class:`VolumeSampler`.
+    """
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self,
+        dataset: Dataset,
+        num_replicas: Optional[int] = None,
+        rank: Optional[int] = None,
+        shuffle: bool = True,
+        slice_block_size: Optional[int] = None,
+        num_workers: int = 0,
+        batch_size: int = 1,
+        seed: int = 0,
+        drop_last: bool = False,
+    ):
+        """Inits :class:`DistributedVolumeSampler`.
+
+        Parameters
+        ----------
+        dataset : Dataset
+            The dataset, see :func:`volume_slice_indices`.
+        num_replicas : int, optional
+            Number of processes. If ``None``, the world size of the process group. Default is ``None``.
+        rank : int, optional
+            Rank of the current process. If ``None``, the rank in the process group. Default is ``None``.
+        shuffle : bool, optional
+            Whether to shuffle the volumes, and the blocks of slices of every volume. Default is ``True``.
+        slice_block_size : int, optional
+            Number of consecutive slices that are kept in order when the slices of a volume are shuffled. If ``None``,
+            the slices of every volume are sampled in order. Default is ``None``.
+        num_workers : int, optional
+            Number of workers of the :class:`torch.utils.data.DataLoader` of every process. Default is ``0``.
+        batch_size : int, optional
+            Batch size of the :class:`torch.utils.data.DataLoader`. Default is ``1``.
+        seed : int, optional
+            Seed of the order of the epoch, which must be the same in all processes. Default is ``0``.
+        drop_last : bool, optional
+            Whether to drop slices so that every process samples the same number of slices, instead of repeating
+            slices. Default is ``False``.
+        """
+        # DistributedSampler.__init__ requires an initialized process group, so the attributes are set here
+        VolumeSampler.__init__(
+            self,
+            dataset,
+            shuffle=shuffle,
+            slice_block_size=slice_block_size,
+            num_workers=num_workers,
+            batch_size=batch_size,
+            seed=seed,
+        )
+        if rank is not None and num_replicas is not None and not 0 <= rank < num_replicas:
+            raise ValueError(f"Invalid rank {rank}, rank should be in the interval [0, {num_replicas - 1}].")
+        self._num_replicas = num_replicas
+        self._rank = rank
+        self.drop_last = drop_last
+
+    @property
+    def num_replicas(self) -> int:  # type: ignore
+        """Number of processes."""
+        if self._num_replicas is not None:
+            return self._num_replicas
+        return dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+
+    @property
+    def rank(self) -> int:  # type: ignore
+        """Rank of the current process."""
+        if self._rank is not None:
+            return self._rank
+        return dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+
+    @property
+    def num_samples(self) -> int:  # type: ignore
+        """Number of slices that every process samples in an epoch."""
+        num_slices = VolumeSampler.__len__(self)
+        if self.drop_last:
+            return num_slices // self.num_replicas
+        return math.ceil(num_slices / self.num_replicas)
+
+    def _indices(self) -> np.ndarray:
+        """Returns the indices of the slices of the current process in the epoch."""
+        volumes = self._shuffle_volumes(self._generator())
+        num_samples = self.num_samples
+        processes = [self._interleave_workers(split) for split in _split_volumes(volumes, self.num_replicas)]
+        # the last slices of the processes with more slices go to the processes with fewer, so that every slice is
+        # sampled
+        overflow = _concatenate([indices[num_samples:] for indices in processes])
+        start = 0
+        for rank, indices in enumerate(processes[: self.rank + 1]):
+            missing = max(num_samples - len(indices), 0)
+            processes[rank] = np.concatenate([indices[:num_samples], overflow[start : start + missing]])
+            start += missing
+        indices = processes[self.rank]
+        if len(indices) == 0:
+            indices = _concatenate(volumes)
+        # np.resize repeats the indices from the start
+        return np.resize(indices, num_samples)
+
+    def __len__(self) -> int:
+        """Number of slices that the current process samples in an epoch."""
+        return self.num_samples
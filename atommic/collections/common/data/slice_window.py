@@ -0,0 +1,192 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+import h5py
+import numpy as np
+
+
+class _SliceRingBuffer:
+    """Ring buffer of the last slices read from an HDF5 dataset. Slice ``s`` is kept in slot ``s % size``, so a window
+    of ``size`` consecutive slices that moves by one slice evicts only the slice it leaves."""
+
+    def __init__(self, size: int, slice_shape: Tuple[int, ...], dtype: np.dtype):
+        """Inits :class:`_SliceRingBuffer`."""
+        self.slots = np.empty((size, *slice_shape), dtype=dtype)
+        self.tags = np.full(size, -1, dtype=np.int64)
+
+    def matches(self, size: int, slice_shape: Tuple[int, ...], dtype: np.dtype) -> bool:
+        """Whether the buffer holds slices of the given shape and dtype, in the given number of slots."""
+        return len(self.tags) == size and self.slots.shape[1:] == slice_shape and self.slots.dtype == dtype
+
+    def read(self, x: h5py.Dataset, start: int, stop: int, out: np.ndarray):
+        """Reads the slices ``start`` to ``stop`` of the dataset to ``out``, reading from the file only the slices
+        that are not buffered, in contiguous runs."""
+        size = len(self.tags)
+        missing = [s for s in range(start, stop) if self.tags[s % size] != s]
+        run_start = 0
+        for i, s in enumerate(missing):
+            if i + 1 < len(missing) and missing[i + 1] == s + 1:
+                continue
+            first = missing[run_start]
+            for j, data in enumerate(x[first : s + 1]):
+                self.slots[(first + j) % size] = data
+                self.tags[(first + j) % size] = first + j
+            run_start = i + 1
+        for s in range(start, stop):
+            out[s - start] = self.slots[s % size]
+
+
+class SliceWindowCache:
+    """A per-process LRU cache of the last slices read from HDF5 datasets, for reading consecutive slices.
+
+    With ``consecutive_slices > 1``, the windows of adjacent slices overlap in all but one slice, so reading every
+    window from the file reads every slice ``consecutive_slices`` times. The cache keeps a ring buffer of the last
+    window of every dataset, keyed by the file and the dataset name, and only the slices that are not buffered are
+    read from the file. Reuse depends on reading the slices of a volume in order, e.g. with
+    :class:`atommic.collections.common.data.samplers.VolumeSampler`. Like
+    :class:`atommic.collections.common.data.file_pool.HDF5FilePool`, the cache is bound to the process that filled it.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from atommic.collections.common.data.slice_window import SliceWindowCache
+    >>> cache = SliceWindowCache(capacity=4)
+    >>> with h5py.File("file.h5", "r") as hf:
+    ...     out = np.empty((3, *hf["kspace"].shape[1:]), dtype=hf["kspace"].dtype)
+    ...     cache.read(hf["kspace"], 4, 7, out)  # reads slices 4, 5 and 6
+    ...     cache.read(hf["kspace"], 5, 8, out)  # reads only slice 7
+    """
+
+    def __init__(self, capacity: int = 8):
+        """Inits :class:`SliceWindowCache`.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of datasets, e.g. the ``kspace`` and the ``sensitivity_map`` of a volume, whose slices are
+            buffered at the same time. Set to ``0`` to read every window from the file. Default is ``8``.
+        """
+        if capacity is None or capacity < 0:
+            raise ValueError(f"Slice window cache capacity must be >= 0, got {capacity}.")
+        self.capacity = int(capacity)
+        self._buffers: OrderedDict = OrderedDict()
+        self._pid = os.getpid()
+
+    def __len__(self) -> int:
+        """Number of currently buffered datasets."""
+        return len(self._buffers)
+
+    def __getstate__(self):
+        """Only the configuration is sent to spawned workers, not the buffered slices."""
+        return {"capacity": self.capacity}
+
+    def __setstate__(self, state):
+        """Restores the cache configuration with no buffered slices."""
+        self.__init__(state["capacity"])
+
+    def read(self, x: h5py.Dataset, start: int, stop: int, out: np.ndarray, size: Optional[int] = None):
+        """Reads the slices ``start`` to ``stop`` of the first dimension of a dataset to ``out``.
+
+        Parameters
+        ----------
+        x : h5py.Dataset
+            The dataset.
+        start : int
+            First slice to read.
+        stop : int
+            Slice after the last slice to read.
+        out : np.ndarray
+            Array of ``stop - start`` slices to read the slices to.
+        size : int, optional
+            Number of slices that are buffered for the dataset. If ``None``, ``stop - start``. Default is ``None``.
+        """
+        if self.capacity == 0:
+            out[...] = x[start:stop]
+            return
+        if self._pid != os.getpid():
+            self.reset()
+
+        size = max(stop - start, size or 0, 1)
+        key = (x.file.filename, x.name)
+        buffer = self._buffers.get(key, None)
+        if buffer is None or not buffer.matches(size, x.shape[1:], x.dtype):
+            buffer = _SliceRingBuffer(size, x.shape[1:], x.dtype)
+        self._buffers[key] = buffer
+        self._buffers.move_to_end(key)
+        while len(self._buffers) > self.capacity:
+            self._buffers.popitem(last=False)
+        buffer.read(x, start, stop, out)
+
+    def reset(self):
+        """Drops all buffered slices and binds the cache to the current process."""
+        self._buffers = OrderedDict()
+        self._pid = os.getpid()
+
+
+def read_consecutive_slices(
+    x: Union[np.ndarray, h5py.Dataset],
+    dataslice: int,
+    consecutive_slices: int,
+    axis: int = 0,
+    window_cache: Optional[SliceWindowCache] = None,
+) -> np.ndarray:
+    """Reads the window of consecutive slices centered at a slice, padded with zero slices at the edges of the
+    volume.
+
+    The window is preallocated in the dtype of the data, so padding does not change the dtype. If the number of
+    consecutive slices is greater than or equal to the number of slices, all slices are returned, padded on both sides.
+
+    Parameters
+    ----------
+    x : Union[np.ndarray, h5py.Dataset]
+        The volume.
+    dataslice : int
+        The center slice of the window.
+    consecutive_slices : int
+        Number of consecutive slices. The window holds ``2 * (consecutive_slices // 2) + 1`` slices, unless there are
+        fewer slices than ``consecutive_slices``.
+    axis : int, optional
+        The slice dimension. Default is ``0``.
+    window_cache : SliceWindowCache, optional
+        Cache of the slices of the previous windows, used for HDF5 datasets sliced along the first dimension. Default
+        is ``None``.
+
+    Returns
+    -------
+    np.ndarray
+        The window of consecutive slices.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from atommic.collections.common.data.slice_window import read_consecutive_slices
+    >>> x = np.arange(1, 5, dtype=np.float32)
+    >>> read_consecutive_slices(x, 0, 3)
+    array([0., 1., 2.], dtype=float32)
+    """
+    num_slices = x.shape[axis]
+    if consecutive_slices >= num_slices:
+        length = consecutive_slices
+        padding = (consecutive_slices - num_slices) // 2
+        start, stop = 0, num_slices
+    else:
+        half_slices = consecutive_slices // 2
+        start, stop = dataslice - half_slices, dataslice + half_slices + 1
+        length = stop - start
+        padding = max(-start, 0)
+        start, stop = max(start, 0), min(stop, num_slices)
+
+    shape = list(x.shape)
+    shape[axis] = length
+    window = np.zeros(shape, dtype=x.dtype)
+    index = (slice(None),) * axis
+    out = window[(*index, slice(padding, padding + stop - start))]
+    if window_cache is not None and axis == 0 and isinstance(x, h5py.Dataset):
+        window_cache.read(x, start, stop, out, size=length)
+    else:
+        out[...] = x[(*index, slice(start, stop))]
+    return window
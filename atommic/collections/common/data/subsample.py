@@ -2,7 +2,7 @@
 __author__ = "Dimitris Karkalousos"
 
 import contextlib
-from typing import List, Optional, Sequence, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 import numba as nb
 import numpy as np
@@ -582,7 +582,10 @@ class Poisson2DMaskFunc(MaskFunc):
     The function generates a variable density Poisson-disc sampling mask with density proportional to
     :math:`1 / (1 + s |r|)`, where :math:`r` represents the k-space radius, and :math:`s` represents the slope. A
     binary search is performed on the slope :math:`s` such that the resulting acceleration factor is close to the
-    prescribed acceleration factor `accel`. The parameter `tol` determines how much they can deviate.
+    prescribed acceleration factor `accel`. The parameter `tol` determines how much they can deviate. The slope found
+    for a shape and acceleration factor is remembered and tried first the next time, which usually avoids the search.
+    Optionally, a bank of pregenerated masks per shape and acceleration factor can be sampled instead, see
+    ``mask_bank_size``.
 
     References
     ----------
@@ -592,6 +595,27 @@ class Poisson2DMaskFunc(MaskFunc):
         Taken and adapted from: https://github.com/mikgroup/sigpy/blob/master/sigpy/mri/samp.py
     """
 
+    def __init__(self, center_fractions: Sequence[float], accelerations: Sequence[int], mask_bank_size: int = 0):
+        """Inits :class:`Poisson2DMaskFunc`.
+
+        Parameters
+        ----------
+        center_fractions : Sequence[float]
+            Fraction of low-frequency columns to be retained. If multiple values are provided, then one of these
+            numbers is chosen uniformly each time.
+        accelerations : Sequence[int]
+            Amount of under-sampling. This should have the same length as center_fractions. If multiple values are
+            provided, then one of these is chosen uniformly each time.
+        mask_bank_size : int, optional
+            If greater than ``0``, the first ``mask_bank_size`` masks generated for every shape, acceleration factor
+            and set of mask parameters are kept, and afterward masks are drawn from them instead of being generated.
+            Default is ``0``.
+        """
+        super().__init__(center_fractions, accelerations)
+        self.mask_bank_size = mask_bank_size
+        self.mask_bank: Dict[Tuple, List[torch.Tensor]] = {}
+        self.slopes: Dict[Tuple, Optional[float]] = {}
+
     def __call__(
         self,
         shape: Union[Sequence[int], np.ndarray],
@@ -643,6 +667,24 @@ class Poisson2DMaskFunc(MaskFunc):
             self.center_scale = center_scale
             _, self.acceleration = self.choose_acceleration()
 
+            if self.mask_bank_size > 0:
+                bank = self.mask_bank.setdefault(
+                    (
+                        self.shape,
+                        self.acceleration,
+                        partial_fourier_percentage,
+                        center_scale,
+                        tuple(calib),  # type: ignore
+                        crop_corner,
+                        max_attempts,
+                        tol,
+                    ),
+                    [],
+                )
+                if len(bank) >= self.mask_bank_size:
+                    # the mask is drawn with the seeded generator, so the same seed draws the same mask
+                    return bank[self.rng.randint(0, len(bank))].clone(), self.acceleration
+
             ny, nx = self.shape
             y, x = np.mgrid[:ny, :nx]
             x = np.maximum(abs(x - nx / 2) - calib[-1] / 2, 0)  # type: ignore
@@ -652,30 +694,16 @@ class Poisson2DMaskFunc(MaskFunc):
 
             r = np.hypot(x, y)
 
-            slope_max = 40.0
-            slope_min = 0.0
-
-            d = max(nx, ny)
-
-            while slope_min < slope_max:
-                slope = (slope_max + slope_min) / 2
-                radius_x = np.clip((1 + r * slope) * nx / d, 1, None)
-                radius_y = np.clip((1 + r * slope) * ny / d, 1, None)
-
-                mask = self.generate_poisson_mask(nx, ny, max_attempts, radius_x, radius_y, calib)
-
-                if crop_corner:
-                    mask *= r < 1
-
-                with np.errstate(divide="ignore", invalid="ignore"):
-                    actual_acceleration = mask.size / np.sum(mask)
-
-                if abs(actual_acceleration - self.acceleration) < tol:
-                    break
-                if actual_acceleration < self.acceleration:
-                    slope_min = slope
-                else:
-                    slope_max = slope
+            slope_key = (self.shape, self.acceleration, tuple(calib), crop_corner, max_attempts, tol)  # type: ignore
+            if slope_key not in self.slopes:
+                # searched once with a fixed seed, so that the masks of a seed do not depend on the previous calls
+                _, self.slopes[slope_key], _ = self.search_slope(
+                    r, calib, crop_corner, max_attempts, tol, np.random.RandomState(0)  # type: ignore
+                )
+            # the search starts from the slope that satisfies the acceleration factor, if any
+            mask, _, actual_acceleration = self.search_slope(
+                r, calib, crop_corner, max_attempts, tol, self.rng, self.slopes[slope_key]  # type: ignore
+            )
 
             pattern1 = mask
             pattern2 = self.centered_circle()
@@ -689,8 +717,78 @@ class Poisson2DMaskFunc(MaskFunc):
 
             mask = torch.from_numpy(mask.reshape(self.shape).astype(np.float32)).unsqueeze(0).unsqueeze(-1)
 
+            if self.mask_bank_size > 0:
+                bank.append(mask.clone())
+
         return mask, self.acceleration
 
+    def search_slope(
+        self,
+        r: np.ndarray,
+        calib: Tuple[float, float],
+        crop_corner: bool,
+        max_attempts: int,
+        tol: float,
+        rng: np.random.RandomState,
+        slope: Optional[float] = None,
+    ) -> Tuple[np.ndarray, Optional[float], float]:
+        """Searches by bisection the slope of the sampling radius over the distance from the center of k-space, for
+        which the Poisson mask satisfies the acceleration factor.
+
+        Parameters
+        ----------
+        r : np.ndarray
+            The normalized distance of every point from the center of k-space.
+        calib : Tuple[float, float]
+            Defines the size of the calibration region.
+        crop_corner : bool
+            If set to True, the corners of the mask, outside the unit distance, are not sampled.
+        max_attempts : int
+            Maximum number of attempts to place a point in the Poisson mask.
+        tol : float
+            Tolerance for the acceleration factor.
+        rng : np.random.RandomState
+            Generator of the seeds of the Poisson masks.
+        slope : float, optional
+            The slope to try first. If ``None``, the search starts from the middle of the range. Default is ``None``.
+
+        Returns
+        -------
+        Tuple[np.ndarray, Optional[float], float]
+            The last generated mask, the slope that satisfies the acceleration factor, or ``None`` if none does, and
+            the acceleration factor of the mask.
+        """
+        ny, nx = self.shape
+        d = max(nx, ny)
+        slope_max = 40.0
+        slope_min = 0.0
+
+        while slope_min < slope_max:
+            if slope is None:
+                slope = (slope_max + slope_min) / 2
+            radius_x = np.clip((1 + r * slope) * nx / d, 1, None)
+            radius_y = np.clip((1 + r * slope) * ny / d, 1, None)
+
+            mask = self.generate_poisson_mask(
+                nx, ny, max_attempts, radius_x, radius_y, calib, rng.randint(0, 2**31 - 1)  # type: ignore
+            )
+
+            if crop_corner:
+                mask *= r < 1
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                actual_acceleration = mask.size / np.sum(mask)
+
+            if abs(actual_acceleration - self.acceleration) < tol:
+                return mask, slope, actual_acceleration
+            if actual_acceleration < self.acceleration:
+                slope_min = slope
+            else:
+                slope_max = slope
+            slope = None
+
+        return mask, None, actual_acceleration
+
     def centered_circle(self) -> np.ndarray:
         """Creates a boolean centered circle image using the center_scale as a radius.
 
@@ -718,10 +816,14 @@ class Poisson2DMaskFunc(MaskFunc):
         radius_x: np.ndarray,
         radius_y: np.ndarray,
         calib: Tuple[float, float],
+        seed: int = -1,
     ) -> np.ndarray:
         """Generates a Poisson mask of shape `(ny, nx)` by placing points on the grid according to a Poisson
         distribution.
 
+        Sampled points are indexed by a uniform grid of cells, so that a candidate point with a large neighbourhood is
+        only checked against the points in the cells that overlap it, instead of against every pixel of it.
+
         Parameters
         ----------
         nx : int
@@ -738,19 +840,36 @@ class Poisson2DMaskFunc(MaskFunc):
             Defines the size of the calibration region. The calibration region is a square region in the center of
             k-space. The first value defines the percentage of the center that is sampled. The second value defines
             the size of the calibration region in the center of k-space.
+        seed : int, optional
+            Seed of the random number generator. If negative, the generator is not seeded. Default is ``-1``.
 
         Returns
         -------
         np.ndarray
             A binary mask with points placed according to a Poisson distribution.
         """
+        if seed >= 0:
+            np.random.seed(seed)
+
         mask = np.zeros((ny, nx))
 
+        # grid of cells indexing the sampled points, with a linked list of points per cell
+        cell_size = 4
+        cell_head = np.full(((ny + cell_size - 1) // cell_size, (nx + cell_size - 1) // cell_size), -1, np.int64)
+        next_point = np.empty(nx * ny, np.int64)
+        point_x = np.empty(nx * ny, np.int64)
+        point_y = np.empty(nx * ny, np.int64)
+        num_points = 0
+
         # Add calibration region
-        mask[
-            int(ny / 2 - calib[-2] / 2) : int(ny / 2 + calib[-2] / 2),
-            int(nx / 2 - calib[-1] / 2) : int(nx / 2 + calib[-1] / 2),
-        ] = 1
+        for y in range(max(int(ny / 2 - calib[-2] / 2), 0), min(int(ny / 2 + calib[-2] / 2), ny)):
+            for x in range(max(int(nx / 2 - calib[-1] / 2), 0), min(int(nx / 2 + calib[-1] / 2), nx)):
+                mask[y, x] = 1
+                point_x[num_points] = x
+                point_y[num_points] = y
+                next_point[num_points] = cell_head[y // cell_size, x // cell_size]
+                cell_head[y // cell_size, x // cell_size] = num_points
+                num_points += 1
 
         # initialize active list
         pxs = np.empty(nx * ny, np.int32)
@@ -768,6 +887,8 @@ class Poisson2DMaskFunc(MaskFunc):
             # Attempt to generate point
             done = False
             k = 0
+            qx = 0.0
+            qy = 0.0
             while not done and k < max_attempts:
                 # Generate point randomly from r and 2 * r
                 v = (np.random.random() * 3 + 1) ** 0.5
@@ -783,12 +904,34 @@ class Poisson2DMaskFunc(MaskFunc):
                     endy = min(int(qy + ry + 1), ny)
 
                     done = True
-                    for x in range(startx, endx):
-                        for y in range(starty, endy):
-                            if mask[y, x] == 1 and (
-                                ((qx - x) / radius_x[y, x]) ** 2 + ((qy - y) / (radius_y[y, x])) ** 2 < 1
-                            ):
-                                done = False
+                    if (endx - startx) * (endy - starty) <= cell_size**3:
+                        # small neighbourhoods are cheaper to check pixel by pixel
+                        for x in range(startx, endx):
+                            for y in range(starty, endy):
+                                if mask[y, x] == 1 and (
+                                    ((qx - x) / radius_x[y, x]) ** 2 + ((qy - y) / (radius_y[y, x])) ** 2 < 1
+                                ):
+                                    done = False
+                                    break
+                            if not done:
+                                break
+                    else:
+                        for cy in range(starty // cell_size, (endy - 1) // cell_size + 1):
+                            for cx in range(startx // cell_size, (endx - 1) // cell_size + 1):
+                                j = cell_head[cy, cx]
+                                while done and j >= 0:
+                                    x = point_x[j]
+                                    y = point_y[j]
+                                    if (
+                                        startx <= x < endx
+                                        and starty <= y < endy
+                                        and ((qx - x) / radius_x[y, x]) ** 2 + ((qy - y) / (radius_y[y, x])) ** 2 < 1
+                                    ):
+                                        done = False
+                                    j = next_point[j]
+                                if not done:
+                                    break
+                            if not done:
                                 break
 
                 k += 1
@@ -797,7 +940,15 @@ class Poisson2DMaskFunc(MaskFunc):
             if done:
                 pxs[num_actives] = qx
                 pys[num_actives] = qy
-                mask[int(qy), int(qx)] = 1
+                x = int(qx)
+                y = int(qy)
+                if mask[y, x] == 0:
+                    mask[y, x] = 1
+                    point_x[num_points] = x
+                    point_y[num_points] = y
+                    next_point[num_points] = cell_head[y // cell_size, x // cell_size]
+                    cell_head[y // cell_size, x // cell_size] = num_points
+                    num_points += 1
                 num_actives += 1
             else:
                 pxs[i] = pxs[num_actives - 1]
@@ -910,7 +1061,10 @@ class Powerlaw1DMaskFunc(MaskFunc):
 
 
 def create_masker(
-    mask_type_str: str, center_fractions: Union[Sequence[float], float], accelerations: Union[Sequence[int], int]
+    mask_type_str: str,
+    center_fractions: Union[Sequence[float], float],
+    accelerations: Union[Sequence[int], int],
+    mask_bank_size: int = 0,
 ) -> MaskFunc:
     """Creates a MaskFunc object based on the specified mask type.
 
@@ -923,6 +1077,9 @@ def create_masker(
         The center fractions for the mask.
     accelerations : Sequence[int] or int
         The accelerations for the mask.
+    mask_bank_size : int, optional
+        Number of pregenerated masks, per shape and acceleration, to draw from for the ``poisson2d`` mask. ``0``
+        generates every mask on the fly. Default is ``0``.
 
     Returns
     -------
@@ -965,5 +1122,5 @@ def create_masker(
     if mask_type_str == "powerlaw1d":
         return Powerlaw1DMaskFunc(center_fractions, accelerations)
     if mask_type_str == "poisson2d":
-        return Poisson2DMaskFunc(center_fractions, accelerations)
+        return Poisson2DMaskFunc(center_fractions, accelerations, mask_bank_size)
     raise NotImplementedError(f"{mask_type_str} not supported")
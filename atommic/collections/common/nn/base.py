@@ -1,7 +1,9 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
+import os
 from abc import ABC
+from pathlib import Path
 from typing import Dict, Optional, Sequence, Tuple
 
 import torch
@@ -12,6 +14,7 @@ from torch import nn
 from torch.utils.data import DataLoader
 from torchmetrics.metric import Metric
 
+from atommic.collections.common.data.prediction_writer import StreamingPredictionWriter
 from atommic.collections.common.parts import utils
 from atommic.collections.common.parts.fft import ifft2
 from atommic.collections.reconstruction.nn.unet_base.unet_block import NormUnet
@@ -88,6 +91,12 @@ class BaseMRIModel(modelPT.ModelPT, ABC):
 
         super().__init__(cfg=cfg, trainer=trainer)
 
+        # Test predictions are streamed to disk, optionally compressed, with a bounded memory budget.
+        self.predictions_compression = cfg.get("predictions_compression", None)
+        self.predictions_compression_opts = cfg.get("predictions_compression_opts", None)
+        self.predictions_max_in_flight_mb = cfg.get("predictions_max_in_flight_mb", 512)
+        self.predictions_writer: Optional[StreamingPredictionWriter] = None
+
     # pylint: disable=arguments-differ
     def training_step(self, batch: Dict[float, torch.Tensor], batch_idx: int) -> Dict[str, torch.Tensor]:
         """Performs a training step.
@@ -166,6 +175,38 @@ class BaseMRIModel(modelPT.ModelPT, ABC):
         if "tensorboard" in self.logger.__module__.lower():
             self.logger.experiment.add_image(name, image, global_step=self.global_step)
 
+    def get_predictions_writer(self, name: str) -> StreamingPredictionWriter:
+        """Returns the writer of the test predictions, creating it on the first call of a test epoch.
+
+        Parameters
+        ----------
+        name : str
+            Name of the directory, in the log directory, to write the predictions to.
+
+        Returns
+        -------
+        StreamingPredictionWriter
+            The writer of the test predictions.
+        """
+        if self.predictions_writer is None:
+            if "wandb" in self.logger.__module__.lower():
+                out_dir = Path(os.path.join(self.logger.save_dir, name))
+            else:
+                out_dir = Path(os.path.join(self.logger.log_dir, name))
+            self.predictions_writer = StreamingPredictionWriter(
+                out_dir,
+                compression=self.predictions_compression,
+                compression_opts=self.predictions_compression_opts,
+                max_in_flight_bytes=int(self.predictions_max_in_flight_mb * 1024**2),
+            )
+        return self.predictions_writer
+
+    def close_predictions_writer(self):
+        """Flushes the remaining test predictions to disk and waits for the writes to finish."""
+        if self.predictions_writer is not None:
+            writer, self.predictions_writer = self.predictions_writer, None
+            writer.close()
+
     def on_validation_epoch_end(self):
         """Called at the end of validation epoch to aggregate outputs."""
         raise NotImplementedError
@@ -6,7 +6,6 @@ __author__ = "Dimitris Karkalousos"
 from abc import ABC
 from typing import Callable, Optional, Sequence
 
-import numpy as np
 import torch
 
 from atommic.collections.common.parts.fft import ifft2
@@ -142,99 +141,75 @@ class EspiritCalibration(ABC, torch.nn.Module):
     def calculate_sensitivity_map(self, acs_mask: torch.Tensor, kspace: torch.Tensor) -> torch.Tensor:
         """Calculates sensitivity map given as input the `acs_mask` and the `k-space`.
 
+        All steps are batched over the leading dimensions of the k-space, so that a batch of slices is calibrated at
+        once, on the device of the k-space. The kernels of the calibration matrix are transformed to the image domain
+        with a single FFT, from which the covariance of every pixel is built, and the maximum eigenvector of every
+        covariance is found with the power method, batched over pixels and slices.
+
         Parameters
         ----------
         acs_mask : torch.Tensor
-            Autocalibration mask.
+            Autocalibration mask, of spatial shape [n_x, n_y], shared by all slices.
         kspace : torch.Tensor
-            K-space.
+            K-space of shape [..., coils, n_x, n_y, 2]. Coils that are zero, e.g. padded for batching, get zero maps.
 
         Returns
         -------
         sensitivity_map : torch.Tensor
-            Coil sensitivity maps.
+            Coil sensitivity maps, of the same shape as the k-space.
         """
-        ndim = kspace.ndim - 2
-        spatial_size = kspace.shape[1:-1]
-
-        # Used in case the k-space is padded (e.g. for batches)
-        non_padded_dim = kspace.clone().sum(dim=tuple(range(1, kspace.ndim))).bool()
-
-        num_coils = non_padded_dim.sum()
-        acs_kspace_cropped = torch.view_as_complex(crop_to_acs(acs_mask.squeeze(), kspace[non_padded_dim]))
-
-        # Get calibration matrix.
-        calibration_matrix = (
-            torch.nn.functional.unfold(acs_kspace_cropped.unsqueeze(0), kernel_size=self.kernel_size, stride=1)
-            .transpose(1, 2)
-            .to(acs_kspace_cropped.device)
-            .reshape(
-                num_coils,
-                *(np.array(acs_kspace_cropped.shape[1:3]) - self.kernel_size + 1),
-                *([self.kernel_size] * ndim),
-            )
+        num_coils, spatial_size = kspace.shape[-4], kspace.shape[-3:-1]
+        x = torch.view_as_complex(kspace.reshape(-1, *kspace.shape[-4:]).contiguous())
+
+        # Crop to the bounding box of the autocalibration region, of shape [batch, coils, acs_x, acs_y]
+        acs_mask = acs_mask.reshape(-1, *spatial_size).bool().any(0)
+        x_acs = torch.view_as_complex(crop_to_acs(acs_mask, torch.view_as_real(x.flatten(0, 1))).contiguous())
+        x_acs = x_acs.reshape(x.shape[0], num_coils, *x_acs.shape[-2:])
+
+        # Get calibration matrix, with one row per patch, of shape [batch, patches, coils * kernel_size**2]
+        calibration_matrix = x_acs.unfold(2, self.kernel_size, 1).unfold(3, self.kernel_size, 1)
+        calibration_matrix = calibration_matrix.permute(0, 2, 3, 1, 4, 5).reshape(
+            x.shape[0], -1, num_coils * self.kernel_size**2
         )
-        calibration_matrix = calibration_matrix.reshape(num_coils, -1, self.kernel_size**ndim)
-        calibration_matrix = calibration_matrix.permute(1, 0, 2)
-        calibration_matrix = calibration_matrix.reshape(-1, num_coils * self.kernel_size**ndim)
-
-        _, s, vh = torch.linalg.svd(calibration_matrix, full_matrices=True)
-        vh = torch.where(s > (self.threshold * s.max()), vh, torch.zeros_like(vh))
-
-        # Get kernels
-        num_kernels = vh.shape[0]
-        kernels = vh.reshape([num_kernels, num_coils] + [self.kernel_size] * ndim)
-
-        # Get covariance matrix in image domain
-        covariance = torch.zeros(
-            spatial_size[::-1] + (num_coils, num_coils),
-            dtype=kernels.dtype,
-            device=kernels.device,
+
+        # Get kernels, the right singular vectors of singular values above the threshold. Singular values are sorted,
+        # so the slices with fewer kernels are padded with zero kernels.
+        _, s, vh = torch.linalg.svd(calibration_matrix, full_matrices=False)
+        keep = s > (self.threshold * s.amax(-1, keepdim=True))
+        num_kernels = int(keep.sum(-1).max())
+        kernels = (vh[:, :num_kernels] * keep[:, :num_kernels, None]).reshape(
+            x.shape[0], num_kernels, num_coils, self.kernel_size, self.kernel_size
         )
-        for kernel in kernels:
-            pad_h, pad_w = (
-                spatial_size[0] - self.kernel_size,
-                spatial_size[1] - self.kernel_size,
-            )
-            pad = (pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2)
-            kernel_padded = torch.nn.functional.pad(kernel, pad)
-
-            img_kernel = ifft2(kernel_padded, self.fft_centered, self.fft_normalization, self.spatial_dims)
-            img_kernel = torch.view_as_complex(img_kernel)
-
-            aH = img_kernel.permute(*torch.arange(img_kernel.ndim - 1, -1, -1)).unsqueeze(-1)
-            a = aH.transpose(-1, -2).conj()
-            covariance = covariance + aH @ a
-
-        covariance = covariance * (np.prod(spatial_size) / self.kernel_size**ndim)
-        sensitivity_map = torch.ones(
-            (*spatial_size[::-1], num_coils, 1),
-            dtype=kernels.dtype,
-            device=kernels.device,
+
+        # Get covariance matrix in image domain, of shape [batch, n_x, n_y, coils, coils]
+        pad_h, pad_w = spatial_size[0] - self.kernel_size, spatial_size[1] - self.kernel_size
+        kernels = torch.nn.functional.pad(kernels, (pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2))
+        img_kernels = torch.view_as_complex(
+            ifft2(kernels, self.fft_centered, self.fft_normalization, list(self.spatial_dims))
         )
+        covariance = torch.einsum("bkchw,bkdhw->bhwcd", img_kernels, img_kernels.conj())
+        covariance = covariance * (spatial_size[0] * spatial_size[1] / self.kernel_size**2)
 
-        def forward(x):
-            return covariance @ x
+        def forward(y):
+            return covariance @ y
 
-        def normalize(x):
-            return (x.abs() ** 2).sum(dim=-2, keepdims=True) ** 0.5
+        def normalize(y):
+            return (y.abs() ** 2).sum(dim=-2, keepdims=True) ** 0.5
 
         power_method = MaximumEigenvaluePowerMethod(forward, max_iter=self.max_iter, norm_func=normalize)
-        power_method.fit(x=sensitivity_map)
-
-        temp_sensitivity_map = power_method.x.squeeze(-1)
-        temp_sensitivity_map = temp_sensitivity_map.permute(
-            *torch.arange(temp_sensitivity_map.ndim - 1, -1, -1)
-        ).squeeze(-1)
-        temp_sensitivity_map = temp_sensitivity_map * temp_sensitivity_map.conj() / temp_sensitivity_map.abs()
-
-        max_eig = power_method.max_eig.squeeze()
-        max_eig = max_eig.permute(*torch.arange(max_eig.ndim - 1, -1, -1))
-        temp_sensitivity_map = temp_sensitivity_map * (max_eig > self.crop)
+        power_method.fit(x=torch.ones(*covariance.shape[:-1], 1, dtype=covariance.dtype, device=covariance.device))
+
+        # Remove the phase of the first non-zero coil and crop by the maximum eigenvalue
+        sensitivity_map = power_method.x.squeeze(-1)
+        reference_coil = (x.flatten(2).abs().sum(-1) > 0).int().argmax(1)
+        reference = sensitivity_map.gather(-1, reference_coil.view(-1, 1, 1, 1).expand(-1, *spatial_size, 1))
+        reference_phase = torch.where(
+            reference.abs() > 0, reference.conj() / reference.abs(), torch.ones_like(reference)
+        )
+        sensitivity_map = sensitivity_map * reference_phase * (power_method.max_eig.squeeze(-1) > self.crop)
 
-        sensitivity_map = torch.zeros_like(kspace, device=kspace.device, dtype=kspace.dtype)
-        sensitivity_map[non_padded_dim] = torch.view_as_real(temp_sensitivity_map)
-        return sensitivity_map
+        sensitivity_map = torch.view_as_real(sensitivity_map.permute(0, 3, 1, 2).contiguous())
+        return sensitivity_map.reshape(kspace.shape).to(kspace.dtype)
 
     def forward(self, acs_mask: torch.Tensor, kspace: torch.Tensor) -> torch.Tensor:
         """Forward pass of :class:`EspiritCalibration`.
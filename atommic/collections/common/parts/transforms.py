@@ -3,20 +3,22 @@ from __future__ import annotations
 
 __author__ = "Dimitris Karkalousos"
 
+import math
 import os
 from math import sqrt
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import torch
 
 import matplotlib.pyplot as plt
 
+from atommic.collections.common.data.preprocessing_cache import PreprocessingCache
 from atommic.collections.common.parts.coil_sensitivity_maps import EspiritCalibration
 from atommic.collections.common.parts.fft import fft2, ifft2
 from atommic.collections.common.parts.utils import add_coil_dim_if_singlecoil, apply_mask, center_crop
 from atommic.collections.common.parts.utils import coil_combination_method as coil_combination_method_func
-from atommic.collections.common.parts.utils import is_none, reshape_fortran, rss, to_tensor
+from atommic.collections.common.parts.utils import is_none, magnitude_statistics, rss, to_tensor
 from atommic.collections.motioncorrection.parts.motionsimulation import MotionSimulation
 
 __all__ = [
@@ -446,6 +448,11 @@ class EstimateCoilSensitivityMaps:
 class GeometricDecompositionCoilCompression:
     """Geometric Decomposition Coil Compression in PyTorch, as presented in [Zhang2013]_.
 
+    The data can be a single slice of shape [n_coils, n_x, n_y] or a batch of slices of shape
+    [..., n_coils, n_x, n_y], optionally with a last dimension of size 2 for the real and imaginary parts. The
+    compression matrices of all readout positions and slices are computed with batched linear algebra, on the device
+    of the data.
+
     References
     ----------
     .. [Zhang2013] Zhang, T., Pauly, J. M., Vasanawala, S. S., & Lustig, M. (2013). Coil compression for accelerated
@@ -465,6 +472,8 @@ class GeometricDecompositionCoilCompression:
     >>> gdcc = GeometricDecompositionCoilCompression(virtual_coils=10, calib_lines=24, spatial_dims=[-2, -1])
     >>> gdcc(data).shape
     torch.Size([10, 100, 100, 2])
+    >>> gdcc(torch.randn([4, 30, 100, 100], dtype=torch.complex64)).shape
+    torch.Size([4, 10, 100, 100, 2])
     """
 
     def __init__(
@@ -565,21 +574,21 @@ class GeometricDecompositionCoilCompression:
                 spatial_dims=self.spatial_dims,
             )
 
-        self.data = data
-        if self.data.shape[-1] == 2:
-            self.data = torch.view_as_complex(self.data)
+        if data.shape[-1] == 2:
+            data = torch.view_as_complex(data)
 
-        curr_num_coils = self.data.shape[0]
+        curr_num_coils = data.shape[-3]
         if curr_num_coils < self.virtual_coils:
             raise ValueError(
                 f"Tried to compress from {curr_num_coils} to {self.virtual_coils} coils, please select less coils."
             )
 
-        self.data = self.data.permute(1, 2, 0)
+        # Slices are folded into a single batch dimension, [batch_size, n_x, n_y, n_coils].
+        batch_shape = data.shape[:-3]
+        self.data = data.reshape(-1, *data.shape[-3:]).permute(0, 2, 3, 1)
         self.init_data: torch.Tensor = self.data
-        self.fft_dim = [0, 1]
 
-        _, self.width, self.coils = self.data.shape
+        _, _, self.width, self.coils = self.data.shape
 
         # TODO: figure out why this is happening for singlecoil data
         # For singlecoil data, use no calibration lines equal to the no of coils.
@@ -594,8 +603,10 @@ class GeometricDecompositionCoilCompression:
         else:
             rotated_compressed_data = self.rotate_and_compress(data_to_cc=self.unaligned_data)
 
-        rotated_compressed_data = torch.flip(rotated_compressed_data, dims=[1])
-        rotated_compressed_data = torch.view_as_real(rotated_compressed_data.permute(2, 0, 1))
+        rotated_compressed_data = torch.flip(rotated_compressed_data, dims=[-1])
+        rotated_compressed_data = torch.view_as_real(
+            rotated_compressed_data.reshape(*batch_shape, *rotated_compressed_data.shape[1:])
+        )
 
         if not apply_forward_transform:
             rotated_compressed_data = fft2(
@@ -609,119 +620,93 @@ class GeometricDecompositionCoilCompression:
 
     def crop(self):
         """Crop to the size of the calibration lines."""
-        s = torch.as_tensor([self.calib_lines, self.width, self.coils])
-
-        idx = [
-            torch.arange(
-                abs(int(self.data.shape[n] // 2 + torch.ceil(-s[n] / 2))),
-                abs(int(self.data.shape[n] // 2 + torch.ceil(s[n] / 2) + 1)),
-            )
-            for n in range(len(s))
-        ]
-
-        self.data = (
-            self.data[idx[0][0] : idx[0][-1], idx[1][0] : idx[1][-1], idx[2][0] : idx[2][-1]]
-            .unsqueeze(-2)
-            .permute(1, 0, 2, 3)
-        )
+        n_x = self.data.shape[1]
+        start = abs(int(n_x // 2 + math.ceil(-self.calib_lines / 2)))
+        stop = abs(int(n_x // 2 + math.ceil(self.calib_lines / 2) + 1)) - 1
+        # [batch_size, width, calib_lines, n_coils]
+        self.data = self.data[:, start:stop].permute(0, 2, 1, 3)
 
     def calculate_gcc(self):
-        """Calculates Geometric Coil-Compression."""
+        """Calculates Geometric Coil-Compression.
+
+        The compression matrices of all readout positions, and of all slices of the batch, are computed with a single
+        batched SVD of the sliding windows of the calibration data.
+        """
         ws = (self.virtual_coils // 2) * 2 + 1
 
-        Nx, Ny, Nz, Nc = self.data.shape
+        _, Nx, Ny, Nc = self.data.shape
 
         im = torch.view_as_complex(
-            ifft2(torch.view_as_real(self.data), self.fft_centered, self.fft_normalization, spatial_dims=0)
+            ifft2(torch.view_as_real(self.data), self.fft_centered, self.fft_normalization, spatial_dims=1)
         )
 
-        s = torch.as_tensor([Nx + ws - 1, Ny, Nz, Nc])
-        idx = [
-            torch.arange(
-                abs(int(im.shape[n] // 2 + torch.ceil((-s[n] / 2).clone().detach()))),
-                abs(int(im.shape[n] // 2 + torch.ceil((s[n] / 2).clone().detach())) + 1),
-            )
-            for n in range(len(s))
-        ]
-
-        zpim = torch.zeros((Nx + ws - 1, Ny, Nz, Nc)).type(im.dtype)
-        zpim[idx[0][0] : idx[0][-1], idx[1][0] : idx[1][-1], idx[2][0] : idx[2][-1], idx[3][0] : idx[3][-1]] = im
+        # zero-pad the readout, to center a window of ws positions on every position
+        pad_start = abs(int(Nx // 2 + math.ceil(-(Nx + ws - 1) / 2)))
+        zpim = im.new_zeros((im.shape[0], Nx + ws - 1, Ny, Nc))
+        zpim[:, pad_start : pad_start + Nx] = im
 
-        self.unaligned_data = torch.zeros((Nc, min(Nc, ws * Ny * Nz), Nx)).type(im.dtype)
-        for n in range(Nx):
-            tmpc = reshape_fortran(zpim[n : n + ws, :, :, :], (ws * Ny * Nz, Nc))
-            _, _, v = torch.svd(tmpc, some=False)
-            self.unaligned_data[:, :, n] = v
+        # [batch_size, Nx, Ny * ws, Nc], with the rows of each window in Fortran order
+        windows = zpim.unfold(1, ws, 1).permute(0, 1, 2, 4, 3).reshape(im.shape[0], Nx, Ny * ws, Nc)
+        _, _, vh = torch.linalg.svd(windows, full_matrices=False)
 
-        self.unaligned_data = self.unaligned_data[:, : self.virtual_coils, :]
+        # [batch_size, Nx, Nc, virtual_coils]
+        self.unaligned_data = vh.mH[..., : self.virtual_coils]
 
     def align_compressed_coils(self):
-        """Virtual Coil Alignment."""
-        self.aligned_data = self.unaligned_data
+        """Virtual Coil Alignment.
 
-        _, sy, nc = self.aligned_data.shape
-        ncc = sy
+        The alignment is propagated from the center of the readout outward, so it is sequential over the readout
+        positions, but batched over the slices.
+        """
+        self.aligned_data = self.unaligned_data
 
+        nc = self.aligned_data.shape[1]
         n0 = nc // 2
 
-        A00 = self.aligned_data[:, :ncc, n0 - 1]
+        A00 = self.aligned_data[:, n0 - 1]
 
         A0 = A00
         for n in range(n0, 0, -1):
-            A1 = self.aligned_data[:, :ncc, n - 1]
-            C = torch.conj(A1).T @ A0
-            u, _, v = torch.svd(C, some=False)
-            P = v @ torch.conj(u).T
-            self.aligned_data[:, :ncc, n - 1] = A1 @ torch.conj(P).T
-            A0 = self.aligned_data[:, :ncc, n - 1]
+            A1 = self.aligned_data[:, n - 1]
+            u, _, vh = torch.linalg.svd(A1.mH @ A0)
+            P = vh.mH @ u.mH
+            self.aligned_data[:, n - 1] = A1 @ P.mH
+            A0 = self.aligned_data[:, n - 1]
 
         A0 = A00
         for n in range(n0, nc):
-            A1 = self.aligned_data[:, :ncc, n]
-            C = torch.conj(A1).T @ A0
-            u, _, v = torch.svd(C, some=False)
-            P = v @ torch.conj(u).T
-            self.aligned_data[:, :ncc, n] = A1 @ torch.conj(P).T
-            A0 = self.aligned_data[:, :ncc, n]
+            A1 = self.aligned_data[:, n]
+            u, _, vh = torch.linalg.svd(A1.mH @ A0)
+            P = vh.mH @ u.mH
+            self.aligned_data[:, n] = A1 @ P.mH
+            A0 = self.aligned_data[:, n]
 
     def rotate_and_compress(self, data_to_cc):
-        """Uses compression matrices to project the data onto them -> rotate to the compressed space."""
-        _data = self.init_data.permute(1, 0, 2).unsqueeze(-2)
-        _ncc = data_to_cc.shape[1]
+        """Uses compression matrices to project the data onto them -> rotate to the compressed space.
 
+        All readout positions, and all slices of the batch, are projected with a single batched matrix product.
+        """
+        # [batch_size, width, n_x, n_coils]
+        _data = self.init_data.permute(0, 2, 1, 3)
         data_to_cc = data_to_cc.to(_data.device)
 
-        Nx, Ny, Nz, Nc = _data.shape
         im = torch.view_as_complex(
-            ifft2(torch.view_as_real(_data), self.fft_centered, self.fft_normalization, spatial_dims=0)
+            ifft2(torch.view_as_real(_data), self.fft_centered, self.fft_normalization, spatial_dims=1)
         )
-
-        ccdata = torch.zeros((Nx, Ny, Nz, _ncc)).type(_data.dtype).to(_data.device)
-        for n in range(Nx):
-            tmpc = im[n, :, :, :].squeeze().reshape(Ny * Nz, Nc)
-            ccdata[n, :, :, :] = (tmpc @ data_to_cc[:, :, n]).reshape(Ny, Nz, _ncc).unsqueeze(0)
-
-        ccdata = (
-            torch.view_as_complex(
-                fft2(torch.view_as_real(ccdata), self.fft_centered, self.fft_normalization, spatial_dims=0)
-            )
-            .permute(1, 0, 2, 3)
-            .squeeze()
+        ccdata = im @ data_to_cc
+        ccdata = torch.view_as_complex(
+            fft2(torch.view_as_real(ccdata), self.fft_centered, self.fft_normalization, spatial_dims=1)
         )
 
-        # Singlecoil
-        if ccdata.dim() == 2:
-            ccdata = ccdata.unsqueeze(-1)
-
-        gcc = torch.zeros(ccdata.shape).type(ccdata.dtype)
-        for n in range(ccdata.shape[-1]):
-            gcc[:, :, n] = torch.view_as_complex(
-                ifft2(
-                    torch.view_as_real(ccdata[:, :, n]), self.fft_centered, self.fft_normalization, self.spatial_dims
-                )
+        # [batch_size, virtual_coils, n_x, width]
+        return torch.view_as_complex(
+            ifft2(
+                torch.view_as_real(ccdata.permute(0, 3, 2, 1)),
+                self.fft_centered,
+                self.fft_normalization,
+                spatial_dims=[-2, -1],
             )
-
-        return gcc
+        )
 
 
 class Masker:
@@ -1208,12 +1193,16 @@ class NoisePreWhitening:
         self.fft_centered = fft_centered
         self.fft_normalization = fft_normalization
         self.spatial_dims = spatial_dims
+        # optimal patches found on the reference slice of every volume, so that they are searched once per volume
+        self.optimal_patches: Dict[Hashable, List[int]] = {}
 
     def __call__(
         self,
         data: torch.Tensor,
         apply_backward_transform: bool = False,
         apply_forward_transform: bool = False,
+        volume: Optional[Hashable] = None,
+        reference: Optional[torch.Tensor] = None,
     ) -> torch.Tensor:
         """Calls :class:`NoisePreWhitening`.
 
@@ -1225,8 +1214,15 @@ class NoisePreWhitening:
             Apply backward transform. Default is ``False``.
         apply_forward_transform : bool
             Apply forward transform. Default is ``False``.
+        volume : Hashable, optional
+            Identifies the volume of the data, e.g. the file name. If given, and ``find_patch_size`` is ``True``, the
+            optimal patch of the volume is searched on its reference slice and reused for all its slices. Default is
+            ``None``.
+        reference : torch.Tensor, optional
+            A fixed slice of the volume, e.g. the middle slice, in the same format as the data. Needed to search the
+            optimal patch of a volume, see :meth:`needs_reference`. Default is ``None``.
         """
-        return self.forward(data, apply_backward_transform, apply_forward_transform)
+        return self.forward(data, apply_backward_transform, apply_forward_transform, volume, reference)
 
     def __repr__(self):
         """Representation of :class:`NoisePreWhitening`."""
@@ -1236,12 +1232,18 @@ class NoisePreWhitening:
         """String representation of :class:`NoisePreWhitening`."""
         return str(self.__repr__)
 
+    def needs_reference(self, volume: Hashable) -> bool:
+        """Whether the optimal patch of a volume is to be searched, so a reference slice of it must be given."""
+        return self.find_patch_size and volume not in self.optimal_patches
+
     # pylint: disable=unused-argument
     def forward(
         self,
         data: torch.Tensor,
         apply_backward_transform: bool = False,
         apply_forward_transform: bool = False,
+        volume: Optional[Hashable] = None,
+        reference: Optional[torch.Tensor] = None,
     ) -> torch.Tensor:
         """Forward pass of :class:`NoisePreWhitening`.
 
@@ -1253,6 +1255,12 @@ class NoisePreWhitening:
             Apply backward transform before noise pre-whitening.
         apply_forward_transform : bool
             Apply forward transform before noise pre-whitening.
+        volume : Hashable, optional
+            Identifies the volume of the data, to reuse the optimal patch found for it. Default is ``None``.
+        reference : torch.Tensor, optional
+            A fixed slice of the volume, on which the optimal patch of the volume is searched. If the patch of the
+            volume has not been searched and no reference is given, the patch is searched on the data and not reused,
+            so that the patch never depends on the order in which the slices are loaded. Default is ``None``.
 
         Returns
         -------
@@ -1271,7 +1279,19 @@ class NoisePreWhitening:
             data = torch.view_as_real(data)
 
         if self.find_patch_size:
-            patch = self.find_optimal_patch_size(data)
+            if volume in self.optimal_patches:
+                patch = self.optimal_patches[volume]
+            elif volume is not None and reference is not None:
+                if apply_forward_transform:
+                    reference = fft2(
+                        reference,
+                        centered=self.fft_centered,
+                        normalization=self.fft_normalization,
+                        spatial_dims=self.spatial_dims,
+                    )
+                patch = self.optimal_patches[volume] = self.find_optimal_patch_size(reference)
+            else:
+                patch = self.find_optimal_patch_size(data)
             noise = data[:, patch[0] : patch[1], patch[2] : patch[3]]
         elif not is_none(self.patch_size):
             noise = data[
@@ -1309,6 +1329,11 @@ class NoisePreWhitening:
     def find_optimal_patch_size(data: torch.Tensor, min_noise: float = 1e10) -> List[int]:
         """Find optimal patch size for noise pre-whitening.
 
+        Square patches of length 10 to 50, starting every 10 pixels, are scored by the standard deviation of the
+        root-sum-of-squares of the data in them, and the patch with the lowest one is selected. The sums of every
+        patch are read from summed-area tables of the root-sum-of-squares and of its square, so that all patches are
+        scored at once.
+
         Parameters
         ----------
         data : torch.Tensor
@@ -1323,31 +1348,38 @@ class NoisePreWhitening:
         """
         if data.shape[-1] == 2:
             data = torch.view_as_complex(data)
-        best_patch = []
+        # double precision, since the patch sums are differences of the (large) sums of the tables
+        image = torch.abs(rss(data)).to(torch.float64)
+
+        # summed-area tables of the image and of its square, padded with zeros on the top and the left
+        tables = torch.zeros(2, image.shape[-2] + 1, image.shape[-1] + 1, dtype=torch.float64, device=image.device)
+        tables[:, 1:, 1:] = torch.stack([image, image**2]).cumsum(-2).cumsum(-1)
+
+        patch_lengths, patch_starts_x, patch_starts_y = [], [], []
         for patch_length in [10, 20, 30, 40, 50]:
-            for patch_start_x in range(0, data.shape[-2] - patch_length, 10):
-                for patch_start_y in range(0, data.shape[-1] - patch_length, 10):
-                    patch = torch.abs(
-                        rss(
-                            data[
-                                :,
-                                patch_start_x : patch_start_x + patch_length,
-                                patch_start_y : patch_start_y + patch_length,
-                            ],
-                        )
-                    )
-                    noise = torch.sqrt(
-                        torch.sum(torch.abs(patch - torch.mean(patch)) ** 2) / (len(torch.flatten(patch)) - 1)
-                    )
-                    if noise < min_noise:
-                        min_noise = noise
-                        best_patch = [
-                            patch_start_x,
-                            patch_start_x + patch_length,
-                            patch_start_y,
-                            patch_start_y + patch_length,
-                        ]
-        return best_patch
+            starts_x, starts_y = torch.meshgrid(
+                torch.arange(0, max(image.shape[-2] - patch_length, 0), 10, device=image.device),
+                torch.arange(0, max(image.shape[-1] - patch_length, 0), 10, device=image.device),
+                indexing="ij",
+            )
+            patch_lengths.append(torch.full((starts_x.numel(),), patch_length, device=image.device))
+            patch_starts_x.append(starts_x.flatten())
+            patch_starts_y.append(starts_y.flatten())
+        length, start_x, start_y = torch.cat(patch_lengths), torch.cat(patch_starts_x), torch.cat(patch_starts_y)
+        if length.numel() == 0:
+            return []
+
+        end_x, end_y = start_x + length, start_y + length
+        sums = tables[:, end_x, end_y] - tables[:, start_x, end_y] - tables[:, end_x, start_y]
+        sums = sums + tables[:, start_x, start_y]
+        num_elements = length.to(torch.float64) ** 2
+        noise = torch.sqrt(torch.clamp(sums[1] - sums[0] ** 2 / num_elements, min=0) / (num_elements - 1))
+
+        # the first patch with the lowest noise, in the order of the lengths and the starts
+        best = torch.argmin(noise)
+        if noise[best] >= min_noise:
+            return []
+        return [int(start_x[best]), int(end_x[best]), int(start_y[best]), int(end_y[best])]
 
 
 class Normalizer:
@@ -1378,6 +1410,7 @@ class Normalizer:
         fft_centered: bool = False,
         fft_normalization: str = "backward",
         spatial_dims: Sequence[int] = (-2, -1),
+        batched: bool = False,
     ):
         """Inits :class:`Normalizer`.
 
@@ -1403,12 +1436,35 @@ class Normalizer:
             Default is "backward".
         spatial_dims: tuple, optional
             Spatial dimensions. Default is `(-2, -1)`.
+        batched: bool, optional
+            If True, the first dimension of the data is a batch dimension and every example is normalized by its own
+            statistics, which are returned with shape [batch_size]. Default is `False`.
         """
         self.normalization_type = normalization_type
         self.kspace_normalization = kspace_normalization
         self.fft_centered = fft_centered
         self.fft_normalization = fft_normalization
         self.spatial_dims = spatial_dims
+        self.batched = batched
+
+    def reduce(self, reduction: Callable, data: torch.Tensor) -> torch.Tensor:
+        """Reduces the magnitude of the data, over all elements or, if batched, over all elements of every example.
+
+        Parameters
+        ----------
+        reduction : Callable
+            Reduction function, e.g. ``torch.amax``, which accepts a ``dim`` argument.
+        data : torch.Tensor
+            Input data.
+
+        Returns
+        -------
+        torch.Tensor
+            The reduced value, of shape [] or, if batched, of shape [batch_size, 1, ..., 1] to broadcast with the data.
+        """
+        if not self.batched:
+            return reduction(torch.abs(data))
+        return reduction(torch.abs(data).flatten(1), dim=1).view(-1, *[1] * (data.dim() - 1))
 
     def __call__(
         self,
@@ -1487,28 +1543,25 @@ class Normalizer:
         if data.shape[-1] == 2:
             data = torch.view_as_complex(data)
 
-        attrs = {
-            "min": torch.min(torch.abs(data)),
-            "max": torch.max(torch.abs(data)),
-            "mean": torch.mean(torch.abs(data)),
-            "std": torch.std(torch.abs(data)),
-            "var": torch.var(torch.abs(data)),
-        }
+        attrs = magnitude_statistics(data, dim=1 if self.batched else None)
+        stats = attrs
+        if self.batched:
+            # per example statistics, broadcast with the data
+            stats = {key: value.view(-1, *[1] * (data.dim() - 1)) for key, value in attrs.items()}
 
         if self.normalization_type == "max":
-            data = data / torch.max(torch.abs(data))
+            data = data / stats["max"]
         elif self.normalization_type == "minmax":
-            min_value = torch.min(torch.abs(data))
-            data = (data - min_value) / (torch.max(torch.abs(data)) - min_value)
+            data = (data - stats["min"]) / (stats["max"] - stats["min"])
         elif self.normalization_type == "mean_std":
-            data = data - torch.mean(torch.abs(data))
-            data = data / torch.std(torch.abs(data))
+            data = data - stats["mean"]
+            data = data / self.reduce(torch.std, data)
         elif self.normalization_type == "mean_var":
-            data = data - torch.mean(torch.abs(data))
-            data = data / torch.var(torch.abs(data))
+            data = data - stats["mean"]
+            data = data / self.reduce(torch.var, data)
         elif self.normalization_type == "grayscale":
-            data = data - torch.min(torch.abs(data))
-            data = data / torch.max(torch.abs(data))
+            data = data - stats["min"]
+            data = data / self.reduce(torch.amax, data)
             data = data * 255
         elif is_none(self.normalization_type) or self.normalization_type == "fft":
             pass
@@ -2189,8 +2242,10 @@ class MRIDataTransforms:
         fft_normalization: str = "backward",
         spatial_dims: Sequence[int] = None,
         coil_dim: int = 0,
-        consecutive_slices: int = 1,  # pylint: disable=unused-argument
+        consecutive_slices: int = 1,
         use_seed: bool = True,
+        preprocessing_cache_dir: Optional[str] = None,
+        device_transforms: bool = False,
     ):
         """Inits :class:`MRIDataTransforms`.
 
@@ -2337,6 +2392,15 @@ class MRIDataTransforms:
             Consecutive slices. Default is ``1``.
         use_seed : bool, optional
             Whether to use seed. Default is ``True``.
+        preprocessing_cache_dir : str, optional
+            Directory of the on-disk cache of the deterministic preprocessing, i.e. prewhitening, coil compression,
+            zero-filling, cropping before masking and the coil sensitivity maps. If ``None``, these are computed on
+            every call. Default is ``None``.
+        device_transforms : bool, optional
+            If ``True``, calling the transforms only applies the deterministic preprocessing and generates the masks,
+            and masking, cropping, normalization, coil sensitivity maps estimation and coil combination are deferred
+            to :meth:`process_batch`, which applies them batched, on the device of the collated batch. Not supported
+            with SSDU, Noise-to-Recon, random motion, 3D data and grayscale normalization. Default is ``False``.
         """
         super().__init__()
 
@@ -2491,7 +2555,6 @@ class MRIDataTransforms:
             else None
         )
 
-        self.prewhitening = Composer([self.prewhitening])  # type: ignore
         self.coils_shape_transforms = Composer(
             [
                 self.gcc,  # type: ignore
@@ -2504,6 +2567,88 @@ class MRIDataTransforms:
 
         self.use_seed = use_seed
 
+        # The cached results depend only on the arguments of the deterministic transforms, which address the cache.
+        self.preprocessing_cache = (
+            PreprocessingCache(
+                preprocessing_cache_dir,
+                {
+                    "dataset_format": dataset_format,
+                    "consecutive_slices": consecutive_slices,
+                    "apply_prewhitening": apply_prewhitening,
+                    "find_patch_size": find_patch_size,
+                    "prewhitening_scale_factor": prewhitening_scale_factor,
+                    "prewhitening_patch_start": prewhitening_patch_start,
+                    "prewhitening_patch_length": prewhitening_patch_length,
+                    "apply_gcc": apply_gcc,
+                    "gcc_virtual_coils": gcc_virtual_coils,
+                    "gcc_calib_lines": gcc_calib_lines,
+                    "gcc_align_data": gcc_align_data,
+                    "kspace_zero_filling_size": kspace_zero_filling_size,
+                    "crop_size": crop_size,
+                    "kspace_crop": kspace_crop,
+                    "crop_before_masking": crop_before_masking,
+                    "estimate_coil_sensitivity_maps": estimate_coil_sensitivity_maps,
+                    "coil_sensitivity_maps_type": coil_sensitivity_maps_type,
+                    "coil_sensitivity_maps_gaussian_sigma": coil_sensitivity_maps_gaussian_sigma,
+                    "coil_sensitivity_maps_espirit_threshold": coil_sensitivity_maps_espirit_threshold,
+                    "coil_sensitivity_maps_espirit_kernel_size": coil_sensitivity_maps_espirit_kernel_size,
+                    "coil_sensitivity_maps_espirit_crop": coil_sensitivity_maps_espirit_crop,
+                    "coil_sensitivity_maps_espirit_max_iters": coil_sensitivity_maps_espirit_max_iters,
+                    "normalize_inputs": normalize_inputs,
+                    "normalization_type": normalization_type,
+                    "kspace_normalization": kspace_normalization,
+                    "fft_centered": fft_centered,
+                    "fft_normalization": fft_normalization,
+                    "spatial_dims": self.spatial_dims,
+                    "coil_dim": self.coil_dim,
+                },
+            )
+            if not is_none(preprocessing_cache_dir)
+            else None
+        )
+
+        self.device_transforms = device_transforms
+        if self.device_transforms:
+            unsupported = [
+                name
+                for name, enabled in (
+                    ("SSDU", ssdu),
+                    ("Noise-to-Recon", n2r),
+                    ("random motion", apply_random_motion),
+                    ("3D data", dimensionality != 2),
+                    ("grayscale normalization", normalization_type == "grayscale"),
+                )
+                if enabled
+            ]
+            if unsupported:
+                raise ValueError(f"device_transforms is not supported with {', '.join(unsupported)}.")
+
+        # Batched counterparts of the transforms, with the batch dimension first, used by process_batch.
+        self.batched_normalization = Normalizer(
+            normalization_type=normalization_type if normalize_inputs else None,
+            kspace_normalization=kspace_normalization,
+            fft_centered=self.fft_centered,
+            fft_normalization=self.fft_normalization,
+            spatial_dims=self.spatial_dims,
+            batched=True,
+        )
+        self.batched_coil_sensitivity_maps_estimator = (
+            EstimateCoilSensitivityMaps(
+                coil_sensitivity_maps_type=coil_sensitivity_maps_type.lower(),
+                gaussian_sigma=coil_sensitivity_maps_gaussian_sigma,
+                espirit_threshold=coil_sensitivity_maps_espirit_threshold,
+                espirit_kernel_size=coil_sensitivity_maps_espirit_kernel_size,
+                espirit_crop=coil_sensitivity_maps_espirit_crop,
+                espirit_max_iters=coil_sensitivity_maps_espirit_max_iters,
+                fft_centered=self.fft_centered,
+                fft_normalization=self.fft_normalization,
+                spatial_dims=self.spatial_dims,
+                coil_dim=self.coil_dim + 1,
+            )
+            if estimate_coil_sensitivity_maps and self.device_transforms
+            else None
+        )
+
     def __call__(
         self,
         kspace: np.ndarray,
@@ -2548,11 +2693,14 @@ class MRIDataTransforms:
         slice_idx : int
             The slice index.
         """
+        if self.device_transforms:
+            return self.__prepare_device_sample__(kspace, sensitivity_map, mask, target, attrs, fname, slice_idx)
+
         kspace, masked_kspace, mask, kspace_pre_normalization_vars, acc = self.__process_kspace__(  # type: ignore
-            kspace, mask, attrs, fname
+            kspace, mask, attrs, fname, slice_idx
         )
         sensitivity_map, sensitivity_pre_normalization_vars = self.__process_coil_sensitivities_map__(
-            sensitivity_map, kspace
+            sensitivity_map, kspace, fname, slice_idx
         )
 
         if self.n2r and len(masked_kspace) > 1:  # type: ignore
@@ -2622,6 +2770,176 @@ class MRIDataTransforms:
             attrs,
         )
 
+    def __prepare_device_sample__(
+        self,
+        kspace: np.ndarray,
+        sensitivity_map: np.ndarray,
+        mask: np.ndarray,
+        target: np.ndarray,
+        attrs: Dict,
+        fname: str,
+        slice_idx: int,
+    ) -> Tuple:
+        """Prepares a sample for :meth:`process_batch`, when ``device_transforms`` is enabled.
+
+        Only the deterministic preprocessing is applied, and the masks are generated, with the same seed as when the
+        transforms are applied per sample. The masked kspace and the initial prediction are left empty, as is the
+        target if it is not stored, and the coil sensitivity maps if they are estimated.
+
+        Parameters
+        ----------
+        kspace : np.ndarray
+            The fully-sampled kspace, if exists. Otherwise, the subsampled kspace.
+        sensitivity_map : np.ndarray
+            The coil sensitivity map.
+        mask : np.ndarray
+            The subsampling mask, if exists.
+        target : np.ndarray
+            The target, if exists.
+        attrs : Dict
+            The attributes, if stored in the data.
+        fname : str
+            The file name.
+        slice_idx : int
+            The slice index.
+
+        Returns
+        -------
+        Tuple
+            The sample, with the same structure as the output of :meth:`__call__`.
+        """
+        kspace = self.__preprocess_kspace__(kspace, fname, slice_idx, attrs.pop("noise_prewhitening_reference", None))
+
+        # the masks only depend on the shape of the kspace, so an empty view of it is masked
+        _, mask, acc = self.masking(
+            kspace[:0],
+            mask,
+            (attrs.get("padding_left", 0), attrs.get("padding_right", 0)),
+            tuple(map(ord, fname)) if self.use_seed else None,  # type: ignore
+        )
+
+        if self.coil_sensitivity_maps_estimator is None and sensitivity_map is not None and sensitivity_map.size != 0:
+            sensitivity_map = self.__preprocess_coil_sensitivities_map__(sensitivity_map, kspace, fname, slice_idx)
+        else:
+            sensitivity_map = torch.tensor([])
+
+        if not is_none(target) and target.ndim >= 2:
+            target = to_tensor(target) if isinstance(target, np.ndarray) else target
+        else:
+            target = torch.tensor([])
+
+        attrs["fname"] = fname
+        attrs["slice_idx"] = slice_idx
+
+        return kspace, torch.tensor([]), sensitivity_map, mask, torch.tensor([]), target, fname, slice_idx, acc, attrs
+
+    def process_batch(self, batch: Sequence) -> List:
+        """Applies the transforms deferred by ``device_transforms`` to a collated batch, on the device of the batch.
+
+        The result is the collated result of applying the transforms per sample. The masks are generated in the
+        workers with the same seed, and normalization, cropping, FFTs and coil combination are applied per example,
+        so that the data are the same as with the per sample transforms on the same device.
+
+        Parameters
+        ----------
+        batch : Sequence
+            Collated batch of samples prepared by :meth:`__call__` with ``device_transforms`` enabled.
+
+        Returns
+        -------
+        List
+            The kspace, masked kspace, coil sensitivity maps, mask, initial prediction, target, file names, slice
+            indices, accelerations and attributes of the batch.
+        """
+        kspace, _, sensitivity_map, mask, _, target, fname, slice_idx, acc, attrs = batch
+
+        # a mask of no dimensions means that there is no mask to apply
+        masked_kspace = [kspace * m + 0.0 if m.dim() > 1 else kspace for m in mask]
+
+        if not self.crop_before_masking:
+            kspace = self.cropping(kspace, apply_backward_transform=not self.kspace_crop)  # type: ignore
+            masked_kspace = self.cropping(masked_kspace, apply_backward_transform=not self.kspace_crop)  # type: ignore
+            mask = self.cropping(mask)  # type: ignore
+
+        kspace, kspace_vars = self.__normalize_batch__(kspace, apply_backward_transform=True)
+        masked_kspace, masked_kspace_vars = map(
+            list, zip(*[self.__normalize_batch__(y, apply_backward_transform=True) for y in masked_kspace])
+        )
+        kspace_pre_normalization_vars = {
+            "kspace_pre_normalization_vars": kspace_vars,
+            "masked_kspace_pre_normalization_vars": masked_kspace_vars,
+            "noise_masked_kspace_pre_normalization_vars": None,
+        }
+
+        if sensitivity_map.numel() == 0:
+            if self.batched_coil_sensitivity_maps_estimator is not None:
+                sensitivity_map = self.batched_coil_sensitivity_maps_estimator(kspace)
+            else:
+                sensitivity_map = torch.ones_like(kspace)
+        sensitivity_map, sensitivity_vars = self.__normalize_batch__(
+            sensitivity_map, apply_forward_transform=self.kspace_crop
+        )
+
+        prediction, prediction_vars = map(
+            list, zip(*[self.__initialize_batched_prediction__(None, y, sensitivity_map) for y in masked_kspace])
+        )
+        if self.unsupervised_masked_target:
+            target, target_vars = prediction, prediction_vars
+        else:
+            target, target_vars = self.__initialize_batched_prediction__(
+                target if target.numel() > 0 else None, kspace, sensitivity_map
+            )
+
+        attrs.update(
+            self.__parse_normalization_vars__(
+                kspace_pre_normalization_vars, sensitivity_vars, prediction_vars, None, target_vars
+            )
+        )
+
+        return [kspace, masked_kspace, sensitivity_map, mask, prediction, target, fname, slice_idx, acc, attrs]
+
+    def __normalize_batch__(
+        self, data: torch.Tensor, apply_backward_transform: bool = False, apply_forward_transform: bool = False
+    ) -> Tuple[torch.Tensor, Dict]:
+        """Normalizes every example of a batch, or only computes its statistics if normalization is disabled."""
+        if is_none(self.normalization.__repr__()):
+            return self.batched_normalization.forward(data)
+        return self.batched_normalization(data, apply_backward_transform, apply_forward_transform)  # type: ignore
+
+    def __initialize_batched_prediction__(
+        self, prediction: Union[torch.Tensor, None], kspace: torch.Tensor, sensitivity_map: torch.Tensor
+    ) -> Tuple[torch.Tensor, Dict]:
+        """Batched counterpart of :meth:`__initialize_prediction__`, for a batch of kspace and coil sensitivity maps.
+
+        Parameters
+        ----------
+        prediction : torch.Tensor, optional
+            The stored prediction of every example. If ``None``, the prediction is estimated from the kspace.
+        kspace : torch.Tensor
+            The kspace, of shape [batch_size, ...].
+        sensitivity_map : torch.Tensor
+            The coil sensitivity maps, of shape [batch_size, ...].
+
+        Returns
+        -------
+        Tuple[torch.Tensor, Dict]
+            The prediction and its statistics, of shape [batch_size], before normalization.
+        """
+        if prediction is None:
+            prediction = coil_combination_method_func(
+                ifft2(kspace, self.fft_centered, self.fft_normalization, self.spatial_dims),
+                sensitivity_map,
+                method=self.coil_combination_method,
+                dim=self.coil_dim + 1,
+            )
+        prediction = self.cropping(prediction, apply_forward_transform=self.kspace_crop)  # type: ignore
+        prediction, pre_normalization_vars = self.__normalize_batch__(
+            prediction, apply_forward_transform=self.kspace_crop
+        )
+        if prediction.shape[-1] != 2 and torch.is_complex(prediction):
+            prediction = torch.view_as_real(prediction)
+        return prediction, pre_normalization_vars
+
     def __repr__(self) -> str:
         """Representation of :class:`MRIDataTransforms`."""
         return (
@@ -2639,7 +2957,7 @@ class MRIDataTransforms:
         return self.__repr__()
 
     def __process_kspace__(  # noqa: MC0001
-        self, kspace: np.ndarray, mask: Union[np.ndarray, None], attrs: Dict, fname: str
+        self, kspace: np.ndarray, mask: Union[np.ndarray, None], attrs: Dict, fname: str, slice_idx: int = None
     ) -> Tuple[torch.Tensor, Union[List[torch.Tensor], torch.Tensor], Union[List[torch.Tensor], torch.Tensor], int]:
         """Apply the preprocessing transforms to the kspace.
 
@@ -2653,6 +2971,8 @@ class MRIDataTransforms:
             The attributes, if stored in the file.
         fname : str
             The file name.
+        slice_idx : int, optional
+            The slice index, which addresses the preprocessing cache. Default is ``None``.
 
         Returns
         -------
@@ -2660,14 +2980,7 @@ class MRIDataTransforms:
             The transformed (fully-sampled) kspace, the masked kspace, the mask, the attributes and the acceleration
             factor.
         """
-        kspace = to_tensor(kspace)
-        kspace = add_coil_dim_if_singlecoil(kspace, dim=self.coil_dim)
-
-        kspace = self.coils_shape_transforms(kspace, apply_backward_transform=True)
-        kspace = self.prewhitening(kspace)  # type: ignore
-
-        if self.crop_before_masking:
-            kspace = self.cropping(kspace, apply_backward_transform=not self.kspace_crop)  # type: ignore
+        kspace = self.__preprocess_kspace__(kspace, fname, slice_idx, attrs.pop("noise_prewhitening_reference", None))
 
         masked_kspace, mask, acc = self.masking(
             self.random_motion(kspace),  # type: ignore
@@ -2701,13 +3014,7 @@ class MRIDataTransforms:
                     is_complex = _kspace.shape[-1] == 2
                     if is_complex:
                         _kspace = torch.view_as_complex(_kspace)
-                    _pre_normalization_vars = {
-                        "min": torch.min(torch.abs(_kspace)),
-                        "max": torch.max(torch.abs(_kspace)),
-                        "mean": torch.mean(torch.abs(_kspace)),
-                        "std": torch.std(torch.abs(_kspace)),
-                        "var": torch.var(torch.abs(_kspace)),
-                    }
+                    _pre_normalization_vars = magnitude_statistics(_kspace)
                     if is_complex:
                         _kspace = torch.view_as_real(_kspace)
                 kspaces.append(_kspace)
@@ -2722,13 +3029,7 @@ class MRIDataTransforms:
                 is_complex = kspace.shape[-1] == 2
                 if is_complex:
                     kspace = torch.view_as_complex(kspace)
-                pre_normalization_vars = {  # type: ignore
-                    "min": torch.min(torch.abs(kspace)),
-                    "max": torch.max(torch.abs(kspace)),
-                    "mean": torch.mean(torch.abs(kspace)),
-                    "std": torch.std(torch.abs(kspace)),
-                    "var": torch.var(torch.abs(kspace)),
-                }
+                pre_normalization_vars = magnitude_statistics(kspace)  # type: ignore
                 if is_complex:
                     kspace = torch.view_as_real(kspace)
 
@@ -2745,13 +3046,7 @@ class MRIDataTransforms:
                     is_complex = _masked_kspace.shape[-1] == 2
                     if is_complex:
                         _masked_kspace = torch.view_as_complex(_masked_kspace)
-                    _masked_pre_normalization_vars = {
-                        "min": torch.min(torch.abs(_masked_kspace)),
-                        "max": torch.max(torch.abs(_masked_kspace)),
-                        "mean": torch.mean(torch.abs(_masked_kspace)),
-                        "std": torch.std(torch.abs(_masked_kspace)),
-                        "var": torch.var(torch.abs(_masked_kspace)),
-                    }
+                    _masked_pre_normalization_vars = magnitude_statistics(_masked_kspace)
                     if is_complex:
                         _masked_kspace = torch.view_as_real(_masked_kspace)
                 masked_kspaces.append(_masked_kspace)
@@ -2766,13 +3061,7 @@ class MRIDataTransforms:
                 is_complex = masked_kspace.shape[-1] == 2
                 if is_complex:
                     masked_kspace = torch.view_as_complex(masked_kspace)
-                masked_pre_normalization_vars = {
-                    "min": torch.min(torch.abs(masked_kspace)),
-                    "max": torch.max(torch.abs(masked_kspace)),
-                    "mean": torch.mean(torch.abs(masked_kspace)),
-                    "std": torch.std(torch.abs(masked_kspace)),
-                    "var": torch.var(torch.abs(masked_kspace)),
-                }
+                masked_pre_normalization_vars = magnitude_statistics(masked_kspace)
                 if is_complex:
                     masked_kspace = torch.view_as_real(masked_kspace)
 
@@ -3006,8 +3295,55 @@ class MRIDataTransforms:
             mask = [train_mask, loss_mask]
         return kspace, masked_kspace, mask
 
+    def __preprocess_kspace__(
+        self, kspace: np.ndarray, fname: str, slice_idx: int = None, reference: Optional[np.ndarray] = None
+    ) -> torch.Tensor:
+        """Apply the deterministic preprocessing transforms to the kspace, which run before masking.
+
+        If a preprocessing cache is set, the result is loaded from the cache, or computed and stored in it.
+
+        Parameters
+        ----------
+        kspace : np.ndarray
+            The kspace.
+        fname : str
+            The file name.
+        slice_idx : int, optional
+            The slice index, which addresses the preprocessing cache. Default is ``None``.
+        reference : np.ndarray, optional
+            The reference slice of the volume, on which the noise prewhitening patch of the volume is searched.
+            Default is ``None``.
+
+        Returns
+        -------
+        torch.Tensor
+            The prewhitened, coil compressed, zero-filled and, if ``crop_before_masking``, cropped kspace.
+        """
+        use_cache = self.preprocessing_cache is not None and slice_idx is not None
+        if use_cache:
+            cached_kspace = self.preprocessing_cache.load(fname, slice_idx, "kspace")  # type: ignore
+            if cached_kspace is not None:
+                return cached_kspace
+
+        kspace = to_tensor(kspace)
+        kspace = add_coil_dim_if_singlecoil(kspace, dim=self.coil_dim)
+
+        kspace = self.coils_shape_transforms(kspace, apply_backward_transform=True)
+        if self.prewhitening is not None:
+            if reference is not None:
+                reference = add_coil_dim_if_singlecoil(to_tensor(reference), dim=self.coil_dim)
+                reference = self.coils_shape_transforms(reference, apply_backward_transform=True)
+            kspace = self.prewhitening(kspace, volume=fname, reference=reference)
+
+        if self.crop_before_masking:
+            kspace = self.cropping(kspace, apply_backward_transform=not self.kspace_crop)  # type: ignore
+
+        if use_cache and isinstance(kspace, torch.Tensor):
+            self.preprocessing_cache.save(fname, slice_idx, "kspace", kspace)  # type: ignore
+        return kspace
+
     def __process_coil_sensitivities_map__(
-        self, sensitivity_map: np.ndarray, kspace: torch.Tensor
+        self, sensitivity_map: np.ndarray, kspace: torch.Tensor, fname: str = None, slice_idx: int = None
     ) -> Union[torch.Tensor, Dict]:
         """Preprocesses the coil sensitivities map.
 
@@ -3017,23 +3353,17 @@ class MRIDataTransforms:
             The coil sensitivities map.
         kspace : torch.Tensor
             The kspace.
+        fname : str, optional
+            The file name, which addresses the preprocessing cache. Default is ``None``.
+        slice_idx : int, optional
+            The slice index, which addresses the preprocessing cache. Default is ``None``.
 
         Returns
         -------
         List[torch.Tensor, Dict]
             The preprocessed coil sensitivities map and the normalization variables.
         """
-        # This condition is necessary in case of auto estimation of sense maps.
-        if self.coil_sensitivity_maps_estimator is not None:
-            sensitivity_map = self.coil_sensitivity_maps_estimator(kspace)
-        elif sensitivity_map is not None and sensitivity_map.size != 0:
-            sensitivity_map = to_tensor(sensitivity_map)
-            sensitivity_map = self.coils_shape_transforms(sensitivity_map, apply_forward_transform=True)
-            sensitivity_map = self.cropping(sensitivity_map, apply_forward_transform=self.kspace_crop)  # type: ignore
-        else:
-            # If no sensitivity map is provided, either the data is singlecoil or the sense net is used.
-            # Initialize the sensitivity map to 1 to assure for the singlecoil case.
-            sensitivity_map = torch.ones_like(kspace) if not isinstance(kspace, list) else torch.ones_like(kspace[0])
+        sensitivity_map = self.__preprocess_coil_sensitivities_map__(sensitivity_map, kspace, fname, slice_idx)
 
         if not is_none(self.normalization.__repr__()):
             sensitivity_map, pre_normalization_vars = self.normalization(  # type: ignore
@@ -3043,17 +3373,59 @@ class MRIDataTransforms:
             is_complex = sensitivity_map.shape[-1] == 2
             if is_complex:
                 sensitivity_map = torch.view_as_complex(sensitivity_map)
-            pre_normalization_vars = {
-                "min": torch.min(torch.abs(sensitivity_map)),
-                "max": torch.max(torch.abs(sensitivity_map)),
-                "mean": torch.mean(torch.abs(sensitivity_map)),
-                "std": torch.std(torch.abs(sensitivity_map)),
-                "var": torch.var(torch.abs(sensitivity_map)),
-            }
+            pre_normalization_vars = magnitude_statistics(sensitivity_map)
             if is_complex:
                 sensitivity_map = torch.view_as_real(sensitivity_map)
         return sensitivity_map, pre_normalization_vars
 
+    def __preprocess_coil_sensitivities_map__(
+        self, sensitivity_map: np.ndarray, kspace: torch.Tensor, fname: str = None, slice_idx: int = None
+    ) -> torch.Tensor:
+        """Estimates, or preprocesses the stored, coil sensitivities map, before normalization.
+
+        If a preprocessing cache is set, the result is loaded from the cache, or computed and stored in it.
+
+        Parameters
+        ----------
+        sensitivity_map : np.ndarray
+            The coil sensitivities map.
+        kspace : torch.Tensor
+            The kspace.
+        fname : str, optional
+            The file name, which addresses the preprocessing cache. Default is ``None``.
+        slice_idx : int, optional
+            The slice index, which addresses the preprocessing cache. Default is ``None``.
+
+        Returns
+        -------
+        torch.Tensor
+            The coil sensitivities map.
+        """
+        # With SSDU the maps are estimated from the randomly masked kspace, so they cannot be cached.
+        use_cache = self.preprocessing_cache is not None and slice_idx is not None and not self.ssdu
+        cached_sensitivity_map = (
+            self.preprocessing_cache.load(fname, slice_idx, "sensitivity_map") if use_cache else None  # type: ignore
+        )
+
+        # This condition is necessary in case of auto estimation of sense maps.
+        if cached_sensitivity_map is not None:
+            sensitivity_map = cached_sensitivity_map
+        elif self.coil_sensitivity_maps_estimator is not None:
+            sensitivity_map = self.coil_sensitivity_maps_estimator(kspace)
+        elif sensitivity_map is not None and sensitivity_map.size != 0:
+            sensitivity_map = to_tensor(sensitivity_map)
+            sensitivity_map = self.coils_shape_transforms(sensitivity_map, apply_forward_transform=True)
+            sensitivity_map = self.cropping(sensitivity_map, apply_forward_transform=self.kspace_crop)  # type: ignore
+        else:
+            # If no sensitivity map is provided, either the data is singlecoil or the sense net is used.
+            # Initialize the sensitivity map to 1 to assure for the singlecoil case.
+            sensitivity_map = torch.ones_like(kspace) if not isinstance(kspace, list) else torch.ones_like(kspace[0])
+            use_cache = False
+
+        if use_cache and cached_sensitivity_map is None and isinstance(sensitivity_map, torch.Tensor):
+            self.preprocessing_cache.save(fname, slice_idx, "sensitivity_map", sensitivity_map)  # type: ignore
+        return sensitivity_map
+
     def __initialize_prediction__(
         self, prediction: Union[np.ndarray, None], kspace: torch.Tensor, sensitivity_map: torch.Tensor
     ) -> Tuple[Union[List[torch.Tensor], torch.Tensor], Dict]:
@@ -3093,13 +3465,7 @@ class MRIDataTransforms:
                     else:
                         if pred.shape[-1] == 2:
                             pred = torch.view_as_complex(pred)
-                        _pre_normalization_vars = {
-                            "min": torch.min(torch.abs(pred)),
-                            "max": torch.max(torch.abs(pred)),
-                            "mean": torch.mean(torch.abs(pred)),
-                            "std": torch.std(torch.abs(pred)),
-                            "var": torch.var(torch.abs(pred)),
-                        }
+                        _pre_normalization_vars = magnitude_statistics(pred)
                     prediction.append(pred)
                     pre_normalization_vars.append(_pre_normalization_vars)
                 if prediction[0].shape[-1] != 2 and torch.is_complex(prediction[0]):
@@ -3119,13 +3485,7 @@ class MRIDataTransforms:
                 else:
                     if prediction.shape[-1] == 2:
                         prediction = torch.view_as_complex(prediction)
-                    pre_normalization_vars = {  # type: ignore
-                        "min": torch.min(torch.abs(prediction)),
-                        "max": torch.max(torch.abs(prediction)),
-                        "mean": torch.mean(torch.abs(prediction)),
-                        "std": torch.std(torch.abs(prediction)),
-                        "var": torch.var(torch.abs(prediction)),
-                    }
+                    pre_normalization_vars = magnitude_statistics(prediction)  # type: ignore
                 if prediction.shape[-1] != 2 and torch.is_complex(prediction):
                     prediction = torch.view_as_real(prediction)
         else:
@@ -3139,13 +3499,7 @@ class MRIDataTransforms:
             else:
                 if prediction.shape[-1] == 2:  # type: ignore
                     prediction = torch.view_as_complex(prediction)
-                pre_normalization_vars = {  # type: ignore
-                    "min": torch.min(torch.abs(prediction)),
-                    "max": torch.max(torch.abs(prediction)),
-                    "mean": torch.mean(torch.abs(prediction)),
-                    "std": torch.std(torch.abs(prediction)),
-                    "var": torch.var(torch.abs(prediction)),
-                }
+                pre_normalization_vars = magnitude_statistics(prediction)  # type: ignore
             if prediction.shape[-1] != 2 and torch.is_complex(prediction):
                 prediction = torch.view_as_real(prediction)
         return prediction, pre_normalization_vars  # type: ignore
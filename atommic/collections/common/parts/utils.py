@@ -26,6 +26,7 @@ __all__ = [
     "crop_to_acs",
     "expand_op",
     "is_none",
+    "magnitude_statistics",
     "mask_center",
     "normalize_inplace",
     "parse_list_and_keep_last",
@@ -672,6 +673,41 @@ def is_none(x: Union[Any, None]) -> bool:
     return x is None or str(x).lower() == "none" or "none" in str(x).lower()
 
 
+def magnitude_statistics(x: torch.Tensor, dim: Optional[int] = None) -> Dict[str, torch.Tensor]:
+    """
+    Computes the minimum, maximum, mean, standard deviation and variance of the magnitude of the input.
+
+    The magnitude is computed once, and the statistics in two fused reductions, ``torch.aminmax`` and
+    ``torch.var_mean``, instead of five separate passes over the data. The results are, up to rounding, those of
+    ``torch.min``, ``torch.max``, ``torch.mean``, ``torch.std`` and ``torch.var`` of ``torch.abs(x)``.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        The input, real or complex.
+    dim : int, optional
+        If given, the statistics are computed over all dimensions from ``dim`` on, e.g. ``dim=1`` gives the statistics
+        of every example of a batch. If ``None``, the statistics are computed over all elements. Default is ``None``.
+
+    Returns
+    -------
+    Dict[str, torch.Tensor]
+        The statistics, keyed by ``min``, ``max``, ``mean``, ``std`` and ``var``.
+
+    Examples
+    --------
+    >>> from atommic.collections.common.parts.utils import magnitude_statistics
+    >>> import torch
+    >>> magnitude_statistics(torch.tensor([3 + 4j, -1 + 0j]))
+    {'min': tensor(1.), 'max': tensor(5.), 'mean': tensor(3.), 'std': tensor(2.8284), 'var': tensor(8.)}
+    """
+    x = torch.abs(x)
+    x = x.flatten() if dim is None else x.flatten(dim)
+    min_value, max_value = torch.aminmax(x, dim=-1)
+    var, mean = torch.var_mean(x, dim=-1)
+    return {"min": min_value, "max": max_value, "mean": mean, "std": torch.sqrt(var), "var": var}
+
+
 def mask_center(
     x: torch.Tensor, mask_from: Optional[int], mask_to: Optional[int], mask_type: str = "2D"
 ) -> torch.Tensor:
@@ -6,8 +6,6 @@ import warnings
 from pathlib import Path
 from typing import Callable, Optional, Tuple, Union
 
-import h5py
-import nibabel as nib
 import numpy as np
 
 from atommic.collections.common.data.mri_loader import MRIDataset
@@ -242,7 +240,7 @@ class RSMRIDataset(MRIDataset):
     def __getitem__(self, i: int):  # noqa: MC0001
         """Get item from :class:`RSMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             if self.complex_data:
                 kspace = self.get_consecutive_slices(hf, "kspace", dataslice).astype(np.complex64)
 
@@ -265,7 +263,9 @@ class RSMRIDataset(MRIDataset):
                             if os.path.exists(coil_sensitivity_maps_root / Path(split_dir[-2]) / fname.name):
                                 break
                     # load coil sensitivity maps
-                    with h5py.File(Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name, "r") as sf:
+                    with self.file_pool.open(
+                        Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name
+                    ) as sf:
                         if "sensitivity_map" in sf or "sensitivity_map" in next(iter(sf.keys())):
                             sensitivity_map = (
                                 self.get_consecutive_slices(sf, "sensitivity_map", dataslice)
@@ -279,7 +279,7 @@ class RSMRIDataset(MRIDataset):
                     if mask.ndim == 3:
                         mask = mask[dataslice]
                 elif self.mask_root is not None and self.mask_root != "None":
-                    with h5py.File(Path(self.mask_root) / fname.name, "r") as mf:
+                    with self.file_pool.open(Path(self.mask_root) / fname.name) as mf:
                         mask = np.asarray(self.get_consecutive_slices(mf, "mask", dataslice))
 
                 imspace = np.empty([])
@@ -304,7 +304,7 @@ class RSMRIDataset(MRIDataset):
 
             segmentation_labels = np.empty([])
             if self.segmentations_root is not None and self.segmentations_root != "None":
-                with h5py.File(Path(self.segmentations_root) / fname.name, "r") as sf:
+                with self.file_pool.open(Path(self.segmentations_root) / fname.name) as sf:
                     segmentation_labels = np.asarray(self.get_consecutive_slices(sf, "segmentation", dataslice))
                     segmentation_labels = self.process_segmentation_labels(segmentation_labels)
             elif "segmentation" in hf:
@@ -313,7 +313,7 @@ class RSMRIDataset(MRIDataset):
 
             initial_prediction = np.empty([])
             if not is_none(self.initial_predictions_root):
-                with h5py.File(Path(self.initial_predictions_root) / fname.name, "r") as ipf:  # type: ignore
+                with self.file_pool.open(Path(self.initial_predictions_root) / fname.name) as ipf:  # type: ignore
                     if "reconstruction" in hf:
                         initial_prediction = (
                             self.get_consecutive_slices(ipf, "reconstruction", dataslice)
@@ -346,6 +346,12 @@ class RSMRIDataset(MRIDataset):
 
             attrs.update(metadata)
 
+            if self.complex_data:
+                # the noise prewhitening patch of the volume is searched on its middle slice
+                reference = self.get_noise_prewhitening_reference(hf, "kspace", fname.name, dataslice)
+                if reference is not None:
+                    attrs["noise_prewhitening_reference"] = reference.astype(np.complex64)
+
         if sensitivity_map.shape != kspace.shape and sensitivity_map.ndim > 1:
             if sensitivity_map.ndim == 3:
                 sensitivity_map = np.transpose(sensitivity_map, (2, 0, 1))
@@ -392,6 +398,32 @@ class SKMTEARSMRIDataset(RSMRIDataset):
         Extends :class:`atommic.collections.multitask.rs.data.mrirs_loader.RSMRIDataset`.
     """
 
+    @staticmethod
+    def segmentation_one_hot(segmentation_labels: np.ndarray) -> np.ndarray:
+        """Converts the segmentation labels to the Patellar Cartilage (label 1), the Femoral Cartilage (label 2), the
+        Tibial Cartilage (Lateral and Medial - labels 3 and 4), and the Meniscus (Lateral and Medial - labels 5 and 6)
+        classes.
+
+        Parameters
+        ----------
+        segmentation_labels : np.ndarray
+            The segmentation labels.
+
+        Returns
+        -------
+        np.ndarray
+            The boolean classes, stacked at the first dimension.
+        """
+        return np.stack(
+            [
+                segmentation_labels == 1,
+                segmentation_labels == 2,
+                (segmentation_labels == 3) | (segmentation_labels == 4),
+                (segmentation_labels == 5) | (segmentation_labels == 6),
+            ],
+            axis=0,
+        )
+
     def __getitem__(self, i: int):  # noqa: MC0001
         """Get item from :class:`SKMTEARSMRIDataset`."""
         if not is_none(self.dataset_format):
@@ -405,7 +437,7 @@ class SKMTEARSMRIDataset(RSMRIDataset):
             masking = "custom"
 
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             kspace = self.get_consecutive_slices(hf, "kspace", dataslice).astype(np.complex64)
 
             if not is_none(dataset_format) and dataset_format == "skm-tea-echo1":
@@ -439,47 +471,16 @@ class SKMTEARSMRIDataset(RSMRIDataset):
                     mask[key.split("_")[-1].split(".")[0]] = np.asarray(val)
 
             # get the file format of the segmentation files
-            segmentation_labels = nib.load(
+            segmentation_labels = self.volume_cache.get(
                 Path(self.segmentations_root) / Path(str(fname.name.split(".")[0]) + ".nii.gz")  # type: ignore
-            ).get_fdata()
+            )
 
             # get a slice
             segmentation_labels = self.get_consecutive_slices({"seg": segmentation_labels}, "seg", dataslice)
-
-            # Get the segmentation labels. They are valued as follows:
-            # 0: Patellar Cartilage
-            patellar_cartilage = np.zeros_like(segmentation_labels)
-            patellar_cartilage[segmentation_labels == 1] = 1
-            # 1: Femoral Cartilage
-            femoral_cartilage = np.zeros_like(segmentation_labels)
-            femoral_cartilage[segmentation_labels == 2] = 1
-            # 2: Lateral Tibial Cartilage
-            lateral_tibial_cartilage = np.zeros_like(segmentation_labels)
-            lateral_tibial_cartilage[segmentation_labels == 3] = 1
-            # 3: Medial Tibial Cartilage
-            medial_tibial_cartilage = np.zeros_like(segmentation_labels)
-            medial_tibial_cartilage[segmentation_labels == 4] = 1
-            # 4: Lateral Meniscus
-            lateral_meniscus = np.zeros_like(segmentation_labels)
-            lateral_meniscus[segmentation_labels == 5] = 1
-            # 5: Medial Meniscus
-            medial_meniscus = np.zeros_like(segmentation_labels)
-            medial_meniscus[segmentation_labels == 6] = 1
-            # combine Lateral Tibial Cartilage and Medial Tibial Cartilage
-            tibial_cartilage = lateral_tibial_cartilage + medial_tibial_cartilage
-            # combine Lateral Meniscus and Medial Meniscus
-            medial_meniscus = lateral_meniscus + medial_meniscus
+            segmentation_labels = self.segmentation_one_hot(segmentation_labels)
 
             if self.consecutive_slices > 1:
-                segmentation_labels_dim = 1
-            else:
-                segmentation_labels_dim = 0
-
-            # stack the labels in the last dimension
-            segmentation_labels = np.stack(
-                [patellar_cartilage, femoral_cartilage, tibial_cartilage, medial_meniscus],
-                axis=segmentation_labels_dim,
-            )
+                segmentation_labels = np.moveaxis(segmentation_labels, 0, 1)
 
             # TODO: This is hardcoded on the SKM-TEA side, how to generalize this?
             # We need to crop the segmentation labels in the frequency domain to reduce the FOV.
@@ -1,14 +1,11 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import os
 import warnings
 from abc import ABC
 from collections import defaultdict
-from pathlib import Path
 from typing import Dict, List, Tuple, Union
 
-import h5py
 import numpy as np
 import torch
 from omegaconf import DictConfig, OmegaConf
@@ -18,6 +15,8 @@ from torch.utils.data import DataLoader
 
 # do not import BaseMRIModel, BaseSensitivityModel, and DistributedMetricSum directly to avoid circular imports
 import atommic.collections.common as atommic_common
+from atommic.collections.common.data.file_pool import worker_init_fn
+from atommic.collections.common.data.samplers import DistributedVolumeSampler
 from atommic.collections.common.data.subsample import create_masker
 from atommic.collections.common.losses import VALID_RECONSTRUCTION_LOSSES, VALID_SEGMENTATION_LOSSES
 from atommic.collections.common.losses.aggregator import AggregatorLoss
@@ -1490,13 +1489,14 @@ class BaseMRIReconstructionSegmentationModel(atommic_common.nn.base.BaseMRIModel
                 .numpy()
             )
 
-        predictions = (
-            (predictions_segmentation, predictions_reconstruction)
-            if self.use_reconstruction_module
-            else (predictions_segmentation, predictions_segmentation)
-        )
+        outputs = {"segmentation": predictions_segmentation}
+        if self.use_reconstruction_module:
+            outputs["reconstruction"] = predictions_reconstruction
+        if self.consecutive_slices > 1:
+            # always keep the middle slice
+            outputs = {name: output[self.consecutive_slices // 2] for name, output in outputs.items()}
 
-        self.test_step_outputs.append([str(fname[0]), slice_idx, predictions])  # type: ignore
+        self.get_predictions_writer("predictions").write(str(fname[0]), slice_idx, outputs)  # type: ignore
 
     def on_validation_epoch_end(self):  # noqa: MC0001
         """Called at the end of validation epoch to aggregate outputs.
@@ -1662,52 +1662,8 @@ class BaseMRIReconstructionSegmentationModel(atommic_common.nn.base.BaseMRIModel
             for metric, value in metrics_reconstruction.items():
                 self.log(f"test_metrics/{metric}", value / tot_examples, prog_bar=True, sync_dist=True)
 
-        segmentations = defaultdict(list)
-        for fname, slice_num, output in self.test_step_outputs:
-            segmentations_pred, _ = output
-            segmentations[fname].append((slice_num, segmentations_pred))
-
-        for fname in segmentations:
-            segmentations[fname] = np.stack([out for _, out in sorted(segmentations[fname])])
-
-        if self.consecutive_slices > 1:
-            # iterate over the slices and always keep the middle slice
-            for fname in segmentations:
-                segmentations[fname] = segmentations[fname][:, self.consecutive_slices // 2]
-
-        if self.use_reconstruction_module:
-            reconstructions = defaultdict(list)
-            for fname, slice_num, output in self.test_step_outputs:
-                _, reconstructions_pred = output
-                reconstructions[fname].append((slice_num, reconstructions_pred))
-
-            for fname in reconstructions:
-                reconstructions[fname] = np.stack([out for _, out in sorted(reconstructions[fname])])
-
-            if self.consecutive_slices > 1:
-                # iterate over the slices and always keep the middle slice
-                for fname in reconstructions:
-                    reconstructions[fname] = reconstructions[fname][:, self.consecutive_slices // 2]
-        else:
-            reconstructions = None
-
-        if "wandb" in self.logger.__module__.lower():
-            out_dir = Path(os.path.join(self.logger.save_dir, "predictions"))
-        else:
-            out_dir = Path(os.path.join(self.logger.log_dir, "predictions"))
-        out_dir.mkdir(exist_ok=True, parents=True)
-
-        if reconstructions is not None:
-            for (fname, segmentations_pred), (_, reconstructions_pred) in zip(
-                segmentations.items(), reconstructions.items()
-            ):
-                with h5py.File(out_dir / fname, "w") as hf:
-                    hf.create_dataset("segmentation", data=segmentations_pred)
-                    hf.create_dataset("reconstruction", data=reconstructions_pred)
-        else:
-            for fname, segmentations_pred in segmentations.items():
-                with h5py.File(out_dir / fname, "w") as hf:
-                    hf.create_dataset("segmentation", data=segmentations_pred)
+        # Flush the predictions that are not written yet.
+        self.close_predictions_writer()
 
     @staticmethod
     def _setup_dataloader_from_config(cfg: DictConfig) -> DataLoader:
@@ -1742,7 +1698,7 @@ class BaseMRIReconstructionSegmentationModel(atommic_common.nn.base.BaseMRIModel
                 center_fractions = center_fractions * 2
             mask_center_scale = mask_args.get("center_scale", 0.02)
 
-            mask_func = [create_masker(mask_type, center_fractions, accelerations)]
+            mask_func = [create_masker(mask_type, center_fractions, accelerations, mask_args.get("mask_bank_size", 0))]
 
         complex_data = cfg.get("complex_data", True)
 
@@ -1774,6 +1730,11 @@ class BaseMRIReconstructionSegmentationModel(atommic_common.nn.base.BaseMRIModel
             n2r_supervised_rate=cfg.get("n2r_supervised_rate", 0.0),
             complex_target=cfg.get("complex_target", False),
             log_images_rate=cfg.get("log_images_rate", 1.0),
+            file_handle_pool_size=cfg.get("file_handle_pool_size", 16),
+            slice_window_cache_size=cfg.get("slice_window_cache_size", 8),
+            nifti_volume_cache_size=cfg.get("nifti_volume_cache_size", 4),
+            metadata_scan_workers=cfg.get("metadata_scan_workers", 0),
+            metadata_scan_mode=cfg.get("metadata_scan_mode", "thread"),
             transform=RSMRIDataTransforms(
                 complex_data=complex_data,
                 dataset_format=dataset_format,
@@ -1844,7 +1805,16 @@ class BaseMRIReconstructionSegmentationModel(atommic_common.nn.base.BaseMRIModel
             segmentation_classes_thresholds=cfg.get("segmentation_classes_thresholds", None),
             complex_data=complex_data,
         )
-        if cfg.shuffle:
+        if cfg.get("volume_sampler", False):
+            # sample volume by volume, so that the workers reuse their open files and decoded volumes
+            sampler = DistributedVolumeSampler(
+                dataset,
+                shuffle=cfg.shuffle,
+                slice_block_size=cfg.get("slice_block_size", None),
+                num_workers=cfg.get("num_workers", 4),
+                batch_size=cfg.get("batch_size", 1),
+            )
+        elif cfg.shuffle:
             sampler = torch.utils.data.RandomSampler(dataset)
         else:
             sampler = torch.utils.data.SequentialSampler(dataset)
@@ -1855,5 +1825,6 @@ class BaseMRIReconstructionSegmentationModel(atommic_common.nn.base.BaseMRIModel
             sampler=sampler,
             num_workers=cfg.get("num_workers", 4),
             pin_memory=cfg.get("pin_memory", False),
+            worker_init_fn=worker_init_fn,
             drop_last=cfg.get("drop_last", False),
         )
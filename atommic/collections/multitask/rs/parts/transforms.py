@@ -21,7 +21,7 @@ from atommic.collections.common.parts.transforms import (
 )
 from atommic.collections.common.parts.utils import add_coil_dim_if_singlecoil
 from atommic.collections.common.parts.utils import coil_combination_method as coil_combination_method_func
-from atommic.collections.common.parts.utils import is_none, to_tensor
+from atommic.collections.common.parts.utils import is_none, magnitude_statistics, to_tensor
 from atommic.collections.motioncorrection.parts.motionsimulation import MotionSimulation
 
 __all__ = ["RSMRIDataTransforms"]
@@ -397,7 +397,6 @@ class RSMRIDataTransforms:
 
             self.coil_combination_method = coil_combination_method
 
-            self.prewhitening = Composer([self.prewhitening])  # type: ignore
             self.coils_shape_transforms = Composer(
                 [
                     self.gcc,  # type: ignore
@@ -642,7 +641,12 @@ class RSMRIDataTransforms:
         kspace = add_coil_dim_if_singlecoil(kspace, dim=self.coil_dim)
 
         kspace = self.coils_shape_transforms(kspace, apply_backward_transform=True)
-        kspace = self.prewhitening(kspace)  # type: ignore
+        if self.prewhitening is not None:
+            reference = attrs.pop("noise_prewhitening_reference", None)
+            if reference is not None:
+                reference = add_coil_dim_if_singlecoil(to_tensor(reference), dim=self.coil_dim)
+                reference = self.coils_shape_transforms(reference, apply_backward_transform=True)
+            kspace = self.prewhitening(kspace, volume=fname, reference=reference)
 
         if self.crop_before_masking:
             kspace = self.cropping(kspace, apply_backward_transform=not self.kspace_crop)  # type: ignore
@@ -679,13 +683,7 @@ class RSMRIDataTransforms:
                     is_complex = _kspace.shape[-1] == 2
                     if is_complex:
                         _kspace = torch.view_as_complex(_kspace)
-                    _pre_normalization_vars = {
-                        "min": torch.min(torch.abs(_kspace)),
-                        "max": torch.max(torch.abs(_kspace)),
-                        "mean": torch.mean(torch.abs(_kspace)),
-                        "std": torch.std(torch.abs(_kspace)),
-                        "var": torch.var(torch.abs(_kspace)),
-                    }
+                    _pre_normalization_vars = magnitude_statistics(_kspace)
                     if is_complex:
                         _kspace = torch.view_as_real(_kspace)
                 kspaces.append(_kspace)
@@ -700,13 +698,7 @@ class RSMRIDataTransforms:
                 is_complex = kspace.shape[-1] == 2
                 if is_complex:
                     kspace = torch.view_as_complex(kspace)
-                pre_normalization_vars = {  # type: ignore
-                    "min": torch.min(torch.abs(kspace)),
-                    "max": torch.max(torch.abs(kspace)),
-                    "mean": torch.mean(torch.abs(kspace)),
-                    "std": torch.std(torch.abs(kspace)),
-                    "var": torch.var(torch.abs(kspace)),
-                }
+                pre_normalization_vars = magnitude_statistics(kspace)  # type: ignore
                 if is_complex:
                     kspace = torch.view_as_real(kspace)
 
@@ -723,13 +715,7 @@ class RSMRIDataTransforms:
                     is_complex = _masked_kspace.shape[-1] == 2
                     if is_complex:
                         _masked_kspace = torch.view_as_complex(_masked_kspace)
-                    _masked_pre_normalization_vars = {
-                        "min": torch.min(torch.abs(_masked_kspace)),
-                        "max": torch.max(torch.abs(_masked_kspace)),
-                        "mean": torch.mean(torch.abs(_masked_kspace)),
-                        "std": torch.std(torch.abs(_masked_kspace)),
-                        "var": torch.var(torch.abs(_masked_kspace)),
-                    }
+                    _masked_pre_normalization_vars = magnitude_statistics(_masked_kspace)
                     if is_complex:
                         _masked_kspace = torch.view_as_real(_masked_kspace)
                 masked_kspaces.append(_masked_kspace)
@@ -744,13 +730,7 @@ class RSMRIDataTransforms:
                 is_complex = masked_kspace.shape[-1] == 2
                 if is_complex:
                     masked_kspace = torch.view_as_complex(masked_kspace)
-                masked_pre_normalization_vars = {
-                    "min": torch.min(torch.abs(masked_kspace)),
-                    "max": torch.max(torch.abs(masked_kspace)),
-                    "mean": torch.mean(torch.abs(masked_kspace)),
-                    "std": torch.std(torch.abs(masked_kspace)),
-                    "var": torch.var(torch.abs(masked_kspace)),
-                }
+                masked_pre_normalization_vars = magnitude_statistics(masked_kspace)
                 if is_complex:
                     masked_kspace = torch.view_as_real(masked_kspace)
 
@@ -1021,13 +1001,7 @@ class RSMRIDataTransforms:
             is_complex = sensitivity_map.shape[-1] == 2
             if is_complex:
                 sensitivity_map = torch.view_as_complex(sensitivity_map)
-            pre_normalization_vars = {
-                "min": torch.min(torch.abs(sensitivity_map)),
-                "max": torch.max(torch.abs(sensitivity_map)),
-                "mean": torch.mean(torch.abs(sensitivity_map)),
-                "std": torch.std(torch.abs(sensitivity_map)),
-                "var": torch.var(torch.abs(sensitivity_map)),
-            }
+            pre_normalization_vars = magnitude_statistics(sensitivity_map)
             if is_complex:
                 sensitivity_map = torch.view_as_real(sensitivity_map)
         return sensitivity_map, pre_normalization_vars
@@ -1071,13 +1045,7 @@ class RSMRIDataTransforms:
                     else:
                         if pred.shape[-1] == 2:
                             pred = torch.view_as_complex(pred)
-                        _pre_normalization_vars = {
-                            "min": torch.min(torch.abs(pred)),
-                            "max": torch.max(torch.abs(pred)),
-                            "mean": torch.mean(torch.abs(pred)),
-                            "std": torch.std(torch.abs(pred)),
-                            "var": torch.var(torch.abs(pred)),
-                        }
+                        _pre_normalization_vars = magnitude_statistics(pred)
                     prediction.append(pred)
                     pre_normalization_vars.append(_pre_normalization_vars)
                 if prediction[0].shape[-1] != 2 and torch.is_complex(prediction[0]):
@@ -1097,13 +1065,7 @@ class RSMRIDataTransforms:
                 else:
                     if prediction.shape[-1] == 2:
                         prediction = torch.view_as_complex(prediction)
-                    pre_normalization_vars = {  # type: ignore
-                        "min": torch.min(torch.abs(prediction)),
-                        "max": torch.max(torch.abs(prediction)),
-                        "mean": torch.mean(torch.abs(prediction)),
-                        "std": torch.std(torch.abs(prediction)),
-                        "var": torch.var(torch.abs(prediction)),
-                    }
+                    pre_normalization_vars = magnitude_statistics(prediction)  # type: ignore
                 if prediction.shape[-1] != 2 and torch.is_complex(prediction):
                     prediction = torch.view_as_real(prediction)
         else:
@@ -1117,13 +1079,7 @@ class RSMRIDataTransforms:
             else:
                 if prediction.shape[-1] == 2:  # type: ignore
                     prediction = torch.view_as_complex(prediction)
-                pre_normalization_vars = {  # type: ignore
-                    "min": torch.min(torch.abs(prediction)),
-                    "max": torch.max(torch.abs(prediction)),
-                    "mean": torch.mean(torch.abs(prediction)),
-                    "std": torch.std(torch.abs(prediction)),
-                    "var": torch.var(torch.abs(prediction)),
-                }
+                pre_normalization_vars = magnitude_statistics(prediction)  # type: ignore
             if prediction.shape[-1] != 2 and torch.is_complex(prediction):
                 prediction = torch.view_as_real(prediction)
         return prediction, pre_normalization_vars  # type: ignore
@@ -7,7 +7,6 @@ import warnings
 from pathlib import Path
 from typing import Callable, Optional, Tuple, Union
 
-import h5py
 import numpy as np
 
 from atommic.collections.common.data.mri_loader import MRIDataset
@@ -147,7 +146,7 @@ class AHEADqMRIDataset(qMRIDataset):
     def __getitem__(self, i: int):  # noqa: MC0001
         """Get item from :class:`AHEADqMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             kspace = self.get_consecutive_slices(hf, "kspace", dataslice).astype(np.complex64)
 
             kspace = kspace / self.kspace_scaling_factor
@@ -166,8 +165,8 @@ class AHEADqMRIDataset(qMRIDataset):
                         if os.path.exists(coil_sensitivity_maps_root / Path(split_dir[-2]) / fname.name):
                             break
 
-                with h5py.File(
-                    Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name, "r"  # type: ignore
+                with self.file_pool.open(
+                    Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name  # type: ignore
                 ) as sf:
                     if "sensitivity_map" in sf or "sensitivity_map" in next(iter(sf.keys())):
                         sensitivity_map = (
@@ -183,7 +182,7 @@ class AHEADqMRIDataset(qMRIDataset):
                 if mask.ndim == 3:
                     mask = mask[dataslice]
             elif not is_none(self.mask_root):
-                with h5py.File(Path(self.mask_root) / fname.name, "r") as mf:  # type: ignore
+                with self.file_pool.open(Path(self.mask_root) / fname.name) as mf:  # type: ignore
                     mask = np.asarray(self.get_consecutive_slices(mf, "mask", dataslice))
             else:
                 mask = np.empty([])
@@ -193,7 +192,7 @@ class AHEADqMRIDataset(qMRIDataset):
                 if anatomy_mask.ndim == 3:
                     anatomy_mask = anatomy_mask[dataslice]
             elif not is_none(self.segmentation_mask_root):
-                with h5py.File(Path(self.segmentation_mask_root) / fname.name, "r") as mf:  # type: ignore
+                with self.file_pool.open(Path(self.segmentation_mask_root) / fname.name) as mf:  # type: ignore
                     anatomy_mask = np.asarray(self.get_consecutive_slices(mf, "anatomy_mask", dataslice))
             else:
                 anatomy_mask = np.empty([])
@@ -202,7 +201,7 @@ class AHEADqMRIDataset(qMRIDataset):
 
             prediction = np.empty([])
             if not is_none(self.initial_predictions_root):
-                with h5py.File(Path(self.initial_predictions_root) / fname.name, "r") as ipf:  # type: ignore
+                with self.file_pool.open(Path(self.initial_predictions_root) / fname.name) as ipf:  # type: ignore
                     rkey = "reconstruction" if "reconstruction" in ipf else "initial_prediction"
                     prediction = self.get_consecutive_slices(ipf, rkey, dataslice).squeeze().astype(np.complex64)
             elif "reconstruction" in hf or "initial_prediction" in hf:
@@ -239,6 +238,11 @@ class AHEADqMRIDataset(qMRIDataset):
 
             attrs.update(metadata)
 
+            # the noise prewhitening patches of the echoes of the volume are searched on its middle slice
+            reference = self.get_noise_prewhitening_reference(hf, "kspace", fname.name, dataslice, (fname.name, 0))
+            if reference is not None:
+                attrs["noise_prewhitening_reference"] = reference.astype(np.complex64) / self.kspace_scaling_factor
+
         if self.data_saved_per_slice:
             # arbitrary slice number for logging purposes
             dataslice = str(fname.name)  # type: ignore
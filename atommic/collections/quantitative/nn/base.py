@@ -1,14 +1,11 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import os
 import warnings
 from abc import ABC
 from collections import defaultdict
-from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-import h5py
 import numpy as np
 import torch
 from numpy import ndarray
@@ -20,6 +17,8 @@ from torch.utils.data import DataLoader
 
 # do not import BaseMRIModel and BaseSensitivityModel directly to avoid circular imports
 import atommic.collections.common as atommic_common
+from atommic.collections.common.data.file_pool import worker_init_fn
+from atommic.collections.common.data.samplers import DistributedVolumeSampler
 from atommic.collections.common.data.subsample import create_masker
 from atommic.collections.common.losses import VALID_RECONSTRUCTION_LOSSES
 from atommic.collections.common.losses.aggregator import AggregatorLoss
@@ -1924,13 +1923,14 @@ class BaseqMRIReconstructionModel(atommic_common.nn.base.BaseMRIModel, ABC):
             .numpy()
         )
 
-        predictions = (
-            (prediction_qmaps, prediction_reconstruction)
-            if self.use_reconstruction_module
-            else (prediction_qmaps, prediction_qmaps)
-        )
+        outputs = {"qmaps": prediction_qmaps}
+        if self.use_reconstruction_module:
+            outputs["reconstruction"] = prediction_reconstruction
+        if self.consecutive_slices > 1:
+            # always keep the middle slice
+            outputs = {name: output[self.consecutive_slices // 2] for name, output in outputs.items()}
 
-        self.test_step_outputs.append([str(fname[0]), slice_idx, predictions])  # type: ignore
+        self.get_predictions_writer("predictions").write(str(fname[0]), slice_idx, outputs)  # type: ignore
 
     def on_validation_epoch_end(self):  # noqa: MC0001
         """Called at the end of validation epoch to aggregate outputs.
@@ -2332,50 +2332,8 @@ class BaseqMRIReconstructionModel(atommic_common.nn.base.BaseMRIModel, ABC):
                     sync_dist=True,
                 )
 
-        qmaps = defaultdict(list)
-        for fname, slice_num, output in self.test_step_outputs:
-            qmaps_pred, _ = output
-            qmaps[fname].append((slice_num, qmaps_pred))
-
-        for fname in qmaps:
-            qmaps[fname] = np.stack([out for _, out in sorted(qmaps[fname])])
-
-        if self.consecutive_slices > 1:
-            # iterate over the slices and always keep the middle slice
-            for fname in qmaps:
-                qmaps[fname] = qmaps[fname][:, self.consecutive_slices // 2]
-
-        if self.use_reconstruction_module:
-            reconstructions = defaultdict(list)
-            for fname, slice_num, output in self.test_step_outputs:
-                _, reconstructions_pred = output
-                reconstructions[fname].append((slice_num, reconstructions_pred))
-
-            for fname in reconstructions:
-                reconstructions[fname] = np.stack([out for _, out in sorted(reconstructions[fname])])
-
-            if self.consecutive_slices > 1:
-                # iterate over the slices and always keep the middle slice
-                for fname in reconstructions:
-                    reconstructions[fname] = reconstructions[fname][:, self.consecutive_slices // 2]
-        else:
-            reconstructions = None
-
-        if "wandb" in self.logger.__module__.lower():
-            out_dir = Path(os.path.join(self.logger.save_dir, "predictions"))
-        else:
-            out_dir = Path(os.path.join(self.logger.log_dir, "predictions"))
-        out_dir.mkdir(exist_ok=True, parents=True)
-
-        if reconstructions is not None:
-            for (fname, qmaps_pred), (_, reconstructions_pred) in zip(qmaps.items(), reconstructions.items()):
-                with h5py.File(out_dir / fname, "w") as hf:
-                    hf.create_dataset("qmaps", data=qmaps_pred)
-                    hf.create_dataset("reconstruction", data=reconstructions_pred)
-        else:
-            for fname, qmaps_pred in qmaps.items():
-                with h5py.File(out_dir / fname, "w") as hf:
-                    hf.create_dataset("qmaps", data=qmaps_pred)
+        # Flush the predictions that are not written yet.
+        self.close_predictions_writer()
 
     @staticmethod
     def _setup_dataloader_from_config(cfg: DictConfig) -> DataLoader:
@@ -2410,7 +2368,7 @@ class BaseqMRIReconstructionModel(atommic_common.nn.base.BaseMRIModel, ABC):
                 center_fractions = center_fractions * 2
             mask_center_scale = mask_args.get("center_scale", 0.02)
 
-            mask_func = [create_masker(mask_type, center_fractions, accelerations)]
+            mask_func = [create_masker(mask_type, center_fractions, accelerations, mask_args.get("mask_bank_size", 0))]
 
         dataset_format = cfg.get("dataset_format", None)
         if dataset_format.lower() == "ahead":
@@ -2438,6 +2396,10 @@ class BaseqMRIReconstructionModel(atommic_common.nn.base.BaseMRIModel, ABC):
             n2r_supervised_rate=cfg.get("n2r_supervised_rate", 0.0),
             complex_target=cfg.get("complex_target", False),
             log_images_rate=cfg.get("log_images_rate", 1.0),
+            file_handle_pool_size=cfg.get("file_handle_pool_size", 16),
+            slice_window_cache_size=cfg.get("slice_window_cache_size", 8),
+            metadata_scan_workers=cfg.get("metadata_scan_workers", 0),
+            metadata_scan_mode=cfg.get("metadata_scan_mode", "thread"),
             transform=qMRIDataTransforms(
                 TEs=cfg.get("TEs"),
                 precompute_quantitative_maps=cfg.get("precompute_quantitative_maps"),
@@ -2506,7 +2468,16 @@ class BaseqMRIReconstructionModel(atommic_common.nn.base.BaseMRIModel, ABC):
             segmentation_mask_root=cfg.get("segmentation_mask_path", None),
             kspace_scaling_factor=cfg.get("kspace_scaling_factor", 1),
         )
-        if cfg.shuffle:
+        if cfg.get("volume_sampler", False):
+            # sample volume by volume, so that the workers reuse their open files and decoded volumes
+            sampler = DistributedVolumeSampler(
+                dataset,
+                shuffle=cfg.shuffle,
+                slice_block_size=cfg.get("slice_block_size", None),
+                num_workers=cfg.get("num_workers", 4),
+                batch_size=cfg.get("batch_size", 1),
+            )
+        elif cfg.shuffle:
             sampler = torch.utils.data.RandomSampler(dataset)
         else:
             sampler = torch.utils.data.SequentialSampler(dataset)
@@ -2517,6 +2488,7 @@ class BaseqMRIReconstructionModel(atommic_common.nn.base.BaseMRIModel, ABC):
             sampler=sampler,
             num_workers=cfg.get("num_workers", 4),
             pin_memory=cfg.get("pin_memory", False),
+            worker_init_fn=worker_init_fn,
             drop_last=cfg.get("drop_last", False),
         )
 
@@ -2570,6 +2542,27 @@ class SignalForwardModel:
             f"Found {self.sequence}"
         )
 
+    def _echo_times(
+        self, TEs: Union[List, torch.Tensor], like: torch.Tensor, scaling: Optional[float] = None
+    ) -> torch.Tensor:
+        """Returns the scaled echo times as a tensor of shape [n_echoes, 1, ..., 1], which broadcasts with the maps
+        unsqueezed at the echo dimension."""
+        scaling = self.scaling if scaling is None else scaling
+        TEs = torch.as_tensor(TEs, dtype=like.dtype, device=like.device) * scaling
+        return TEs.view(-1, *[1] * (like.dim() - 1))
+
+    def _decay(
+        self,
+        R2star_map: torch.Tensor,
+        B0_map: torch.Tensor,
+        TEs: Union[List, torch.Tensor],
+        scaling: Optional[float] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the scaled echo times and the complex decay :math:`e^{-TE (R_2^* + i B_0)}` of all echoes, of shape
+        [batch_size, n_echoes, n_x, n_y]."""
+        TEs = self._echo_times(TEs, R2star_map, scaling)
+        return TEs, torch.exp(-TEs * torch.complex(R2star_map, B0_map).unsqueeze(1))
+
     def MEGRESignalModel(
         self,
         R2star_map: torch.Tensor,
@@ -2580,6 +2573,8 @@ class SignalForwardModel:
     ):
         """MEGRE forward model.
 
+        The signal of all echoes is computed at once as :math:`(S_0 + i \phi) e^{-TE (R_2^* + i B_0)}`.
+
         Parameters
         ----------
         R2star_map : torch.Tensor
@@ -2592,37 +2587,51 @@ class SignalForwardModel:
             phi map of shape [batch_size, n_x, n_y].
         TEs : list of float, optional
             List of echo times.
+
+        Returns
+        -------
+        torch.Tensor
+            The signal of shape [batch_size, n_echoes, n_x, n_y, 2].
         """
-        S0_map_real = S0_map
-        S0_map_imag = phi_map
-
-        def first_term(i):
-            """First term of the MEGRE signal model."""
-            return torch.exp(-TEs[i] * self.scaling * R2star_map)
-
-        def second_term(i):
-            """Second term of the MEGRE signal model."""
-            return torch.cos(B0_map * self.scaling * -TEs[i])
-
-        def third_term(i):
-            """Third term of the MEGRE signal model."""
-            return torch.sin(B0_map * self.scaling * -TEs[i])
-
-        pred = torch.stack(
-            [
-                torch.stack(
-                    (
-                        S0_map_real * first_term(i) * second_term(i) - S0_map_imag * first_term(i) * third_term(i),
-                        S0_map_real * first_term(i) * third_term(i) + S0_map_imag * first_term(i) * second_term(i),
-                    ),
-                    -1,
-                )
-                for i in range(len(TEs))  # type: ignore
-            ],
-            1,
-        )
-        pred = torch.where(torch.isnan(pred), torch.zeros_like(pred), pred)
-        return torch.view_as_real(pred[..., 0] + 1j * pred[..., 1])
+        _, decay = self._decay(R2star_map, B0_map, TEs)  # type: ignore
+        pred = torch.view_as_real(torch.complex(S0_map, phi_map).unsqueeze(1) * decay)
+        return torch.where(torch.isnan(pred), torch.zeros_like(pred), pred)
+
+    def MEGREJacobian(
+        self,
+        R2star_map: torch.Tensor,
+        S0_map: torch.Tensor,
+        B0_map: torch.Tensor,
+        phi_map: torch.Tensor,
+        TEs: Optional[List] = None,
+        scaling: Optional[float] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Analytic derivatives of the MEGRE forward model, see :meth:`MEGRESignalModel`, with respect to the R2* and
+        the S0 maps.
+
+        Parameters
+        ----------
+        R2star_map : torch.Tensor
+            R2* map of shape [batch_size, n_x, n_y].
+        S0_map : torch.Tensor
+            S0 map of shape [batch_size, n_x, n_y].
+        B0_map : torch.Tensor
+            B0 map of shape [batch_size, n_x, n_y].
+        phi_map : torch.Tensor
+            phi map of shape [batch_size, n_x, n_y].
+        TEs : list of float, optional
+            List of echo times.
+        scaling : float, optional
+            Scaling of the echo times. If ``None``, the scaling of the forward model. Default is ``None``.
+
+        Returns
+        -------
+        Tuple[torch.Tensor, torch.Tensor]
+            The complex derivatives of the signal with respect to R2* and S0, of shape
+            [batch_size, n_echoes, n_x, n_y].
+        """
+        TEs, decay = self._decay(R2star_map, B0_map, TEs, scaling)  # type: ignore
+        return -TEs * torch.complex(S0_map, phi_map).unsqueeze(1) * decay, decay
 
     def MEGRENoPhaseSignalModel(
         self,
@@ -2632,6 +2641,9 @@ class SignalForwardModel:
     ):
         """MEGRE no phase forward model.
 
+        The magnitude of all echoes is computed at once as :math:`S_0 e^{-TE R_2^*}`, and is used as both the real and
+        the imaginary part of the signal.
+
         Parameters
         ----------
         R2star_map : torch.Tensor
@@ -2640,19 +2652,12 @@ class SignalForwardModel:
             S0 map of shape [batch_size, n_x, n_y].
         TEs : list of float, optional
             List of echo times.
+
+        Returns
+        -------
+        torch.Tensor
+            The signal of shape [batch_size, n_echoes, n_x, n_y, 2].
         """
-        pred = torch.stack(
-            [
-                torch.stack(
-                    (
-                        S0_map * torch.exp(-TEs[i] * self.scaling * R2star_map),  # type: ignore
-                        S0_map * torch.exp(-TEs[i] * self.scaling * R2star_map),  # type: ignore
-                    ),
-                    -1,
-                )
-                for i in range(len(TEs))  # type: ignore
-            ],
-            1,
-        )
+        pred = S0_map.unsqueeze(1) * torch.exp(-self._echo_times(TEs, R2star_map) * R2star_map.unsqueeze(1))
         pred = torch.where(torch.isnan(pred), torch.zeros_like(pred), pred)
-        return torch.view_as_real(pred[..., 0] + 1j * pred[..., 1])
+        return torch.stack([pred, pred], -1)
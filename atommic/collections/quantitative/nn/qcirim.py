@@ -189,49 +189,36 @@ class qCIRIM(BaseqMRIReconstructionModel):
              If False, returns the final estimate.
         """
         if self.use_reconstruction_module:
-            cascades_echoes_reconstruction_predictions = []
+            # fold the echoes into the batch dimension, to reconstruct all echoes at once
+            batch_size, n_echoes = y.shape[:2]
+            y_echoes = y.reshape([batch_size * n_echoes, *y.shape[2:]])
+            sensitivity_maps_echoes = sensitivity_maps.repeat_interleave(n_echoes, dim=0)
+            sampling_mask_echoes = sampling_mask[:, 0, ...]
+            while sampling_mask_echoes.dim() < y_echoes.dim():
+                sampling_mask_echoes = sampling_mask_echoes.unsqueeze(1)
+            sampling_mask_echoes = sampling_mask_echoes.repeat_interleave(n_echoes, dim=0)
+
+            reconstruction_prediction_echoes = y_echoes.clone()
+            hx = None
             sigma = 1.0
-            for echo in range(y.shape[1]):
-                reconstruction_prediction = y[:, echo, ...].clone()
-                initial_reconstruction_prediction_echo = None
-                hx = None
-                cascades_reconstruction_predictions = []
-                for i, cascade in enumerate(self.reconstruction_module):
-                    # Forward pass through the cascades
-                    reconstruction_prediction, hx = cascade(
-                        reconstruction_prediction,
-                        y[:, echo, ...],
-                        sensitivity_maps,
-                        sampling_mask[:, 0, ...],
-                        initial_reconstruction_prediction_echo if i == 0 else reconstruction_prediction,
-                        hx,
-                        sigma,
-                        keep_prediction=False if i == 0 else self.reconstruction_module_keep_prediction,
-                    )
-                    cascades_reconstruction_predictions.append(
-                        [torch.view_as_complex(x) for x in reconstruction_prediction]
-                    )
-                    reconstruction_prediction = reconstruction_prediction[-1]
-                cascades_echoes_reconstruction_predictions.append(cascades_reconstruction_predictions)
-
-            # cascades_echoes_reconstruction_predictions is of length n_echoes, len(self.reconstruction_module),
-            # self.reconstruction_module_time_steps. We want to concatenate the echoes for each cascade and time step.
             reconstruction_prediction = []
-            for cascade in range(len(cascades_echoes_reconstruction_predictions[0])):
-                reconstruction_prediction_cascade = []
-                for time_step in range(len(cascades_echoes_reconstruction_predictions[0][cascade])):
-                    reconstruction_prediction_time_step = []
-                    for echo in range(  # pylint: disable=consider-using-enumerate
-                        len(cascades_echoes_reconstruction_predictions)
-                    ):
-                        reconstruction_prediction_time_step.append(
-                            cascades_echoes_reconstruction_predictions[echo][cascade][time_step]
-                        )
-                    reconstruction_prediction_time_step = torch.stack(reconstruction_prediction_time_step, dim=1)
-                    if reconstruction_prediction_time_step.shape[-1] != 2:  # type: ignore
-                        reconstruction_prediction_time_step = torch.view_as_real(reconstruction_prediction_time_step)
-                    reconstruction_prediction_cascade.append(reconstruction_prediction_time_step)
-                reconstruction_prediction.append(reconstruction_prediction_cascade)
+            for i, cascade in enumerate(self.reconstruction_module):
+                # Forward pass through the cascades
+                reconstruction_prediction_echoes, hx = cascade(
+                    reconstruction_prediction_echoes,
+                    y_echoes,
+                    sensitivity_maps_echoes,
+                    sampling_mask_echoes,
+                    None if i == 0 else reconstruction_prediction_echoes,
+                    hx,
+                    sigma,
+                    keep_prediction=False if i == 0 else self.reconstruction_module_keep_prediction,
+                )
+                # unfold the echoes of every time step, to [batch_size, n_echoes, n_x, n_y, 2]
+                reconstruction_prediction.append(
+                    [x.reshape([batch_size, n_echoes, *x.shape[1:]]) for x in reconstruction_prediction_echoes]
+                )
+                reconstruction_prediction_echoes = reconstruction_prediction_echoes[-1]
 
             final_reconstruction_prediction = reconstruction_prediction[-1][-1]
             if not self.reconstruction_module_accumulate_predictions:
@@ -249,28 +236,20 @@ class qCIRIM(BaseqMRIReconstructionModel):
                 self.spatial_dims,
             )
 
-            R2star_maps_init = []
-            S0_maps_init = []
-            B0_maps_init = []
-            phi_maps_init = []
-            for batch_idx in range(final_reconstruction_prediction.shape[0]):
-                R2star_map_init, S0_map_init, B0_map_init, phi_map_init = R2star_B0_S0_phi_mapping(
-                    final_reconstruction_prediction[batch_idx],
-                    TEs,
-                    anatomy_mask,
-                    scaling_factor=self.quantitative_maps_scaling_factor,
-                    fft_centered=self.fft_centered,
-                    fft_normalization=self.fft_normalization,
-                    spatial_dims=self.spatial_dims,
-                )
-                R2star_maps_init.append(R2star_map_init.squeeze(0))
-                S0_maps_init.append(S0_map_init.squeeze(0))
-                B0_maps_init.append(B0_map_init.squeeze(0))
-                phi_maps_init.append(phi_map_init.squeeze(0))
-            R2star_map_init = torch.stack(R2star_maps_init, dim=0).to(y)
-            S0_map_init = torch.stack(S0_maps_init, dim=0).to(y)
-            B0_map_init = torch.stack(B0_maps_init, dim=0).to(y)
-            phi_map_init = torch.stack(phi_maps_init, dim=0).to(y)
+            # map all the examples of the batch at once
+            R2star_map_init, S0_map_init, B0_map_init, phi_map_init = R2star_B0_S0_phi_mapping(
+                final_reconstruction_prediction,
+                TEs,
+                anatomy_mask,
+                scaling_factor=self.quantitative_maps_scaling_factor,
+                fft_centered=self.fft_centered,
+                fft_normalization=self.fft_normalization,
+                spatial_dims=self.spatial_dims,
+            )
+            R2star_map_init = R2star_map_init.to(y)
+            S0_map_init = S0_map_init.to(y)
+            B0_map_init = B0_map_init.to(y)
+            phi_map_init = phi_map_init.to(y)
         else:
             reconstruction_prediction = initial_prediction.clone()
 
@@ -188,8 +188,6 @@ class qRIMBlock(torch.nn.Module):
             quantitative maps of shape [batch_size, n_echoes, n_coils, n_x, n_y] and the hidden state is a list
             of the hidden states of the recurrent layers.
         """
-        batch_size = masked_kspace.shape[0]
-
         if hx is None:
             hx = [
                 prediction.new_zeros((prediction.size(0), f, *prediction.size()[2:])).to(masked_kspace)
@@ -199,24 +197,22 @@ class qRIMBlock(torch.nn.Module):
 
         predictions = []
         for _ in range(self.time_steps):
-            grad_prediction = torch.zeros_like(prediction)
-            for idx in range(batch_size):
-                grad_prediction[idx] = (
-                    analytical_log_likelihood_gradient(
-                        self.linear_forward_model,
-                        prediction[idx],
-                        TEs,
-                        sensitivity_maps[idx],
-                        masked_kspace[idx],
-                        sampling_mask[idx],
-                        fft_centered=self.fft_centered,
-                        fft_normalization=self.fft_normalization,
-                        spatial_dims=self.spatial_dims,
-                        coil_dim=self.coil_dim,
-                        coil_combination_method=self.coil_combination_method,
-                    ).contiguous()
-                    / 100
-                )
+            grad_prediction = (
+                analytical_log_likelihood_gradient(
+                    self.linear_forward_model,
+                    prediction,
+                    TEs,
+                    sensitivity_maps,
+                    masked_kspace,
+                    sampling_mask,
+                    fft_centered=self.fft_centered,
+                    fft_normalization=self.fft_normalization,
+                    spatial_dims=self.spatial_dims,
+                    coil_dim=self.coil_dim,
+                    coil_combination_method=self.coil_combination_method,
+                ).contiguous()
+                / 100
+            )
             grad_prediction = torch.cat([grad_prediction, prediction], dim=self.coil_dim - 1).to(masked_kspace)
             for h, convrnn in enumerate(self.layers):
                 hx[h] = convrnn(grad_prediction, hx[h])
@@ -60,15 +60,16 @@ def analytical_log_likelihood_gradient(
     linear_forward_model: SignalForwardModel
         Signal forward model to use.
     prediction : torch.Tensor
-        Current prediction of the quantitative maps.
+        Current prediction of the quantitative maps of shape [batch_size, 4, n_x, n_y].
     TEs : List
         List of echo times.
     sensitivity_maps : torch.Tensor
         Coil sensitivity maps of shape [batch_size, n_coils, n_x, n_y, 2].
     masked_kspace : torch.Tensor
-        Data of shape [batch_size, n_echoes, n_coils, n_x, n_y, 2].
+        Data of shape [batch_size, n_echoes, n_coils, n_x, n_y, 2], or [batch_size, n_coils, n_x, n_y, 2] to use the
+        same data for all echoes.
     sampling_mask : torch.Tensor
-        Mask of the sampling of shape [batch_size, 1, n_x, n_y, 1].
+        Mask of the sampling of shape [batch_size, 1, n_x, n_y, 1], or [batch_size, n_echoes, 1, n_x, n_y, 1].
     fft_centered : bool
         If True, the FFT is centered.
     fft_normalization : str
@@ -85,83 +86,43 @@ def analytical_log_likelihood_gradient(
     Returns
     -------
     torch.Tensor
-        Analytical gradient of the log-likelihood function.
+        Analytical gradient of the log-likelihood function of shape [batch_size, 4, n_x, n_y].
     """
-    nr_TEs = len(TEs)
-
-    R2star_map, S0_map, B0_map, phi_map = prediction[0], prediction[1], prediction[2], prediction[3]
-
-    R2star_map = R2star_map.unsqueeze(0)
-    S0_map = S0_map.unsqueeze(0)
-    B0_map = B0_map.unsqueeze(0)
-    phi_map = phi_map.unsqueeze(0)
+    R2star_map, S0_map, B0_map, phi_map = prediction[:, 0], prediction[:, 1], prediction[:, 2], prediction[:, 3]
 
     pred = linear_forward_model(R2star_map, S0_map, B0_map, phi_map, TEs)
 
-    S0_map_real = S0_map
-    S0_map_imag = phi_map
+    # the echoes share the sensitivity maps and, when they have no echo dimension, the data and the sampling mask
+    sensitivity_maps = sensitivity_maps.unsqueeze(coil_dim - 1)
 
     pred_kspace = fft.fft2(
-        expand_op(pred.unsqueeze(coil_dim), sensitivity_maps.unsqueeze(0).unsqueeze(coil_dim - 1)),
+        expand_op(pred.unsqueeze(coil_dim), sensitivity_maps),
         fft_centered,
         fft_normalization,
         spatial_dims,
     )
 
+    if masked_kspace.dim() < pred_kspace.dim():
+        masked_kspace = masked_kspace.unsqueeze(1)
+    while sampling_mask.dim() < pred_kspace.dim():
+        sampling_mask = sampling_mask.unsqueeze(1)
+
     diff_data = (pred_kspace - masked_kspace) * sampling_mask
     diff_data_inverse = utils.coil_combination_method(
         fft.ifft2(diff_data, fft_centered, fft_normalization, spatial_dims),
-        sensitivity_maps.unsqueeze(0).unsqueeze(coil_dim - 1),
+        sensitivity_maps,
         method=coil_combination_method,
         dim=coil_dim,
     )
 
-    def first_term(i):
-        """First term of the gradient."""
-        return torch.exp(-TEs[i] * scaling * R2star_map)
-
-    def second_term(i):
-        """Second term of the gradient."""
-        return torch.cos(B0_map * scaling * -TEs[i])
-
-    def third_term(i):
-        """Third term of the gradient."""
-        return torch.sin(B0_map * scaling * -TEs[i])
-
-    S0_part_der = torch.stack(
-        [torch.stack((first_term(i) * second_term(i), -first_term(i) * third_term(i)), -1) for i in range(nr_TEs)], 1
-    )
-
-    R2str_part_der = torch.stack(
-        [
-            torch.stack(
-                (
-                    -TEs[i] * scaling * first_term(i) * (S0_map_real * second_term(i) - S0_map_imag * third_term(i)),
-                    -TEs[i] * scaling * first_term(i) * (-S0_map_real * third_term(i) - S0_map_imag * second_term(i)),
-                ),
-                -1,
-            )
-            for i in range(nr_TEs)
-        ],
-        1,
-    )
-
-    S0_map_real_grad = (
-        diff_data_inverse[..., 0] * S0_part_der[..., 0] - diff_data_inverse[..., 1] * S0_part_der[..., 1]
-    )
-    S0_map_imag_grad = (
-        diff_data_inverse[..., 0] * S0_part_der[..., 1] + diff_data_inverse[..., 1] * S0_part_der[..., 0]
-    )
-    R2star_map_real_grad = (
-        diff_data_inverse[..., 0] * R2str_part_der[..., 0] - diff_data_inverse[..., 1] * R2str_part_der[..., 1]
-    )
-    R2star_map_imag_grad = (
-        diff_data_inverse[..., 0] * R2str_part_der[..., 1] + diff_data_inverse[..., 1] * R2str_part_der[..., 0]
+    # the derivatives of the MEGRE signal, whose conjugates weigh the coil-combined residuals of every echo
+    R2star_map_der, S0_map_der = linear_forward_model.MEGREJacobian(
+        R2star_map, S0_map, B0_map, phi_map, TEs, scaling=scaling
     )
+    diff_data_inverse = torch.view_as_complex(diff_data_inverse.contiguous())
 
-    S0_map_grad = torch.stack([S0_map_real_grad, S0_map_imag_grad], -1).squeeze()
-    S0_map_grad = torch.mean(S0_map_grad, 0)
-    R2star_map_grad = torch.stack([R2star_map_real_grad, R2star_map_imag_grad], -1).squeeze()
-    R2star_map_grad = torch.mean(R2star_map_grad, 0)
+    # average over the echoes
+    R2star_map_grad = torch.mean(diff_data_inverse * torch.conj(R2star_map_der), 1)
+    S0_map_grad = torch.mean(diff_data_inverse * torch.conj(S0_map_der), 1)
 
-    return torch.stack([R2star_map_grad[..., 0], S0_map_grad[..., 0], R2star_map_grad[..., 1], S0_map_grad[..., 1]], 0)
+    return torch.stack([R2star_map_grad.real, S0_map_grad.real, R2star_map_grad.imag, S0_map_grad.imag], 1)
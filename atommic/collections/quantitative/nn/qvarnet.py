@@ -190,27 +190,19 @@ class qVarNet(BaseqMRIReconstructionModel):
                 self.spatial_dims,
             )
 
-            R2star_maps_init = []
-            S0_maps_init = []
-            B0_maps_init = []
-            phi_maps_init = []
-            for batch_idx in range(reconstruction_prediction.shape[0]):
-                R2star_map_init, S0_map_init, B0_map_init, phi_map_init = R2star_B0_S0_phi_mapping(
-                    reconstruction_prediction[batch_idx],
-                    TEs,
-                    anatomy_mask,
-                    fft_centered=self.fft_centered,
-                    fft_normalization=self.fft_normalization,
-                    spatial_dims=self.spatial_dims,
-                )
-                R2star_maps_init.append(R2star_map_init.squeeze(0))
-                S0_maps_init.append(S0_map_init.squeeze(0))
-                B0_maps_init.append(B0_map_init.squeeze(0))
-                phi_maps_init.append(phi_map_init.squeeze(0))
-            R2star_map_init = torch.stack(R2star_maps_init, dim=0).to(y)
-            S0_map_init = torch.stack(S0_maps_init, dim=0).to(y)
-            B0_map_init = torch.stack(B0_maps_init, dim=0).to(y)
-            phi_map_init = torch.stack(phi_maps_init, dim=0).to(y)
+            # map all the examples of the batch at once
+            R2star_map_init, S0_map_init, B0_map_init, phi_map_init = R2star_B0_S0_phi_mapping(
+                reconstruction_prediction,
+                TEs,
+                anatomy_mask,
+                fft_centered=self.fft_centered,
+                fft_normalization=self.fft_normalization,
+                spatial_dims=self.spatial_dims,
+            )
+            R2star_map_init = R2star_map_init.to(y)
+            S0_map_init = S0_map_init.to(y)
+            B0_map_init = B0_map_init.to(y)
+            phi_map_init = phi_map_init.to(y)
         else:
             reconstruction_prediction = initial_prediction.clone()
 
@@ -24,7 +24,7 @@ from atommic.collections.common.parts.transforms import (
 )
 from atommic.collections.common.parts.utils import add_coil_dim_if_singlecoil
 from atommic.collections.common.parts.utils import coil_combination_method as coil_combination_method_func
-from atommic.collections.common.parts.utils import is_none, sense, to_tensor
+from atommic.collections.common.parts.utils import is_none, magnitude_statistics, sense, to_tensor
 from atommic.collections.motioncorrection.parts.motionsimulation import MotionSimulation
 
 __all__ = ["qMRIDataTransforms"]
@@ -422,7 +422,6 @@ class qMRIDataTransforms:
             else None
         )
 
-        self.prewhitening = Composer([self.prewhitening])  # type: ignore
         self.coils_shape_transforms = Composer(
             [
                 self.gcc,  # type: ignore
@@ -649,11 +648,21 @@ class qMRIDataTransforms:
         kspace = to_tensor(kspace)
         kspace = add_coil_dim_if_singlecoil(kspace, dim=self.coil_dim)
 
+        reference = attrs.pop("noise_prewhitening_reference", None)
+        if reference is not None:
+            reference = add_coil_dim_if_singlecoil(to_tensor(reference), dim=self.coil_dim)
+
         kspace_echoes = []
         for ke in range(kspace.shape[0]):
             kspace_echo = kspace[ke]
             kspace_echo = self.coils_shape_transforms(kspace_echo, apply_backward_transform=True)
-            kspace_echo = self.prewhitening(kspace_echo)  # type: ignore
+            if self.prewhitening is not None:
+                reference_echo = (
+                    self.coils_shape_transforms(reference[ke], apply_backward_transform=True)
+                    if reference is not None
+                    else None
+                )
+                kspace_echo = self.prewhitening(kspace_echo, volume=(fname, ke), reference=reference_echo)
             kspace_echoes.append(kspace_echo)
         kspace = torch.stack(kspace_echoes, dim=0)
 
@@ -694,13 +703,7 @@ class qMRIDataTransforms:
                     is_complex = _kspace.shape[-1] == 2
                     if is_complex:
                         _kspace = torch.view_as_complex(_kspace)
-                    _pre_normalization_vars = {
-                        "min": torch.min(torch.abs(_kspace)),
-                        "max": torch.max(torch.abs(_kspace)),
-                        "mean": torch.mean(torch.abs(_kspace)),
-                        "std": torch.std(torch.abs(_kspace)),
-                        "var": torch.var(torch.abs(_kspace)),
-                    }
+                    _pre_normalization_vars = magnitude_statistics(_kspace)
                     if is_complex:
                         _kspace = torch.view_as_real(_kspace)
                 kspaces.append(_kspace)
@@ -715,13 +718,7 @@ class qMRIDataTransforms:
                 is_complex = kspace.shape[-1] == 2
                 if is_complex:
                     kspace = torch.view_as_complex(kspace)
-                pre_normalization_vars = {  # type: ignore
-                    "min": torch.min(torch.abs(kspace)),
-                    "max": torch.max(torch.abs(kspace)),
-                    "mean": torch.mean(torch.abs(kspace)),
-                    "std": torch.std(torch.abs(kspace)),
-                    "var": torch.var(torch.abs(kspace)),
-                }
+                pre_normalization_vars = magnitude_statistics(kspace)  # type: ignore
                 if is_complex:
                     kspace = torch.view_as_real(kspace)
 
@@ -738,13 +735,7 @@ class qMRIDataTransforms:
                     is_complex = _masked_kspace.shape[-1] == 2
                     if is_complex:
                         _masked_kspace = torch.view_as_complex(_masked_kspace)
-                    _masked_pre_normalization_vars = {
-                        "min": torch.min(torch.abs(_masked_kspace)),
-                        "max": torch.max(torch.abs(_masked_kspace)),
-                        "mean": torch.mean(torch.abs(_masked_kspace)),
-                        "std": torch.std(torch.abs(_masked_kspace)),
-                        "var": torch.var(torch.abs(_masked_kspace)),
-                    }
+                    _masked_pre_normalization_vars = magnitude_statistics(_masked_kspace)
                     if is_complex:
                         _masked_kspace = torch.view_as_real(_masked_kspace)
                 masked_kspaces.append(_masked_kspace)
@@ -759,13 +750,7 @@ class qMRIDataTransforms:
                 is_complex = masked_kspace.shape[-1] == 2
                 if is_complex:
                     masked_kspace = torch.view_as_complex(masked_kspace)
-                masked_pre_normalization_vars = {
-                    "min": torch.min(torch.abs(masked_kspace)),
-                    "max": torch.max(torch.abs(masked_kspace)),
-                    "mean": torch.mean(torch.abs(masked_kspace)),
-                    "std": torch.std(torch.abs(masked_kspace)),
-                    "var": torch.var(torch.abs(masked_kspace)),
-                }
+                masked_pre_normalization_vars = magnitude_statistics(masked_kspace)
                 if is_complex:
                     masked_kspace = torch.view_as_real(masked_kspace)
 
@@ -1033,13 +1018,7 @@ class qMRIDataTransforms:
             is_complex = sensitivity_map.shape[-1] == 2
             if is_complex:
                 sensitivity_map = torch.view_as_complex(sensitivity_map)
-            pre_normalization_vars = {
-                "min": torch.min(torch.abs(sensitivity_map)),
-                "max": torch.max(torch.abs(sensitivity_map)),
-                "mean": torch.mean(torch.abs(sensitivity_map)),
-                "std": torch.std(torch.abs(sensitivity_map)),
-                "var": torch.var(torch.abs(sensitivity_map)),
-            }
+            pre_normalization_vars = magnitude_statistics(sensitivity_map)
             if is_complex:
                 sensitivity_map = torch.view_as_real(sensitivity_map)
         return sensitivity_map, pre_normalization_vars
@@ -1113,45 +1092,13 @@ class qMRIDataTransforms:
                 )
 
                 R2star_maps.append(R2star_map)
-                R2star_map_pre_normalization_vars.append(
-                    {
-                        "min": torch.min(torch.abs(R2star_map)),
-                        "max": torch.max(torch.abs(R2star_map)),
-                        "mean": torch.mean(torch.abs(R2star_map)),
-                        "std": torch.std(torch.abs(R2star_map)),
-                        "var": torch.var(torch.abs(R2star_map)),
-                    }
-                )
+                R2star_map_pre_normalization_vars.append(magnitude_statistics(R2star_map))
                 S0_maps.append(S0_map)
-                S0_map_pre_normalization_vars.append(
-                    {
-                        "min": torch.min(torch.abs(S0_map)),
-                        "max": torch.max(torch.abs(S0_map)),
-                        "mean": torch.mean(torch.abs(S0_map)),
-                        "std": torch.std(torch.abs(S0_map)),
-                        "var": torch.var(torch.abs(S0_map)),
-                    }
-                )
+                S0_map_pre_normalization_vars.append(magnitude_statistics(S0_map))
                 B0_maps.append(B0_map)
-                B0_map_pre_normalization_vars.append(
-                    {
-                        "min": torch.min(torch.abs(B0_map)),
-                        "max": torch.max(torch.abs(B0_map)),
-                        "mean": torch.mean(torch.abs(B0_map)),
-                        "std": torch.std(torch.abs(B0_map)),
-                        "var": torch.var(torch.abs(B0_map)),
-                    }
-                )
+                B0_map_pre_normalization_vars.append(magnitude_statistics(B0_map))
                 phi_maps.append(phi_map)
-                phi_map_pre_normalization_vars.append(
-                    {
-                        "min": torch.min(torch.abs(phi_map)),
-                        "max": torch.max(torch.abs(phi_map)),
-                        "mean": torch.mean(torch.abs(phi_map)),
-                        "std": torch.std(torch.abs(phi_map)),
-                        "var": torch.var(torch.abs(phi_map)),
-                    }
-                )
+                phi_map_pre_normalization_vars.append(magnitude_statistics(phi_map))
 
             R2star_map = R2star_maps
             S0_map = S0_maps
@@ -1180,34 +1127,10 @@ class qMRIDataTransforms:
                 spatial_dims=self.spatial_dims,
             )
 
-            R2star_map_pre_normalization_vars = {  # type: ignore
-                "min": torch.min(torch.abs(R2star_map)),
-                "max": torch.max(torch.abs(R2star_map)),
-                "mean": torch.mean(torch.abs(R2star_map)),
-                "std": torch.std(torch.abs(R2star_map)),
-                "var": torch.var(torch.abs(R2star_map)),
-            }
-            S0_map_pre_normalization_vars = {  # type: ignore
-                "min": torch.min(torch.abs(S0_map)),
-                "max": torch.max(torch.abs(S0_map)),
-                "mean": torch.mean(torch.abs(S0_map)),
-                "std": torch.std(torch.abs(S0_map)),
-                "var": torch.var(torch.abs(S0_map)),
-            }
-            B0_map_pre_normalization_vars = {  # type: ignore
-                "min": torch.min(torch.abs(B0_map)),
-                "max": torch.max(torch.abs(B0_map)),
-                "mean": torch.mean(torch.abs(B0_map)),
-                "std": torch.std(torch.abs(B0_map)),
-                "var": torch.var(torch.abs(B0_map)),
-            }
-            phi_map_pre_normalization_vars = {  # type: ignore
-                "min": torch.min(torch.abs(phi_map)),
-                "max": torch.max(torch.abs(phi_map)),
-                "mean": torch.mean(torch.abs(phi_map)),
-                "std": torch.std(torch.abs(phi_map)),
-                "var": torch.var(torch.abs(phi_map)),
-            }
+            R2star_map_pre_normalization_vars = magnitude_statistics(R2star_map)  # type: ignore
+            S0_map_pre_normalization_vars = magnitude_statistics(S0_map)  # type: ignore
+            B0_map_pre_normalization_vars = magnitude_statistics(B0_map)  # type: ignore
+            phi_map_pre_normalization_vars = magnitude_statistics(phi_map)  # type: ignore
 
         return (
             R2star_map,
@@ -1258,13 +1181,7 @@ class qMRIDataTransforms:
                     else:
                         if pred.shape[-1] == 2:
                             pred = torch.view_as_complex(pred)
-                        _pre_normalization_vars = {
-                            "min": torch.min(torch.abs(pred)),
-                            "max": torch.max(torch.abs(pred)),
-                            "mean": torch.mean(torch.abs(pred)),
-                            "std": torch.std(torch.abs(pred)),
-                            "var": torch.var(torch.abs(pred)),
-                        }
+                        _pre_normalization_vars = magnitude_statistics(pred)
                     prediction.append(pred)
                     pre_normalization_vars.append(_pre_normalization_vars)
                 if prediction[0].shape[-1] != 2 and torch.is_complex(prediction[0]):
@@ -1284,13 +1201,7 @@ class qMRIDataTransforms:
                 else:
                     if prediction.shape[-1] == 2:
                         prediction = torch.view_as_complex(prediction)
-                    pre_normalization_vars = {  # type: ignore
-                        "min": torch.min(torch.abs(prediction)),
-                        "max": torch.max(torch.abs(prediction)),
-                        "mean": torch.mean(torch.abs(prediction)),
-                        "std": torch.std(torch.abs(prediction)),
-                        "var": torch.var(torch.abs(prediction)),
-                    }
+                    pre_normalization_vars = magnitude_statistics(prediction)  # type: ignore
                 if prediction.shape[-1] != 2 and torch.is_complex(prediction):
                     prediction = torch.view_as_real(prediction)
         else:
@@ -1304,13 +1215,7 @@ class qMRIDataTransforms:
             else:
                 if prediction.shape[-1] == 2:  # type: ignore
                     prediction = torch.view_as_complex(prediction)
-                pre_normalization_vars = {  # type: ignore
-                    "min": torch.min(torch.abs(prediction)),
-                    "max": torch.max(torch.abs(prediction)),
-                    "mean": torch.mean(torch.abs(prediction)),
-                    "std": torch.std(torch.abs(prediction)),
-                    "var": torch.var(torch.abs(prediction)),
-                }
+                pre_normalization_vars = magnitude_statistics(prediction)  # type: ignore
             if prediction.shape[-1] != 2 and torch.is_complex(prediction):
                 prediction = torch.view_as_real(prediction)
 
@@ -1709,6 +1614,7 @@ class GaussianSmoothing(torch.nn.Module):
                         self.fft_normalization,
                         self.spatial_dims,
                     ),
+                    dim=tuple(range(1, data.dim())),
                 ),
                 self.fft_centered,
                 self.fft_normalization,
@@ -1727,6 +1633,7 @@ class GaussianSmoothing(torch.nn.Module):
                         self.fft_normalization,
                         self.spatial_dims,
                     ),
+                    dim=tuple(range(1, x.dim())),
                 ),
                 self.fft_centered,
                 self.fft_normalization,
@@ -1765,6 +1672,49 @@ class LeastSquaresFitting:
         q, r = torch.qr(A)
         return torch.inverse(r) @ q.permute(0, 2, 1) @ Y + reg_factor
 
+    @staticmethod
+    def weighted_linear_fit(
+        x: torch.Tensor, y: torch.Tensor, weights: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Closed-form weighted linear least squares fit of ``y = slope * x + intercept``, for many signals at once.
+
+        The fit minimizes ``sum((weights * (y - slope * x - intercept)) ** 2)`` along the first dimension, which is
+        the same as ``np.polyfit(x, y, 1, w=weights)``. It is computed in double precision on the device of ``y``.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            Sample points of shape [n].
+        y : torch.Tensor
+            Signals of shape [n, ...].
+        weights : torch.Tensor
+            Weights of the residuals, of shape [n, ...].
+
+        Returns
+        -------
+        Tuple[torch.Tensor, torch.Tensor]
+            The slope and the intercept, of shape [...].
+
+        Examples
+        --------
+        >>> import torch
+        >>> x = torch.tensor([1.0, 2.0, 3.0])
+        >>> y = torch.tensor([[3.0, 1.0], [5.0, 1.0], [7.0, 1.0]])
+        >>> LeastSquaresFitting.weighted_linear_fit(x, y, torch.ones_like(y))
+        (tensor([2., 0.]), tensor([1., 1.]))
+        """
+        dtype = y.dtype
+        x = x.to(device=y.device, dtype=torch.float64).view(-1, *[1] * (y.dim() - 1))
+        y = y.to(torch.float64)
+        weights = weights.to(torch.float64) ** 2
+        total_weight = weights.sum(0)
+        x_mean = (weights * x).sum(0) / total_weight
+        y_mean = (weights * y).sum(0) / total_weight
+        x_centered = x - x_mean
+        slope = (weights * x_centered * (y - y_mean)).sum(0) / (weights * x_centered**2).sum(0)
+        intercept = y_mean - slope * x_mean
+        return slope.to(dtype), intercept.to(dtype)
+
     @staticmethod
     def lsqrt_pinv(
         A: torch.Tensor, Y: torch.Tensor, reg_factor: float = 0.0  # pylint: disable=unused-argument
@@ -1809,11 +1759,12 @@ def R2star_B0_S0_phi_mapping(
     Parameters
     ----------
     prediction : torch.Tensor
-        The prediction of the model.
+        The prediction of the model, of shape [n_echoes, n_x, n_y, 2], or [batch_size, n_echoes, n_x, n_y, 2] to map
+        all the examples of a batch at once.
     TEs : Union[Optional[List[float]], float]
         The TEs of the images.
     anatomy_mask : torch.Tensor
-        The anatomy mask of the images.
+        The anatomy mask of the images, of n_x * n_y elements, or batch_size * n_x * n_y elements for a batch.
     scaling_factor : float
         The scaling factor to apply to the prediction.
     fft_centered : bool
@@ -1864,7 +1815,7 @@ def R2star_mapping(prediction: torch.Tensor, TEs: Union[Optional[List[float]], f
     Parameters
     ----------
     prediction : torch.Tensor
-        The prediction of the model.
+        The prediction of the model, of shape [n_echoes, n_x, n_y, 2] or [batch_size, n_echoes, n_x, n_y, 2].
     TEs : Union[Optional[List[float]], float]
         The TEs of the images.
     scaling_factor : float
@@ -1873,28 +1824,29 @@ def R2star_mapping(prediction: torch.Tensor, TEs: Union[Optional[List[float]], f
     Returns
     -------
     R2star : torch.Tensor
-        The R2* map.
-    S0 : torch.Tensor
-        The S0 map.
+        The R2* map, of shape [n_x, n_y] or [batch_size, n_x, n_y].
     """
-    prediction = torch.view_as_complex(prediction)
-    prediction = torch.abs(prediction / torch.max(torch.abs(prediction))) + 1e-8
+    batched = prediction.dim() == 5
+    if not batched:
+        prediction = prediction.unsqueeze(0)
+
+    prediction = torch.abs(torch.view_as_complex(prediction))
+    # every example is normalized by its own maximum
+    prediction = prediction / torch.amax(prediction, dim=(1, 2, 3), keepdim=True) + 1e-8
 
-    prediction_flatten = torch.flatten(prediction, start_dim=1, end_dim=-1).detach().cpu()
-    log_prediction_flatten = torch.log(prediction_flatten)
-    sqrt_prediction_flatten = torch.sqrt(prediction_flatten)
+    # [batch_size, n_echoes, n_x, n_y] -> [n_echoes, batch_size * n_x * n_y]
+    prediction_flatten = prediction.transpose(0, 1).reshape(prediction.shape[1], -1).detach()
 
     TEs = torch.tensor(TEs).to(prediction_flatten)
     TEs = TEs * scaling_factor  # type: ignore
 
-    R2star_map = torch.zeros([prediction_flatten.shape[1]])
-    for i in range(prediction_flatten.shape[1]):
-        R2star_map[i], _ = torch.from_numpy(
-            np.polyfit(TEs, log_prediction_flatten[:, i], 1, w=sqrt_prediction_flatten[:, i])
-        ).to(prediction)
+    # weighted fit of log(S) = -R2* TE + log(S0) for all pixels at once, weighted by sqrt(S) as np.polyfit(w=sqrt(S))
+    R2star_map, _ = LeastSquaresFitting.weighted_linear_fit(
+        TEs, torch.log(prediction_flatten), torch.sqrt(prediction_flatten)  # type: ignore
+    )
 
-    R2star_map = torch.reshape(-R2star_map, prediction.shape[1:4])
-    return R2star_map
+    R2star_map = torch.reshape(-R2star_map, [prediction.shape[0], *prediction.shape[2:4]])
+    return R2star_map if batched else R2star_map[0]
 
 
 def B0_phi_mapping(
@@ -1911,11 +1863,12 @@ def B0_phi_mapping(
     Parameters
     ----------
     prediction : torch.Tensor
-        The prediction of the model.
+        The prediction of the model, of shape [n_echoes, n_x, n_y, 2] or [batch_size, n_echoes, n_x, n_y, 2]. It is
+        smoothed in-place.
     TEs : Union[Optional[List[float]], float]
         The TEs of the images.
     anatomy_mask : torch.Tensor
-        The anatomy mask of the images.
+        The anatomy mask of the images, of n_x * n_y elements, or batch_size * n_x * n_y elements for a batch.
     scaling_factor : float
         The scaling factor.
     fft_centered : bool
@@ -1928,18 +1881,24 @@ def B0_phi_mapping(
     Returns
     -------
     B0 : torch.Tensor
-        The B0 map.
+        The B0 map, of shape [n_x, n_y] or [batch_size, n_x, n_y].
     phi : torch.Tensor
-        The phi map.
+        The phi map, of shape [n_x, n_y] or [batch_size, n_x, n_y].
     """
+    batched = prediction.dim() == 5
+    if not batched:
+        prediction = prediction.unsqueeze(0)
+
     lsq = LeastSquaresFitting(device=prediction.device)
 
     TEnotused = 3  # if fully_sampled else 3
     TEs = torch.tensor(TEs)
 
+    batch_size, n_echoes, n_x, n_y = prediction.shape[:4]
+
     # brain_mask is used only for descale of phase difference (so that phase_diff is in between -2pi and 2pi)
+    anatomy_mask = anatomy_mask.reshape(-1, n_x, n_y).expand(batch_size, n_x, n_y)
     anatomy_mask_descale = anatomy_mask
-    shape = prediction.shape
 
     # apply gaussian blur with radius r to
     smoothing = GaussianSmoothing(
@@ -1951,13 +1910,15 @@ def B0_phi_mapping(
         fft_normalization=fft_normalization,
         spatial_dims=spatial_dims,
     )
-    prediction = prediction.unsqueeze(1).permute([0, 1, 4, 2, 3])  # add a dummy batch dimension
-    for i in range(prediction.shape[0]):
-        prediction[i] = smoothing(F.pad(prediction[i], (4, 4, 4, 4), mode="reflect"))
-    prediction = prediction.permute([0, 1, 3, 4, 2]).squeeze(1)
+    # smooth all echoes of all examples at once and write them back to the input, which S0_mapping then uses
+    prediction.copy_(
+        smoothing(F.pad(prediction.reshape(-1, n_x, n_y, 2).permute(0, 3, 1, 2), (4, 4, 4, 4), mode="reflect"))
+        .permute(0, 2, 3, 1)
+        .reshape(prediction.shape)
+    )
 
     prediction = ifft2(
-        torch.fft.fftshift(fft2(prediction, fft_centered, fft_normalization, spatial_dims), dim=(1, 2)),
+        torch.fft.fftshift(fft2(prediction, fft_centered, fft_normalization, spatial_dims), dim=(-3, -2)),
         fft_centered,
         fft_normalization,
         spatial_dims,
@@ -1971,47 +1932,46 @@ def B0_phi_mapping(
     body_part_mask = anatomy_mask.clone()
     body_part_mask_np = np.invert(body_part_mask.cpu().detach().numpy() > 0.5)
 
-    # loop over echo times
-    for i in range(phase.shape[0]):
-        phase_unwrapped[i] = torch.from_numpy(
-            unwrap_phase(np.ma.array(phase[i].detach().cpu().numpy(), mask=body_part_mask_np)).data
-        ).to(prediction)
-
-    phase_diff_set = []
-    TE_diff = []
-
-    # obtain phase differences and TE differences
-    for i in range(phase_unwrapped.shape[0] - TEnotused):
-        phase_diff_set.append(torch.flatten(phase_unwrapped[i + 1] - phase_unwrapped[i]))
-        phase_diff_set[i] = (
-            phase_diff_set[i]
-            - torch.round(
-                torch.abs(
-                    torch.sum(phase_diff_set[i] * torch.flatten(anatomy_mask_descale))
-                    / torch.sum(anatomy_mask_descale)
-                    / 2
-                    / np.pi
-                )
+    # loop over examples and echo times, since the phase unwrapping runs on the cpu one image at a time
+    phase_np = phase.detach().cpu().numpy()
+    for b in range(batch_size):
+        for i in range(n_echoes):
+            phase_unwrapped[b, i] = torch.from_numpy(
+                unwrap_phase(np.ma.array(phase_np[b, i], mask=body_part_mask_np[b])).data
+            ).to(prediction)
+
+    # obtain phase differences and TE differences of all examples at once
+    n_diffs = n_echoes - TEnotused
+    phase_diff_set = torch.flatten(phase_unwrapped[:, 1 : n_diffs + 1] - phase_unwrapped[:, :n_diffs], start_dim=2)
+    anatomy_mask_descale = torch.flatten(anatomy_mask_descale, start_dim=1).unsqueeze(1).to(phase_diff_set)
+    phase_diff_set = (
+        phase_diff_set
+        - torch.round(
+            torch.abs(
+                torch.sum(phase_diff_set * anatomy_mask_descale, dim=-1, keepdim=True)
+                / torch.sum(anatomy_mask_descale, dim=-1, keepdim=True)
+                / 2
+                / np.pi
             )
-            * 2
-            * np.pi
         )
-        TE_diff.append(TEs[i + 1] - TEs[i])  # type: ignore
-
-    phase_diff_set = torch.stack(phase_diff_set, 0)
-    TE_diff = torch.stack(TE_diff, 0).to(prediction)
+        * 2
+        * np.pi
+    )
+    TE_diff = (TEs[1 : n_diffs + 1] - TEs[:n_diffs]).to(prediction)  # type: ignore
 
-    # least squares fitting to obtain phase map
+    # least squares fitting to obtain phase map, for all pixels of all examples at once
     B0_map_tmp = lsq.lsqrt_pinv(
-        phase_diff_set.unsqueeze(2).permute(1, 0, 2), TE_diff.unsqueeze(1) * scaling_factor  # type: ignore
+        phase_diff_set.permute(0, 2, 1).reshape(-1, n_diffs, 1),
+        TE_diff.unsqueeze(1) * scaling_factor,  # type: ignore
     )
-    B0_map = B0_map_tmp.reshape(shape[-3], shape[-2])
+    B0_map = B0_map_tmp.reshape(batch_size, n_x, n_y)
     B0_map = B0_map * torch.abs(body_part_mask)
 
     # obtain phi map
-    phi_map = (phase_unwrapped[0] - scaling_factor * TEs[0] * B0_map).squeeze(0)  # type: ignore
+    phi_map = phase_unwrapped[:, 0] - scaling_factor * TEs[0] * B0_map  # type: ignore
 
-    return B0_map.squeeze(0).to(prediction), phi_map.to(prediction)
+    B0_map, phi_map = B0_map.to(prediction), phi_map.to(prediction)
+    return (B0_map, phi_map) if batched else (B0_map[0], phi_map[0])
 
 
 def S0_mapping(
@@ -2029,13 +1989,13 @@ def S0_mapping(
     Parameters
     ----------
     prediction : torch.Tensor
-        The prediction of the model.
+        The prediction of the model, of shape [n_echoes, n_x, n_y, 2] or [batch_size, n_echoes, n_x, n_y, 2].
     TEs : Union[Optional[List[float]], float]
         The TEs of the images.
     R2star_map : torch.Tensor
-        The R2* map.
+        The R2* map, of shape [n_x, n_y] or [batch_size, n_x, n_y].
     B0_map : torch.Tensor
-        The B0 map.
+        The B0 map, of shape [n_x, n_y] or [batch_size, n_x, n_y].
     scaling_factor : float
         The scaling factor.
     fft_centered : bool
@@ -2049,11 +2009,18 @@ def S0_mapping(
     -------
     S0 : torch.Tensor
         The S0 map.
+    phi : torch.Tensor
+        The phi map.
     """
+    batched = prediction.dim() == 5
+    if not batched:
+        prediction = prediction.unsqueeze(0)
+
     lsq = LeastSquaresFitting(device=prediction.device)
 
     prediction = torch.view_as_complex(prediction)
-    prediction_flatten = prediction.reshape(prediction.shape[0], -1)
+    # [batch_size, n_echoes, n_x, n_y] -> [batch_size * n_x * n_y, n_echoes, 1]
+    prediction_flatten = prediction.flatten(start_dim=2).permute(0, 2, 1).reshape(-1, prediction.shape[1], 1)
 
     TEs = torch.tensor(TEs).to(prediction)
 
@@ -2062,19 +2029,19 @@ def S0_mapping(
 
     TEs_r2 = TEs[0:4].unsqueeze(1) * -R2star_B0_complex_map_flatten  # type: ignore
 
-    S0_map = lsq.lsqrt_pinv(
-        prediction_flatten.permute(1, 0).unsqueeze(2), torch.exp(scaling_factor * TEs_r2.permute(1, 0).unsqueeze(2))
-    )
+    S0_map = lsq.lsqrt_pinv(prediction_flatten, torch.exp(scaling_factor * TEs_r2.permute(1, 0).unsqueeze(2)))
 
-    S0_map = torch.view_as_real(S0_map.reshape(prediction.shape[1:]))
+    S0_map = torch.view_as_real(S0_map.reshape(prediction.shape[0], *prediction.shape[2:]))
 
     S0_map = ifft2(
-        torch.fft.fftshift(fft2(S0_map, fft_centered, fft_normalization, spatial_dims), dim=(0, 1)),
+        torch.fft.fftshift(fft2(S0_map, fft_centered, fft_normalization, spatial_dims), dim=(-3, -2)),
         fft_centered,
         fft_normalization,
         spatial_dims,
     )
 
-    S0_map = torch.view_as_complex(S0_map).squeeze(-1)
+    S0_map = torch.view_as_complex(S0_map)
+    if not batched:
+        S0_map = S0_map[0]
 
     return torch.abs(S0_map), torch.angle(S0_map)
@@ -14,11 +14,19 @@ from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import h5py
 import numpy as np
-import yaml  # type: ignore
 from defusedxml.ElementTree import fromstring
 from torch.utils.data import Dataset
 
+from atommic.collections.common.data.dataset_index import (
+    VolumeIndex,
+    dataset_index_path,
+    load_dataset_index,
+    load_noise_index,
+    scan_metadata,
+    subsample_examples,
+)
 from atommic.collections.common.data.mri_loader import MRIDataset, et_query
+from atommic.collections.common.data.slice_window import SliceWindowCache, read_consecutive_slices
 from atommic.collections.common.parts.utils import is_none
 
 
@@ -42,7 +50,7 @@ class ReconstructionMRIDataset(MRIDataset):
     def __getitem__(self, i: int):  # noqa: MC0001
         """Get item from :class:`ReconstructionMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             min_val = hf["min"][()] if "min" in hf else None
             max_val = hf["max"][()] if "max" in hf else None
             mean_val = hf["mean"][()] if "mean" in hf else None
@@ -62,7 +70,7 @@ class ReconstructionMRIDataset(MRIDataset):
                     coil_sensitivity_maps_root = Path(f"{self.coil_sensitivity_maps_root}/{split_dir[-j]}/")
                     if os.path.exists(coil_sensitivity_maps_root / Path(split_dir[-2]) / fname.name):
                         break
-                with h5py.File(Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name, "r") as sf:
+                with self.file_pool.open(Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name) as sf:
                     if "sensitivity_map" in sf or "sensitivity_map" in next(iter(sf.keys())):
                         sensitivity_map = (
                             self.get_consecutive_slices(sf, "sensitivity_map", dataslice)
@@ -76,12 +84,12 @@ class ReconstructionMRIDataset(MRIDataset):
                 if mask.ndim == 3:
                     mask = mask[dataslice]
             elif self.mask_root is not None and self.mask_root != "None":
-                with h5py.File(Path(self.mask_root) / fname.name, "r") as mf:
+                with self.file_pool.open(Path(self.mask_root) / fname.name) as mf:
                     mask = np.asarray(self.get_consecutive_slices(mf, "mask", dataslice))
 
             prediction = np.empty([])
             if not is_none(self.initial_predictions_root):
-                with h5py.File(Path(self.initial_predictions_root) / fname.name, "r") as ipf:  # type: ignore
+                with self.file_pool.open(Path(self.initial_predictions_root) / fname.name) as ipf:  # type: ignore
                     if "reconstruction" in hf:
                         prediction = (
                             self.get_consecutive_slices(ipf, "reconstruction", dataslice)
@@ -126,6 +134,11 @@ class ReconstructionMRIDataset(MRIDataset):
 
             attrs.update(metadata)
 
+            # the noise prewhitening patch of the volume is searched on its middle slice
+            reference = self.get_noise_prewhitening_reference(hf, "kspace", fname.name, dataslice)
+            if reference is not None:
+                attrs["noise_prewhitening_reference"] = reference.astype(np.complex64)
+
         if sensitivity_map.shape != kspace.shape and sensitivity_map.ndim > 1:
             if sensitivity_map.ndim == 3:
                 sensitivity_map = np.transpose(sensitivity_map, (2, 0, 1))
@@ -199,6 +212,9 @@ class CC359ReconstructionMRIDataset(Dataset):
         complex_target: bool = False,
         log_images_rate: Optional[float] = 1.0,
         transform: Optional[Callable] = None,
+        slice_window_cache_size: int = 8,
+        metadata_scan_workers: int = 0,
+        metadata_scan_mode: str = "thread",
         **kwargs,  # pylint: disable=unused-argument
     ):
         """Inits :class:`CC359ReconstructionMRIDataset`.
@@ -230,7 +246,7 @@ class CC359ReconstructionMRIDataset(Dataset):
             Whether to cache dataset metadata. This is very useful for large datasets.
         dataset_cache_file : Union[str, Path, os.PathLike, none], optional
             A file in which to cache dataset information for faster load times. If not provided, the cache will be
-            stored in the dataset root.
+            stored in the atommic cache directory.
         num_cols : Optional[Tuple[int]], optional
             If provided, only slices with the desired number of columns will be considered.
         consecutive_slices : int, optional
@@ -251,19 +267,25 @@ class CC359ReconstructionMRIDataset(Dataset):
             should take ``kspace``, ``coil sensitivity maps``, ``quantitative maps``, ``mask``, ``initial prediction``,
             ``target``, ``attributes``, ``filename``, and ``slice number`` as inputs. ``target`` may be null for test
             data. Default is ``None``.
+        slice_window_cache_size : int, optional
+            Number of HDF5 datasets, e.g. the ``kspace`` of a volume, whose last window of consecutive slices is kept
+            per worker when ``consecutive_slices`` > 1, so that the slices shared by the windows of adjacent slices are
+            read once. Set to ``0`` to read every window from the file. Default is ``8``.
+        metadata_scan_workers : int, optional
+            Number of workers used to read the metadata of the files when the dataset index is built. ``0`` reads the
+            files serially, ``-1`` uses all available cores. Default is ``0``.
+        metadata_scan_mode : str, optional
+            Whether the metadata is read by a pool of ``'thread'`` or ``'process'`` workers. Default is ``'thread'``.
         **kwargs
             Additional keyword arguments.
         """
         super().__init__()
+        self.slice_window_cache = SliceWindowCache(
+            capacity=0 if is_none(slice_window_cache_size) else slice_window_cache_size
+        )
         self.coil_sensitivity_maps_root = coil_sensitivity_maps_root
         self.mask_root = mask_root
 
-        if str(noise_root).endswith(".json"):
-            with open(noise_root, "r") as f:  # type: ignore  # pylint: disable=unspecified-encoding
-                noise_root = [json.loads(line) for line in f.readlines()]  # type: ignore
-        else:
-            noise_root = None
-
         self.initial_predictions_root = initial_predictions_root
         self.dataset_format = dataset_format
 
@@ -282,12 +304,6 @@ class CC359ReconstructionMRIDataset(Dataset):
 
         self.dataset_cache_file = None if is_none(dataset_cache_file) else Path(dataset_cache_file)  # type: ignore
 
-        if self.dataset_cache_file is not None and self.dataset_cache_file.exists() and use_dataset_cache:
-            with open(self.dataset_cache_file, "rb") as f:
-                dataset_cache = yaml.safe_load(f)
-        else:
-            dataset_cache = {}
-
         if consecutive_slices < 1:
             raise ValueError(f"Consecutive slices {consecutive_slices} is out of range, must be > 0.")
         self.consecutive_slices = consecutive_slices
@@ -296,16 +312,26 @@ class CC359ReconstructionMRIDataset(Dataset):
         self.data_saved_per_slice = data_saved_per_slice
 
         self.recons_key = "reconstruction"
-        self.examples = []
+        if str(root).endswith(".json"):
+            with open(root, "r") as f:  # pylint: disable=unspecified-encoding
+                examples = json.load(f)
+            files = [Path(example) for example in examples]
+        else:
+            files = list(Path(root).iterdir())
+
+        dataset_index_file = (
+            dataset_index_path(
+                self.dataset_cache_file, root, f"{type(self).__name__}:{consecutive_slices}:{data_saved_per_slice}"
+            )
+            if use_dataset_cache
+            else None
+        )
+        self.examples = load_dataset_index(dataset_index_file, files)
 
         # Check if our dataset is in the cache. If yes, use that metadata, if not, then regenerate the metadata.
-        if dataset_cache.get(root) is None or not use_dataset_cache:
-            if str(root).endswith(".json"):
-                with open(root, "r") as f:  # pylint: disable=unspecified-encoding
-                    examples = json.load(f)
-                files = [Path(example) for example in examples]
-            else:
-                files = list(Path(root).iterdir())
+        if self.examples is None:
+            volumes = []
+            noise_index = load_noise_index(noise_root) if str(noise_root).endswith(".json") else None
 
             if n2r_supervised_rate != 0.0:
                 # randomly select a subset of files for N2R supervised loss based on n2r_supervised_rate
@@ -313,10 +339,11 @@ class CC359ReconstructionMRIDataset(Dataset):
                     files, int(np.round(n2r_supervised_rate * len(files)))  # type: ignore
                 )
 
-            for fname in sorted(files):
-                metadata, num_slices = self._retrieve_metadata(fname)
+            files = sorted(files)
+            scanned = scan_metadata(self._retrieve_metadata, files, metadata_scan_workers, metadata_scan_mode)
+            for fname, (metadata, num_slices) in zip(files, scanned):
                 metadata["noise_levels"] = (
-                    self.__parse_noise__(noise_root, fname) if noise_root is not None else []  # type: ignore
+                    self.__parse_noise__(noise_index, fname) if noise_index is not None else []  # type: ignore
                 )
                 metadata["n2r_supervised"] = False
                 if n2r_supervised_rate != 0.0:
@@ -329,33 +356,20 @@ class CC359ReconstructionMRIDataset(Dataset):
                     num_slices = num_slices - (consecutive_slices - 1)
 
                 # Specific to CC359 dataset, we need to remove the first and last 50 slices
-                self.examples += [
-                    (fname, slice_ind, metadata) for slice_ind in range(num_slices) if 50 < slice_ind < num_slices - 50
-                ]
-
-            if dataset_cache.get(root) is None and use_dataset_cache:
-                dataset_cache[root] = self.examples
-                logging.info("Saving dataset cache to %s.", self.dataset_cache_file)
-                with open(self.dataset_cache_file, "wb") as f:  # type: ignore
-                    yaml.dump(dataset_cache, f)
+                volumes.append((fname, 51, num_slices - 50, metadata))
+
+            self.examples = VolumeIndex.from_rows(volumes)
+
+            if dataset_index_file is not None:
+                logging.info("Saving dataset cache to %s.", dataset_index_file)
+                self.examples.save(dataset_index_file)
         else:
-            logging.info("Using dataset cache from %s.", self.dataset_cache_file)
-            self.examples = dataset_cache[root]
+            logging.info("Using dataset cache from %s.", dataset_index_file)
 
         # subsample if desired
-        if sample_rate < 1.0:  # sample by slice
-            random.shuffle(self.examples)
-            num_examples = round(len(self.examples) * sample_rate)
-            self.examples = self.examples[:num_examples]
-        elif volume_sample_rate < 1.0:  # sample by volume
-            vol_names = sorted(list({f[0].stem for f in self.examples}))
-            random.shuffle(vol_names)
-            num_volumes = round(len(vol_names) * volume_sample_rate)
-            sampled_vols = vol_names[:num_volumes]
-            self.examples = [example for example in self.examples if example[0].stem in sampled_vols]
-
-        if num_cols and not is_none(num_cols):
-            self.examples = [ex for ex in self.examples if ex[2]["encoding_size"][1] in num_cols]
+        self.examples = subsample_examples(
+            self.examples, sample_rate, volume_sample_rate, None if is_none(num_cols) else num_cols
+        )
 
         self.indices_to_log = np.random.choice(
             len(self.examples), int(log_images_rate * len(self.examples)), replace=False  # type: ignore
@@ -433,13 +447,14 @@ class CC359ReconstructionMRIDataset(Dataset):
         return metadata, num_slices
 
     @staticmethod
-    def __parse_noise__(noise: str, fname: Path) -> List[str]:
+    def __parse_noise__(noise: Dict[str, List], fname: Path) -> List[str]:
         """Parse noise type from filename.
 
         Parameters
         ----------
-        noise : str
-            json string of noise type.
+        noise : Dict[str, List]
+            Noise levels keyed by filename, as loaded by
+            :func:`atommic.collections.common.data.dataset_index.load_noise_index`.
         fname : Path
             Filename to parse noise type from.
 
@@ -448,7 +463,7 @@ class CC359ReconstructionMRIDataset(Dataset):
         List[str]
             List of noise values.
         """
-        return [noise[i]["noise"] for i in range(len(noise)) if noise[i]["fname"] == fname.name]  # type: ignore
+        return list(noise.get(fname.name, []))
 
     def get_consecutive_slices(self, data: Dict, key: str, dataslice: int) -> np.ndarray:
         """Get consecutive slices from a given data dictionary.
@@ -467,7 +482,8 @@ class CC359ReconstructionMRIDataset(Dataset):
         np.ndarray
             Array of consecutive slices. If ``self.consecutive_slices`` is > 1, then the array will have shape
             ``(self.consecutive_slices, *data[key].shape[1:])``. Otherwise, the array will have shape
-            ``data[key].shape[1:]``.
+            ``data[key].shape[1:]``. Windows at the edges of the volume are padded with zero slices of the same
+            dtype.
 
         Examples
         --------
@@ -491,51 +507,7 @@ class CC359ReconstructionMRIDataset(Dataset):
                 return x[dataslice]
             return x
 
-        # get consecutive slices
-        num_slices = x.shape[0]
-
-        # If the number of consecutive slices is greater than or equal to the total slices, return the entire stack
-        if self.consecutive_slices >= num_slices:
-            # pad left and right with zero slices to match the desired number of slices
-            slices_to_add_start = (self.consecutive_slices - num_slices) // 2
-            slices_to_add_end = self.consecutive_slices - num_slices - slices_to_add_start
-            if slices_to_add_start > 0:
-                zero_slices = np.zeros((slices_to_add_start, *x.shape[1:]))
-                x = np.concatenate((zero_slices, x), axis=0)
-            if slices_to_add_end > 0:
-                zero_slices = np.zeros((slices_to_add_end, *x.shape[1:]))
-                x = np.concatenate((x, zero_slices), axis=0)
-            return x
-
-        # Calculate half of the consecutive slices to determine the middle position
-        half_slices = self.consecutive_slices // 2
-
-        # Determine the start and end slices based on the middle position
-        start_slice = dataslice - half_slices
-        end_slice = dataslice + half_slices + 1
-
-        # Handle edge cases
-        slices_to_add_start = 0
-        slices_to_add_end = 0
-        if start_slice < 0:
-            slices_to_add_start = abs(start_slice)
-            start_slice = 0
-
-        if end_slice > (num_slices - 1):
-            slices_to_add_end = end_slice - num_slices
-            extracted_slices = x[start_slice:]
-        else:
-            extracted_slices = x[start_slice:end_slice]
-
-        # Add slices to the start and end if needed
-        if slices_to_add_start > 0:
-            zero_slices = np.zeros((slices_to_add_start, *extracted_slices.shape[1:]))
-            extracted_slices = np.concatenate((zero_slices, extracted_slices), axis=0)
-        if slices_to_add_end > 0:
-            zero_slices = np.zeros((slices_to_add_end, *extracted_slices.shape[1:]))
-            extracted_slices = np.concatenate((extracted_slices, zero_slices), axis=0)
-
-        return extracted_slices
+        return read_consecutive_slices(x, dataslice, self.consecutive_slices, window_cache=self.slice_window_cache)
 
     def __len__(self):
         """Length of :class:`MRIDataset`."""
@@ -681,7 +653,7 @@ class SKMTEAReconstructionMRIDataset(MRIDataset):
             masking = "custom"
 
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             kspace = self.get_consecutive_slices(hf, "kspace", dataslice).astype(np.complex64)
 
             if not is_none(dataset_format) and dataset_format == "skm-tea-echo1":
@@ -717,14 +689,14 @@ class SKMTEAReconstructionMRIDataset(MRIDataset):
             prediction = np.empty([])
             if not is_none(self.initial_predictions_root):
                 if "reconstruction" in hf:
-                    with h5py.File(Path(self.initial_predictions_root) / fname.name, "r") as ipf:  # type: ignore
+                    with self.file_pool.open(Path(self.initial_predictions_root) / fname.name) as ipf:  # type: ignore
                         prediction = (
                             self.get_consecutive_slices(ipf, "reconstruction", dataslice)
                             .squeeze()
                             .astype(np.complex64)
                         )
                 elif "initial_prediction" in hf:
-                    with h5py.File(Path(self.initial_predictions_root) / fname.name, "r") as ipf:  # type: ignore
+                    with self.file_pool.open(Path(self.initial_predictions_root) / fname.name) as ipf:  # type: ignore
                         prediction = (
                             self.get_consecutive_slices(ipf, "initial_prediction", dataslice)
                             .squeeze()
@@ -797,11 +769,16 @@ class StanfordKneesReconstructionMRIDataset(MRIDataset):
     def __getitem__(self, i: int):
         """Get item from :class:`StanfordKneesReconstructionMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             kspace = self.get_consecutive_slices(hf, "kspace", dataslice).astype(np.complex64)
 
             attrs = dict(hf.attrs)
 
+            # the noise prewhitening patch of the volume is searched on its middle slice
+            reference = self.get_noise_prewhitening_reference(hf, "kspace", fname.name, dataslice)
+            if reference is not None:
+                attrs["noise_prewhitening_reference"] = reference.astype(np.complex64)
+
         sensitivity_map = np.array([])
         if "sensitivity_map" in hf:
             sensitivity_map = self.get_consecutive_slices(hf, "sensitivity_map", dataslice).astype(np.complex64)
@@ -814,7 +791,7 @@ class StanfordKneesReconstructionMRIDataset(MRIDataset):
                 coil_sensitivity_maps_root = Path(f"{self.coil_sensitivity_maps_root}/{split_dir[-j]}/")
                 if os.path.exists(coil_sensitivity_maps_root / Path(split_dir[-2]) / fname.name):
                     break
-            with h5py.File(Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name, "r") as sf:
+            with self.file_pool.open(Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name) as sf:
                 if "sensitivity_map" in sf or "sensitivity_map" in next(iter(sf.keys())):
                     sensitivity_map = (
                         self.get_consecutive_slices(sf, "sensitivity_map", dataslice).squeeze().astype(np.complex64)
@@ -1,4 +1,11 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
+from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import (  # noqa: F401
+    VolumeMetricsAccumulator,
+    batched_mse,
+    batched_nmse,
+    batched_psnr,
+    batched_ssim,
+)
 from atommic.collections.reconstruction.metrics.reconstruction_metrics import mse, nmse, psnr, ssim  # noqa: F401
@@ -0,0 +1,264 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+from typing import Dict, List, Optional, Sequence
+
+import torch
+import torch.nn.functional as F
+
+__all__ = ["batched_mse", "batched_nmse", "batched_psnr", "batched_ssim", "VolumeMetricsAccumulator"]
+
+
+def _data_range(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """Per-example data range ``max(ptp(x), ptp(y))``, as used by
+    :func:`atommic.collections.reconstruction.metrics.reconstruction_metrics.psnr` and
+    :func:`atommic.collections.reconstruction.metrics.reconstruction_metrics.ssim`."""
+    x = x.flatten(1)
+    y = y.flatten(1)
+    return torch.maximum(x.amax(1) - x.amin(1), y.amax(1) - y.amin(1))
+
+
+def batched_mse(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """Computes the Mean Squared Error (MSE) of every example of a batch.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Target images of shape [batch_size, ...].
+    y : torch.Tensor
+        Predicted images of shape [batch_size, ...].
+
+    Returns
+    -------
+    torch.Tensor
+        MSE of shape [batch_size].
+
+    Examples
+    --------
+    >>> from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import batched_mse
+    >>> import torch
+    >>> datax = torch.rand(2, 1, 100, 100)
+    >>> datay = torch.rand(2, 1, 100, 100)
+    >>> batched_mse(datax, datay)
+    tensor([0.1665, 0.1672])
+    """
+    return ((x - y) ** 2).flatten(1).mean(1)
+
+
+def batched_nmse(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """Computes the Normalized Mean Squared Error (NMSE) of every example of a batch.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Target images of shape [batch_size, ...].
+    y : torch.Tensor
+        Predicted images of shape [batch_size, ...].
+
+    Returns
+    -------
+    torch.Tensor
+        NMSE of shape [batch_size].
+
+    Examples
+    --------
+    >>> from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import batched_nmse
+    >>> import torch
+    >>> datax = torch.rand(2, 1, 100, 100)
+    >>> datay = torch.rand(2, 1, 100, 100)
+    >>> batched_nmse(datax, datay)
+    tensor([0.4995, 0.5012])
+    """
+    return ((x - y) ** 2).flatten(1).sum(1) / (x**2).flatten(1).sum(1)
+
+
+def batched_psnr(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """Computes the Peak Signal to Noise Ratio (PSNR) of every example of a batch.
+
+    The data range of each example is ``max(ptp(x), ptp(y))``, as in
+    :func:`atommic.collections.reconstruction.metrics.reconstruction_metrics.psnr`.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Target images of shape [batch_size, ...].
+    y : torch.Tensor
+        Predicted images of shape [batch_size, ...].
+
+    Returns
+    -------
+    torch.Tensor
+        PSNR of shape [batch_size].
+
+    Examples
+    --------
+    >>> from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import batched_psnr
+    >>> import torch
+    >>> datax = torch.rand(2, 1, 100, 100)
+    >>> datay = torch.rand(2, 1, 100, 100)
+    >>> batched_psnr(datax, datay)
+    tensor([7.7858, 7.7681])
+    """
+    return 10 * torch.log10(_data_range(x, y) ** 2 / batched_mse(x, y))
+
+
+def batched_ssim(
+    x: torch.Tensor, y: torch.Tensor, win_size: int = 7, k1: float = 0.01, k2: float = 0.03
+) -> torch.Tensor:
+    """Computes the Structural Similarity Index Measure (SSIM) of every example of a batch.
+
+    This is the scikit-image ``structural_similarity`` with its default, uniform, window and sample covariance, as
+    used by :func:`atommic.collections.reconstruction.metrics.reconstruction_metrics.ssim`. The SSIM map is computed
+    only where the window fits in the image, which is the region scikit-image averages over after cropping the
+    borders. All slices of an example share the data range of the example, and their SSIM is averaged.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Target images of shape [batch_size, ..., n_x, n_y].
+    y : torch.Tensor
+        Predicted images of shape [batch_size, ..., n_x, n_y].
+    win_size : int, optional
+        Side length of the sliding window. Default is ``7``.
+    k1 : float, optional
+        Algorithm parameter K1. Default is ``0.01``.
+    k2 : float, optional
+        Algorithm parameter K2. Default is ``0.03``.
+
+    Returns
+    -------
+    torch.Tensor
+        SSIM of shape [batch_size].
+
+    Examples
+    --------
+    >>> from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import batched_ssim
+    >>> import torch
+    >>> datax = torch.rand(2, 1, 100, 100)
+    >>> datay = datax * 0.5
+    >>> batched_ssim(datax, datay)
+    tensor([0.7994, 0.7995])
+    """
+    if x.shape != y.shape:
+        raise ValueError("Ground truth dimensions does not match prediction dimensions.")
+    if x.dim() == 2:
+        x = x.unsqueeze(0)
+        y = y.unsqueeze(0)
+    batch_size = x.shape[0]
+    data_range = _data_range(x, y)
+
+    # fold all slices of an example into the batch, [batch_size * num_slices, 1, n_x, n_y]
+    x = x.reshape(-1, 1, *x.shape[-2:])
+    y = y.reshape(-1, 1, *y.shape[-2:])
+    data_range = data_range.repeat_interleave(x.shape[0] // batch_size).view(-1, 1, 1, 1)
+
+    num_points = win_size**2
+    cov_norm = num_points / (num_points - 1)
+    ux, uy, uxx, uyy, uxy = F.avg_pool2d(
+        torch.cat([x, y, x * x, y * y, x * y], dim=1), kernel_size=win_size, stride=1
+    ).unbind(1)
+    ux, uy, uxx, uyy, uxy = (u.unsqueeze(1) for u in (ux, uy, uxx, uyy, uxy))
+    vx = cov_norm * (uxx - ux * ux)
+    vy = cov_norm * (uyy - uy * uy)
+    vxy = cov_norm * (uxy - ux * uy)
+
+    c1 = (k1 * data_range) ** 2
+    c2 = (k2 * data_range) ** 2
+    s = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux**2 + uy**2 + c1) * (vx + vy + c2))
+    return s.flatten(1).mean(1).view(batch_size, -1).mean(1)
+
+
+class VolumeMetricsAccumulator:
+    """Accumulates per-slice metrics into per-volume sums on the device of the metrics.
+
+    Sums and counts are kept in preallocated tensors, with one row per volume, and are updated with a single
+    ``index_add_`` per batch. The capacity is doubled when more volumes are seen than rows are allocated.
+
+    Examples
+    --------
+    >>> from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import (
+    ...     VolumeMetricsAccumulator,
+    ... )
+    >>> import torch
+    >>> accumulator = VolumeMetricsAccumulator(["MSE", "SSIM"])
+    >>> accumulator.update(["a.h5", "a.h5", "b.h5"], {"MSE": torch.tensor([1.0, 2.0, 3.0]), "SSIM": torch.ones(3)})
+    >>> accumulator.volume_means()
+    {'MSE': tensor([1.5000, 3.0000]), 'SSIM': tensor([1., 1.])}
+    """
+
+    def __init__(self, metrics: Sequence[str], capacity: int = 64):
+        """Inits :class:`VolumeMetricsAccumulator`.
+
+        Parameters
+        ----------
+        metrics : Sequence[str]
+            Names of the accumulated metrics.
+        capacity : int, optional
+            Initial number of volumes for which memory is allocated. Default is ``64``.
+        """
+        self.metrics = list(metrics)
+        self.capacity = max(int(capacity), 1)
+        self.volumes: Dict[str, int] = {}
+        self.sums: Optional[torch.Tensor] = None
+        self.counts: Optional[torch.Tensor] = None
+
+    def __len__(self) -> int:
+        """Number of accumulated volumes."""
+        return len(self.volumes)
+
+    def reset(self):
+        """Clears the accumulated metrics, keeping the allocated memory."""
+        self.volumes = {}
+        if self.sums is not None:
+            self.sums.zero_()
+            self.counts.zero_()  # type: ignore
+
+    def _allocate(self, device: torch.device, num_volumes: int):
+        """Allocates, or grows, the sums and counts to hold at least ``num_volumes`` volumes."""
+        if self.sums is not None and self.sums.shape[0] >= num_volumes and self.sums.device == device:
+            return
+        capacity = self.capacity if self.sums is None else self.sums.shape[0]
+        while capacity < num_volumes:
+            capacity *= 2
+        sums = torch.zeros(capacity, len(self.metrics), dtype=torch.float64, device=device)
+        counts = torch.zeros(capacity, dtype=torch.float64, device=device)
+        if self.sums is not None:
+            sums[: self.sums.shape[0]] = self.sums.to(device)
+            counts[: self.counts.shape[0]] = self.counts.to(device)  # type: ignore
+        self.sums, self.counts = sums, counts
+
+    def update(self, fnames: Sequence[str], values: Dict[str, torch.Tensor]):
+        """Adds the metrics of a batch of slices.
+
+        Parameters
+        ----------
+        fnames : Sequence[str]
+            Volume of each slice of the batch.
+        values : Dict[str, torch.Tensor]
+            Metric values of shape [batch_size], keyed by metric name.
+        """
+        rows: List[int] = [self.volumes.setdefault(str(fname), len(self.volumes)) for fname in fnames]
+        device = values[self.metrics[0]].device
+        self._allocate(device, len(self.volumes))
+        index = torch.tensor(rows, dtype=torch.long, device=device)
+        batch_values = torch.stack([values[metric].to(torch.float64).view(-1) for metric in self.metrics], dim=1)
+        self.sums.index_add_(0, index, batch_values)  # type: ignore
+        self.counts.index_add_(0, index, torch.ones(len(rows), dtype=torch.float64, device=device))  # type: ignore
+
+    def volume_means(self) -> Dict[str, torch.Tensor]:
+        """Returns the mean of each metric over the slices of each volume.
+
+        Returns
+        -------
+        Dict[str, torch.Tensor]
+            Per-volume means of shape [num_volumes], keyed by metric name, in the order the volumes were first seen.
+        """
+        if self.sums is None:
+            return {metric: torch.zeros(0, dtype=torch.float64) for metric in self.metrics}
+        num_volumes = len(self.volumes)
+        means = self.sums[:num_volumes] / self.counts[:num_volumes, None]  # type: ignore
+        return {metric: means[:, i] for i, metric in enumerate(self.metrics)}
+
+    def sum_of_volume_means(self) -> Dict[str, torch.Tensor]:
+        """Returns the sum over volumes of the per-volume mean of each metric, ready for a distributed sum."""
+        return {metric: value.sum() for metric, value in self.volume_means().items()}
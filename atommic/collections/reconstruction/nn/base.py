@@ -1,14 +1,10 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import os
 import warnings
 from abc import ABC
-from collections import defaultdict
-from pathlib import Path
-from typing import Dict, List, Tuple, Union
+from typing import Any, Dict, List, Tuple, Union
 
-import h5py
 import numpy as np
 import torch
 from omegaconf import DictConfig, OmegaConf
@@ -16,6 +12,8 @@ from pytorch_lightning import Trainer
 from torch.nn import L1Loss, MSELoss
 from torch.utils.data import DataLoader
 
+from atommic.collections.common.data.file_pool import worker_init_fn
+from atommic.collections.common.data.samplers import DistributedVolumeSampler
 from atommic.collections.common.data.subsample import create_masker
 from atommic.collections.common.losses import VALID_RECONSTRUCTION_LOSSES, AggregatorLoss, SinkhornDistance
 from atommic.collections.common.nn.base import BaseMRIModel, BaseSensitivityModel, DistributedMetricSum
@@ -39,7 +37,13 @@ from atommic.collections.reconstruction.data.mri_reconstruction_loader import (
 )
 from atommic.collections.reconstruction.losses.na import NoiseAwareLoss
 from atommic.collections.reconstruction.losses.ssim import SSIMLoss
-from atommic.collections.reconstruction.metrics.reconstruction_metrics import mse, nmse, psnr, ssim
+from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import (
+    VolumeMetricsAccumulator,
+    batched_mse,
+    batched_nmse,
+    batched_psnr,
+    batched_ssim,
+)
 from atommic.collections.reconstruction.parts.transforms import ReconstructionMRIDataTransforms
 
 __all__ = ["BaseMRIReconstructionModel"]
@@ -169,11 +173,8 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
         self.PSNR = DistributedMetricSum()
         self.TotExamples = DistributedMetricSum()
 
-        # Set evaluation metrics dictionaries
-        self.mse_vals: Dict = defaultdict(dict)
-        self.nmse_vals: Dict = defaultdict(dict)
-        self.ssim_vals: Dict = defaultdict(dict)
-        self.psnr_vals: Dict = defaultdict(dict)
+        # Set evaluation metrics accumulator, holding the per-volume sums of the metrics
+        self.metrics_accumulator = VolumeMetricsAccumulator(["MSE", "NMSE", "SSIM", "PSNR"])
 
     def __abs_output__(self, x: torch.Tensor) -> torch.Tensor:
         """Converts the input to absolute value."""
@@ -522,66 +523,60 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
         target = target.unsqueeze(1)
         predictions = predictions.unsqueeze(1)
 
-        # Iterate over the batch and log the target and predictions.
-        for _batch_idx_ in range(target.shape[0]):
-            output_target = target[_batch_idx_]
-            output_predictions = predictions[_batch_idx_]
-
-            if self.unnormalize_log_outputs:
-                # Unnormalize target and predictions with pre normalization values. This is only for logging purposes.
-                # For the loss computation, the self.unnormalize_loss_inputs flag is used.
-                output_target, output_predictions, _ = self.__unnormalize_for_loss_or_log__(
-                    output_target, output_predictions, None, attrs, r, _batch_idx_
+        if self.unnormalize_log_outputs:
+            # Unnormalize target and predictions with pre normalization values. This is only for logging purposes.
+            # For the loss computation, the self.unnormalize_loss_inputs flag is used.
+            unnormalized = [
+                self.__unnormalize_for_loss_or_log__(
+                    target[_batch_idx_], predictions[_batch_idx_], None, attrs, r, _batch_idx_
                 )
+                for _batch_idx_ in range(target.shape[0])
+            ]
+            target = torch.stack([x[0] for x in unnormalized])
+            predictions = torch.stack([x[1] for x in unnormalized])
 
-            # Normalize target and predictions to [0, 1] for logging.
-            if torch.is_complex(output_target) and output_target.shape[-1] != 2:
-                output_target = torch.view_as_real(output_target)
-            if output_target.shape[-1] == 2:
-                output_target = torch.view_as_complex(output_target)
-            output_target = torch.abs(output_target / torch.max(torch.abs(output_target))).detach().cpu()
-
-            if torch.is_complex(output_predictions) and output_predictions.shape[-1] != 2:
-                output_predictions = torch.view_as_real(output_predictions)
-            if output_predictions.shape[-1] == 2:
-                output_predictions = torch.view_as_complex(output_predictions)
-            output_predictions = (
-                torch.abs(output_predictions / torch.max(torch.abs(output_predictions))).detach().cpu()
-            )
+        # Normalize target and predictions to [0, 1] for logging and metrics, for the whole batch at once.
+        output_target = self.__normalize_for_metrics__(target)
+        output_predictions = self.__normalize_for_metrics__(predictions)
 
-            # Log target and predictions, if log_image is True for this slice.
+        # Log target and predictions, if log_image is True for this slice.
+        for _batch_idx_ in range(target.shape[0]):
             if attrs["log_image"][_batch_idx_]:
+                log_target = output_target[_batch_idx_].detach().cpu()
+                log_predictions = output_predictions[_batch_idx_].detach().cpu()
+
                 # if consecutive slices, select the middle slice
                 if self.consecutive_slices > 1:
-                    output_target = output_target[self.consecutive_slices // 2]
-                    output_predictions = output_predictions[self.consecutive_slices // 2]
+                    log_target = log_target[self.consecutive_slices // 2]
+                    log_predictions = log_predictions[self.consecutive_slices // 2]
 
                 key = f"{fname[_batch_idx_]}_slice_{int(slice_idx[_batch_idx_])}-Acc={acceleration}x"  # type: ignore
-                self.log_image(f"{key}/target", output_target)
-                self.log_image(f"{key}/reconstruction", output_predictions)
-                self.log_image(f"{key}/error", torch.abs(output_target - output_predictions))
-
-            # Compute metrics and log them.
-            output_target = output_target.numpy()
-            output_predictions = output_predictions.numpy()
-            self.mse_vals[fname[_batch_idx_]][str(slice_idx[_batch_idx_].item())] = torch.tensor(  # type: ignore
-                mse(output_target, output_predictions)
-            ).view(1)
-            self.nmse_vals[fname[_batch_idx_]][str(slice_idx[_batch_idx_].item())] = torch.tensor(  # type: ignore
-                nmse(output_target, output_predictions)
-            ).view(1)
-
-            max_value = max(np.max(output_target), np.max(output_predictions)) - min(
-                np.min(output_target), np.min(output_predictions)
-            )
-            max_value = max(max_value, attrs['max']) if 'max' in attrs else max_value
+                self.log_image(f"{key}/target", log_target)
+                self.log_image(f"{key}/reconstruction", log_predictions)
+                self.log_image(f"{key}/error", torch.abs(log_target - log_predictions))
+
+        # Compute metrics for the whole batch on the device of the model and accumulate them per volume.
+        output_target = output_target.detach()
+        output_predictions = output_predictions.detach()
+        self.metrics_accumulator.update(
+            fname,
+            {
+                "MSE": batched_mse(output_target, output_predictions),
+                "NMSE": batched_nmse(output_target, output_predictions),
+                "SSIM": batched_ssim(output_target, output_predictions),
+                "PSNR": batched_psnr(output_target, output_predictions),
+            },
+        )
 
-            self.ssim_vals[fname[_batch_idx_]][str(slice_idx[_batch_idx_].item())] = torch.tensor(  # type: ignore
-                ssim(output_target, output_predictions, maxval=max_value)
-            ).view(1)
-            self.psnr_vals[fname[_batch_idx_]][str(slice_idx[_batch_idx_].item())] = torch.tensor(  # type: ignore
-                psnr(output_target, output_predictions, maxval=max_value)
-            ).view(1)
+    @staticmethod
+    def __normalize_for_metrics__(x: torch.Tensor) -> torch.Tensor:
+        """Normalizes the magnitude of every example of a batch to [0, 1] by its maximum, for logging and metrics."""
+        if torch.is_complex(x) and x.shape[-1] != 2:
+            x = torch.view_as_real(x)
+        if x.shape[-1] == 2:
+            x = torch.view_as_complex(x.float())
+        x = torch.abs(x).float()
+        return x / torch.amax(x.flatten(1), dim=1).view(-1, *[1] * (x.dim() - 1))
 
     def __check_noise_to_recon_inputs__(
         self, y: torch.Tensor, mask: torch.Tensor, initial_prediction: torch.Tensor, attrs: Dict
@@ -1149,52 +1144,56 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
             predictions = torch.view_as_complex(torch.view_as_real(predictions).type(torch.float32))
         predictions = predictions.detach().cpu().numpy()
 
-        self.test_step_outputs.append([fname, slice_idx, predictions])
+        if self.consecutive_slices > 1:
+            # always keep the middle slice
+            predictions = predictions[self.consecutive_slices // 2]
+
+        self.get_predictions_writer("reconstructions").write(fname[0], slice_idx, {"reconstruction": predictions})
+
+    def on_after_batch_transfer(self, batch: Any, dataloader_idx: int) -> Any:
+        """Applies the data transforms that the dataset defers to the device of the model, batched.
+
+        Parameters
+        ----------
+        batch : Any
+            The batch, on the device of the model.
+        dataloader_idx : int
+            The index of the dataloader of the batch.
+
+        Returns
+        -------
+        Any
+            The transformed batch.
+        """
+        if self._trainer is None:
+            return batch
+        if self.trainer.training:
+            dataloader = self._train_dl
+        elif self.trainer.validating or self.trainer.sanity_checking:
+            dataloader = self._validation_dl
+        else:
+            dataloader = self._test_dl
+        if isinstance(dataloader, (list, tuple)):
+            dataloader = dataloader[dataloader_idx]
+        transform = getattr(getattr(dataloader, "dataset", None), "transform", None)
+        if getattr(transform, "device_transforms", False):
+            batch = transform.process_batch(batch)
+        return batch
 
     def on_validation_epoch_end(self):
         """Called at the end of validation epoch to aggregate outputs."""
         self.log("val_loss", torch.stack([x["val_loss"] for x in self.validation_step_outputs]).mean(), sync_dist=True)
 
-        # Initialize metrics.
-        mse_vals = defaultdict(dict)
-        nmse_vals = defaultdict(dict)
-        ssim_vals = defaultdict(dict)
-        psnr_vals = defaultdict(dict)
-        for k, v in self.mse_vals.items():
-            mse_vals[k].update(v)
-        for k, v in self.nmse_vals.items():
-            nmse_vals[k].update(v)
-        for k, v in self.ssim_vals.items():
-            ssim_vals[k].update(v)
-        for k, v in self.psnr_vals.items():
-            psnr_vals[k].update(v)
-
-        # Parse metrics and log them.
-        metrics = {
-            "MSE": 0,
-            "NMSE": 0,
-            "SSIM": 0,
-            "PSNR": 0,
-        }
-        local_examples = 0
-        for fname in mse_vals:
-            local_examples += 1
-            metrics["MSE"] = metrics["MSE"] + torch.mean(torch.cat([v.view(-1) for _, v in mse_vals[fname].items()]))
-            metrics["NMSE"] = metrics["NMSE"] + torch.mean(
-                torch.cat([v.view(-1) for _, v in nmse_vals[fname].items()])
-            )
-            metrics["SSIM"] = metrics["SSIM"] + torch.mean(
-                torch.cat([v.view(-1) for _, v in ssim_vals[fname].items()])
-            )
-            metrics["PSNR"] = metrics["PSNR"] + torch.mean(
-                torch.cat([v.view(-1) for _, v in psnr_vals[fname].items()])
-            )
+        # Parse metrics and log them. Each volume contributes the mean of its slices.
+        metrics = self.metrics_accumulator.sum_of_volume_means()
+        local_examples = len(self.metrics_accumulator)
+        self.metrics_accumulator.reset()
 
         # reduce across ddp via sum
-        metrics["MSE"] = self.MSE(metrics["MSE"])
-        metrics["NMSE"] = self.NMSE(metrics["NMSE"])
-        metrics["SSIM"] = self.SSIM(metrics["SSIM"])
-        metrics["PSNR"] = self.PSNR(metrics["PSNR"])
+        metrics["MSE"] = self.MSE(metrics["MSE"].float())
+        metrics["NMSE"] = self.NMSE(metrics["NMSE"].float())
+        metrics["SSIM"] = self.SSIM(metrics["SSIM"].float())
+        metrics["PSNR"] = self.PSNR(metrics["PSNR"].float())
         tot_examples = self.TotExamples(torch.tensor(local_examples))
 
         for metric, value in metrics.items():
@@ -1202,74 +1201,23 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
 
     def on_test_epoch_end(self):
         """Called at the end of test epoch to aggregate outputs, log metrics and save predictions."""
-        # Initialize metrics.
-        mse_vals = defaultdict(dict)
-        nmse_vals = defaultdict(dict)
-        ssim_vals = defaultdict(dict)
-        psnr_vals = defaultdict(dict)
-
-        for k, v in self.mse_vals.items():
-            mse_vals[k].update(v)
-        for k, v in self.nmse_vals.items():
-            nmse_vals[k].update(v)
-        for k, v in self.ssim_vals.items():
-            ssim_vals[k].update(v)
-        for k, v in self.psnr_vals.items():
-            psnr_vals[k].update(v)
-
-        # apply means across image volumes
-        metrics = {
-            "MSE": 0,
-            "NMSE": 0,
-            "SSIM": 0,
-            "PSNR": 0,
-        }
-        local_examples = 0
-        for fname in mse_vals:
-            local_examples += 1
-            metrics["MSE"] = metrics["MSE"] + torch.mean(torch.cat([v.view(-1) for _, v in mse_vals[fname].items()]))
-            metrics["NMSE"] = metrics["NMSE"] + torch.mean(
-                torch.cat([v.view(-1) for _, v in nmse_vals[fname].items()])
-            )
-            metrics["SSIM"] = metrics["SSIM"] + torch.mean(
-                torch.cat([v.view(-1) for _, v in ssim_vals[fname].items()])
-            )
-            metrics["PSNR"] = metrics["PSNR"] + torch.mean(
-                torch.cat([v.view(-1) for _, v in psnr_vals[fname].items()])
-            )
+        # Parse metrics and log them. Each volume contributes the mean of its slices.
+        metrics = self.metrics_accumulator.sum_of_volume_means()
+        local_examples = len(self.metrics_accumulator)
+        self.metrics_accumulator.reset()
 
         # reduce across ddp via sum
-        metrics["MSE"] = self.MSE(metrics["MSE"])
-        metrics["NMSE"] = self.NMSE(metrics["NMSE"])
-        metrics["SSIM"] = self.SSIM(metrics["SSIM"])
-        metrics["PSNR"] = self.PSNR(metrics["PSNR"])
+        metrics["MSE"] = self.MSE(metrics["MSE"].float())
+        metrics["NMSE"] = self.NMSE(metrics["NMSE"].float())
+        metrics["SSIM"] = self.SSIM(metrics["SSIM"].float())
+        metrics["PSNR"] = self.PSNR(metrics["PSNR"].float())
         tot_examples = self.TotExamples(torch.tensor(local_examples))
 
         for metric, value in metrics.items():
             self.log(f"test_metrics/{metric}", value / tot_examples, prog_bar=True, sync_dist=True)
 
-        # Save predictions.
-        reconstructions = defaultdict(list)
-        for fname, slice_num, output in self.test_step_outputs:
-            reconstructions[fname].append((slice_num, output))
-
-        for fname in reconstructions:
-            reconstructions[fname] = np.stack([out for _, out in sorted(reconstructions[fname])])
-
-        if self.consecutive_slices > 1:
-            # iterate over the slices and always keep the middle slice
-            for fname in reconstructions:
-                reconstructions[fname] = reconstructions[fname][:, self.consecutive_slices // 2]
-
-        if "wandb" in self.logger.__module__.lower():
-            out_dir = Path(os.path.join(self.logger.save_dir, "reconstructions"))
-        else:
-            out_dir = Path(os.path.join(self.logger.log_dir, "reconstructions"))
-        out_dir.mkdir(exist_ok=True, parents=True)
-
-        for fname, recons in reconstructions.items():
-            with h5py.File(out_dir / fname[0], "w") as hf:
-                hf.create_dataset("reconstruction", data=recons)
+        # Flush the predictions that are not written yet.
+        self.close_predictions_writer()
 
     @staticmethod
     def _setup_dataloader_from_config(cfg: DictConfig) -> DataLoader:
@@ -1305,7 +1253,7 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
                 center_fractions = center_fractions * 2
             mask_center_scale = mask_args.get("center_scale", 0.02)
 
-            mask_func = [create_masker(mask_type, center_fractions, accelerations)]
+            mask_func = [create_masker(mask_type, center_fractions, accelerations, mask_args.get("mask_bank_size", 0))]
 
         dataset_format = cfg.get("dataset_format", None)
         if dataset_format.lower() == "cc359":
@@ -1342,6 +1290,10 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
             n2r_supervised_rate=cfg.get("n2r_supervised_rate", 0.0),
             complex_target=cfg.get("complex_target", False),
             log_images_rate=cfg.get("log_images_rate", 1.0),
+            file_handle_pool_size=cfg.get("file_handle_pool_size", 16),
+            slice_window_cache_size=cfg.get("slice_window_cache_size", 8),
+            metadata_scan_workers=cfg.get("metadata_scan_workers", 0),
+            metadata_scan_mode=cfg.get("metadata_scan_mode", "thread"),
             transform=ReconstructionMRIDataTransforms(
                 dataset_format=dataset_format,
                 apply_prewhitening=cfg.get("apply_prewhitening", False),
@@ -1402,9 +1354,20 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
                 coil_dim=cfg.get("coil_dim", 1),
                 consecutive_slices=cfg.get("consecutive_slices", 1),
                 use_seed=cfg.get("use_seed", True),
+                preprocessing_cache_dir=cfg.get("preprocessing_cache_dir", None),
+                device_transforms=cfg.get("device_transforms", False),
             ),
         )
-        if cfg.shuffle:
+        if cfg.get("volume_sampler", False):
+            # sample volume by volume, so that the workers reuse their open files and decoded volumes
+            sampler = DistributedVolumeSampler(
+                dataset,
+                shuffle=cfg.shuffle,
+                slice_block_size=cfg.get("slice_block_size", None),
+                num_workers=cfg.get("num_workers", 4),
+                batch_size=cfg.get("batch_size", 1),
+            )
+        elif cfg.shuffle:
             sampler = torch.utils.data.RandomSampler(dataset)
         else:
             sampler = torch.utils.data.SequentialSampler(dataset)
@@ -1415,5 +1378,6 @@ class BaseMRIReconstructionModel(BaseMRIModel, ABC):
             sampler=sampler,
             num_workers=cfg.get("num_workers", 4),
             pin_memory=cfg.get("pin_memory", False),
+            worker_init_fn=worker_init_fn,
             drop_last=cfg.get("drop_last", False),
         )
@@ -76,6 +76,9 @@ class CIRIM(BaseMRIReconstructionModel):
         # Keep estimation through the cascades if keep_prediction is True or re-estimate it if False.
         self.keep_prediction = cfg_dict.get("keep_prediction")
 
+        # At inference, keep only the final estimate instead of the estimates of every cascade and time step.
+        self.inference_mode = cfg_dict.get("inference_mode", False)
+
     # pylint: disable=arguments-differ
     @typecheck()
     def forward(
@@ -104,8 +107,11 @@ class CIRIM(BaseMRIReconstructionModel):
         Returns
         -------
         List of torch.Tensor
-            List of the intermediate predictions for each cascade. Shape [batch_size, n_x, n_y].
+            List of the intermediate predictions for each cascade. Shape [batch_size, n_x, n_y]. If
+            ``inference_mode`` is set and the model is not training, only the final prediction is kept, as
+            ``[[prediction]]``.
         """
+        keep_intermediate_predictions = self.training or not self.inference_mode
         prediction = y.clone()
         initial_prediction = None if initial_prediction is None or initial_prediction.dim() < 4 else initial_prediction
         hx = None
@@ -121,9 +127,13 @@ class CIRIM(BaseMRIReconstructionModel):
                 hx,
                 sigma,
                 keep_prediction=False if i == 0 else self.keep_prediction,
+                keep_intermediate_predictions=keep_intermediate_predictions,
             )
-            cascades_predictions.append([check_stacked_complex(p) for p in prediction])
-            prediction = prediction[-1]
+            if keep_intermediate_predictions:
+                cascades_predictions.append([check_stacked_complex(p) for p in prediction])
+                prediction = prediction[-1]
+        if not keep_intermediate_predictions:
+            return [[check_stacked_complex(prediction)]]
         return cascades_predictions
 
     def process_reconstruction_loss(  # noqa: MC0001
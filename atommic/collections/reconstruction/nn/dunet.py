@@ -88,6 +88,7 @@ class DUNet(BaseMRIReconstructionModel):
                 fft_centered=self.fft_centered,
                 fft_normalization=self.fft_normalization,
                 spatial_dims=self.spatial_dims,
+                warm_start=cfg_dict.get("data_consistency_warm_start", False),
             )
         elif data_consistency_term == "VS":
             dc_layer = DataVSLayer(
@@ -63,7 +63,10 @@ class MoDL(BaseMRIReconstructionModel):
                 self.spatial_dims,
                 self.coil_dim,
                 self.coil_combination_method,
+                cfg_dict.get("conjugate_gradient_tolerance", 0.0),
             )
+            # start the solver of every cascade from the solution of the previous one
+            self.conjugate_gradient_warm_start = cfg_dict.get("conjugate_gradient_warm_start", False)
 
     # pylint: disable=arguments-differ
     @typecheck()
@@ -97,7 +100,8 @@ class MoDL(BaseMRIReconstructionModel):
         """
         x = initial_prediction.clone()
         for _ in range(self.unrolled_iterations):
+            x0 = x if self.dc and self.conjugate_gradient_warm_start else None
             x = self.reconstruction_module(x.permute(0, 3, 1, 2)).permute(0, 2, 3, 1)
             if self.dc:
-                x = self.dc_block(initial_prediction + self.mu * x, sensitivity_maps, mask)
+                x = self.dc_block(initial_prediction + self.mu * x, sensitivity_maps, mask, x0=x0)
         return check_stacked_complex(x)
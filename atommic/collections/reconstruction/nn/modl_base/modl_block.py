@@ -1,13 +1,14 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-from typing import Sequence
+from typing import Optional, Sequence
 
 import torch
 from torch import nn
 
 from atommic.collections.common.parts.fft import fft2, ifft2
 from atommic.collections.common.parts.utils import coil_combination_method
+from atommic.collections.reconstruction.parts.conjugate_gradient import conjugate_gradient
 
 
 class ResidualNetwork(nn.Module):
@@ -90,6 +91,7 @@ class ConjugateGradient(nn.Module):
         spatial_dims: Sequence[int] = (-2, -1),
         coil_dim: int = 1,
         coil_combination_method: str = "SENSE",
+        tol: float = 0.0,
     ):
         """Inits :class:`ConjugateGradient`.
 
@@ -107,6 +109,11 @@ class ConjugateGradient(nn.Module):
             Spatial dimensions of the input. Default is ``(-2, -1)``.
         coil_dim : int, optional
             Coil dimension. Default is ``1``.
+        coil_combination_method : str, optional
+            Coil combination method. Default is ``"SENSE"``.
+        tol : float, optional
+            Relative residual tolerance, at which the iterations of every example stop early. If ``0``, ``CG_Iter``
+            iterations are always run. Default is ``0.0``.
         """
         super().__init__()
         self.CG_Iter = CG_Iter
@@ -116,6 +123,7 @@ class ConjugateGradient(nn.Module):
         self.spatial_dims = spatial_dims
         self.coil_dim = coil_dim
         self.coil_combination_method = coil_combination_method
+        self.tol = tol
 
     def EhE_Op(
         self, prediction: torch.Tensor, sens_maps: torch.Tensor, mask: torch.Tensor  # pylint: disable=unused-argument
@@ -150,49 +158,9 @@ class ConjugateGradient(nn.Module):
         pred = torch.view_as_real(pred[..., 0] + 1j * pred[..., 1])
         return torch.view_as_complex(pred) + self.mu * prediction
 
-    def proximal_gradient(
-        self,
-        rsold: torch.Tensor,
-        x: torch.Tensor,
-        r: torch.Tensor,
-        p: torch.Tensor,
-        sens_maps: torch.Tensor,
-        mask: torch.Tensor,
+    def forward(
+        self, rhs: torch.Tensor, sens_maps: torch.Tensor, mask: torch.Tensor, x0: Optional[torch.Tensor] = None
     ) -> torch.Tensor:
-        """Proximal gradient descent.
-
-        Parameters
-        ----------
-        rsold : torch.Tensor
-            The residual.
-        x : torch.Tensor
-            The current estimate.
-        r : torch.Tensor
-            The current residual.
-        p : torch.Tensor
-            The current search direction.
-        sens_maps : torch.Tensor
-            The sensitivity maps.
-        mask : torch.Tensor
-            The undersampling mask.
-
-        Returns
-        -------
-        torch.Tensor
-            The new residual, the new estimate, the new residual, and the new search direction.
-        """
-        Ap = self.EhE_Op(p, sens_maps, mask)
-        alpha = rsold / torch.sum(torch.conj(p) * Ap)
-        alpha = alpha + 0j
-        x = x + alpha * p
-        r = r - alpha * Ap
-        rsnew = torch.sum(torch.conj(r) * r)
-        beta = rsnew / rsold
-        beta = beta + 0j
-        p = r + beta * p
-        return rsnew, x, r, p
-
-    def forward(self, rhs: torch.Tensor, sens_maps: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
         """Forward pass of :class:`ConjugateGradient`.
 
         Parameters
@@ -203,6 +171,9 @@ class ConjugateGradient(nn.Module):
             The sensitivity maps.
         mask : torch.Tensor
             The undersampling mask.
+        x0 : torch.Tensor, optional
+            Initial guess, e.g. the solution of the previous cascade. If ``None``, the solver starts from zeros.
+            Default is ``None``.
 
         Returns
         -------
@@ -211,10 +182,14 @@ class ConjugateGradient(nn.Module):
         """
         rhs = torch.view_as_complex(rhs)
         sens_maps = torch.view_as_complex(sens_maps)
-        x = torch.zeros_like(rhs)
-        i, r, p = 0, rhs, rhs
-        rsold = torch.sum(torch.conj(r) * r)
-        while i < self.CG_Iter:
-            rsold, x, r, p = self.proximal_gradient(rsold, x, r, p, sens_maps, mask)
-            i = i + 1
+        if x0 is not None:
+            x0 = torch.view_as_complex(x0)
+        x = conjugate_gradient(
+            lambda p: self.EhE_Op(p, sens_maps, mask),
+            rhs,
+            params=(self.mu, sens_maps),
+            x0=x0,
+            max_iter=self.CG_Iter,
+            tol=self.tol,
+        )
         return torch.view_as_real(x)
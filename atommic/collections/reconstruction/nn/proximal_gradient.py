@@ -50,6 +50,7 @@ class ProximalGradient(BaseMRIReconstructionModel):
             self.spatial_dims,
             self.coil_dim,
             self.coil_combination_method,
+            cfg_dict.get("conjugate_gradient_tolerance", 0.0),
         )
 
     # pylint: disable=arguments-differ
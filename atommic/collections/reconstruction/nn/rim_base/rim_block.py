@@ -173,6 +173,7 @@ class RIMBlock(torch.nn.Module):
         hx: torch.Tensor = None,
         sigma: float = 1.0,
         keep_prediction: bool = False,
+        keep_intermediate_predictions: bool = True,
     ) -> Tuple[Any, Union[list, torch.Tensor, None]]:
         """Forward pass of :class:`RIMBlock`.
 
@@ -194,6 +195,10 @@ class RIMBlock(torch.nn.Module):
             Noise level. Default is ``1.0``.
         keep_prediction : bool, optional
             Whether to keep the prediction. Default is ``False``.
+        keep_intermediate_predictions : bool, optional
+            Whether to return the predictions of all time steps, as a list, or only the prediction of the last time
+            step, as a tensor. The latter saves the memory of the intermediate predictions and, with data consistency,
+            their Fourier transforms, at inference. Default is ``True``.
 
         Returns
         -------
@@ -275,6 +280,10 @@ class RIMBlock(torch.nn.Module):
 
             prediction = prediction + log_likelihood_gradient_prediction
 
+            if keep_intermediate_predictions:
+                predictions.append(prediction)
+
+        if not keep_intermediate_predictions:
             predictions.append(prediction)
 
         if self.consecutive_slices > 1 or self.dimensionality == 3:
@@ -282,7 +291,7 @@ class RIMBlock(torch.nn.Module):
                 predictions[i] = pred.reshape([batch, slices, *pred.shape[1:]])
 
         if self.no_dc:
-            return predictions, hx
+            return (predictions if keep_intermediate_predictions else predictions[-1]), hx
 
         soft_dc = torch.where(mask, y - masked_kspace, self.zero.to(masked_kspace)) * self.dc_weight
         current_kspace = [
@@ -297,4 +306,4 @@ class RIMBlock(torch.nn.Module):
             for e in predictions
         ]
 
-        return current_kspace, hx
+        return (current_kspace if keep_intermediate_predictions else current_kspace[-1]), hx
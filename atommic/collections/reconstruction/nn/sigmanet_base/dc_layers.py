@@ -9,7 +9,8 @@ from typing import Any, List, Optional, Tuple
 import torch
 
 from atommic.collections.common.parts.fft import fft2, ifft2
-from atommic.collections.common.parts.utils import complex_abs, complex_conj, complex_mul
+from atommic.collections.common.parts.utils import complex_conj, complex_mul
+from atommic.collections.reconstruction.parts.conjugate_gradient import conjugate_gradient_solve
 
 
 class ConjugateGradient(torch.autograd.Function):
@@ -24,46 +25,38 @@ class ConjugateGradient(torch.autograd.Function):
         return torch.stack([torch.sum(re.view(nBatch, -1), dim=-1), torch.sum(im.view(nBatch, -1), dim=-1)], -1)
 
     @staticmethod
-    def solve(x0: torch.Tensor, M: torch.Tensor, tol: float, max_iter: int) -> torch.Tensor:
+    def solve(
+        x0: torch.Tensor, M: torch.Tensor, tol: float, max_iter: int, x_init: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         """Solve the linear system Mx=b using conjugate gradient.
 
+        Every example of the batch stops when its squared relative residual is below ``tol``, see
+        :func:`atommic.collections.reconstruction.parts.conjugate_gradient.conjugate_gradient_solve`.
+
         Parameters
         ----------
         x0 : torch.Tensor
-            Initial guess. Shape [batch_size, height, width, 2].
+            Right-hand side b. Shape [batch_size, height, width, 2].
         M : torch.Tensor
             Linear operator. Shape [batch_size, height, width, 2].
         tol : float
             Tolerance for the stopping criterion.
         max_iter : int
             Maximum number of iterations.
+        x_init : torch.Tensor, optional
+            Initial guess. If ``None``, the solver starts from zeros. Default is ``None``.
         """
-        nBatch = x0.shape[0]
-        x = torch.zeros(x0.shape).to(x0.device)
-        r = x0.clone()
-        p = x0.clone()
-        x0x0 = (x0.pow(2)).view(nBatch, -1).sum(-1)
-        rr = torch.stack([(r.pow(2)).view(nBatch, -1).sum(-1), torch.zeros(nBatch).to(x0.device)], dim=-1)
-
-        it = 0
-        while torch.min(rr[..., 0] / x0x0) > tol and it < max_iter:
-            it = it + 1
-            q = M(p)
-
-            data1 = rr
-            data2 = ConjugateGradient.complexDot(p, q)
-
-            re1, im1 = torch.unbind(data1, -1)
-            re2, im2 = torch.unbind(data2, -1)
-            alpha = torch.stack([re1 * re2 + im1 * im2, im1 * re2 - re1 * im2], -1) / complex_abs(data2) ** 2
-
-            x = x + complex_mul(alpha.reshape(nBatch, 1, 1, 1, -1), p.clone())
-            r = r - complex_mul(alpha.reshape(nBatch, 1, 1, 1, -1), q.clone())
-            rr_new = torch.stack([(r.pow(2)).view(nBatch, -1).sum(-1), torch.zeros(nBatch).to(x0.device)], dim=-1)
-            beta = torch.stack([rr_new[..., 0] / rr[..., 0], torch.zeros(nBatch).to(x0.device)], dim=-1)
-            p = r.clone() + complex_mul(beta.reshape(nBatch, 1, 1, 1, -1), p)
-            rr = rr_new.clone()
-        return x
+
+        def operator(p):
+            """M on complex tensors."""
+            return torch.view_as_complex(M(torch.view_as_real(p)).contiguous())
+
+        if x_init is not None:
+            x_init = torch.view_as_complex(x_init.expand_as(x0).contiguous())
+        x = conjugate_gradient_solve(
+            operator, torch.view_as_complex(x0.contiguous()), x_init, max_iter=max_iter, tol=tol**0.5
+        )
+        return torch.view_as_real(x)
 
     # pylint: disable=arguments-differ
     @staticmethod
@@ -79,6 +72,7 @@ class ConjugateGradient(torch.autograd.Function):
         fft_centered: bool,
         fft_normalization: str,
         spatial_dims: List[int],
+        x_init: Optional[torch.Tensor] = None,
     ) -> torch.Tensor:
         """Forward pass of :class:`ConjugateGradient`.
 
@@ -106,6 +100,8 @@ class ConjugateGradient(torch.autograd.Function):
             FFT normalization.
         spatial_dims : List[int]
             Spatial dimensions.
+        x_init : torch.Tensor, optional
+            Initial guess of the solver. If ``None``, the solver starts from zeros. Default is ``None``.
 
         Returns
         -------
@@ -148,13 +144,13 @@ class ConjugateGradient(torch.autograd.Function):
         x0 = _lambda * AT(y) + z
         ctx.save_for_backward(AT(y), x0, sensitivity_maps, mask, _lambda)
 
-        return ConjugateGradient.solve(x0, M, ctx.tol, ctx.max_iter)
+        return ConjugateGradient.solve(x0, M, ctx.tol, ctx.max_iter, x_init)
 
     # pylint: disable=arguments-differ
     @staticmethod
     def backward(
         ctx: torch.autograd.function, grad_x: torch.Tensor
-    ) -> tuple[torch.Tensor, Any, None, None, None, None, None, None, None, None]:
+    ) -> tuple[torch.Tensor, Any, None, None, None, None, None, None, None, None, None]:
         """Backward pass of the conjugate gradient solver.
 
         Parameters
@@ -223,7 +219,7 @@ class ConjugateGradient(torch.autograd.Function):
             ).sum()
         )
 
-        return grad_z, grad_lambda, None, None, None, None, None, None, None, None
+        return grad_z, grad_lambda, None, None, None, None, None, None, None, None, None
 
 
 class DataIDLayer(torch.nn.Module):
@@ -340,6 +336,7 @@ class DataProxCGLayer(torch.nn.Module):
         fft_centered: bool = False,
         fft_normalization: str = "backward",
         spatial_dims: Optional[Tuple[int, int]] = None,
+        warm_start: bool = False,
     ):
         """Inits :class:`DataProxCGLayer`.
 
@@ -359,6 +356,9 @@ class DataProxCGLayer(torch.nn.Module):
             FFT normalization. Default is ``"backward"``.
         spatial_dims : tuple of int
             Spatial dimensions of the FFT. Default is ``None``.
+        warm_start : bool
+            If True, the Conjugate Gradient solver starts from the input prediction instead of zeros. Default is
+            ``False``.
         """
         super().__init__()
 
@@ -369,6 +369,7 @@ class DataProxCGLayer(torch.nn.Module):
 
         self.tol = tol
         self.iter = iterations
+        self.warm_start = warm_start
 
         self.op = ConjugateGradient
 
@@ -406,6 +407,7 @@ class DataProxCGLayer(torch.nn.Module):
             self.fft_centered,
             self.fft_normalization,
             self.spatial_dims,
+            x.detach() if self.warm_start else None,
         )
 
     def set_learnable(self, flag: bool):
@@ -0,0 +1,182 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+import torch
+
+__all__ = ["batched_dot", "conjugate_gradient", "conjugate_gradient_solve"]
+
+
+def batched_dot(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """Computes the complex dot product of every example of two batches.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Complex batch. Shape [batch_size, ...].
+    y : torch.Tensor
+        Complex batch. Shape [batch_size, ...].
+
+    Returns
+    -------
+    torch.Tensor
+        The dot products :math:`x_i^H y_i`, with shape [batch_size, 1, ..., 1] to broadcast with the batches.
+    """
+    return torch.sum(torch.conj(x) * y, dim=tuple(range(1, x.dim())), keepdim=True)
+
+
+@torch.no_grad()
+def conjugate_gradient_solve(
+    operator: Callable[[torch.Tensor], torch.Tensor],
+    rhs: torch.Tensor,
+    x0: Optional[torch.Tensor] = None,
+    max_iter: int = 10,
+    tol: float = 0.0,
+) -> torch.Tensor:
+    """Solves the linear systems :math:`A x_i = b_i` of every example of a batch with the conjugate gradient method.
+
+    Every example has its own step sizes and stops when its residual is small enough, i.e.
+    :math:`\\|b_i - A x_i\\| \\leq tol \\|b_i\\|`. Converged examples are not updated anymore, and the iterations stop
+    when all examples have converged.
+
+    Parameters
+    ----------
+    operator : Callable[[torch.Tensor], torch.Tensor]
+        The Hermitian positive definite operator :math:`A`, applied to every example of a batch.
+    rhs : torch.Tensor
+        The right-hand sides :math:`b`. Complex, shape [batch_size, ...].
+    x0 : torch.Tensor, optional
+        Initial guess, e.g. the solution of the previous cascade. If ``None``, zeros. Default is ``None``.
+    max_iter : int, optional
+        Maximum number of iterations. Default is ``10``.
+    tol : float, optional
+        Relative residual tolerance. If ``0``, ``max_iter`` iterations are always run. Default is ``0.0``.
+
+    Returns
+    -------
+    torch.Tensor
+        The solutions. Shape [batch_size, ...].
+    """
+    if x0 is None:
+        x = torch.zeros_like(rhs)
+        r = rhs.clone()
+    else:
+        x = x0.clone()
+        r = rhs - operator(x)
+    p = r.clone()
+    rs = batched_dot(r, r).real
+    threshold = tol**2 * batched_dot(rhs, rhs).real
+    active = rs > threshold
+
+    for _ in range(max_iter):
+        if tol > 0 and not active.any():
+            break
+        Ap = operator(p)
+        pAp = batched_dot(p, Ap)
+        alpha = torch.where(active, rs / torch.where(active, pAp, torch.ones_like(pAp)), torch.zeros_like(pAp))
+        x = x + alpha * p
+        r = r - alpha * Ap
+        rs_new = batched_dot(r, r).real
+        beta = torch.where(active, rs_new / torch.where(active, rs, torch.ones_like(rs)), torch.zeros_like(rs))
+        p = r + beta * p
+        rs = torch.where(active, rs_new, rs)
+        active = active & (rs > threshold)
+    return x
+
+
+class _ConjugateGradient(torch.autograd.Function):
+    """Conjugate gradient solver, differentiated implicitly.
+
+    The gradient is computed from the solution only, instead of back-propagating through the iterations, so memory
+    does not grow with the number of iterations. For :math:`x = A^{-1} b`, the gradient of :math:`b` is
+    :math:`v = A^{-1} \\bar{x}` and the gradients of the parameters of :math:`A` are those of :math:`-v^H A x`.
+    """
+
+    # pylint: disable=arguments-differ
+    @staticmethod
+    def forward(
+        ctx: Any,
+        operator: Callable[[torch.Tensor], torch.Tensor],
+        rhs: torch.Tensor,
+        x0: Optional[torch.Tensor],
+        max_iter: int,
+        tol: float,
+        *params: torch.Tensor,
+    ) -> torch.Tensor:
+        """Forward pass of :class:`_ConjugateGradient`, see :func:`conjugate_gradient`."""
+        x = conjugate_gradient_solve(operator, rhs, x0, max_iter, tol)
+        ctx.operator = operator
+        ctx.max_iter = max_iter
+        ctx.tol = tol
+        ctx.save_for_backward(x, *params)
+        return x
+
+    # pylint: disable=arguments-differ
+    @staticmethod
+    def backward(ctx: Any, grad_x: torch.Tensor) -> Tuple[Optional[torch.Tensor], ...]:
+        """Backward pass of :class:`_ConjugateGradient`."""
+        x, *params = ctx.saved_tensors
+        # the operator is Hermitian, so the adjoint system is solved with the same operator
+        v = conjugate_gradient_solve(ctx.operator, grad_x, None, ctx.max_iter, ctx.tol)
+
+        params_grads = [None] * len(params)
+        differentiable = [i for i, param in enumerate(params) if param.requires_grad]
+        if differentiable:
+            with torch.enable_grad():
+                Ax = ctx.operator(x.detach())
+            grads = torch.autograd.grad(Ax, [params[i] for i in differentiable], grad_outputs=-v, allow_unused=True)
+            for i, grad in zip(differentiable, grads):
+                params_grads[i] = grad
+
+        rhs_grad = v if ctx.needs_input_grad[1] else None
+        return (None, rhs_grad, None, None, None, *params_grads)
+
+
+def conjugate_gradient(
+    operator: Callable[[torch.Tensor], torch.Tensor],
+    rhs: torch.Tensor,
+    params: Sequence[torch.Tensor] = (),
+    x0: Optional[torch.Tensor] = None,
+    max_iter: int = 10,
+    tol: float = 0.0,
+) -> torch.Tensor:
+    """Solves the linear systems :math:`A x_i = b_i` of a batch with the conjugate gradient method, see
+    :func:`conjugate_gradient_solve`, with an implicit-differentiation backward pass.
+
+    Parameters
+    ----------
+    operator : Callable[[torch.Tensor], torch.Tensor]
+        The Hermitian positive definite operator :math:`A`, applied to every example of a batch.
+    rhs : torch.Tensor
+        The right-hand sides :math:`b`. Complex, shape [batch_size, ...].
+    params : Sequence[torch.Tensor], optional
+        The tensors the operator depends on, e.g. the sensitivity maps and the regularization weight, which get
+        gradients. Default is ``()``.
+    x0 : torch.Tensor, optional
+        Initial guess, e.g. the solution of the previous cascade. It is not differentiated. Default is ``None``.
+    max_iter : int, optional
+        Maximum number of iterations. Default is ``10``.
+    tol : float, optional
+        Relative residual tolerance. If ``0``, ``max_iter`` iterations are always run. Default is ``0.0``.
+
+    Returns
+    -------
+    torch.Tensor
+        The solutions. Shape [batch_size, ...].
+
+    Examples
+    --------
+    >>> import torch
+    >>> from atommic.collections.reconstruction.parts.conjugate_gradient import conjugate_gradient
+    >>> weights = torch.tensor([[1.0, 2.0], [3.0, 4.0]], dtype=torch.complex64)
+    >>> rhs = torch.ones(2, 2, dtype=torch.complex64)
+    >>> conjugate_gradient(lambda x: weights * x, rhs, max_iter=5, tol=1e-6)
+    tensor([[1.0000+0.j, 0.5000+0.j],
+            [0.3333+0.j, 0.2500+0.j]])
+    """
+    if x0 is not None:
+        x0 = x0.detach()
+    if torch.is_grad_enabled() and (rhs.requires_grad or any(param.requires_grad for param in params)):
+        return _ConjugateGradient.apply(operator, rhs, x0, max_iter, tol, *params)
+    return conjugate_gradient_solve(operator, rhs, x0, max_iter, tol)
@@ -4,18 +4,26 @@ __author__ = "Dimitris Karkalousos"
 import json
 import logging
 import os
-import random
 from pathlib import Path
 from typing import Callable, Dict, Optional, Tuple, Union
 
 import h5py
 import nibabel as nib
 import numpy as np
-import yaml  # type: ignore
 from nibabel.filebasedimages import FileBasedImage
 from torch.utils.data import Dataset
 
+from atommic.collections.common.data.dataset_index import (
+    VolumeIndex,
+    dataset_index_path,
+    load_dataset_index,
+    scan_metadata,
+    subsample_examples,
+)
+from atommic.collections.common.data.file_pool import HDF5FilePool
 from atommic.collections.common.data.mri_loader import MRIDataset
+from atommic.collections.common.data.nifti_volumes import NiftiVolumeCache
+from atommic.collections.common.data.slice_window import SliceWindowCache, read_consecutive_slices
 from atommic.collections.common.parts.utils import is_none
 
 
@@ -246,7 +254,7 @@ class SegmentationMRIDataset(MRIDataset):
     def __getitem__(self, i: int):  # noqa: MC0001
         """Get item from :class:`SegmentationMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
-        with h5py.File(fname, "r") as hf:
+        with self.file_pool.open(fname) as hf:
             if self.complex_data:
                 kspace = self.get_consecutive_slices(hf, "kspace", dataslice).astype(np.complex64)
 
@@ -269,7 +277,9 @@ class SegmentationMRIDataset(MRIDataset):
                             if os.path.exists(coil_sensitivity_maps_root / Path(split_dir[-2]) / fname.name):
                                 break
                     # load coil sensitivity maps
-                    with h5py.File(Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name, "r") as sf:
+                    with self.file_pool.open(
+                        Path(coil_sensitivity_maps_root) / Path(split_dir[-2]) / fname.name
+                    ) as sf:
                         if "sensitivity_map" in sf or "sensitivity_map" in next(iter(sf.keys())):
                             sensitivity_map = (
                                 self.get_consecutive_slices(sf, "sensitivity_map", dataslice)
@@ -283,7 +293,7 @@ class SegmentationMRIDataset(MRIDataset):
                     if mask.ndim == 3:
                         mask = mask[dataslice]
                 elif self.mask_root is not None and self.mask_root != "None":
-                    with h5py.File(Path(self.mask_root) / fname.name, "r") as mf:
+                    with self.file_pool.open(Path(self.mask_root) / fname.name) as mf:
                         mask = np.asarray(self.get_consecutive_slices(mf, "mask", dataslice))
 
                 imspace = np.empty([])
@@ -304,7 +314,7 @@ class SegmentationMRIDataset(MRIDataset):
 
             segmentation_labels = np.empty([])
             if self.segmentations_root is not None and self.segmentations_root != "None":
-                with h5py.File(Path(self.segmentations_root) / fname.name, "r") as sf:
+                with self.file_pool.open(Path(self.segmentations_root) / fname.name) as sf:
                     segmentation_labels = np.asarray(self.get_consecutive_slices(sf, "segmentation", dataslice))
                     segmentation_labels = self.process_segmentation_labels(segmentation_labels)
             elif "segmentation" in hf:
@@ -313,7 +323,7 @@ class SegmentationMRIDataset(MRIDataset):
 
             initial_prediction = np.empty([])
             if not is_none(self.initial_predictions_root):
-                with h5py.File(Path(self.initial_predictions_root) / fname.name, "r") as ipf:  # type: ignore
+                with self.file_pool.open(Path(self.initial_predictions_root) / fname.name) as ipf:  # type: ignore
                     if "reconstruction" in hf:
                         initial_prediction = (
                             self.get_consecutive_slices(ipf, "reconstruction", dataslice)
@@ -346,6 +356,12 @@ class SegmentationMRIDataset(MRIDataset):
 
             attrs.update(metadata)
 
+            if self.complex_data:
+                # the noise prewhitening patch of the volume is searched on its middle slice
+                reference = self.get_noise_prewhitening_reference(hf, "kspace", fname.name, dataslice)
+                if reference is not None:
+                    attrs["noise_prewhitening_reference"] = reference.astype(np.complex64)
+
         if sensitivity_map.shape != kspace.shape and sensitivity_map.ndim > 1:
             if sensitivity_map.ndim == 3:
                 sensitivity_map = np.transpose(sensitivity_map, (2, 0, 1))
@@ -418,6 +434,11 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
         segmentation_classes_to_separate: Optional[Tuple[int]] = None,
         segmentation_classes_thresholds: Optional[Tuple[float]] = None,
         complex_data: bool = True,
+        file_handle_pool_size: int = 16,
+        nifti_volume_cache_size: int = 4,
+        slice_window_cache_size: int = 8,
+        metadata_scan_workers: int = 0,
+        metadata_scan_mode: str = "thread",
         **kwargs,  # pylint: disable=unused-argument
     ):
         """Inits :class:`BraTS2023AdultGliomaSegmentationMRIDataset`.
@@ -491,10 +512,32 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
             ``(0.5, 0.5, 0.5, 0.5, 0.5)``. Default is ``None``.
         complex_data : bool, optional
             Whether the data is complex. If ``False``, the data is assumed to be magnitude only. Default is ``True``.
+        file_handle_pool_size : int, optional
+            Number of HDF5 files that are kept open per worker, when the dataset is converted to HDF5 with
+            ``atommic convert``. Set to ``0`` to open and close the files on every read. Default is ``16``.
+        nifti_volume_cache_size : int, optional
+            Number of decoded NIfTI volumes that are kept in memory per worker, so that a compressed volume is decoded
+            once rather than for every slice. Set to ``0`` to decode the volume on every read. Default is ``4``.
+        slice_window_cache_size : int, optional
+            Number of HDF5 datasets, e.g. the ``kspace`` of a volume, whose last window of consecutive slices is kept
+            per worker when ``consecutive_slices`` > 1, so that the slices shared by the windows of adjacent slices are
+            read once. Set to ``0`` to read every window from the file. Default is ``8``.
+        metadata_scan_workers : int, optional
+            Number of workers used to read the metadata of the files when the dataset index is built. ``0`` reads the
+            files serially, ``-1`` uses all available cores. Default is ``0``.
+        metadata_scan_mode : str, optional
+            Whether the metadata is read by a pool of ``'thread'`` or ``'process'`` workers. Default is ``'thread'``.
         **kwargs : dict
             Additional keyword arguments.
         """
         super().__init__()
+        self.file_pool = HDF5FilePool(capacity=0 if is_none(file_handle_pool_size) else file_handle_pool_size)
+        self.volume_cache = NiftiVolumeCache(
+            capacity=0 if is_none(nifti_volume_cache_size) else nifti_volume_cache_size
+        )
+        self.slice_window_cache = SliceWindowCache(
+            capacity=0 if is_none(slice_window_cache_size) else slice_window_cache_size
+        )
         self.initial_predictions_root = initial_predictions_root
         self.dataset_format = dataset_format
 
@@ -513,12 +556,6 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
 
         self.dataset_cache_file = None if is_none(dataset_cache_file) else Path(dataset_cache_file)  # type: ignore
 
-        if self.dataset_cache_file is not None and self.dataset_cache_file.exists() and use_dataset_cache:
-            with open(self.dataset_cache_file, "rb") as f:
-                dataset_cache = yaml.safe_load(f)
-        else:
-            dataset_cache = {}
-
         if consecutive_slices < 1:
             raise ValueError(f"Consecutive slices {consecutive_slices} is out of range, must be > 0.")
         self.consecutive_slices = consecutive_slices
@@ -526,48 +563,44 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
         self.transform = transform
         self.data_saved_per_slice = data_saved_per_slice
 
-        self.examples = []
+        if str(root).endswith(".json"):
+            with open(root, "r") as f:  # type: ignore  # pylint: disable=unspecified-encoding
+                examples = json.load(f)
+            files = [Path(example) for example in examples]
+        else:
+            files = list(Path(root).iterdir())
 
-        # Check if our dataset is in the cache. If yes, use that metadata, if not, then regenerate the metadata.
-        if dataset_cache.get(root) is None or not use_dataset_cache:
-            if str(root).endswith(".json"):
-                with open(root, "r") as f:  # type: ignore  # pylint: disable=unspecified-encoding
-                    examples = json.load(f)
-                files = [Path(example) for example in examples]
-            else:
-                files = list(Path(root).iterdir())
+        dataset_index_file = (
+            dataset_index_path(
+                self.dataset_cache_file, root, f"{type(self).__name__}:{consecutive_slices}:{data_saved_per_slice}"
+            )
+            if use_dataset_cache
+            else None
+        )
+        self.examples = load_dataset_index(dataset_index_file, files)
 
-            for fname in sorted(files):
-                metadata, num_slices = self._retrieve_metadata(fname)
+        # Check if our dataset is in the cache. If yes, use that metadata, if not, then regenerate the metadata.
+        if self.examples is None:
+            volumes = []
 
+            files = sorted(files)
+            scanned = scan_metadata(self._retrieve_metadata, files, metadata_scan_workers, metadata_scan_mode)
+            for fname, (metadata, num_slices) in zip(files, scanned):
                 # Specific to SKM-TEA segmentation dataset, we need to remove the first 50 and last 65 slices
-                self.examples += [
-                    (fname, slice_ind, metadata) for slice_ind in range(num_slices) if 50 < slice_ind < num_slices - 65
-                ]
-
-            if dataset_cache.get(root) is None and use_dataset_cache:
-                dataset_cache[root] = self.examples
-                logging.info("Saving dataset cache to %s.", self.dataset_cache_file)
-                with open(self.dataset_cache_file, "wb") as f:  # type: ignore
-                    yaml.dump(dataset_cache, f)
+                volumes.append((fname, 51, num_slices - 65, metadata))
+
+            self.examples = VolumeIndex.from_rows(volumes)
+
+            if dataset_index_file is not None:
+                logging.info("Saving dataset cache to %s.", dataset_index_file)
+                self.examples.save(dataset_index_file)
         else:
-            logging.info("Using dataset cache from %s.", self.dataset_cache_file)
-            self.examples = dataset_cache[root]
+            logging.info("Using dataset cache from %s.", dataset_index_file)
 
         # subsample if desired
-        if sample_rate < 1.0:  # sample by slice
-            random.shuffle(self.examples)
-            num_examples = round(len(self.examples) * sample_rate)
-            self.examples = self.examples[:num_examples]
-        elif volume_sample_rate < 1.0:  # sample by volume
-            vol_names = sorted(list({f[0].stem for f in self.examples}))
-            random.shuffle(vol_names)
-            num_volumes = round(len(vol_names) * volume_sample_rate)
-            sampled_vols = vol_names[:num_volumes]
-            self.examples = [example for example in self.examples if example[0].stem in sampled_vols]
-
-        if num_cols and not is_none(num_cols):
-            self.examples = [ex for ex in self.examples if ex[2]["encoding_size"][1] in num_cols]
+        self.examples = subsample_examples(
+            self.examples, sample_rate, volume_sample_rate, None if is_none(num_cols) else num_cols
+        )
 
         self.indices_to_log = np.random.choice(
             len(self.examples), int(log_images_rate * len(self.examples)), replace=False  # type: ignore
@@ -611,8 +644,12 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
         Tuple[Dict, int]
             Metadata dictionary and number of slices in the file.
         """
-        data = self.__read_nifti__(fname)
-        num_slices = data.header["dim"][4]
+        if Path(fname).suffix == ".h5":
+            # converted with ``atommic convert``, slices first
+            with h5py.File(fname, "r") as hf:
+                num_slices = hf["target"].shape[0]
+        else:
+            num_slices = self.__read_nifti__(fname).header["dim"][4]
         # compute the mean and std of the data
         metadata = {
             "padding_left": 0,
@@ -640,7 +677,8 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
         np.ndarray
             Array of consecutive slices. If ``self.consecutive_slices`` is > 1, then the array will have shape
             ``(self.consecutive_slices, *data[key].shape[1:])``. Otherwise, the array will have shape
-            ``data[key].shape[1:]``.
+            ``data[key].shape[1:]``. Windows at the edges of the volume are padded with zero slices of the same
+            dtype.
 
         Examples
         --------
@@ -664,51 +702,28 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
                 return x[dataslice]
             return x
 
-        # get consecutive slices
-        num_slices = x.shape[0]
-
-        # If the number of consecutive slices is greater than or equal to the total slices, return the entire stack
-        if self.consecutive_slices >= num_slices:
-            # pad left and right with zero slices to match the desired number of slices
-            slices_to_add_start = (self.consecutive_slices - num_slices) // 2
-            slices_to_add_end = self.consecutive_slices - num_slices - slices_to_add_start
-            if slices_to_add_start > 0:
-                zero_slices = np.zeros((slices_to_add_start, *x.shape[1:]))
-                x = np.concatenate((zero_slices, x), axis=0)
-            if slices_to_add_end > 0:
-                zero_slices = np.zeros((slices_to_add_end, *x.shape[1:]))
-                x = np.concatenate((x, zero_slices), axis=0)
-            return x
-
-        # Calculate half of the consecutive slices to determine the middle position
-        half_slices = self.consecutive_slices // 2
-
-        # Determine the start and end slices based on the middle position
-        start_slice = dataslice - half_slices
-        end_slice = dataslice + half_slices + 1
+        return read_consecutive_slices(x, dataslice, self.consecutive_slices, window_cache=self.slice_window_cache)
 
-        # Handle edge cases
-        slices_to_add_start = 0
-        slices_to_add_end = 0
-        if start_slice < 0:
-            slices_to_add_start = abs(start_slice)
-            start_slice = 0
-
-        if end_slice > (num_slices - 1):
-            slices_to_add_end = end_slice - num_slices
-            extracted_slices = x[start_slice:]
-        else:
-            extracted_slices = x[start_slice:end_slice]
+    @staticmethod
+    def segmentation_one_hot(segmentation_labels: np.ndarray) -> np.ndarray:
+        """Converts the segmentation labels to the Necrotic Tumor Core (NCR - label 1), the Peritumoral
+        Edematous/Invaded Tissue (ED - label 2), the GD-Enhancing Tumor (ET - label 3), and the Whole Tumor (WT -
+        label 1, 2, or 3) classes.
 
-        # Add slices to the start and end if needed
-        if slices_to_add_start > 0:
-            zero_slices = np.zeros((slices_to_add_start, *extracted_slices.shape[1:]))
-            extracted_slices = np.concatenate((zero_slices, extracted_slices), axis=0)
-        if slices_to_add_end > 0:
-            zero_slices = np.zeros((slices_to_add_end, *extracted_slices.shape[1:]))
-            extracted_slices = np.concatenate((extracted_slices, zero_slices), axis=0)
+        Parameters
+        ----------
+        segmentation_labels : np.ndarray
+            The segmentation labels.
 
-        return extracted_slices
+        Returns
+        -------
+        np.ndarray
+            The boolean classes, stacked at the first dimension.
+        """
+        return np.stack(
+            [segmentation_labels == 1, segmentation_labels == 2, segmentation_labels == 3, segmentation_labels != 0],
+            axis=0,
+        )
 
     def __len__(self):
         """Length of :class:`MRIDataset`."""
@@ -718,37 +733,29 @@ class BraTS2023AdultGliomaSegmentationMRIDataset(Dataset):
         """Get item from :class:`BraTS2023AdultGliomaSegmentationMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
 
-        imspace = self.get_consecutive_slices(
-            {"target": np.moveaxis(self.__read_nifti__(fname).get_fdata(), -1, 0)}, "target", dataslice
-        ).astype(np.float32)
-
-        segmentation_path = Path(self.segmentations_root) / Path(  # type: ignore
-            str(fname.name).replace(".nii.gz", "-seg.nii.gz")
-        )
+        if fname.suffix == ".h5":
+            # converted with ``atommic convert``, the one-hot segmentation is precomputed
+            with self.file_pool.open(fname) as hf:
+                imspace = self.get_consecutive_slices(hf, "target", dataslice).astype(np.float32)
+                segmentation_labels = self.get_consecutive_slices(hf, "segmentation", dataslice).astype(np.float32)
+        else:
+            imspace = self.get_consecutive_slices(
+                {"target": np.moveaxis(self.volume_cache.get(fname), -1, 0)}, "target", dataslice
+            ).astype(np.float32)
 
-        segmentation_labels = self.get_consecutive_slices(
-            {"segmentation": np.moveaxis(self.__read_nifti__(segmentation_path).get_fdata(), -1, 0)},
-            "segmentation",
-            dataslice,
-        )
+            segmentation_path = Path(self.segmentations_root) / Path(  # type: ignore
+                str(fname.name).replace(".nii.gz", "-seg.nii.gz")
+            )
 
-        # Necrotic Tumor Core (NCR - label 1)
-        ncr = np.zeros_like(segmentation_labels)
-        ncr[segmentation_labels == 1] = 1
-        # Peritumoral Edematous/Invaded Tissue (ED - label 2)
-        ed = np.zeros_like(segmentation_labels)
-        ed[segmentation_labels == 2] = 1
-        # GD-Enhancing Tumor (ET - label 3)
-        et = np.zeros_like(segmentation_labels)
-        et[segmentation_labels == 3] = 1
-        # Whole Tumor (WT — label 1, 2, or 3)
-        wt = np.zeros_like(segmentation_labels)
-        wt[segmentation_labels != 0] = 1
-
-        segmentation_labels = np.stack([ncr, ed, et, wt], axis=0).astype(np.float32)
+            segmentation_labels = self.get_consecutive_slices(
+                {"segmentation": np.moveaxis(self.volume_cache.get(segmentation_path), -1, 0)},
+                "segmentation",
+                dataslice,
+            )
+            segmentation_labels = self.segmentation_one_hot(segmentation_labels).astype(np.float32)
 
-        if self.consecutive_slices > 1:
-            segmentation_labels = np.moveaxis(segmentation_labels, 0, 1)
+            if self.consecutive_slices > 1:
+                segmentation_labels = np.moveaxis(segmentation_labels, 0, 1)
 
         kspace = np.empty([])
         target = imspace
@@ -825,8 +832,12 @@ class ISLES2022SubAcuteStrokeSegmentationMRIDataset(SegmentationMRIDataset):
         Tuple[Dict, int]
             Metadata dictionary and number of slices in the file.
         """
-        data = self.__read_nifti__(fname)
-        num_slices = data.header["dim"][4]
+        if Path(fname).suffix == ".h5":
+            # converted with ``atommic convert``, slices first
+            with h5py.File(fname, "r") as hf:
+                num_slices = hf["target"].shape[0]
+        else:
+            num_slices = self.__read_nifti__(fname).header["dim"][4]
         metadata = {
             "padding_left": 0,
             "padding_right": 0,
@@ -836,13 +847,48 @@ class ISLES2022SubAcuteStrokeSegmentationMRIDataset(SegmentationMRIDataset):
         }
         return metadata, num_slices
 
+    @staticmethod
+    def segmentation_one_hot(segmentation_labels: np.ndarray) -> np.ndarray:
+        """Converts the segmentation labels to the Lesions (label 1) class.
+
+        Parameters
+        ----------
+        segmentation_labels : np.ndarray
+            The segmentation labels.
+
+        Returns
+        -------
+        np.ndarray
+            The boolean class, stacked at the first dimension.
+        """
+        return np.stack([segmentation_labels == 1], axis=0)
+
     def __getitem__(self, i: int):
         """Get item from :class:`ISLES2022SubAcuteStrokeSegmentationMRIDataset`."""
         fname, dataslice, metadata = self.examples[i]
 
-        imspace = self.get_consecutive_slices(
-            {"target": np.moveaxis(self.__read_nifti__(fname).get_fdata(), -1, 0)}, "target", dataslice
-        ).astype(np.float32)
+        if fname.suffix == ".h5":
+            # converted with ``atommic convert``, the one-hot segmentation is precomputed
+            with self.file_pool.open(fname) as hf:
+                imspace = self.get_consecutive_slices(hf, "target", dataslice).astype(np.float32)
+                segmentation_labels = self.get_consecutive_slices(hf, "segmentation", dataslice).astype(np.float32)
+            if self.consecutive_slices > 1:
+                # bring the segmentation classes dimension first, as the one-hot of the labels
+                segmentation_labels = np.moveaxis(segmentation_labels, 0, 1)
+        else:
+            imspace = self.get_consecutive_slices(
+                {"target": np.moveaxis(self.volume_cache.get(fname), -1, 0)}, "target", dataslice
+            ).astype(np.float32)
+
+            segmentation_path = Path(self.segmentations_root) / Path(  # type: ignore
+                str(fname.name).replace(".nii.gz", "-seg.nii.gz")
+            )
+            segmentation_labels = self.get_consecutive_slices(
+                {"segmentation": np.moveaxis(self.volume_cache.get(segmentation_path), -1, 0)},
+                "segmentation",
+                dataslice,
+            )
+            segmentation_labels = self.segmentation_one_hot(segmentation_labels).astype(np.float32)
 
         if self.consecutive_slices > 1:
             imspace = np.moveaxis(imspace, 0, 1)
@@ -857,22 +903,6 @@ class ISLES2022SubAcuteStrokeSegmentationMRIDataset(SegmentationMRIDataset):
         # normalize all by min and max values of all channels
         imspace = (imspace - np.min(imspace)) / (np.max(imspace) - np.min(imspace))
 
-        segmentation_path = Path(self.segmentations_root) / Path(  # type: ignore
-            str(fname.name).replace(".nii.gz", "-seg.nii.gz")
-        )
-        segmentation_labels = self.get_consecutive_slices(
-            {"segmentation": np.moveaxis(self.__read_nifti__(segmentation_path).get_fdata(), -1, 0)},
-            "segmentation",
-            dataslice,
-        ).astype(np.float32)
-
-        # Lesions (label 1)
-        lesions = np.zeros_like(segmentation_labels)
-        lesions[segmentation_labels == 1] = 1
-
-        # stack lesions as a new channel
-        segmentation_labels = np.stack([lesions], axis=0).astype(np.float32)
-
         if self.consecutive_slices > 1:
             # bring the segmentation classes dimension back to the first dimension
             imspace = np.moveaxis(imspace, 0, 1)
@@ -947,6 +977,8 @@ class SKMTEASegmentationMRIDataset(Dataset):
         segmentation_classes_to_separate: Optional[Tuple[int]] = None,
         segmentation_classes_thresholds: Optional[Tuple[float]] = None,
         complex_data: bool = True,
+        metadata_scan_workers: int = 0,
+        metadata_scan_mode: str = "thread",
         **kwargs,  # pylint: disable=unused-argument
     ):
         """Inits :class:`SKMTEASegmentationMRIDataset`.
@@ -1020,6 +1052,11 @@ class SKMTEASegmentationMRIDataset(Dataset):
             ``(0.5, 0.5, 0.5, 0.5, 0.5)``. Default is ``None``.
         complex_data : bool, optional
             Whether the data is complex. If ``False``, the data is assumed to be magnitude only. Default is ``True``.
+        metadata_scan_workers : int, optional
+            Number of workers used to read the metadata of the files when the dataset index is built. ``0`` reads the
+            files serially, ``-1`` uses all available cores. Default is ``0``.
+        metadata_scan_mode : str, optional
+            Whether the metadata is read by a pool of ``'thread'`` or ``'process'`` workers. Default is ``'thread'``.
         **kwargs : dict
             Additional keyword arguments.
         """
@@ -1042,12 +1079,6 @@ class SKMTEASegmentationMRIDataset(Dataset):
 
         self.dataset_cache_file = None if is_none(dataset_cache_file) else Path(dataset_cache_file)  # type: ignore
 
-        if self.dataset_cache_file is not None and self.dataset_cache_file.exists() and use_dataset_cache:
-            with open(self.dataset_cache_file, "rb") as f:
-                dataset_cache = yaml.safe_load(f)
-        else:
-            dataset_cache = {}
-
         if consecutive_slices < 1:
             raise ValueError(f"Consecutive slices {consecutive_slices} is out of range, must be > 0.")
         self.consecutive_slices = consecutive_slices
@@ -1055,48 +1086,44 @@ class SKMTEASegmentationMRIDataset(Dataset):
         self.transform = transform
         self.data_saved_per_slice = data_saved_per_slice
 
-        self.examples = []
+        if str(root).endswith(".json"):
+            with open(root, "r") as f:  # type: ignore  # pylint: disable=unspecified-encoding
+                examples = json.load(f)
+            files = [Path(example) for example in examples]
+        else:
+            files = list(Path(root).iterdir())
 
-        # Check if our dataset is in the cache. If yes, use that metadata, if not, then regenerate the metadata.
-        if dataset_cache.get(root) is None or not use_dataset_cache:
-            if str(root).endswith(".json"):
-                with open(root, "r") as f:  # type: ignore  # pylint: disable=unspecified-encoding
-                    examples = json.load(f)
-                files = [Path(example) for example in examples]
-            else:
-                files = list(Path(root).iterdir())
+        dataset_index_file = (
+            dataset_index_path(
+                self.dataset_cache_file, root, f"{type(self).__name__}:{consecutive_slices}:{data_saved_per_slice}"
+            )
+            if use_dataset_cache
+            else None
+        )
+        self.examples = load_dataset_index(dataset_index_file, files)
 
-            for fname in sorted(files):
-                metadata, num_slices = self._retrieve_metadata(fname)
+        # Check if our dataset is in the cache. If yes, use that metadata, if not, then regenerate the metadata.
+        if self.examples is None:
+            volumes = []
 
+            files = sorted(files)
+            scanned = scan_metadata(self._retrieve_metadata, files, metadata_scan_workers, metadata_scan_mode)
+            for fname, (metadata, num_slices) in zip(files, scanned):
                 # Specific to SKM-TEA segmentation dataset, we need to remove the first and last 30 slices
-                self.examples += [
-                    (fname, slice_ind, metadata) for slice_ind in range(num_slices) if 30 < slice_ind < num_slices - 30
-                ]
-
-            if dataset_cache.get(root) is None and use_dataset_cache:
-                dataset_cache[root] = self.examples
-                logging.info("Saving dataset cache to %s.", self.dataset_cache_file)
-                with open(self.dataset_cache_file, "wb") as f:  # type: ignore
-                    yaml.dump(dataset_cache, f)
+                volumes.append((fname, 31, num_slices - 30, metadata))
+
+            self.examples = VolumeIndex.from_rows(volumes)
+
+            if dataset_index_file is not None:
+                logging.info("Saving dataset cache to %s.", dataset_index_file)
+                self.examples.save(dataset_index_file)
         else:
-            logging.info("Using dataset cache from %s.", self.dataset_cache_file)
-            self.examples = dataset_cache[root]
+            logging.info("Using dataset cache from %s.", dataset_index_file)
 
         # subsample if desired
-        if sample_rate < 1.0:  # sample by slice
-            random.shuffle(self.examples)
-            num_examples = round(len(self.examples) * sample_rate)
-            self.examples = self.examples[:num_examples]
-        elif volume_sample_rate < 1.0:  # sample by volume
-            vol_names = sorted(list({f[0].stem for f in self.examples}))
-            random.shuffle(vol_names)
-            num_volumes = round(len(vol_names) * volume_sample_rate)
-            sampled_vols = vol_names[:num_volumes]
-            self.examples = [example for example in self.examples if example[0].stem in sampled_vols]
-
-        if num_cols and not is_none(num_cols):
-            self.examples = [ex for ex in self.examples if ex[2]["encoding_size"][1] in num_cols]
+        self.examples = subsample_examples(
+            self.examples, sample_rate, volume_sample_rate, None if is_none(num_cols) else num_cols
+        )
 
         self.indices_to_log = np.random.choice(
             len(self.examples), int(log_images_rate * len(self.examples)), replace=False  # type: ignore
@@ -1144,51 +1171,7 @@ class SKMTEASegmentationMRIDataset(Dataset):
                 return x[:, :, dataslice]
             return x
 
-        # get consecutive slices
-        num_slices = x.shape[2]
-
-        # If the number of consecutive slices is greater than or equal to the total slices, return the entire stack
-        if self.consecutive_slices >= num_slices:
-            # pad left and right with zero slices to match the desired number of slices
-            slices_to_add_start = (self.consecutive_slices - num_slices) // 2
-            slices_to_add_end = self.consecutive_slices - num_slices - slices_to_add_start
-            if slices_to_add_start > 0:
-                zero_slices = np.zeros((x.shape[0], x.shape[1], slices_to_add_start))
-                x = np.concatenate((zero_slices, x), axis=2)
-            if slices_to_add_end > 0:
-                zero_slices = np.zeros((x.shape[0], x.shape[1], slices_to_add_end))
-                x = np.concatenate((x, zero_slices), axis=2)
-            return x
-
-        # Calculate half of the consecutive slices to determine the middle position
-        half_slices = self.consecutive_slices // 2
-
-        # Determine the start and end slices based on the middle position
-        start_slice = dataslice - half_slices
-        end_slice = dataslice + half_slices + 1
-
-        # Handle edge cases
-        slices_to_add_start = 0
-        slices_to_add_end = 0
-        if start_slice < 0:
-            slices_to_add_start = abs(start_slice)
-            start_slice = 0
-
-        if end_slice > (num_slices - 1):
-            slices_to_add_end = end_slice - num_slices
-            extracted_slices = x[:, :, start_slice:]
-        else:
-            extracted_slices = x[:, :, start_slice:end_slice]
-
-        # Add slices to the start and end if needed
-        if slices_to_add_start > 0:
-            zero_slices = np.zeros((x.shape[0], x.shape[1], slices_to_add_start))
-            extracted_slices = np.concatenate((zero_slices, extracted_slices), axis=2)
-        if slices_to_add_end > 0:
-            zero_slices = np.zeros((x.shape[0], x.shape[1], slices_to_add_end))
-            extracted_slices = np.concatenate((extracted_slices, zero_slices), axis=2)
-
-        return extracted_slices
+        return read_consecutive_slices(x, dataslice, self.consecutive_slices, axis=2)
 
     def __len__(self):
         """Length of :class:`MRIDataset`."""
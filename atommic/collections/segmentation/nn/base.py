@@ -1,20 +1,18 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import os
 import warnings
 from abc import ABC
 from collections import defaultdict
-from pathlib import Path
 from typing import Dict, Tuple, Union
 
-import h5py
-import numpy as np
 import torch
 from omegaconf import DictConfig, OmegaConf
 from pytorch_lightning import Trainer
 from torch.utils.data import DataLoader
 
+from atommic.collections.common.data.file_pool import worker_init_fn
+from atommic.collections.common.data.samplers import DistributedVolumeSampler
 from atommic.collections.common.data.subsample import create_masker
 from atommic.collections.common.losses import VALID_SEGMENTATION_LOSSES
 from atommic.collections.common.losses.aggregator import AggregatorLoss
@@ -691,7 +689,12 @@ class BaseMRISegmentationModel(BaseMRIModel, ABC):
         if '.nii.gz' in fname or '.nii' in fname or '.h5' in fname:  # type: ignore
             fname = fname.split('.')[0]  # type: ignore
 
-        self.test_step_outputs.append([fname, slice_idx, predictions.detach().cpu()])
+        predictions = predictions.detach().cpu().numpy()
+        if self.consecutive_slices > 1:
+            # always keep the middle slice
+            predictions = predictions[self.consecutive_slices // 2]
+
+        self.get_predictions_writer("segmentations").write(fname, slice_idx, {"segmentation": predictions})
 
     def on_validation_epoch_end(self):
         """Called at the end of validation epoch to aggregate outputs.
@@ -775,27 +778,8 @@ class BaseMRISegmentationModel(BaseMRIModel, ABC):
         for metric, value in metrics.items():
             self.log(f"test_metrics/{metric}", value / tot_examples, prog_bar=True, sync_dist=True)
 
-        segmentations = defaultdict(list)
-        for fname, slice_num, segmentations_pred in self.test_step_outputs:
-            segmentations[fname].append((slice_num, segmentations_pred))
-
-        for fname in segmentations:
-            segmentations[fname] = np.stack([out for _, out in sorted(segmentations[fname])])
-
-        if self.consecutive_slices > 1:
-            # iterate over the slices and always keep the middle slice
-            for fname in segmentations:
-                segmentations[fname] = segmentations[fname][:, self.consecutive_slices // 2]
-
-        if "wandb" in self.logger.__module__.lower():
-            out_dir = Path(os.path.join(self.logger.save_dir, "segmentations"))
-        else:
-            out_dir = Path(os.path.join(self.logger.log_dir, "segmentations"))
-        out_dir.mkdir(exist_ok=True, parents=True)
-
-        for fname, segmentations_pred in segmentations.items():
-            with h5py.File(out_dir / fname, "w") as hf:
-                hf.create_dataset("segmentation", data=segmentations_pred)
+        # Flush the predictions that are not written yet.
+        self.close_predictions_writer()
 
     @staticmethod
     def _setup_dataloader_from_config(cfg: DictConfig) -> DataLoader:
@@ -830,7 +814,7 @@ class BaseMRISegmentationModel(BaseMRIModel, ABC):
                 center_fractions = center_fractions * 2
             mask_center_scale = mask_args.get("center_scale", 0.02)
 
-            mask_func = [create_masker(mask_type, center_fractions, accelerations)]
+            mask_func = [create_masker(mask_type, center_fractions, accelerations, mask_args.get("mask_bank_size", 0))]
 
         complex_data = cfg.get("complex_data", True)
 
@@ -867,6 +851,11 @@ class BaseMRISegmentationModel(BaseMRIModel, ABC):
             n2r_supervised_rate=cfg.get("n2r_supervised_rate", 0.0),
             complex_target=cfg.get("complex_target", False),
             log_images_rate=cfg.get("log_images_rate", 1.0),
+            file_handle_pool_size=cfg.get("file_handle_pool_size", 16),
+            slice_window_cache_size=cfg.get("slice_window_cache_size", 8),
+            nifti_volume_cache_size=cfg.get("nifti_volume_cache_size", 4),
+            metadata_scan_workers=cfg.get("metadata_scan_workers", 0),
+            metadata_scan_mode=cfg.get("metadata_scan_mode", "thread"),
             transform=SegmentationMRIDataTransforms(
                 complex_data=complex_data,
                 dataset_format=dataset_format,
@@ -937,7 +926,16 @@ class BaseMRISegmentationModel(BaseMRIModel, ABC):
             segmentation_classes_thresholds=cfg.get("segmentation_classes_thresholds", None),
             complex_data=complex_data,
         )
-        if cfg.shuffle:
+        if cfg.get("volume_sampler", False):
+            # sample volume by volume, so that the workers reuse their open files and decoded volumes
+            sampler = DistributedVolumeSampler(
+                dataset,
+                shuffle=cfg.shuffle,
+                slice_block_size=cfg.get("slice_block_size", None),
+                num_workers=cfg.get("num_workers", 4),
+                batch_size=cfg.get("batch_size", 1),
+            )
+        elif cfg.shuffle:
             sampler = torch.utils.data.RandomSampler(dataset)
         else:
             sampler = torch.utils.data.SequentialSampler(dataset)
@@ -948,5 +946,6 @@ class BaseMRISegmentationModel(BaseMRIModel, ABC):
             sampler=sampler,
             num_workers=cfg.get("num_workers", 4),
             pin_memory=cfg.get("pin_memory", False),
+            worker_init_fn=worker_init_fn,
             drop_last=cfg.get("drop_last", False),
         )
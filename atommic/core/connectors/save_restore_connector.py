@@ -18,6 +18,7 @@ from pytorch_lightning.trainer.trainer import Trainer
 
 # to avoid circular import do not import ModelPT directly
 from atommic.core import classes as atommic_classes
+from atommic.core.connectors.tensor_file import load_tensor_file, mmap_file, save_tensor_file
 from atommic.utils import logging, model_utils
 from atommic.utils.app_state import AppState
 from atommic.utils.get_rank import is_global_rank_zero
@@ -30,17 +31,21 @@ class SaveRestoreConnector:
         """Inits :class:`SaveRestoreConnector`."""
         self._model_config_yaml = "model_config.yaml"
         self._model_weights_ckpt = "model_weights.ckpt"
+        self._model_weights_tensor_file = "model_weights.safetensors"
         self._model_extracted_dir = None
+        self._weights_format = "ckpt"
+        self._share_weights = False
 
     def save_to(self, model: "atommic.ModelPT", save_path: str):  # type: ignore  # noqa: F821
         """Saves model instance (weights and configuration) into .atommic file.
 
         You can use "restore_from" method to fully restore instance from .atommic file.
 
-        .atommic file is an archive (tar.gz) with the following:
+        .atommic file is an archive (tar) with the following:
         - model_config.yaml - model configuration in .yaml format. You can deserialize this into cfg argument for
         model's constructor
-        - model_weights.ckpt - model checkpoint
+        - model_weights.ckpt - model checkpoint, or model_weights.safetensors if ``weights_format`` is
+        ``"safetensors"``, which is restored without copies from a memory map of the archive
 
         Parameters
         ----------
@@ -60,7 +65,10 @@ class SaveRestoreConnector:
                     self._handle_artifacts(model, atommic_file_folder=tmpdir)
                     # We should not update self._cfg here - the model can still be in use
                     self._update_artifact_paths(model, path2yaml_file=config_yaml)
-                self._save_state_dict_to_disk(model.state_dict(), model_weights)
+                if self.weights_format == "safetensors":
+                    save_tensor_file(model.state_dict(), os.path.join(tmpdir, self.model_weights_tensor_file))
+                else:
+                    self._save_state_dict_to_disk(model.state_dict(), model_weights)
                 self._make_atommic_file_from_folder(filename=save_path, source_dir=tmpdir)
         else:
             return
@@ -119,6 +127,7 @@ class SaveRestoreConnector:
                 map_location = torch.device("cpu")
 
         app_state = AppState()
+        model_parallel = app_state.model_parallel_size is not None and app_state.model_parallel_size > 1
         with tempfile.TemporaryDirectory() as tmpdir:
             try:
                 # Check if self.model_extracted_dir is set, and is a valid path
@@ -130,9 +139,13 @@ class SaveRestoreConnector:
                     # Override `tmpdir` above with the pre-extracted `model_extracted_dir`
                     tmpdir = self.model_extracted_dir
                 else:
-                    # Extract the atommic file into the temporary directory
+                    # Extract the config and the artifacts of the atommic file into the temporary directory. The
+                    # weights are read from the archive directly, except for the weights of model parallel ranks.
                     self._unpack_atommic_file(
-                        path2file=restore_path, out_folder=tmpdir, extract_config_only=return_config is True
+                        path2file=restore_path,
+                        out_folder=tmpdir,
+                        extract_config_only=return_config is True,
+                        exclude={self.model_weights_ckpt, self.model_weights_tensor_file},
                     )
 
                 # Change current working directory to the temporary directory
@@ -171,9 +184,15 @@ class SaveRestoreConnector:
                 instance = calling_cls.from_config_dict(config=conf, trainer=trainer)
                 instance = instance.to(map_location)
                 # add load_state_dict override
-                if app_state.model_parallel_size is not None and app_state.model_parallel_size > 1:
+                if model_parallel:
                     model_weights = self._inject_model_parallel_rank_for_ckpt(tmpdir, self.model_weights_ckpt)
-                state_dict = self._load_state_dict_from_disk(model_weights, map_location=map_location)
+                    state_dict = self._load_state_dict_from_disk(model_weights, map_location=map_location)
+                elif tmpdir == self.model_extracted_dir:
+                    if os.path.exists(os.path.join(tmpdir, self.model_weights_tensor_file)):
+                        model_weights = os.path.join(tmpdir, self.model_weights_tensor_file)
+                    state_dict = self._load_state_dict_from_disk(model_weights, map_location=map_location)
+                else:
+                    state_dict = self._load_state_dict_from_archive(restore_path, map_location=map_location)
             finally:
                 os.chdir(cwd)
 
@@ -229,6 +248,8 @@ class SaveRestoreConnector:
             return loaded_params
         _, instance, state_dict = loaded_params
         self.load_instance_with_state_dict(instance, state_dict, strict)
+        if self.share_weights:
+            self._share_state_dict(instance, state_dict)
         logging.info(f"Model {instance.__class__.__name__} was successfully restored from {restore_path}.")
         return instance, state_dict
 
@@ -270,36 +291,27 @@ class SaveRestoreConnector:
         -------
         The state dict that was loaded from the original .atommic checkpoint.
         """
-        cwd = os.getcwd()
-
         save_dir = os.path.abspath(save_dir)
         if not os.path.exists(save_dir):
             os.makedirs(save_dir, exist_ok=True)
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            try:
-                self._unpack_atommic_file(path2file=restore_path, out_folder=tmpdir)
-                os.chdir(tmpdir)
-                model_weights = os.path.join(tmpdir, self.model_weights_ckpt)
-                state_dict = self._load_state_dict_from_disk(model_weights)
+        state_dict = self._load_state_dict_from_archive(restore_path, map_location="cpu")
 
-                if not split_by_module:
-                    filepath = os.path.join(save_dir, self.model_weights_ckpt)
-                    self._save_state_dict_to_disk(state_dict, filepath)
+        if not split_by_module:
+            filepath = os.path.join(save_dir, self.model_weights_ckpt)
+            self._save_state_dict_to_disk(state_dict, filepath)
 
-                else:
-                    key_set = {key.split(".")[0] for key in state_dict.keys()}
-                    for primary_key in key_set:
-                        inner_keys = [key for key in state_dict.keys() if key.split(".")[0] == primary_key]
-                        state_dict_subset = {
-                            ".".join(inner_key.split(".")[1:]): state_dict[inner_key] for inner_key in inner_keys
-                        }
-                        filepath = os.path.join(save_dir, f"{primary_key}.ckpt")
-                        self._save_state_dict_to_disk(state_dict_subset, filepath)
-
-                logging.info(f"Checkpoints from {restore_path} were successfully extracted into {save_dir}.")
-            finally:
-                os.chdir(cwd)
+        else:
+            key_set = {key.split(".")[0] for key in state_dict.keys()}
+            for primary_key in key_set:
+                inner_keys = [key for key in state_dict.keys() if key.split(".")[0] == primary_key]
+                state_dict_subset = {
+                    ".".join(inner_key.split(".")[1:]): state_dict[inner_key] for inner_key in inner_keys
+                }
+                filepath = os.path.join(save_dir, f"{primary_key}.ckpt")
+                self._save_state_dict_to_disk(state_dict_subset, filepath)
+
+        logging.info(f"Checkpoints from {restore_path} were successfully extracted into {save_dir}.")
 
         return state_dict
 
@@ -539,27 +551,75 @@ class SaveRestoreConnector:
             tar.add(source_dir, arcname=".")
 
     @staticmethod
-    def _unpack_atommic_file(path2file: str, out_folder: str, extract_config_only: bool = False) -> str:
-        """This method is called by ModelPT.save_to() and ModelPT.load_from() to unpack a atommic file."""
+    def _is_compressed_atommic_file(path2file: str) -> bool:
+        """Checks whether a atommic file is a compressed tar, as written by older versions, from its magic number."""
+        with open(path2file, "rb") as f:
+            return f.read(2) == b"\x1f\x8b"
+
+    @staticmethod
+    def _open_atommic_file(path2file: str) -> tarfile.TarFile:
+        """Opens a atommic file, which is an uncompressed tar for versions 1.7.0 and above and a compressed tar
+        before."""
         if not os.path.exists(path2file):
             raise FileNotFoundError(f"{path2file} does not exist")
-        # we start with an assumption of uncompressed tar, which should be true for versions 1.7.0 and above
-        tar_header = "r:"
-        try:
-            tar_test = tarfile.open(path2file, tar_header)  # pylint: disable=consider-using-with
-            tar_test.close()
-        except tarfile.ReadError:
-            # can be older checkpoint => try compressed tar
-            tar_header = "r:gz"
-        tar = tarfile.open(path2file, tar_header)  # pylint: disable=consider-using-with
-        if not extract_config_only:
-            tar.extractall(path=out_folder)
-        else:
-            members = [x for x in tar.getmembers() if ".yaml" in x.name]
+        tar_header = "r:gz" if SaveRestoreConnector._is_compressed_atommic_file(path2file) else "r:"
+        return tarfile.open(path2file, tar_header)  # pylint: disable=consider-using-with
+
+    @staticmethod
+    def _unpack_atommic_file(
+        path2file: str, out_folder: str, extract_config_only: bool = False, exclude: Optional[Set[str]] = None
+    ) -> str:
+        """This method is called by ModelPT.save_to() and ModelPT.load_from() to unpack a atommic file. Members in
+        ``exclude``, e.g. the weights when they are read from the archive directly, are not extracted."""
+        with SaveRestoreConnector._open_atommic_file(path2file) as tar:
+            members = tar.getmembers()
+            if extract_config_only:
+                members = [x for x in members if ".yaml" in x.name]
+            if exclude:
+                members = [x for x in members if os.path.normpath(x.name) not in exclude]
             tar.extractall(path=out_folder, members=members)
-        tar.close()
         return out_folder
 
+    def _load_state_dict_from_archive(self, path2file: str, map_location: Optional[torch.device] = None):
+        """Loads the state dict from a atommic file without extracting it.
+
+        Weights saved in the safetensors layout are memory-mapped from the archive, so they are neither copied to disk
+        nor to memory, and the processes that restore the same file share their pages. Weights saved as a torch
+        checkpoint are streamed from the archive.
+        """
+        with self._open_atommic_file(path2file) as tar:
+            members = {os.path.normpath(member.name): member for member in tar.getmembers()}
+            if self.model_weights_tensor_file in members:
+                member = members[self.model_weights_tensor_file]
+                if self._is_compressed_atommic_file(path2file):
+                    state_dict = load_tensor_file(bytearray(tar.extractfile(member).read()))
+                else:
+                    state_dict = load_tensor_file(mmap_file(path2file), offset=member.offset_data)
+                return self._map_state_dict(state_dict, map_location)
+            if self.model_weights_ckpt not in members:
+                raise FileNotFoundError(f"{path2file} does not contain {self.model_weights_ckpt}")
+            return torch.load(tar.extractfile(members[self.model_weights_ckpt]), map_location=map_location)
+
+    @staticmethod
+    def _map_state_dict(state_dict, map_location=None):
+        """Moves the tensors of a state dict to ``map_location``. Tensors that stay on the cpu are not copied."""
+        if map_location is None or torch.device(map_location).type == "cpu":
+            return state_dict
+        return {name: tensor.to(map_location) for name, tensor in state_dict.items()}
+
+    @staticmethod
+    def _share_state_dict(instance, state_dict):
+        """Replaces the parameters and buffers of the instance with the tensors of the state dict, when they are on the
+        same device, so that the memory-mapped weights are used in place instead of copies."""
+        tensors = dict(instance.named_parameters())
+        tensors.update(instance.named_buffers())
+        for name, tensor in tensors.items():
+            if name not in state_dict:
+                continue
+            value = state_dict[name]
+            if value.device == tensor.device and value.dtype == tensor.dtype and value.shape == tensor.shape:
+                tensor.data = value
+
     @staticmethod
     def _save_state_dict_to_disk(state_dict, filepath):
         """This method is called by ModelPT.save_to() and ModelPT.load_from() to save the state dict to disk."""
@@ -568,6 +628,8 @@ class SaveRestoreConnector:
     @staticmethod
     def _load_state_dict_from_disk(model_weights, map_location="cpu"):
         """This method is called by ModelPT.save_to() and ModelPT.load_from() to load the state dict from disk."""
+        if model_weights.endswith(".safetensors"):
+            return SaveRestoreConnector._map_state_dict(load_tensor_file(mmap_file(model_weights)), map_location)
         return torch.load(model_weights, map_location=map_location)
 
     @property
@@ -590,6 +652,41 @@ class SaveRestoreConnector:
         """This property is used to set the path to the model weights ckpt file."""
         self._model_weights_ckpt = path
 
+    @property
+    def model_weights_tensor_file(self) -> str:
+        """This property is used to get the path to the model weights file in the safetensors layout."""
+        return self._model_weights_tensor_file
+
+    @model_weights_tensor_file.setter
+    def model_weights_tensor_file(self, path: str):
+        """This property is used to set the path to the model weights file in the safetensors layout."""
+        self._model_weights_tensor_file = path
+
+    @property
+    def weights_format(self) -> str:
+        """The format in which save_to() stores the weights: ``"ckpt"`` for a torch checkpoint, or ``"safetensors"``
+        for the safetensors layout, which is restored without copies. Both formats are restored."""
+        return self._weights_format
+
+    @weights_format.setter
+    def weights_format(self, weights_format: str):
+        """This property is used to set the format in which save_to() stores the weights."""
+        if weights_format not in ("ckpt", "safetensors"):
+            raise ValueError(f"weights_format must be one of 'ckpt' or 'safetensors', got {weights_format}.")
+        self._weights_format = weights_format
+
+    @property
+    def share_weights(self) -> bool:
+        """Whether restore_from() uses the memory-mapped weights of the safetensors layout as the parameters of the
+        model on the cpu, instead of copying them, so that the processes that restore the same file share them. The
+        pages are copy-on-write, so training or modifying the weights only copies the modified pages."""
+        return self._share_weights
+
+    @share_weights.setter
+    def share_weights(self, share_weights: bool):
+        """This property is used to set whether restore_from() shares the memory-mapped weights."""
+        self._share_weights = share_weights
+
     @property
     def model_extracted_dir(self) -> Optional[str]:
         return self._model_extracted_dir
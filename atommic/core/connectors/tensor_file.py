@@ -0,0 +1,141 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import json
+import mmap
+import struct
+import warnings
+from typing import Dict, Union
+
+import torch
+
+# The layout follows the safetensors format (https://github.com/huggingface/safetensors): an 8-byte little-endian
+# header size, a json header with the dtype, shape and byte range of every tensor, and the raw bytes of the tensors.
+# Complex tensors, which safetensors does not support, are stored as real views and listed in the metadata.
+_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+_TORCH_DTYPES = {name: dtype for dtype, name in _DTYPES.items()}
+_ITEM_SIZES = {dtype: torch.empty(0, dtype=dtype).element_size() for dtype in _DTYPES}
+_METADATA_KEY = "__metadata__"
+_COMPLEX_KEY = "complex"
+
+
+def save_tensor_file(state_dict: Dict[str, torch.Tensor], filepath: str):
+    """Saves a state dict in the safetensors layout, which can be loaded without copies with
+    :func:`load_tensor_file`.
+
+    Parameters
+    ----------
+    state_dict : Dict[str, torch.Tensor]
+        The state dict.
+    filepath : str
+        Path to the file.
+    """
+    tensors = {}
+    complex_names = []
+    for name, tensor in state_dict.items():
+        if not isinstance(tensor, torch.Tensor):
+            raise TypeError(f"Only tensors can be saved in a tensor file, got {type(tensor)} for {name}.")
+        tensor = tensor.detach().cpu()
+        if tensor.is_complex():
+            tensor = torch.view_as_real(tensor)
+            complex_names.append(name)
+        if tensor.dtype not in _DTYPES:
+            raise TypeError(f"Tensors of type {tensor.dtype} cannot be saved in a tensor file, got {name}.")
+        tensors[name] = tensor.contiguous()
+
+    # store the tensors with the largest items first, so that every tensor is aligned to its item size, and list them
+    # in the order of the state dict
+    names = sorted(tensors, key=lambda name: -tensors[name].element_size())
+    data_offsets = {}
+    offset = 0
+    for name in names:
+        size = tensors[name].numel() * tensors[name].element_size()
+        data_offsets[name] = [offset, offset + size]
+        offset += size
+    header = {_METADATA_KEY: {_COMPLEX_KEY: ",".join(complex_names)}}
+    for name, tensor in tensors.items():
+        header[name] = {
+            "dtype": _DTYPES[tensor.dtype],
+            "shape": list(tensor.shape),
+            "data_offsets": data_offsets[name],
+        }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    with open(filepath, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name in names:
+            if tensors[name].numel() > 0:
+                f.write(memoryview(tensors[name].view(-1).view(torch.uint8).numpy()))
+
+
+def load_tensor_file(buffer: Union[mmap.mmap, bytes, bytearray], offset: int = 0) -> Dict[str, torch.Tensor]:
+    """Loads a state dict saved with :func:`save_tensor_file` from a buffer, without copying the tensors.
+
+    When the buffer is a memory map of a file, e.g. opened with :func:`mmap_file`, the tensors are views of the mapped
+    pages, which the processes that map the same file share.
+
+    Parameters
+    ----------
+    buffer : Union[mmap.mmap, bytes, bytearray]
+        The buffer that holds the file.
+    offset : int, optional
+        Offset of the file in the buffer, e.g. of a member of an uncompressed tar archive. Default is ``0``.
+
+    Returns
+    -------
+    Dict[str, torch.Tensor]
+        The state dict.
+    """
+    (header_size,) = struct.unpack_from("<Q", buffer, offset)
+    header = json.loads(bytes(buffer[offset + 8 : offset + 8 + header_size]))
+    complex_names = set(filter(None, header.pop(_METADATA_KEY, {}).get(_COMPLEX_KEY, "").split(",")))
+    data_offset = offset + 8 + header_size
+
+    state_dict = {}
+    with warnings.catch_warnings():
+        # read-only buffers give read-only tensors, which are only copied into the parameters
+        warnings.filterwarnings("ignore", message="The given buffer is not writable")
+        for name, info in header.items():
+            dtype = _TORCH_DTYPES[info["dtype"]]
+            begin, end = info["data_offsets"]
+            if end > begin:
+                tensor = torch.frombuffer(
+                    buffer, dtype=dtype, count=(end - begin) // _ITEM_SIZES[dtype], offset=data_offset + begin
+                ).view(info["shape"])
+            else:
+                tensor = torch.empty(info["shape"], dtype=dtype)
+            state_dict[name] = torch.view_as_complex(tensor) if name in complex_names else tensor
+    return state_dict
+
+
+def mmap_file(filepath: str) -> mmap.mmap:
+    """Maps a file to memory, copy-on-write.
+
+    The pages are read lazily and shared by all the processes that map the file, as long as they are not written to.
+    Writes go to private copies of the pages and never to the file.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the file.
+
+    Returns
+    -------
+    mmap.mmap
+        The memory map of the file.
+    """
+    with open(filepath, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
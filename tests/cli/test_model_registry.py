@@ -0,0 +1,23 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import pytest
+
+from atommic.cli.model_registry import MODELS, get_model_class, get_model_path
+
+
+@pytest.mark.parametrize("model_name", sorted(MODELS))
+def test_get_model_class(model_name):
+    """Every registered model resolves to its class."""
+    module_name, class_name = MODELS[model_name].split(":")
+    model = get_model_class(model_name)
+    assert model.__module__ == module_name
+    assert model.__name__ == class_name
+
+
+def test_get_model_path():
+    """Model names are case-insensitive, and unknown models are rejected."""
+    assert get_model_path("cirim") == get_model_path("CIRIM")
+    assert get_model_path("E2EVN") == get_model_path("VN")
+    with pytest.raises(NotImplementedError, match="NOTAMODEL"):
+        get_model_path("NotAModel")
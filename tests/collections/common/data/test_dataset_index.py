@@ -0,0 +1,164 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import json
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from atommic.collections.common.data.dataset_index import (
+    VolumeIndex,
+    dataset_index_path,
+    load_dataset_index,
+    load_noise_index,
+    scan_metadata,
+    subsample_examples,
+)
+from atommic.collections.reconstruction.data.mri_reconstruction_loader import ReconstructionMRIDataset
+
+
+@pytest.fixture
+def h5_dataset(tmp_path):
+    """Creates a small dataset of three volumes with a different number of slices."""
+    root = tmp_path / "data"
+    root.mkdir()
+    for i, num_slices in enumerate((3, 5, 2)):
+        with h5py.File(root / f"file{i}.h5", "w") as hf:
+            hf.create_dataset("kspace", data=np.zeros((num_slices, 2, 8, 8), dtype=np.complex64))
+    return root
+
+
+def test_index_matches_list_of_examples():
+    """The index returns the same examples as the per-slice list."""
+    rows = [("a.h5", 0, 3, {"encoding_size": (1, 2, 3)}), ("b.h5", 0, 0, {}), ("c.h5", 2, 4, {"num_slices": 4})]
+    index = VolumeIndex.from_rows(rows)
+    examples = [(fname, s, metadata) for fname, start, stop, metadata in rows for s in range(start, stop)]
+    assert len(index) == len(examples)
+    for i, (fname, slice_ind, metadata) in enumerate(examples):
+        assert index[i] == (index.volume_fname(index.volume_of(i)), slice_ind, metadata)
+        assert str(index[i][0]) == fname
+    assert index[-1][1] == 3
+    with pytest.raises(IndexError):
+        index[len(examples)]  # pylint: disable=pointless-statement
+
+
+def test_index_save_and_load(tmp_path):
+    """A saved index is memory-mapped and decodes the metadata, including tuples."""
+    index = VolumeIndex.from_rows(
+        [("a.h5", 0, 3, {"encoding_size": (1, 2, 3), "noise_levels": [0.1, 0.2, 0.3], "num_slices": np.int16(3)})]
+    )
+    path = tmp_path / "index.npy"
+    index.save(path)
+    loaded = VolumeIndex.load(path)
+    assert isinstance(loaded.table, np.memmap)
+    assert len(loaded) == 3
+    _, slice_ind, metadata = loaded[2]
+    assert slice_ind == 2
+    assert metadata == {"encoding_size": (1, 2, 3), "noise_levels": [0.1, 0.2, 0.3], "num_slices": 3}
+    # all slices of a volume share the same metadata
+    assert loaded[0][2] is loaded[1][2]
+
+
+def test_index_is_invalidated_on_changes(h5_dataset, tmp_path):
+    """The cached index is rebuilt when a file is modified, added, or removed."""
+    files = sorted(h5_dataset.iterdir())
+    path = dataset_index_path(tmp_path / "cache.yaml", h5_dataset)
+    VolumeIndex.from_rows([(f, 0, 1, {}) for f in files]).save(path)
+    assert load_dataset_index(path, files) is not None
+    assert load_dataset_index(path, files[:-1]) is None
+    stat = os.stat(files[0])
+    os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_dataset_index(path, files) is None
+
+
+def test_dataset_uses_index_cache(h5_dataset, tmp_path):
+    """The dataset writes the cache on the first run and reuses it afterward."""
+    cache_file = tmp_path / "cache" / "dataset_cache.yaml"
+    dataset = ReconstructionMRIDataset(h5_dataset, use_dataset_cache=True, dataset_cache_file=cache_file)
+    assert len(dataset) == 10
+    cached = list((tmp_path / "cache").iterdir())
+    assert len(cached) == 1 and cached[0].suffix == ".npy"
+
+    dataset_cached = ReconstructionMRIDataset(h5_dataset, use_dataset_cache=True, dataset_cache_file=cache_file)
+    assert isinstance(dataset_cached.examples.table, np.memmap)
+    assert [(str(f), s) for f, s, _ in dataset.examples] == [(str(f), s) for f, s, _ in dataset_cached.examples]
+    assert dataset_cached[7][0].shape == (2, 8, 8)
+
+
+def test_dataset_default_index_outside_root(h5_dataset, tmp_path, monkeypatch):
+    """Without a cache file, the index is written to the cache directory, so the root can be indexed again."""
+    monkeypatch.setenv("ATOMMIC_CACHE_DIR", str(tmp_path / "atommic_cache"))
+    files = sorted(h5_dataset.iterdir())
+    dataset = ReconstructionMRIDataset(h5_dataset, use_dataset_cache=True)
+    assert sorted(h5_dataset.iterdir()) == files
+    assert len(list((tmp_path / "atommic_cache" / "dataset_index").iterdir())) == 1
+
+    dataset_cached = ReconstructionMRIDataset(h5_dataset, use_dataset_cache=True)
+    assert isinstance(dataset_cached.examples.table, np.memmap)
+    assert [(str(f), s) for f, s, _ in dataset.examples] == [(str(f), s) for f, s, _ in dataset_cached.examples]
+
+
+def test_subsample_by_volume_keeps_index():
+    """Sampling by volume keeps whole volumes and the index structure."""
+    index = VolumeIndex.from_rows([(f"file{i}.h5", 0, i + 1, {"encoding_size": (1, i, 1)}) for i in range(4)])
+    subset = subsample_examples(index, volume_sample_rate=0.5)
+    assert isinstance(subset, VolumeIndex)
+    assert subset.num_volumes == 2
+    subset = subsample_examples(index, num_cols=(1, 3))
+    assert [str(f) for f, _, _ in subset] == ["file1.h5"] * 2 + ["file3.h5"] * 4
+    subset = subsample_examples(index, sample_rate=0.5)
+    assert isinstance(subset, list) and len(subset) == 5
+
+
+@pytest.mark.parametrize("scan_mode", ["thread", "process"])
+def test_parallel_scan_keeps_file_order(h5_dataset, scan_mode):
+    """The parallel metadata scan returns the same results, in the same order, as the serial one."""
+    files = sorted(h5_dataset.iterdir())
+    retrieve_metadata = ReconstructionMRIDataset(h5_dataset)._retrieve_metadata  # pylint: disable=protected-access
+    serial = scan_metadata(retrieve_metadata, files)
+    parallel = scan_metadata(retrieve_metadata, files, 2, scan_mode)
+    assert [num_slices for _, num_slices in parallel] == [3, 5, 2]
+    assert parallel == serial
+    with pytest.raises(ValueError):
+        scan_metadata(retrieve_metadata, files, 2, "gpu")
+
+
+def test_scan_progress_only_on_rank_zero(h5_dataset, capsys, monkeypatch):
+    """The progress is shown for parallel scans of the global rank zero, and not for serial scans."""
+    files = sorted(h5_dataset.iterdir())
+    retrieve_metadata = ReconstructionMRIDataset(h5_dataset)._retrieve_metadata  # pylint: disable=protected-access
+    capsys.readouterr()
+    scan_metadata(retrieve_metadata, files)
+    assert "Scanning dataset metadata" not in capsys.readouterr().err
+    monkeypatch.setenv("RANK", "1")
+    scan_metadata(retrieve_metadata, files, 2)
+    assert "Scanning dataset metadata" not in capsys.readouterr().err
+    monkeypatch.setenv("RANK", "0")
+    scan_metadata(retrieve_metadata, files, 2)
+    assert "Scanning dataset metadata" in capsys.readouterr().err
+
+
+def test_dataset_parallel_scan(h5_dataset):
+    """A dataset built with a parallel metadata scan has the same examples as a serially built one."""
+    dataset = ReconstructionMRIDataset(h5_dataset)
+    dataset_parallel = ReconstructionMRIDataset(h5_dataset, metadata_scan_workers=3)
+    assert [(str(f), s) for f, s, _ in dataset.examples] == [(str(f), s) for f, s, _ in dataset_parallel.examples]
+
+
+def test_noise_index(h5_dataset, tmp_path):
+    """Noise levels are streamed into a filename-keyed index and attached to the metadata of each volume."""
+    noise_file = tmp_path / "noise.json"
+    records = [
+        {"fname": f"file{i}.h5", "noise": 0.1 * s} for i, num_slices in enumerate((3, 5, 2)) for s in range(num_slices)
+    ]
+    with open(noise_file, "w") as f:  # pylint: disable=unspecified-encoding
+        f.write("\n".join(json.dumps(record) for record in records[::-1]) + "\n\n")
+    noise_index = load_noise_index(noise_file)
+    assert sorted(noise_index) == ["file0.h5", "file1.h5", "file2.h5"]
+    assert noise_index["file1.h5"] == [0.1 * s for s in range(5)][::-1]
+
+    dataset = ReconstructionMRIDataset(h5_dataset, noise_root=noise_file)
+    for fname, _, metadata in dataset.examples:
+        assert metadata["noise_levels"] == noise_index[fname.name]
@@ -0,0 +1,86 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import pickle
+
+import h5py
+import numpy as np
+import pytest
+
+from atommic.collections.common.data.file_pool import HDF5FilePool
+
+
+@pytest.fixture
+def h5_files(tmp_path):
+    """Creates three small HDF5 volumes."""
+    fnames = []
+    for i in range(3):
+        fname = tmp_path / f"file{i}.h5"
+        with h5py.File(fname, "w") as hf:
+            hf.create_dataset("kspace", data=np.full((4, 8, 8), i, dtype=np.complex64))
+        fnames.append(fname)
+    return fnames
+
+
+def test_pool_reuses_handles(h5_files):
+    """Consecutive reads from the same file reuse the same handle."""
+    pool = HDF5FilePool(capacity=2)
+    with pool.open(h5_files[0]) as hf:
+        first = hf
+        assert hf["kspace"][1].real.max() == 0
+    with pool.open(h5_files[0]) as hf:
+        assert hf is first
+        assert hf.id.valid
+    assert len(pool) == 1
+    pool.close()
+    assert len(pool) == 0
+
+
+def test_pool_evicts_least_recently_used(h5_files):
+    """The least recently used handle is closed when the capacity is exceeded."""
+    pool = HDF5FilePool(capacity=2)
+    first = pool.get(h5_files[0])
+    pool.get(h5_files[1])
+    pool.get(h5_files[0])
+    pool.get(h5_files[2])
+    assert len(pool) == 2
+    assert h5_files[0] in pool
+    assert h5_files[1] not in pool
+    assert first.id.valid
+    pool.close()
+
+
+def test_pool_disabled_closes_files(h5_files):
+    """With capacity 0 the pool behaves like ``h5py.File``."""
+    pool = HDF5FilePool(capacity=0)
+    with pool.open(h5_files[1]) as hf:
+        assert hf["kspace"][0].real.max() == 1
+    assert not hf.id.valid
+    assert len(pool) == 0
+
+
+def test_pool_pickles_without_handles(h5_files):
+    """Pickled pools, e.g. sent to spawned workers, keep their capacity but no handles."""
+    pool = HDF5FilePool(capacity=3)
+    pool.get(h5_files[0])
+    restored = pickle.loads(pickle.dumps(pool))
+    assert restored.capacity == 3
+    assert len(restored) == 0
+    pool.close()
+
+
+def test_pool_drops_handles_of_other_process(h5_files):
+    """Handles opened by another process, e.g. the parent of a forked worker, are not reused."""
+    pool = HDF5FilePool(capacity=3)
+    inherited = pool.get(h5_files[0])
+    pool._pid = -1  # pylint: disable=protected-access
+    assert pool.get(h5_files[0]) is not inherited
+    assert len(pool) == 1
+    inherited.close()
+    pool.close()
+
+
+def test_pool_rejects_negative_capacity():
+    """A negative capacity is not valid."""
+    with pytest.raises(ValueError):
+        HDF5FilePool(capacity=-1)
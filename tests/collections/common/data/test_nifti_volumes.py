@@ -0,0 +1,132 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import pickle
+
+import h5py
+import nibabel as nib
+import numpy as np
+import pytest
+
+from atommic.collections.common.data.nifti_volumes import (
+    NiftiVolumeCache,
+    convert_nifti_dataset,
+    convert_nifti_volume,
+    read_nifti_volume,
+)
+from atommic.collections.segmentation.data.mri_segmentation_loader import (
+    BraTS2023AdultGliomaSegmentationMRIDataset,
+    ISLES2022SubAcuteStrokeSegmentationMRIDataset,
+)
+
+
+def _save_nifti(data, fname):
+    nib.save(nib.Nifti1Image(data, np.eye(4)), fname)
+    return fname
+
+
+@pytest.fixture
+def nifti_dataset(tmp_path):
+    """Creates two small volumes of 4 modalities and 120 slices, and their segmentations."""
+    rng = np.random.default_rng(0)
+    images, segmentations = tmp_path / "images", tmp_path / "segmentations"
+    images.mkdir()
+    segmentations.mkdir()
+    for i in range(2):
+        _save_nifti(rng.integers(0, 1000, (4, 6, 5, 120)).astype(np.int16), images / f"volume{i}.nii.gz")
+        _save_nifti(rng.integers(0, 4, (6, 5, 120)).astype(np.uint8), segmentations / f"volume{i}-seg.nii.gz")
+    return images, segmentations
+
+
+def test_read_nifti_volume_keeps_dtype(nifti_dataset):
+    """The volumes are read in their stored dtype, not as float64."""
+    images, segmentations = nifti_dataset
+    assert read_nifti_volume(images / "volume0.nii.gz").dtype == np.int16
+    labels = read_nifti_volume(segmentations / "volume0-seg.nii.gz")
+    assert labels.dtype == np.uint8
+    np.testing.assert_array_equal(labels, nib.load(segmentations / "volume0-seg.nii.gz").get_fdata())
+
+
+def test_cache_evicts_least_recently_used(nifti_dataset):
+    """Cached volumes are decoded once, are read-only, and the least recently used is dropped."""
+    images, segmentations = nifti_dataset
+    fnames = [images / "volume0.nii.gz", images / "volume1.nii.gz", segmentations / "volume0-seg.nii.gz"]
+    cache = NiftiVolumeCache(capacity=2)
+    first = cache.get(fnames[0])
+    assert not first.flags.writeable
+    assert cache.get(fnames[0]) is first
+    cache.get(fnames[1])
+    cache.get(fnames[0])
+    cache.get(fnames[2])
+    assert len(cache) == 2
+    assert fnames[0] in cache
+    assert fnames[1] not in cache
+
+
+def test_cache_disabled_and_pickled(nifti_dataset):
+    """With capacity 0 nothing is cached, and pickled caches keep their capacity but no volumes."""
+    images, _ = nifti_dataset
+    cache = NiftiVolumeCache(capacity=0)
+    cache.get(images / "volume0.nii.gz")
+    assert len(cache) == 0
+
+    cache = NiftiVolumeCache(capacity=3)
+    cache.get(images / "volume0.nii.gz")
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.capacity == 3
+    assert len(restored) == 0
+
+    with pytest.raises(ValueError):
+        NiftiVolumeCache(capacity=-1)
+
+
+def test_convert_nifti_volume(nifti_dataset, tmp_path):
+    """The converted file stores the slices first, in the stored dtype, and the one-hot segmentation."""
+    images, segmentations = nifti_dataset
+    output = convert_nifti_volume(
+        images / "volume0.nii.gz",
+        tmp_path / "converted" / "volume0.h5",
+        segmentations / "volume0-seg.nii.gz",
+        BraTS2023AdultGliomaSegmentationMRIDataset.segmentation_one_hot,
+    )
+    assert output is None
+    labels = np.moveaxis(read_nifti_volume(segmentations / "volume0-seg.nii.gz"), -1, 0)
+    with h5py.File(tmp_path / "converted" / "volume0.h5", "r") as hf:
+        assert hf["target"].dtype == np.int16
+        assert hf["target"].shape == (120, 4, 6, 5)
+        assert hf["target"].chunks == (1, 4, 6, 5)
+        assert hf["target"].compression is None
+        assert hf["segmentation"].dtype == np.uint8
+        assert hf["segmentation"].shape == (120, 4, 6, 5)
+        np.testing.assert_array_equal(hf["segmentation"][:, 3], labels != 0)
+    assert list((tmp_path / "converted").iterdir()) == [tmp_path / "converted" / "volume0.h5"]
+
+
+@pytest.mark.parametrize(
+    "dataset_class", [BraTS2023AdultGliomaSegmentationMRIDataset, ISLES2022SubAcuteStrokeSegmentationMRIDataset]
+)
+@pytest.mark.parametrize("consecutive_slices", [1, 3])
+def test_converted_dataset_matches_nifti(nifti_dataset, tmp_path, dataset_class, consecutive_slices):
+    """The converted dataset returns the same examples as the NIfTI dataset."""
+    images, segmentations = nifti_dataset
+    files = sorted(images.iterdir())
+    convert_nifti_dataset(
+        files,
+        tmp_path / "converted",
+        [segmentations / fname.name.replace(".nii.gz", "-seg.nii.gz") for fname in files],
+        dataset_class.segmentation_one_hot,
+    )
+
+    kwargs = {"segmentations_root": segmentations, "consecutive_slices": consecutive_slices, "log_images_rate": 0.0}
+    nifti = dataset_class(images, **kwargs)
+    converted = dataset_class(tmp_path / "converted", **kwargs)
+    assert len(nifti) == len(converted) > 0
+    for i in [0, len(nifti) // 2, len(nifti) - 1]:
+        expected, example = nifti[i], converted[i]
+        assert example[7] == expected[7].replace(".nii.gz", ".h5")
+        assert example[8] == expected[8]
+        for j in [1, 5]:
+            assert example[j].dtype == expected[j].dtype == np.float32
+            np.testing.assert_array_equal(example[j], expected[j])
+    # the slices of a volume are decoded once
+    assert len(nifti.volume_cache) == 4
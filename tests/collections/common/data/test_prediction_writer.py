@@ -0,0 +1,41 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import h5py
+import numpy as np
+import pytest
+
+from atommic.collections.common.data.prediction_writer import StreamingPredictionWriter
+
+
+def test_writer_matches_stacked_predictions(tmp_path):
+    """Written volumes hold the slices stacked in slice order, also when a volume is revisited."""
+    rng = np.random.default_rng(0)
+    # a small budget and preallocation exercise blocking and growing the datasets
+    writer = StreamingPredictionWriter(tmp_path, compression="gzip", max_in_flight_bytes=1024, initial_num_slices=2)
+    expected = {}
+    order = [("a.h5", 2), ("a.h5", 0), ("a.h5", 1), ("b.h5", 1), ("b.h5", 0), ("a.h5", 4), ("a.h5", 3)]
+    for fname, slice_num in order:
+        output = (rng.random((1, 8, 8)) + 1j * rng.random((1, 8, 8))).astype(np.complex64)
+        writer.write(fname, slice_num, {"reconstruction": output, "qmaps": output.real})
+        expected.setdefault(fname, []).append((slice_num, output))
+    writer.close()
+
+    for fname, outputs in expected.items():
+        stacked = np.stack([output for _, output in sorted(outputs, key=lambda x: x[0])])
+        with h5py.File(tmp_path / fname, "r") as hf:
+            assert hf["reconstruction"].chunks == (1, 1, 8, 8)
+            assert hf["reconstruction"].compression == "gzip"
+            np.testing.assert_array_equal(hf["reconstruction"][()], stacked)
+            np.testing.assert_array_equal(hf["qmaps"][()], stacked.real)
+
+
+def test_writer_raises_write_errors(tmp_path):
+    """Errors of the writer thread are raised in the caller."""
+    writer = StreamingPredictionWriter(tmp_path)
+    writer.write("a.h5", 0, {"reconstruction": np.zeros((4, 4))})
+    writer.write("a.h5", 1, {"reconstruction": np.zeros((5, 5))})
+    with pytest.raises(RuntimeError):
+        writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write("a.h5", 2, {"reconstruction": np.zeros((4, 4))})
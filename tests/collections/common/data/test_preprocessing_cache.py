@@ -0,0 +1,109 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import h5py
+import numpy as np
+import torch
+from omegaconf import OmegaConf
+
+from atommic.collections.common.data.preprocessing_cache import PreprocessingCache, hash_config
+from atommic.collections.common.data.subsample import Gaussian2DMaskFunc
+from atommic.collections.common.parts.transforms import MRIDataTransforms
+from atommic.collections.reconstruction.data.mri_reconstruction_loader import ReconstructionMRIDataset
+from atommic.collections.reconstruction.parts.transforms import ReconstructionMRIDataTransforms
+
+
+def test_hash_config():
+    """Equal configs hash equally, also when they come from a yaml file, and different configs do not."""
+    config = {"apply_gcc": True, "spatial_dims": [-2, -1], "crop_size": (320, 320)}
+    assert hash_config(config) == hash_config(OmegaConf.create(config))
+    assert hash_config(config) != hash_config({**config, "apply_gcc": False})
+
+
+def test_preprocessing_cache(tmp_path):
+    """Results are stored and loaded per file, slice and config."""
+    cache = PreprocessingCache(tmp_path, {"apply_gcc": True})
+    assert cache.load("a.h5", 0, "kspace") is None
+    kspace = torch.randn(4, 8, 8, 2)
+    cache.save("a.h5", 0, "kspace", kspace)
+    assert torch.equal(cache.load("a.h5", 0, "kspace"), kspace)
+    # the results are memory-mapped, and writing to them does not change the cache
+    loaded = cache.load("a.h5", 0, "kspace")
+    loaded.zero_()
+    assert torch.equal(cache.load("a.h5", 0, "kspace"), kspace)
+    assert cache.load("a.h5", 1, "kspace") is None
+    assert PreprocessingCache(tmp_path, {"apply_gcc": False}).load("a.h5", 0, "kspace") is None
+
+
+def test_transforms_with_preprocessing_cache(tmp_path):
+    """The transforms give the same results with the cache, and read the deterministic stages from it."""
+    rng = np.random.default_rng(0)
+    kspace = (rng.standard_normal((8, 32, 32)) + 1j * rng.standard_normal((8, 32, 32))).astype(np.complex64)
+
+    def transforms(cache_dir):
+        return MRIDataTransforms(
+            apply_gcc=True,
+            gcc_virtual_coils=4,
+            gcc_calib_lines=8,
+            estimate_coil_sensitivity_maps=True,
+            coil_sensitivity_maps_type="rss",
+            mask_func=[Gaussian2DMaskFunc([0.7, 0.7], [4, 4])],
+            coil_dim=1,
+            preprocessing_cache_dir=cache_dir,
+        )
+
+    def call(transform):
+        return transform(kspace, np.array([]), None, np.array([]), np.array([]), {}, "a.h5", 3)
+
+    expected = call(transforms(None))
+    cached_transforms = transforms(tmp_path)
+    for _ in range(2):
+        outputs = call(cached_transforms)
+        for i in (0, 2, 5):
+            torch.testing.assert_close(outputs[i], expected[i], rtol=0, atol=0)
+
+    cache = cached_transforms.preprocessing_cache
+    assert cache.path("a.h5", 3, "kspace").exists()
+    assert cache.path("a.h5", 3, "sensitivity_map").exists()
+    # only the random stages run when the results are cached
+    cached_transforms.coils_shape_transforms = None
+    cached_transforms.coil_sensitivity_maps_estimator = None
+    torch.testing.assert_close(call(cached_transforms)[2], expected[2], rtol=0, atol=0)
+
+
+def test_prewhitening_reference_with_preprocessing_cache(tmp_path, monkeypatch):
+    """The reference slice of a volume is read at most once, and not at all when the kspace is cached."""
+    root = tmp_path / "data"
+    root.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(2):
+        kspace = rng.standard_normal((4, 4, 64, 64)) + 1j * rng.standard_normal((4, 4, 64, 64))
+        with h5py.File(root / f"file{i}.h5", "w") as hf:
+            hf.create_dataset("kspace", data=kspace.astype(np.complex64))
+
+    references = []
+    get_reference = ReconstructionMRIDataset.get_noise_prewhitening_reference
+
+    def counting_get_reference(self, data, key, fname, *args, **kwargs):
+        reference = get_reference(self, data, key, fname, *args, **kwargs)
+        if reference is not None:
+            references.append(fname)
+        return reference
+
+    monkeypatch.setattr(ReconstructionMRIDataset, "get_noise_prewhitening_reference", counting_get_reference)
+
+    def dataset():
+        transform = ReconstructionMRIDataTransforms(
+            apply_prewhitening=True, coil_dim=1, preprocessing_cache_dir=tmp_path / "cache"
+        )
+        return ReconstructionMRIDataset(root, transform=transform)
+
+    first_epoch = [sample[0] for sample in dataset()]
+    assert sorted(references) == ["file0.h5", "file1.h5"]
+
+    # a new process loads every slice from the cache, without reading the reference
+    references.clear()
+    second_epoch = [sample[0] for sample in dataset()]
+    assert not references
+    for expected, kspace in zip(first_epoch, second_epoch):
+        assert torch.equal(expected, kspace)
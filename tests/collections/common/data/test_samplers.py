@@ -0,0 +1,128 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+from pathlib import Path
+
+import pytest
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from atommic.collections.common.data.dataset_index import VolumeIndex
+from atommic.collections.common.data.samplers import DistributedVolumeSampler, VolumeSampler, volume_slice_indices
+
+
+class _VolumesDataset(Dataset):
+    """A dataset of volumes of the given numbers of slices, which returns the volume, slice and worker of an item."""
+
+    def __init__(self, num_slices, as_list=False):
+        self.examples = VolumeIndex.from_rows(
+            [(f"volume{v}.h5", 0, n, {"num_slices": n}) for v, n in enumerate(num_slices)]
+        )
+        if as_list:
+            self.examples = list(self.examples)[::-1]
+
+    def __len__(self):
+        return len(self.examples)
+
+    def __getitem__(self, i):
+        fname, dataslice, _ = self.examples[i]
+        worker_info = torch.utils.data.get_worker_info()
+        return int(Path(fname).stem[6:]), dataslice, 0 if worker_info is None else worker_info.id
+
+
+def _volume_of(dataset, indices):
+    return [dataset[i][0] for i in indices]
+
+
+@pytest.mark.parametrize("as_list", [False, True])
+def test_volume_slice_indices(as_list):
+    """The slices are grouped by volume, in slice order, whether the examples are an index or a list."""
+    dataset = _VolumesDataset([3, 0, 2], as_list=as_list)
+    volumes = volume_slice_indices(dataset)
+    assert [len(volume) for volume in sorted(volumes, key=len)] == [2, 3]
+    for volume in volumes:
+        assert len(set(_volume_of(dataset, volume))) == 1
+        assert [dataset[i][1] for i in volume] == list(range(len(volume)))
+
+
+def test_volume_sampler_shuffles_volumes_and_blocks():
+    """Every slice is sampled once, volume by volume, with the slices of a volume shuffled in blocks."""
+    dataset = _VolumesDataset([12, 12, 12])
+    sampler = VolumeSampler(dataset, slice_block_size=4, seed=0)
+    indices = list(sampler)
+    assert sorted(indices) == list(range(len(dataset))) and len(sampler) == len(dataset)
+
+    volumes = _volume_of(dataset, indices)
+    assert [volumes[i] for i in range(0, 36, 12)] == [volumes[i + 11] for i in range(0, 36, 12)]
+    slices = [dataset[i][1] for i in indices]
+    for block in range(0, 36, 4):
+        assert slices[block] % 4 == 0
+        assert slices[block : block + 4] == list(range(slices[block], slices[block] + 4))
+
+    # the order is the same for the same epoch, and changes with the epoch
+    assert list(sampler) == indices
+    sampler.set_epoch(1)
+    assert list(sampler) != indices
+
+
+def test_volume_sampler_in_order():
+    """Without shuffling, the volumes and slices are sampled in order."""
+    dataset = _VolumesDataset([3, 2, 4])
+    assert list(VolumeSampler(dataset, shuffle=False, slice_block_size=2)) == list(range(9))
+
+
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_volume_sampler_assigns_volumes_to_workers(batch_size):
+    """Every volume is read by a single worker of the DataLoader."""
+    dataset = _VolumesDataset([6, 12, 6, 6, 12, 6, 12, 12])
+    num_workers = 2
+    sampler = VolumeSampler(dataset, slice_block_size=3, num_workers=num_workers, batch_size=batch_size, seed=0)
+    dataloader = DataLoader(dataset, batch_size=batch_size, sampler=sampler, num_workers=num_workers)
+
+    workers = {}
+    num_items = 0
+    for volumes, _, batch_workers in dataloader:
+        for volume, worker in zip(volumes.tolist(), batch_workers.tolist()):
+            workers.setdefault(volume, set()).add(worker)
+            num_items += 1
+    assert num_items == len(dataset)
+    assert all(len(volume_workers) == 1 for volume_workers in workers.values())
+    assert {worker for volume_workers in workers.values() for worker in volume_workers} == {0, 1}
+
+
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_distributed_volume_sampler(drop_last):
+    """Every process samples the same number of slices, of whole volumes except for the slices moved to balance the
+    processes."""
+    dataset = _VolumesDataset([5, 7, 3, 6, 4])
+    samplers = [
+        DistributedVolumeSampler(dataset, num_replicas=2, rank=rank, slice_block_size=2, drop_last=drop_last)
+        for rank in range(2)
+    ]
+    indices = [list(sampler) for sampler in samplers]
+    assert len(indices[0]) == len(indices[1]) == len(samplers[0]) == (12 if drop_last else 13)
+    volumes = [set(_volume_of(dataset, rank_indices)) for rank_indices in indices]
+    assert len(volumes[0] & volumes[1]) <= 1
+    if not drop_last:
+        assert set(indices[0]) | set(indices[1]) == set(range(len(dataset)))
+
+    for sampler in samplers:
+        sampler.set_epoch(3)
+    assert [list(sampler) for sampler in samplers] != indices
+
+
+def test_distributed_volume_sampler_without_process_group():
+    """Without a process group, the sampler samples all the slices."""
+    dataset = _VolumesDataset([5, 7])
+    sampler = DistributedVolumeSampler(dataset)
+    assert sampler.num_replicas == 1 and sampler.rank == 0
+    assert sorted(sampler) == list(range(len(dataset)))
+    assert isinstance(sampler, torch.utils.data.DistributedSampler)
+
+
+def test_distributed_volume_sampler_fewer_volumes_than_processes():
+    """Processes without a volume get the slices that do not fit in the other processes."""
+    dataset = _VolumesDataset([4])
+    indices = [list(DistributedVolumeSampler(dataset, num_replicas=2, rank=rank)) for rank in range(2)]
+    assert len(indices[0]) == len(indices[1]) == 2
+    assert sorted(indices[0] + indices[1]) == list(range(4))
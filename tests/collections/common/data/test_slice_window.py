@@ -0,0 +1,113 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import pickle
+
+import h5py
+import numpy as np
+import pytest
+
+from atommic.collections.common.data.slice_window import SliceWindowCache, read_consecutive_slices
+
+
+def _zero_padded_window(x, dataslice, consecutive_slices):
+    """Reference window, with the float64 zero padding that the datasets used to concatenate."""
+    num_slices = x.shape[0]
+    if consecutive_slices >= num_slices:
+        start = (consecutive_slices - num_slices) // 2
+        end = consecutive_slices - num_slices - start
+        return np.concatenate([np.zeros((start, *x.shape[1:])), x, np.zeros((end, *x.shape[1:]))])
+    half_slices = consecutive_slices // 2
+    start, end = dataslice - half_slices, dataslice + half_slices + 1
+    window = x[max(start, 0) : end]
+    return np.concatenate(
+        [
+            np.zeros((max(-start, 0), *x.shape[1:])),
+            window,
+            np.zeros((max(end - num_slices, 0), *x.shape[1:])),
+        ]
+    )
+
+
+@pytest.fixture
+def volume(tmp_path):
+    """Creates an HDF5 volume of 10 complex slices."""
+    rng = np.random.default_rng(0)
+    data = (rng.standard_normal((10, 3, 4)) + 1j * rng.standard_normal((10, 3, 4))).astype(np.complex64)
+    fname = tmp_path / "volume.h5"
+    with h5py.File(fname, "w") as hf:
+        hf.create_dataset("kspace", data=data)
+        hf.create_dataset("mask", data=np.ones((10, 4), dtype=np.uint8))
+    return fname, data
+
+
+@pytest.mark.parametrize("consecutive_slices", [2, 3, 5, 10, 13])
+@pytest.mark.parametrize("dtype", [np.complex64, np.float32, np.int16])
+def test_read_consecutive_slices(consecutive_slices, dtype):
+    """The windows match the zero-padded windows, in the dtype of the data."""
+    x = (np.arange(10 * 2 * 3).reshape(10, 2, 3) + 1).astype(dtype)
+    for dataslice in range(10):
+        window = read_consecutive_slices(x, dataslice, consecutive_slices)
+        assert window.dtype == dtype
+        np.testing.assert_array_equal(window, _zero_padded_window(x, dataslice, consecutive_slices))
+
+        window = read_consecutive_slices(np.moveaxis(x, 0, 2), dataslice, consecutive_slices, axis=2)
+        np.testing.assert_array_equal(np.moveaxis(window, 2, 0), _zero_padded_window(x, dataslice, consecutive_slices))
+
+
+@pytest.mark.parametrize("consecutive_slices", [3, 5, 12])
+def test_slice_window_cache_matches_file(volume, consecutive_slices):
+    """Windows read through the cache, in any order, match the windows read from the file."""
+    fname, data = volume
+    cache = SliceWindowCache(capacity=2)
+    order = list(range(10)) + list(np.random.default_rng(0).permutation(10)) + list(range(9, -1, -1))
+    with h5py.File(fname, "r") as hf:
+        for dataslice in order:
+            for key in ["kspace", "mask"]:
+                window = read_consecutive_slices(hf[key], dataslice, consecutive_slices, window_cache=cache)
+                assert window.dtype == hf[key].dtype
+                np.testing.assert_array_equal(
+                    window, read_consecutive_slices(hf[key][()], dataslice, consecutive_slices)
+                )
+    np.testing.assert_array_equal(read_consecutive_slices(data, 4, 3), data[3:6])
+    assert len(cache) == 2
+
+
+def test_slice_window_cache_reads_new_slices_only(volume, monkeypatch):
+    """Sliding the window by one slice reads only the new slice from the file."""
+    fname, _ = volume
+    reads = []
+    getitem = h5py.Dataset.__getitem__
+
+    def counting_getitem(self, args, *rest, **kwargs):
+        reads.append(args)
+        return getitem(self, args, *rest, **kwargs)
+
+    monkeypatch.setattr(h5py.Dataset, "__getitem__", counting_getitem)
+    cache = SliceWindowCache(capacity=1)
+    with h5py.File(fname, "r") as hf:
+        for dataslice in range(10):
+            read_consecutive_slices(hf["kspace"], dataslice, 5, window_cache=cache)
+        num_slices = sum(len(range(*s.indices(10))) for s in reads)
+        # every slice is read once
+        assert num_slices == 10
+
+        reads.clear()
+        for dataslice in range(10):
+            read_consecutive_slices(hf["kspace"], dataslice, 5, window_cache=SliceWindowCache(capacity=0))
+        assert sum(len(range(*s.indices(10))) for s in reads) > 30
+
+
+def test_slice_window_cache_evicts_and_pickles(volume):
+    """The least recently used datasets are dropped, and pickled caches keep their capacity but no slices."""
+    fname, _ = volume
+    cache = SliceWindowCache(capacity=1)
+    with h5py.File(fname, "r") as hf:
+        read_consecutive_slices(hf["kspace"], 0, 3, window_cache=cache)
+        read_consecutive_slices(hf["mask"], 0, 3, window_cache=cache)
+    assert len(cache) == 1
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.capacity == 1
+    assert len(restored) == 0
+    with pytest.raises(ValueError):
+        SliceWindowCache(capacity=-1)
@@ -364,6 +364,51 @@ class TestPoisson2DMaskFunc:
         mask, _ = mask_func(shape, scale=scale, tol=tolerance)
         assert torch.sum(mask) > 0
 
+    # Tests that the Poisson sampler is reproducible for a given seed.
+    def test_generate_poisson_mask_with_seed(self):
+        nx, ny = 48, 32
+        y, x = np.mgrid[:ny, :nx]
+        r = np.hypot(abs(x - nx / 2) / (nx / 2), abs(y - ny / 2) / (ny / 2))
+        radius_x = np.clip((1 + r * 4) * nx / nx, 1, None)
+        radius_y = np.clip((1 + r * 4) * ny / nx, 1, None)
+        mask1 = Poisson2DMaskFunc.generate_poisson_mask(nx, ny, 30, radius_x, radius_y, (4.0, 4.0), 42)
+        mask2 = Poisson2DMaskFunc.generate_poisson_mask(nx, ny, 30, radius_x, radius_y, (4.0, 4.0), 42)
+        assert mask1.shape == (ny, nx)
+        assert np.array_equal(mask1, mask2)
+        assert np.all(mask1[14:18, 22:26] == 1)
+
+    # Tests that the mask of a seed does not depend on the previous calls.
+    def test_generate_poisson_mask_independent_of_call_history(self):
+        shape = (1, 32, 32, 2)
+        mask_func = Poisson2DMaskFunc([0.08], [4])
+        expected = mask_func(shape, seed=7)[0]
+        for seed in range(3):
+            mask_func(shape, seed=seed)
+        assert torch.equal(mask_func(shape, seed=7)[0], expected)
+        assert torch.equal(Poisson2DMaskFunc([0.08], [4])(shape, seed=7)[0], expected)
+        assert not torch.equal(mask_func(shape, seed=8)[0], expected)
+
+    # Tests that masks are drawn from the bank once it is full.
+    def test_generate_poisson_mask_with_mask_bank(self):
+        shape = (1, 32, 32, 2)
+        mask_func = Poisson2DMaskFunc([0.08], [4], mask_bank_size=2)
+        masks = [mask_func(shape, seed=i)[0] for i in range(6)]
+        bank = next(iter(mask_func.mask_bank.values()))
+        assert len(mask_func.mask_bank) == 1 and len(bank) == 2
+        for mask in masks[2:]:
+            assert any(torch.equal(mask, banked) for banked in bank)
+
+    # Tests that the masks drawn from the bank depend on the seed only.
+    def test_mask_bank_draws_are_seeded(self):
+        shape = (1, 32, 32, 2)
+        mask_func = Poisson2DMaskFunc([0.08], [4], mask_bank_size=4)
+        for i in range(4):
+            mask_func(shape, seed=i)
+        draws = [mask_func(shape, seed=i)[0] for i in range(10, 20)]
+        for i, mask in zip(range(10, 20), draws):
+            assert torch.equal(mask_func(shape, seed=i)[0], mask)
+        assert len({tuple(mask.flatten().tolist()) for mask in draws}) > 1
+
 
 class TestRandom1DMaskFunc:
     """Tests that the code correctly generates a Random sub-sampling mask of the given shape."""
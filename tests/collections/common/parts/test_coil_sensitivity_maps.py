@@ -0,0 +1,46 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import torch
+
+from atommic.collections.common.parts.coil_sensitivity_maps import EspiritCalibration
+
+
+def _smooth_kspace(num_coils=4, n_x=32, n_y=28):
+    """Centered, orthonormal k-space of a Gaussian image with smooth coil sensitivity maps."""
+    yy, xx = torch.meshgrid(torch.linspace(-1, 1, n_x), torch.linspace(-1, 1, n_y), indexing="ij")
+    image = torch.exp(-(xx**2 + yy**2))
+    maps = torch.stack([torch.exp(1j * (0.5 * c * xx + 0.3 * yy)) * (1 + 0.3 * c * xx) for c in range(num_coils)])
+    maps = maps / (maps.abs() ** 2).sum(0).sqrt()
+    kspace = torch.fft.fftshift(
+        torch.fft.fft2(torch.fft.ifftshift(maps * image, dim=(-2, -1)), norm="ortho"), dim=(-2, -1)
+    )
+    acs_mask = torch.zeros(n_x, n_y)
+    acs_mask[n_x // 2 - 10 : n_x // 2 + 10, n_y // 2 - 10 : n_y // 2 + 10] = 1
+    return torch.view_as_real(kspace).float(), acs_mask, maps
+
+
+def test_espirit_calibration():
+    """ESPIRiT recovers smooth sensitivity maps, up to the phase of the first coil."""
+    kspace, acs_mask, maps = _smooth_kspace()
+    calibrator = EspiritCalibration(
+        threshold=0.02, crop=0.0, max_iter=50, fft_centered=True, fft_normalization="ortho"
+    )
+    sensitivity_map = torch.view_as_complex(calibrator(acs_mask, kspace))
+    assert sensitivity_map.shape == maps.shape
+    expected = maps * maps[0].conj() / maps[0].abs()
+    assert (sensitivity_map - expected)[:, 12:20, 10:18].abs().max() < 1e-2
+
+
+def test_espirit_calibration_batch():
+    """A batch is calibrated as its slices one at a time, and zero-padded coils get zero maps."""
+    kspace, acs_mask, _ = _smooth_kspace()
+    padded_kspace = torch.cat([kspace[1:], torch.zeros_like(kspace[:1])])
+    calibrator = EspiritCalibration(
+        threshold=0.02, crop=0.0, max_iter=50, fft_centered=True, fft_normalization="ortho"
+    )
+    sensitivity_map = calibrator(acs_mask.unsqueeze(0).unsqueeze(-1), torch.stack([kspace, padded_kspace]))
+    assert sensitivity_map.shape == (2, *kspace.shape)
+    torch.testing.assert_close(sensitivity_map[0], calibrator(acs_mask, kspace), rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(sensitivity_map[1, :-1], calibrator(acs_mask, kspace[1:]), rtol=1e-4, atol=1e-4)
+    assert sensitivity_map[1, -1].abs().max() == 0
@@ -24,6 +24,7 @@ from atommic.collections.common.parts import (
     crop_to_acs,
     expand_op,
     is_none,
+    magnitude_statistics,
     mask_center,
     normalize_inplace,
     parse_list_and_keep_last,
@@ -339,6 +340,29 @@ class TestIsNone:
         assert not is_none("ABC")
 
 
+class TestMagnitudeStatistics:
+    # Tests that the statistics match the separate reductions of the magnitude
+    def test_magnitude_statistics(self):
+        data = torch.randn(3, 4, 8, 8, dtype=torch.complex64)
+        stats = magnitude_statistics(data)
+        for key, reduction in (
+            ("min", torch.min),
+            ("max", torch.max),
+            ("mean", torch.mean),
+            ("std", torch.std),
+            ("var", torch.var),
+        ):
+            assert torch.allclose(stats[key], reduction(torch.abs(data)))
+
+    # Tests that the statistics are computed per example when a dimension is given
+    def test_magnitude_statistics_per_example(self):
+        data = torch.randn(3, 4, 8, 8, dtype=torch.complex64)
+        stats = magnitude_statistics(data, dim=1)
+        for key, value in stats.items():
+            assert value.shape == (3,)
+            assert torch.allclose(value, torch.stack([magnitude_statistics(x)[key] for x in data]))
+
+
 class TestMaskCenter:
     # Tests that the function correctly applies a center crop to a 2D input image.
     def test_behaviour_apply_center_crop_to_2D_input_image(self):
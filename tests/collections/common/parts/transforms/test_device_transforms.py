@@ -0,0 +1,66 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import default_collate
+
+from atommic.collections.common.data.subsample import Random1DMaskFunc
+from atommic.collections.common.parts.transforms import MRIDataTransforms
+
+
+def _transforms(device_transforms, **kwargs):
+    return MRIDataTransforms(
+        mask_func=[Random1DMaskFunc([0.08, 0.04], [4, 8])],
+        coil_dim=1,
+        device_transforms=device_transforms,
+        **kwargs,
+    )
+
+
+def _samples(num_samples=3, num_coils=4, size=24):
+    rng = np.random.default_rng(0)
+    for i in range(num_samples):
+        shape = (num_coils, size, size)
+        kspace = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64)
+        yield kspace, np.array([]), None, np.array([]), np.array([]), {}, f"file_{i}.h5", i
+
+
+def _assert_equal(outputs, expected):
+    if isinstance(expected, (list, tuple)):
+        assert len(outputs) == len(expected)
+        for output, expected_output in zip(outputs, expected):
+            _assert_equal(output, expected_output)
+    elif isinstance(expected, torch.Tensor):
+        torch.testing.assert_close(outputs, expected, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"normalize_inputs": False},
+        {"crop_size": [16, 16], "kspace_crop": True},
+        {"estimate_coil_sensitivity_maps": True, "coil_sensitivity_maps_type": "rss"},
+    ],
+)
+def test_device_transforms(kwargs):
+    """Transforming a batch gives the same data as transforming its samples and collating them."""
+    samples = list(_samples())
+    expected = default_collate([_transforms(False, **kwargs)(*sample) for sample in samples])
+    transforms = _transforms(True, **kwargs)
+    outputs = transforms.process_batch(default_collate([transforms(*sample) for sample in samples]))
+
+    # kspace, masked kspace, coil sensitivity maps, mask, initial prediction, target, accelerations
+    for i in (0, 1, 2, 3, 4, 5, 8):
+        _assert_equal(outputs[i], expected[i])
+    for key, value in expected[9].items():
+        if isinstance(value, torch.Tensor) and value.is_floating_point():
+            torch.testing.assert_close(outputs[9][key], value, rtol=1e-5, atol=1e-6, msg=key)
+
+
+def test_device_transforms_unsupported():
+    """Transforms that do not support batching are rejected."""
+    with pytest.raises(ValueError, match="SSDU"):
+        _transforms(True, ssdu=True)
@@ -95,3 +95,17 @@ class TestGeometricDecompositionCoilCompression:
         # Assert
         assert compressed_data.shape == (1, 32, 32, 2)
         assert not torch.allclose(rss(compressed_data), rss(data))
+
+    # Tests that a batch of slices is compressed as each slice on its own
+    def test_compress_batch_of_slices(self):
+        # Arrange
+        compressor = GeometricDecompositionCoilCompression(5, 24, True, False, "backward", (-2, -1))
+        data = torch.randn(3, 10, 32, 32, 2)
+
+        # Act
+        compressed_data = compressor(data)
+
+        # Assert
+        assert compressed_data.shape == (3, 5, 32, 32, 2)
+        for i in range(data.shape[0]):
+            assert torch.allclose(compressed_data[i], compressor(data[i]), atol=1e-4)
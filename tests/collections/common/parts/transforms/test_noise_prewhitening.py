@@ -4,6 +4,7 @@ __author__ = "Dimitris Karkalousos"
 import torch
 
 from atommic.collections.common.parts.transforms import NoisePreWhitening
+from atommic.collections.common.parts.utils import rss
 
 
 class TestNoisePreWhitening:
@@ -78,3 +79,65 @@ class TestNoisePreWhitening:
 
         # Assert that the shape of the result is the same as the input data
         assert result.shape == data.shape
+
+    # Tests that the optimal patch is the one with the lowest noise, as found by an exhaustive search.
+    def test_find_optimal_patch_size(self):
+        torch.manual_seed(0)
+        data = torch.randn([4, 100, 90], dtype=torch.complex64) * (1 + torch.rand([1, 100, 90]))
+        data[:, 30:70, 40:80] *= 0.1
+        data[:, 60:70, 20:30] *= 0.01
+
+        best_patch, min_noise = [], 1e10
+        for patch_length in [10, 20, 30, 40, 50]:
+            for x in range(0, data.shape[-2] - patch_length, 10):
+                for y in range(0, data.shape[-1] - patch_length, 10):
+                    noise = torch.std(rss(data[:, x : x + patch_length, y : y + patch_length]))
+                    if noise < min_noise:
+                        best_patch, min_noise = [x, x + patch_length, y, y + patch_length], noise
+
+        assert best_patch == [60, 70, 20, 30]
+        assert NoisePreWhitening.find_optimal_patch_size(torch.view_as_real(data)) == best_patch
+        assert NoisePreWhitening.find_optimal_patch_size(torch.view_as_real(data[:, :10, :10])) == []
+
+    # Tests that the optimal patch is searched once per volume, on its reference slice.
+    def test_optimal_patch_per_volume(self):
+        prewhitening = NoisePreWhitening()
+        data = torch.view_as_real(torch.randn([4, 100, 100], dtype=torch.complex64))
+        assert prewhitening.needs_reference("file.h5")
+        prewhitening(data, volume="file.h5", reference=data)
+        patch = prewhitening.optimal_patches["file.h5"]
+        assert not prewhitening.needs_reference("file.h5")
+
+        prewhitening.optimal_patches["file.h5"] = [0, 10, 0, 10]
+        result = prewhitening(data, volume="file.h5")
+        expected = NoisePreWhitening(find_patch_size=False, patch_size=[0, 10, 0, 10])(data)
+        assert torch.allclose(result, expected)
+        assert len(patch) == 4
+
+        # without a reference, the patch is searched on the data and not reused
+        prewhitening(data, volume="other.h5")
+        assert "other.h5" not in prewhitening.optimal_patches
+
+    # Tests that the patch of a volume does not depend on the order in which its slices are prewhitened.
+    def test_optimal_patch_independent_of_slice_order(self):
+        torch.manual_seed(0)
+        volume = torch.randn([5, 4, 100, 100], dtype=torch.complex64)
+        # every slice has its lowest noise in a different patch
+        for i in range(volume.shape[0]):
+            volume[i, :, 10 * i : 10 * i + 10, 20:30] *= 0.01
+        volume = torch.view_as_real(volume)
+        reference = volume[volume.shape[0] // 2]
+
+        results, patches = [], []
+        for order in [[0, 1, 2, 3, 4], [4, 2, 0, 3, 1], [3, 4, 1, 0, 2]]:
+            prewhitening = NoisePreWhitening()
+            result = {}
+            for i in order:
+                # as the datasets, the reference is only given until the patch of the volume is searched
+                slice_reference = reference if prewhitening.needs_reference("file.h5") else None
+                result[i] = prewhitening(volume[i], volume="file.h5", reference=slice_reference)
+            results.append(torch.stack([result[i] for i in range(volume.shape[0])]))
+            patches.append(prewhitening.optimal_patches["file.h5"])
+
+        assert patches[0] == patches[1] == patches[2] == [20, 30, 20, 30]
+        assert torch.equal(results[0], results[1]) and torch.equal(results[0], results[2])
@@ -52,8 +52,8 @@ class TestNormalizer:
 
         assert torch.mean(torch.abs(normalized_data)) != torch.mean(torch.abs(data))
         assert torch.std(torch.abs(normalized_data)) != torch.std(torch.abs(data))
-        assert attrs["mean"] == torch.mean(torch.abs(data))
-        assert attrs["std"] == torch.std(torch.abs(data))
+        assert torch.allclose(attrs["mean"], torch.mean(torch.abs(data)))
+        assert torch.allclose(attrs["std"], torch.std(torch.abs(data)))
 
     def test_mean_var_normalization(self):
         # Create an instance of the Normalizer class with normalization_type="max"
@@ -67,8 +67,8 @@ class TestNormalizer:
 
         assert torch.mean(torch.abs(normalized_data)) != torch.mean(torch.abs(data))
         assert torch.std(torch.abs(normalized_data)) != torch.std(torch.abs(data))
-        assert attrs["mean"] == torch.mean(torch.abs(data))
-        assert attrs["std"] == torch.std(torch.abs(data))
+        assert torch.allclose(attrs["mean"], torch.mean(torch.abs(data)))
+        assert torch.allclose(attrs["std"], torch.std(torch.abs(data)))
 
     def test_grayscale_normalization(self):
         # Create an instance of the Normalizer class with normalization_type="max"
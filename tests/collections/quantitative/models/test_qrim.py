@@ -8,7 +8,9 @@ from omegaconf import OmegaConf
 
 from atommic.collections.common.data.subsample import Random1DMaskFunc
 from atommic.collections.common.parts import utils
+from atommic.collections.quantitative.nn.base import SignalForwardModel
 from atommic.collections.quantitative.nn.qcirim import qCIRIM
+from atommic.collections.quantitative.nn.qrim_base.utils import analytical_log_likelihood_gradient
 from tests.collections.reconstruction.mri_data.conftest import create_input
 
 
@@ -325,3 +327,35 @@ def test_qrim(shape, cfg, center_fractions, accelerations, num_TEs, dimensionali
         raise AssertionError
     if phi_map_pred.shape[1:] != x.shape[2:4]:
         raise AssertionError
+
+
+@pytest.mark.parametrize("multiecho_kspace", [True, False])
+def test_analytical_log_likelihood_gradient_batched(multiecho_kspace):
+    """The gradient of a batch matches the gradients of its examples."""
+    generator = torch.Generator().manual_seed(0)
+    prediction = torch.randn(3, 4, 8, 10, generator=generator, dtype=torch.float64)
+    kspace_shape = [3, 4, 5, 8, 10, 2] if multiecho_kspace else [3, 5, 8, 10, 2]
+    masked_kspace = torch.randn(kspace_shape, generator=generator, dtype=torch.float64)
+    sensitivity_maps = torch.randn(3, 5, 8, 10, 2, generator=generator, dtype=torch.float64)
+    sampling_mask = (torch.rand(3, 1, 1, 10, 1, generator=generator) > 0.5).double()
+    TEs = [3.0, 11.5, 20.0, 28.5]
+    kwargs = {"fft_centered": True, "fft_normalization": "ortho", "spatial_dims": [-2, -1], "coil_dim": 2}
+    linear_forward_model = SignalForwardModel(sequence="MEGRE")
+
+    gradient = analytical_log_likelihood_gradient(
+        linear_forward_model, prediction, TEs, sensitivity_maps, masked_kspace, sampling_mask, **kwargs
+    )
+    assert gradient.shape == prediction.shape
+    for i in range(prediction.shape[0]):
+        torch.testing.assert_close(
+            gradient[i : i + 1],
+            analytical_log_likelihood_gradient(
+                linear_forward_model,
+                prediction[i : i + 1],
+                TEs,
+                sensitivity_maps[i : i + 1],
+                masked_kspace[i : i + 1],
+                sampling_mask[i : i + 1],
+                **kwargs,
+            ),
+        )
@@ -0,0 +1,56 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import pytest
+import torch
+
+from atommic.collections.quantitative.nn.base import SignalForwardModel
+
+
+def _maps(seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return [torch.randn(2, 6, 7, generator=generator, dtype=torch.float64) * s for s in (30.0, 1.0, 50.0, 1.0)]
+
+
+@pytest.mark.parametrize("sequence", ["MEGRE", "MEGRE_no_phase"])
+def test_signal_forward_model(sequence):
+    """All echoes are computed at once as the signal of every echo."""
+    R2star_map, S0_map, B0_map, phi_map = _maps()
+    S0_map[0, 0, 0] = float("nan")
+    TEs = [3.0, 11.5, 20.0, 28.5]
+    pred = SignalForwardModel(sequence=sequence)(R2star_map, S0_map, B0_map, phi_map, TEs)
+    assert pred.shape == (2, len(TEs), 6, 7, 2)
+
+    for i, TE in enumerate(TEs):
+        decay = torch.exp(-TE * 1e-3 * R2star_map)
+        if sequence == "MEGRE":
+            signal = (S0_map + 1j * phi_map) * decay * torch.exp(-1j * TE * 1e-3 * B0_map)
+        else:
+            signal = S0_map * decay * (1 + 1j)
+        signal = torch.view_as_real(signal)
+        torch.testing.assert_close(pred[:, i], torch.where(torch.isnan(signal), torch.zeros_like(signal), signal))
+
+
+def test_MEGRE_jacobian():
+    """The analytic derivatives match the derivatives of the signal computed with autograd."""
+    maps = _maps()
+    TEs = [3.0, 11.5, 20.0, 28.5]
+    model = SignalForwardModel(sequence="MEGRE")
+    R2star_map_der, S0_map_der = model.MEGREJacobian(*maps, TEs)
+
+    for map_idx, der in [(0, R2star_map_der), (1, S0_map_der)]:
+        # the maps are pixel-wise, so the derivative of the sum over pixels gives the derivative of every pixel
+        expected = []
+        for part in range(2):
+            inputs = [m.clone().requires_grad_(i == map_idx) for i, m in enumerate(maps)]
+            pred = model(*inputs, TEs)
+            expected.append(
+                torch.stack(
+                    [
+                        torch.autograd.grad(pred[:, e, ..., part].sum(), inputs[map_idx], retain_graph=True)[0]
+                        for e in range(len(TEs))
+                    ],
+                    1,
+                )
+            )
+        torch.testing.assert_close(der, torch.complex(*expected))
@@ -0,0 +1,59 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import numpy as np
+import torch
+
+from atommic.collections.quantitative.parts.transforms import (
+    LeastSquaresFitting,
+    R2star_B0_S0_phi_mapping,
+    R2star_mapping,
+)
+
+
+def test_weighted_linear_fit_matches_polyfit():
+    """The batched weighted fit gives the same slope and intercept as a per-signal weighted ``np.polyfit``."""
+    rng = np.random.default_rng(0)
+    x = np.array([3.0, 11.5, 20.0, 28.5]) * 1e-3
+    y = rng.standard_normal((4, 50))
+    w = rng.random((4, 50))
+    slope, intercept = LeastSquaresFitting.weighted_linear_fit(
+        torch.from_numpy(x), torch.from_numpy(y), torch.from_numpy(w)
+    )
+    expected = np.stack([np.polyfit(x, y[:, i], 1, w=w[:, i]) for i in range(y.shape[1])])
+    np.testing.assert_allclose(slope.numpy(), expected[:, 0], rtol=1e-8)
+    np.testing.assert_allclose(intercept.numpy(), expected[:, 1], rtol=1e-8, atol=1e-12)
+
+
+def test_R2star_mapping_recovers_decay():
+    """A mono-exponential decay is mapped to its R2* value."""
+    TEs = [3.0, 11.5, 20.0, 28.5]
+    R2star = torch.linspace(10, 50, 6 * 8, dtype=torch.float64).view(6, 8)
+    signal = torch.exp(-torch.tensor(TEs, dtype=torch.float64).view(-1, 1, 1) * 1e-3 * R2star)
+    prediction = torch.stack([signal, torch.zeros_like(signal)], dim=-1)
+    R2star_map = R2star_mapping(prediction, TEs, scaling_factor=1e-3)
+    assert R2star_map.shape == (6, 8)
+    torch.testing.assert_close(R2star_map, R2star, rtol=1e-4, atol=1e-4)
+
+
+def test_R2star_B0_S0_phi_mapping_batched():
+    """Mapping a batch at once gives the same maps, and smooths the input the same way, as mapping every example."""
+    generator = torch.Generator().manual_seed(0)
+    prediction = torch.randn(3, 4, 8, 10, 2, generator=generator, dtype=torch.float64)
+    anatomy_mask = (torch.rand(3, 8, 10, generator=generator) > 0.2).double()
+    TEs = [3.0, 11.5, 20.0, 28.5]
+    kwargs = {"fft_centered": False, "fft_normalization": "backward", "spatial_dims": [-2, -1]}
+
+    batch_prediction = prediction.clone()
+    batch_maps = R2star_B0_S0_phi_mapping(batch_prediction, TEs, anatomy_mask, **kwargs)
+
+    examples_prediction = prediction.clone()
+    examples_maps = [
+        R2star_B0_S0_phi_mapping(examples_prediction[i], TEs, anatomy_mask[i], **kwargs)
+        for i in range(prediction.shape[0])
+    ]
+
+    for i, batch_map in enumerate(batch_maps):
+        assert batch_map.shape == (3, 8, 10)
+        torch.testing.assert_close(batch_map, torch.stack([maps[i] for maps in examples_maps]))
+    torch.testing.assert_close(batch_prediction, examples_prediction)
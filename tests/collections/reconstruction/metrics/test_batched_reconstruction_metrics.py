@@ -0,0 +1,44 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import numpy as np
+import pytest
+import torch
+
+from atommic.collections.reconstruction.metrics.batched_reconstruction_metrics import (
+    VolumeMetricsAccumulator,
+    batched_mse,
+    batched_nmse,
+    batched_psnr,
+    batched_ssim,
+)
+from atommic.collections.reconstruction.metrics.reconstruction_metrics import mse, nmse, psnr, ssim
+
+
+@pytest.mark.parametrize(
+    "metric, batched_metric", [(mse, batched_mse), (nmse, batched_nmse), (psnr, batched_psnr), (ssim, batched_ssim)]
+)
+@pytest.mark.parametrize("shape", [(3, 1, 32, 40), (2, 3, 24, 24)])
+def test_batched_metrics_match_numpy_metrics(metric, batched_metric, shape):
+    """The batched metrics give the same results as the per-slice NumPy and scikit-image metrics."""
+    torch.manual_seed(0)
+    x = torch.rand(shape, dtype=torch.float64)
+    y = 0.7 * x + 0.1 * torch.rand(shape, dtype=torch.float64)
+    expected = np.array([metric(x[i].numpy(), y[i].numpy()) for i in range(shape[0])])
+    np.testing.assert_allclose(batched_metric(x, y).numpy(), expected, rtol=1e-10)
+
+
+def test_accumulator_volume_means():
+    """The accumulator averages the slices of each volume and grows beyond its initial capacity."""
+    accumulator = VolumeMetricsAccumulator(["MSE", "SSIM"], capacity=1)
+    accumulator.update(["a", "b", "a"], {"MSE": torch.tensor([1.0, 2.0, 3.0]), "SSIM": torch.tensor([0.5, 1.0, 0.5])})
+    accumulator.update(["c"], {"MSE": torch.tensor([4.0]), "SSIM": torch.tensor([0.0])})
+    assert len(accumulator) == 3
+    means = accumulator.volume_means()
+    assert means["MSE"].tolist() == [2.0, 2.0, 4.0]
+    assert means["SSIM"].tolist() == [0.5, 1.0, 0.0]
+    assert accumulator.sum_of_volume_means()["MSE"].item() == 8.0
+    accumulator.reset()
+    assert len(accumulator) == 0
+    accumulator.update(["d"], {"MSE": torch.tensor([1.0]), "SSIM": torch.tensor([1.0])})
+    assert accumulator.volume_means()["MSE"].tolist() == [1.0]
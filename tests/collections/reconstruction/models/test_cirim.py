@@ -335,3 +335,60 @@ def test_cirim(shape, cfg, center_fractions, accelerations, dimensionality, trai
 
     if y.shape != x.shape:
         raise AssertionError
+
+
+@pytest.mark.parametrize("no_dc, num_cascades", [(True, 2), (False, 1)])
+def test_cirim_inference_mode(no_dc, num_cascades):
+    """
+    Test that CIRIM in inference mode keeps only the final prediction, which is the same as the last one otherwise
+
+    Args:
+        no_dc: whether data consistency is disabled
+        num_cascades: number of cascades
+
+    Returns:
+        None
+    """
+    mask_func = Random1DMaskFunc([0.08], [4])
+    x = create_input([1, 3, 32, 16, 2])
+    output, mask, _ = utils.apply_mask(x / x.abs().max(), mask_func, seed=123)
+    mask = mask.bool()
+
+    cfg = OmegaConf.create(
+        {
+            "recurrent_layer": "IndRNN",
+            "conv_filters": [16, 16, 2],
+            "conv_kernels": [5, 3, 3],
+            "conv_dilations": [1, 2, 1],
+            "conv_bias": [True, True, False],
+            "recurrent_filters": [16, 16, 0],
+            "recurrent_kernels": [1, 1, 0],
+            "recurrent_dilations": [1, 1, 0],
+            "recurrent_bias": [True, True, False],
+            "depth": 2,
+            "conv_dim": 2,
+            "time_steps": 8,
+            "num_cascades": num_cascades,
+            "accumulate_predictions": True,
+            "no_dc": no_dc,
+            "keep_prediction": True,
+            "use_sens_net": False,
+            "coil_combination_method": "SENSE",
+            "fft_centered": True,
+            "fft_normalization": "ortho",
+            "spatial_dims": [-2, -1],
+            "coil_dim": 1,
+            "dimensionality": 2,
+            "reconstruction_loss": {"l1": 1.0},
+        }
+    )
+    cirim = CIRIM(cfg).eval()
+
+    with torch.no_grad():
+        predictions = cirim.forward(output, output, mask, None)
+        cirim.inference_mode = True
+        inference_predictions = cirim.forward(output, output, mask, None)
+
+    assert len(predictions) == num_cascades and len(predictions[-1]) == 8
+    assert len(inference_predictions) == 1 and len(inference_predictions[0]) == 1
+    torch.testing.assert_close(inference_predictions[0][0], predictions[-1][-1])
@@ -0,0 +1,92 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import pytest
+import torch
+
+from atommic.collections.reconstruction.parts.conjugate_gradient import conjugate_gradient, conjugate_gradient_solve
+
+
+def _system(batch_size=3, n=6, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    B = torch.randn(batch_size, n, n, 2, generator=generator, dtype=torch.float64)
+    rhs = torch.randn(batch_size, n, 2, generator=generator, dtype=torch.float64)
+    B, rhs = torch.view_as_complex(B), torch.view_as_complex(rhs)
+    return B, torch.tensor([0.5], dtype=torch.float64), rhs
+
+
+def _matrix(B, mu):
+    return B @ B.mH + mu * torch.eye(B.shape[-1], dtype=B.dtype)
+
+
+def _operator(B, mu):
+    return lambda x: (_matrix(B, mu) @ x.unsqueeze(-1)).squeeze(-1)
+
+
+def test_conjugate_gradient_solve():
+    """The solver matches a direct solve, and stops early once every example has converged."""
+    B, mu, rhs = _system()
+    expected = torch.linalg.solve(_matrix(B, mu), rhs)
+    x = conjugate_gradient_solve(_operator(B, mu), rhs, max_iter=50, tol=1e-10)
+    torch.testing.assert_close(x, expected)
+
+    calls = []
+
+    def operator(x):
+        calls.append(x)
+        return _operator(B, mu)(x)
+
+    conjugate_gradient_solve(operator, rhs, max_iter=50, tol=1e-10)
+    assert len(calls) < 50
+
+
+def test_conjugate_gradient_per_example():
+    """Converged examples are not updated, so an easy example does not wait for a hard one."""
+    B, mu, rhs = _system()
+    B[0] = 0
+    x = conjugate_gradient_solve(_operator(B, mu), rhs, max_iter=50, tol=1e-10)
+    # the first system is mu * I, which is solved exactly in one step
+    torch.testing.assert_close(x[0], rhs[0] / mu)
+    torch.testing.assert_close(x, torch.linalg.solve(_matrix(B, mu), rhs))
+
+
+def test_conjugate_gradient_warm_start():
+    """Starting from the solution returns it without iterating."""
+    B, mu, rhs = _system()
+    expected = torch.linalg.solve(_matrix(B, mu), rhs)
+    calls = []
+
+    def operator(x):
+        calls.append(x)
+        return _operator(B, mu)(x)
+
+    x = conjugate_gradient_solve(operator, rhs, x0=expected, max_iter=50, tol=1e-6)
+    torch.testing.assert_close(x, expected)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("requires_grad", [(True, True, True), (False, True, False), (True, False, False)])
+def test_conjugate_gradient_implicit_gradients(requires_grad):
+    """The implicit gradients match the gradients of a direct solve."""
+    B, mu, rhs = _system()
+    weights = torch.randn(rhs.shape, dtype=torch.float64)
+    tensors = [B, mu, rhs]
+    for tensor, grad in zip(tensors, requires_grad):
+        tensor.requires_grad_(grad)
+
+    x = conjugate_gradient(_operator(B, mu), rhs, params=(B, mu), max_iter=50, tol=1e-12)
+    grads = torch.autograd.grad((weights * x.abs()).sum(), [t for t in tensors if t.requires_grad])
+
+    expected = torch.linalg.solve(_matrix(B, mu), rhs)
+    expected_grads = torch.autograd.grad((weights * expected.abs()).sum(), [t for t in tensors if t.requires_grad])
+    for grad, expected_grad in zip(grads, expected_grads):
+        torch.testing.assert_close(grad, expected_grad)
+
+
+def test_conjugate_gradient_no_grad():
+    """The autograd function is only used when gradients are needed."""
+    B, mu, rhs = _system()
+    rhs.requires_grad_(True)
+    with torch.no_grad():
+        x = conjugate_gradient(_operator(B, mu), rhs, params=(B, mu), max_iter=50)
+    assert x.grad_fn is None
@@ -0,0 +1,57 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import numpy as np
+import pytest
+import torch
+from scipy.spatial.distance import directed_hausdorff
+
+from atommic.collections.segmentation.metrics.segmentation_metrics import (
+    asd,
+    hausdorff_distance_95_metric,
+    hausdorff_distance_metric,
+    surface_distances,
+)
+
+
+def _scipy_hausdorff(x, y, sum_method):
+    """Directed Hausdorff distances of every slice, computed with scipy on the label maps."""
+    hd1, hd2 = [], []
+    for sl in range(x.shape[0]):
+        hdx = x[sl].float().argmax(0).numpy() if sum_method == "max" else x[sl].float().sum(0).numpy()
+        hdy = y[sl].float().argmax(0).numpy() if sum_method == "max" else y[sl].float().sum(0).numpy()
+        hd1.append(directed_hausdorff(hdx, hdy)[0])
+        hd2.append(directed_hausdorff(hdy, hdx)[0])
+    return np.array(hd1), np.array(hd2)
+
+
+@pytest.mark.parametrize("sum_method", ["max", "sum"])
+def test_hausdorff_distances_match_scipy(sum_method):
+    """The batched Hausdorff distances are identical to the per-slice scipy distances."""
+    torch.manual_seed(0)
+    x = torch.randint(0, 2, (4, 3, 32, 24))
+    y = torch.randint(0, 2, (4, 3, 32, 24))
+    hd1, hd2 = _scipy_hausdorff(x, y, sum_method)
+    assert hausdorff_distance_metric(x, y, sum_method=sum_method) == np.mean(np.maximum(hd1, hd2))
+    expected_hd95 = np.mean([np.percentile(np.hstack((a, b)), 95) for a, b in zip(hd1, hd2)])
+    assert hausdorff_distance_95_metric(x, y, sum_method=sum_method) == pytest.approx(expected_hd95, rel=1e-12)
+    # not batched, with numpy inputs
+    assert hausdorff_distance_95_metric(x[0].numpy(), y[0].numpy(), batched=False, sum_method=sum_method) == (
+        pytest.approx(np.percentile(np.hstack((hd1[0], hd2[0])), 95), rel=1e-12)
+    )
+    with pytest.raises(ValueError):
+        hausdorff_distance_metric(x, y, batched=False, sum_method=sum_method)
+
+
+def test_asd_matches_surface_distances():
+    """The average symmetric surface distance equals the mean of both directed surface distances."""
+    rng = np.random.default_rng(0)
+    x = rng.random((2, 3, 32, 32)) > 0.6
+    y = rng.random((2, 3, 32, 32)) > 0.6
+    for voxelspacing in (None, (1, 1, 2, 0.5, 1)):
+        expected = (
+            np.mean(surface_distances(y, x, voxelspacing)) + np.mean(surface_distances(x, y, voxelspacing))
+        ) / 2
+        assert asd(x, y, voxelspacing) == expected
+    with pytest.raises(RuntimeError, match="first"):
+        asd(x, np.zeros_like(y))
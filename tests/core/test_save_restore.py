@@ -375,3 +375,55 @@ class TestSaveRestore:
         assert extracted_tempdir in restored_metadata.restoration_path
         assert extracted_tempdir not in atommic_filepath
         assert not os.path.exists(atommic_filepath)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("weights_format", ["ckpt", "safetensors"])
+    def test_restore_from_archive(self, weights_format):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cfg = _mock_model_config()
+            model = MockModel(cfg=cfg.model)
+            connector = save_restore_connector.SaveRestoreConnector()
+            connector.weights_format = weights_format
+            model._save_restore_connector = connector
+            save_path = os.path.join(tmpdir, "save.atommic")
+            model.save_to(save_path)
+
+            # the weights are read from the archive, and only the config is extracted
+            extracted_dir = os.path.join(tmpdir, "extracted")
+            connector._unpack_atommic_file(
+                save_path, extracted_dir, exclude={connector.model_weights_ckpt, connector.model_weights_tensor_file}
+            )
+            assert os.listdir(extracted_dir) == [connector.model_config_yaml]
+
+            restored_model, state_dict = MockModel.restore_from(save_path, map_location=torch.device("cpu"))
+            assert torch.equal(restored_model.w.weight, model.w.weight)
+            assert torch.equal(restored_model.w.bias, model.w.bias)
+
+            state_dict = MockModel.extract_state_dict_from(save_path, os.path.join(tmpdir, "ckpts"))
+            assert torch.equal(state_dict["w.weight"], model.w.weight)
+
+    @pytest.mark.unit
+    def test_restore_from_archive_shared_weights(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cfg = _mock_model_config()
+            model = MockModel(cfg=cfg.model)
+            connector = save_restore_connector.SaveRestoreConnector()
+            connector.weights_format = "safetensors"
+            model._save_restore_connector = connector
+            save_path = os.path.join(tmpdir, "save.atommic")
+            model.save_to(save_path)
+
+            connector = save_restore_connector.SaveRestoreConnector()
+            connector.share_weights = True
+            restored_model, state_dict = MockModel.restore_from(
+                save_path, map_location=torch.device("cpu"), save_restore_connector=connector
+            )
+            # the parameters are the memory-mapped weights
+            assert restored_model.w.weight.data_ptr() == state_dict["w.weight"].data_ptr()
+            assert torch.equal(restored_model.w.weight, model.w.weight)
+
+            # the pages are copy-on-write, so modifying the weights does not modify the file
+            with torch.no_grad():
+                restored_model.w.weight.add_(1)
+            restored_model, _ = MockModel.restore_from(save_path, map_location=torch.device("cpu"))
+            assert torch.equal(restored_model.w.weight, model.w.weight)
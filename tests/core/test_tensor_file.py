@@ -0,0 +1,58 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import json
+import struct
+
+import pytest
+import torch
+
+from atommic.core.connectors.tensor_file import load_tensor_file, mmap_file, save_tensor_file
+
+
+@pytest.mark.unit
+def test_tensor_file(tmp_path):
+    state_dict = {
+        "weight": torch.randn(3, 4),
+        "bias": torch.randn(4, dtype=torch.float64),
+        "half": torch.randn(5, dtype=torch.bfloat16),
+        "mask": torch.rand(7) > 0.5,
+        "steps": torch.tensor(3),
+        "empty": torch.empty(0, 2),
+        "phase": torch.randn(2, 3, dtype=torch.complex64),
+        "transposed": torch.randn(4, 3).t(),
+    }
+    filepath = str(tmp_path / "weights.safetensors")
+    save_tensor_file(state_dict, filepath)
+
+    # the header is padded, and every tensor is aligned to its item size
+    with open(filepath, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    assert header_size % 8 == 0
+    item_sizes = {"F64": 8, "F32": 4, "BF16": 2, "I64": 8, "BOOL": 1}
+    for name, info in header.items():
+        if name != "__metadata__":
+            assert info["data_offsets"][0] % item_sizes[info["dtype"]] == 0
+
+    loaded = load_tensor_file(mmap_file(filepath))
+    assert list(loaded) == list(state_dict)
+    for name, tensor in state_dict.items():
+        assert loaded[name].dtype == tensor.dtype
+        assert torch.equal(loaded[name], tensor)
+
+
+@pytest.mark.unit
+def test_tensor_file_offset(tmp_path):
+    state_dict = {"weight": torch.randn(3, 4)}
+    filepath = str(tmp_path / "weights.safetensors")
+    save_tensor_file(state_dict, filepath)
+    with open(filepath, "rb") as f:
+        buffer = b"\0" * 512 + f.read()
+    assert torch.equal(load_tensor_file(buffer, offset=512)["weight"], state_dict["weight"])
+
+
+@pytest.mark.unit
+def test_tensor_file_unsupported(tmp_path):
+    with pytest.raises(TypeError, match="Only tensors"):
+        save_tensor_file({"steps": 3}, str(tmp_path / "weights.safetensors"))
@@ -0,0 +1,153 @@
+# coding=utf-8
+__author__ = "Dimitris Karkalousos"
+
+import csv
+import json
+import multiprocessing
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+from runstats import Statistics
+from tqdm import tqdm
+
+
+def list_targets(targets_dir: str) -> List[Path]:
+    """Lists the target volumes of an evaluation, from a directory or a json file with a list of paths.
+
+    Parameters
+    ----------
+    targets_dir : str
+        Path to the directory of the targets, or to a json file listing them.
+
+    Returns
+    -------
+    List[Path]
+        The target volumes, sorted so that the per-volume results are written in a deterministic order.
+    """
+    if targets_dir.endswith(".json"):
+        with open(targets_dir, "r", encoding="utf-8") as f:
+            targets = json.load(f)
+        return sorted(Path(target) for target in targets)
+    return sorted(Path(targets_dir).iterdir())
+
+
+def slice_reader(dataset) -> Tuple[int, Callable[[int], np.ndarray]]:
+    """Streams the slices of an HDF5 dataset, as if the whole dataset was read and squeezed.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        The dataset, with the slices on the first non-singleton dimension.
+
+    Returns
+    -------
+    Tuple[int, Callable[[int], np.ndarray]]
+        The number of slices and a function that reads the squeezed i-th slice.
+    """
+    axis = next((i for i, size in enumerate(dataset.shape) if size != 1), 0)
+    leading = (0,) * axis
+    return dataset.shape[axis], lambda i: np.squeeze(dataset[leading + (i,)])
+
+
+def normalize_per_slice(x: np.ndarray) -> np.ndarray:
+    """Normalizes every 2D slice of an array by its maximum magnitude and returns the magnitude."""
+    return np.abs(x / np.max(np.abs(x), axis=(-2, -1), keepdims=True))
+
+
+def evaluate_volumes(
+    evaluate_volume: Callable[[Path], Dict[str, Statistics]], targets: Sequence[Path], num_workers: int = 0
+) -> List[Tuple[str, Dict[str, Statistics]]]:
+    """Evaluates volumes in parallel, sharding them across worker processes.
+
+    Parameters
+    ----------
+    evaluate_volume : Callable[[Path], Dict[str, Statistics]]
+        Picklable function that evaluates a target volume and returns the running statistics of each metric.
+    targets : Sequence[Path]
+        The target volumes.
+    num_workers : int, optional
+        Number of worker processes. ``0`` or ``1`` evaluates the volumes in the current process. Default is ``0``.
+
+    Returns
+    -------
+    List[Tuple[str, Dict[str, Statistics]]]
+        The filename and the statistics of each volume, in the order of ``targets``.
+    """
+    progress = {"total": len(targets), "desc": "Evaluating", "unit": "volume"}
+    if num_workers <= 1:
+        results = [evaluate_volume(target) for target in tqdm(targets, **progress)]
+    else:
+        with multiprocessing.Pool(min(num_workers, len(targets))) as pool:
+            results = list(tqdm(pool.imap(evaluate_volume, targets), **progress))
+    return [(Path(target).name, volume_scores) for target, volume_scores in zip(targets, results)]
+
+
+def merge_scores(scores, per_volume_scores: List[Tuple[str, Dict[str, Statistics]]]):
+    """Merges the statistics of every volume into the summary metrics.
+
+    Parameters
+    ----------
+    scores : Union[ReconstructionMetrics, SegmentationMetrics, qMRIMetrics]
+        The summary metrics, holding a ``metrics_scores`` dict of running statistics.
+    per_volume_scores : List[Tuple[str, Dict[str, Statistics]]]
+        The statistics of each volume, as returned by :func:`evaluate_volumes`.
+    """
+    for _, volume_scores in per_volume_scores:
+        for metric, stat in volume_scores.items():
+            scores.metrics_scores[metric] += stat
+
+
+def _to_builtin(value) -> Union[float, List]:
+    """Converts a metric value, which might be a numpy scalar or array, to a json serializable value."""
+    value = np.asarray(value)
+    return value.item() if value.ndim == 0 else value.tolist()
+
+
+def write_results(output_dir: Union[str, Path], model: str, scores, per_volume_scores):
+    """Writes the summary and the per-volume metrics of an evaluation.
+
+    The summary is appended to ``results.txt``, the per-volume means are written to ``{model}_per_volume.csv``, and
+    both are written to ``{model}.json``.
+
+    Parameters
+    ----------
+    output_dir : Union[str, Path]
+        The output directory.
+    model : str
+        The name of the evaluated model.
+    scores : Union[ReconstructionMetrics, SegmentationMetrics, qMRIMetrics]
+        The summary metrics.
+    per_volume_scores : List[Tuple[str, Dict[str, Statistics]]]
+        The statistics of each volume, as returned by :func:`evaluate_volumes`.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # if file exists dont' overwrite, but append in a new line
+    with open(output_dir / "results.txt", "a", encoding="utf-8") as f:
+        f.write(f"{model}: {repr(scores)}\n")
+
+    metric_names = list(scores.metrics_scores)
+    volumes = [
+        {
+            "fname": fname,
+            "num_samples": len(next(iter(volume_scores.values()))) if volume_scores else 0,
+            **{metric: _to_builtin(stat.mean()) for metric, stat in volume_scores.items() if len(stat) > 0},
+        }
+        for fname, volume_scores in per_volume_scores
+    ]
+
+    with open(output_dir / f"{model}_per_volume.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["fname", "num_samples"] + metric_names)
+        writer.writeheader()
+        writer.writerows(volumes)
+
+    summary = {
+        metric: {
+            "mean": _to_builtin(stat.mean()) if len(stat) > 0 else None,
+            "stddev": _to_builtin(stat.stddev()) if len(stat) > 1 else None,
+        }
+        for metric, stat in scores.metrics_scores.items()
+    }
+    with open(output_dir / f"{model}.json", "w", encoding="utf-8") as f:
+        json.dump({"model": model, "summary": summary, "volumes": volumes}, f, indent=2)
@@ -1,14 +1,21 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import json
 import os
+from functools import partial
 from pathlib import Path
 
 import h5py
 import numpy as np
+from evaluation_runner import (
+    evaluate_volumes,
+    list_targets,
+    merge_scores,
+    normalize_per_slice,
+    slice_reader,
+    write_results,
+)
 from runstats import Statistics
-from tqdm import tqdm
 
 from atommic.collections.common.parts import center_crop
 from atommic.collections.reconstruction.metrics.reconstruction_metrics import mse, nmse, psnr, ssim
@@ -68,61 +75,77 @@ class qMRIMetrics:
         return res
 
 
-def main(args):
-    # if json file
-    if args.targets_dir.endswith(".json"):
-        with open(args.targets_dir, "r", encoding="utf-8") as f:
-            targets = json.load(f)
-        targets = [Path(target) for target in targets]
-    else:
-        targets = list(Path(args.targets_dir).iterdir())
+def evaluate_volume(target: Path, args) -> dict:
+    """Evaluates the quantitative maps of a single volume against its target, streaming slices from the files.
+
+    Parameters
+    ----------
+    target : Path
+        Path to the target volume. The prediction and the anatomy mask have the same filename in
+        ``args.predictions_dir`` and ``args.segmentations_masks_dir``.
+    args : argparse.Namespace
+        The command line arguments.
+
+    Returns
+    -------
+    dict
+        The running statistics of each metric for this volume.
+    """
+    scores = qMRIMetrics(METRIC_FUNCS)
+    with h5py.File(target, "r") as target_file, h5py.File(
+        Path(args.predictions_dir) / target.name, "r"
+    ) as prediction_file, h5py.File(Path(args.segmentations_masks_dir) / target.name, "r") as anatomy_mask_file:
+        target_dataset = target_file["qmaps"]
+        prediction_dataset = prediction_file["qmaps"]
+        anatomy_mask_dataset = anatomy_mask_file["anatomy_mask"]
+
+        crop_size = None
+        if args.crop_size is not None:
+            crop_size = [
+                min(int(args.crop_size[0]), target_dataset.shape[-2], prediction_dataset.shape[-2]),
+                min(int(args.crop_size[1]), target_dataset.shape[-1], prediction_dataset.shape[-1]),
+            ]
+
+        def prepare(x: np.ndarray, anatomy_mask: np.ndarray) -> np.ndarray:
+            """Crops, normalizes per slice and per map, and masks a slice or a volume of quantitative maps."""
+            if crop_size is not None:
+                x = center_crop(x, crop_size)
+                anatomy_mask = center_crop(anatomy_mask, crop_size)
+            return normalize_per_slice(x) * np.expand_dims(anatomy_mask, -3)
+
+        if args.evaluation_type == "per_slice":
+            num_slices, read_target_slice = slice_reader(target_dataset)
+            _, read_prediction_slice = slice_reader(prediction_dataset)
+            _, read_anatomy_mask_slice = slice_reader(anatomy_mask_dataset)
+            for sl in range(num_slices):
+                anatomy_mask = read_anatomy_mask_slice(sl)
+                target_slice = prepare(read_target_slice(sl), anatomy_mask)
+                prediction_slice = prepare(read_prediction_slice(sl), anatomy_mask)
+                for qmap_idx in range(prediction_slice.shape[0]):
+                    scores.push(target_slice[qmap_idx], prediction_slice[qmap_idx])
+        elif args.evaluation_type == "per_volume":
+            anatomy_mask = anatomy_mask_dataset[()].squeeze()
+            target_volume = prepare(target_dataset[()].squeeze(), anatomy_mask)
+            prediction_volume = prepare(prediction_dataset[()].squeeze(), anatomy_mask)
+            for qmap_idx in range(prediction_volume.shape[1]):
+                scores.push(target_volume[:, qmap_idx], prediction_volume[:, qmap_idx])
+
+    return scores.metrics_scores
+
 
-    crop_size = args.crop_size
-    evaluation_type = args.evaluation_type
+def main(args):
+    targets = list_targets(args.targets_dir)
 
+    per_volume_scores = evaluate_volumes(partial(evaluate_volume, args=args), targets, args.num_workers)
     scores = qMRIMetrics(METRIC_FUNCS)
-    for target in tqdm(targets):
-        fname = str(target).rsplit("/", maxsplit=1)[-1]
-
-        target = h5py.File(target, "r")["qmaps"][()].squeeze()
-        prediction = h5py.File(Path(args.predictions_dir) / fname, "r")["qmaps"][()].squeeze()
-        anatomy_mask = h5py.File(Path(args.segmentations_masks_dir) / fname, "r")["anatomy_mask"][()].squeeze()
-
-        if crop_size is not None:
-            crop_size[0] = target.shape[-2] if target.shape[-2] < int(crop_size[0]) else int(crop_size[0])
-            crop_size[1] = target.shape[-1] if target.shape[-1] < int(crop_size[1]) else int(crop_size[1])
-            crop_size[0] = prediction.shape[-2] if prediction.shape[-2] < int(crop_size[0]) else int(crop_size[0])
-            crop_size[1] = prediction.shape[-1] if prediction.shape[-1] < int(crop_size[1]) else int(crop_size[1])
-
-            target = center_crop(target, crop_size)
-            prediction = center_crop(prediction, crop_size)
-            anatomy_mask = center_crop(anatomy_mask, crop_size)
-
-        # normalize per slice
-        for i in range(target.shape[0]):
-            # normalize per echo
-            for j in range(target.shape[1]):
-                target[i, j] = np.abs(target[i, j] / np.max(np.abs(target[i, j]))) * anatomy_mask[i]
-                prediction[i, j] = np.abs(prediction[i, j] / np.max(np.abs(prediction[i, j]))) * anatomy_mask[i]
-
-        if evaluation_type == "per_slice":
-            for sl in range(target.shape[0]):
-                for qmap_idx in range(prediction.shape[1]):
-                    scores.push(target[sl, qmap_idx], prediction[sl, qmap_idx])
-        elif evaluation_type == "per_volume":
-            for qmap_idx in range(prediction.shape[1]):
-                scores.push(target[:, qmap_idx], prediction[:, qmap_idx])
+    merge_scores(scores, per_volume_scores)
 
     model = args.predictions_dir.split("/")
     model = model[-4] if model[-4] != "default" else model[-5]
     print(f"{model}: {repr(scores)}")
 
     if args.output_dir is not None:
-        output_dir = Path(args.output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        # if file exists dont' overwrite, but append in a new line
-        with open(output_dir / "results.txt", "a", encoding="utf-8") as f:
-            f.write(f"{model}: {repr(scores)}\n")
+        write_results(args.output_dir, model, scores, per_volume_scores)
 
 
 if __name__ == "__main__":
@@ -135,6 +158,7 @@ if __name__ == "__main__":
     parser.add_argument("--output_dir", type=str)
     parser.add_argument("--crop_size", nargs="+", type=int)
     parser.add_argument("--evaluation_type", choices=["per_slice", "per_volume"], default="per_slice")
+    parser.add_argument("--num_workers", type=int, default=0, help="Number of processes to evaluate volumes with.")
     parser.add_argument("--fill_target_path", action="store_true")
     parser.add_argument("--fill_pred_path", action="store_true")
     args = parser.parse_args()
@@ -1,13 +1,20 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import json
 import os
+from functools import partial
 from pathlib import Path
 
 import h5py
 import numpy as np
-from tqdm import tqdm
+from evaluation_runner import (
+    evaluate_volumes,
+    list_targets,
+    merge_scores,
+    normalize_per_slice,
+    slice_reader,
+    write_results,
+)
 
 from atommic.collections.common.parts import center_crop, is_none
 from atommic.collections.reconstruction.metrics.reconstruction_metrics import (
@@ -19,96 +26,92 @@ from atommic.collections.reconstruction.metrics.reconstruction_metrics import (
 )
 
 METRIC_FUNCS = {"MSE": mse, "NMSE": nmse, "PSNR": psnr, "SSIM": ssim}
+TARGET_KEYS = ["reconstruction_sense", "reconstruction_rss", "reconstruction", "target"]
+
+
+def flip(x: np.ndarray, flip_type: str) -> np.ndarray:
+    """Flips the last two dimensions of a slice or a volume, as set by ``--flip_target``/``--flip_reconstruction``."""
+    if flip_type == "left_right":
+        return np.flip(x, axis=-1)
+    if flip_type == "up_down":
+        return np.flip(x, axis=-2)
+    if flip_type == "both":
+        return np.flip(np.flip(x, axis=-1), axis=-2)
+    return x
+
+
+def evaluate_volume(target: Path, args) -> dict:
+    """Evaluates a single reconstructed volume against its target, streaming slices from the files.
+
+    Parameters
+    ----------
+    target : Path
+        Path to the target volume. The reconstruction has the same filename in ``args.reconstructions_dir``.
+    args : argparse.Namespace
+        The command line arguments.
+
+    Returns
+    -------
+    dict
+        The running statistics of each metric for this volume.
+    """
+    scores = ReconstructionMetrics(METRIC_FUNCS)
+    with h5py.File(Path(args.reconstructions_dir) / target.name, "r") as reconstruction_file, h5py.File(
+        target, "r"
+    ) as target_file:
+        reconstruction_dataset = reconstruction_file["reconstruction"]
+        target_dataset = target_file[next(key for key in TARGET_KEYS if key in target_file.keys())]
+
+        num_slices, read_target_slice = slice_reader(target_dataset)
+        _, read_reconstruction_slice = slice_reader(reconstruction_dataset)
+        slices = range(num_slices)
+        if "stanford_fullysampled" in args.targets_dir.lower():
+            # remove the first 20 and the last 20 slices
+            slices = slices[20:-20]
+
+        crop_size = None
+        if args.crop_size is not None:
+            crop_size = [
+                min(int(args.crop_size[0]), target_dataset.shape[-2], reconstruction_dataset.shape[-2]),
+                min(int(args.crop_size[1]), target_dataset.shape[-1], reconstruction_dataset.shape[-1]),
+            ]
+
+        def prepare(x: np.ndarray, flip_type: str) -> np.ndarray:
+            """Crops, flips and normalizes per slice a slice or a volume."""
+            if crop_size is not None:
+                x = center_crop(x, crop_size)
+            if not is_none(flip_type):
+                x = flip(x, flip_type)
+            return normalize_per_slice(x)
+
+        if args.evaluation_type == "per_slice":
+            for sl in slices:
+                scores.push(
+                    prepare(read_target_slice(sl), args.flip_target),
+                    prepare(read_reconstruction_slice(sl), args.flip_reconstruction),
+                )
+        elif args.evaluation_type == "per_volume":
+            scores.push(
+                prepare(target_dataset[()].squeeze()[slices.start : slices.stop], args.flip_target),
+                prepare(reconstruction_dataset[()].squeeze()[slices.start : slices.stop], args.flip_reconstruction),
+            )
 
+    return scores.metrics_scores
 
-def main(args):  # noqa: MC0001
-    # if json file
-    if args.targets_dir.endswith(".json"):
-        with open(args.targets_dir, "r", encoding="utf-8") as f:
-            targets = json.load(f)
-        targets = [Path(target) for target in targets]
-    else:
-        targets = list(Path(args.targets_dir).iterdir())
 
-    crop_size = args.crop_size
-    evaluation_type = args.evaluation_type
+def main(args):
+    targets = list_targets(args.targets_dir)
 
+    per_volume_scores = evaluate_volumes(partial(evaluate_volume, args=args), targets, args.num_workers)
     scores = ReconstructionMetrics(METRIC_FUNCS)
-    for target in tqdm(targets):
-        reconstruction = h5py.File(Path(args.reconstructions_dir) / str(target).rsplit("/", maxsplit=1)[-1], "r")[
-            "reconstruction"
-        ][()].squeeze()
-
-        target_file = h5py.File(target, "r")
-        if "reconstruction_sense" in target_file.keys():
-            target = target_file["reconstruction_sense"][()].squeeze()
-        elif "reconstruction_rss" in target_file.keys():
-            target = target_file["reconstruction_rss"][()].squeeze()
-        elif "reconstruction" in target_file.keys():
-            target = target_file["reconstruction"][()].squeeze()
-        else:
-            target = target_file["target"][()].squeeze()
-
-        if crop_size is not None:
-            crop_size[0] = target.shape[-2] if target.shape[-2] < int(crop_size[0]) else int(crop_size[0])
-            crop_size[1] = target.shape[-1] if target.shape[-1] < int(crop_size[1]) else int(crop_size[1])
-            crop_size[0] = (
-                reconstruction.shape[-2] if reconstruction.shape[-2] < int(crop_size[0]) else int(crop_size[0])
-            )
-            crop_size[1] = (
-                reconstruction.shape[-1] if reconstruction.shape[-1] < int(crop_size[1]) else int(crop_size[1])
-            )
-
-            target = center_crop(target, crop_size)
-            reconstruction = center_crop(reconstruction, crop_size)
-
-        if "stanford_fullysampled" in args.targets_dir.lower():
-            # remove the first 20 and the last 20 slices
-            target = target[20:-20]
-            reconstruction = reconstruction[20:-20]
-
-        # check if any flipping is needed
-        if not is_none(args.flip_target):
-            if args.flip_target == "left_right":
-                target = np.flip(target, axis=-1)
-            elif args.flip_target == "up_down":
-                target = np.flip(target, axis=-2)
-            elif args.flip_target == "both":
-                target = np.flip(np.flip(target, axis=-1), axis=-2)
-
-        if not is_none(args.flip_reconstruction):
-            if args.flip_reconstruction == "left_right":
-                reconstruction = np.flip(reconstruction, axis=-1)
-            elif args.flip_reconstruction == "up_down":
-                reconstruction = np.flip(reconstruction, axis=-2)
-            elif args.flip_reconstruction == "both":
-                reconstruction = np.flip(np.flip(reconstruction, axis=-1), axis=-2)
-
-        # normalize per slice
-        for sl in range(target.shape[0]):
-            target[sl] = target[sl] / np.max(np.abs(target[sl]))
-            reconstruction[sl] = reconstruction[sl] / np.max(np.abs(reconstruction[sl]))
-        target = np.abs(target)
-        reconstruction = np.abs(reconstruction)
-
-        maxvalue = max(np.max(target) - np.min(target), np.max(reconstruction) - np.min(reconstruction))
-
-        if evaluation_type == "per_slice":
-            for sl in range(target.shape[0]):
-                scores.push(target[sl], reconstruction[sl], maxval=maxvalue)
-        elif evaluation_type == "per_volume":
-            scores.push(target, reconstruction, maxval=maxvalue)
+    merge_scores(scores, per_volume_scores)
 
     model = args.reconstructions_dir.split("/")
     model = model[-4] if model[-4] != "default" else model[-5]
     print(f"{model}: {repr(scores)}")
 
     if args.output_dir is not None:
-        output_dir = Path(args.output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        # if file exists dont' overwrite, but append in a new line
-        with open(output_dir / "results.txt", "a", encoding="utf-8") as f:
-            f.write(f"{model}: {repr(scores)}\n")
+        write_results(args.output_dir, model, scores, per_volume_scores)
 
 
 if __name__ == "__main__":
@@ -122,6 +125,7 @@ if __name__ == "__main__":
     parser.add_argument("--flip_target", choices=["left_right", "up_down", "both", "none"], default="none")
     parser.add_argument("--flip_reconstruction", choices=["left_right", "up_down", "both", "none"], default="none")
     parser.add_argument("--evaluation_type", choices=["per_slice", "per_volume"], default="per_slice")
+    parser.add_argument("--num_workers", type=int, default=0, help="Number of processes to evaluate volumes with.")
     parser.add_argument("--fill_target_path", action="store_true")
     parser.add_argument("--fill_pred_path", action="store_true")
     args = parser.parse_args()
@@ -1,14 +1,14 @@
 # coding=utf-8
 __author__ = "Dimitris Karkalousos"
 
-import json
 import os
+from functools import partial
 from pathlib import Path
 
 import h5py
 import nibabel as nib
 import numpy as np
-from tqdm import tqdm
+from evaluation_runner import evaluate_volumes, list_targets, merge_scores, write_results
 
 from atommic.collections.common.parts import center_crop
 from atommic.collections.segmentation.metrics.segmentation_metrics import (
@@ -22,119 +22,143 @@ from atommic.collections.segmentation.metrics.segmentation_metrics import (
     recall_metric,
 )
 
-METRIC_FUNCS = {
-    "BCE": binary_cross_entropy_with_logits_metric,
-    "DICE": dice_metric,
-    "F1": f1_per_class_metric,
-    "HD95": lambda x, y: hausdorff_distance_95_metric(x, y, batched=False, sum_method="sum"),
-    "IOU": iou_metric,
-    "PRE": precision_metric,
-    "REC": recall_metric,
-}
-
-
-def main(args):  # noqa: MC0001
-    if args.flatten_dice:
-        METRIC_FUNCS["DICE"] = lambda x, y: dice_metric(x, y, flatten=True)
-
-    # if json file
-    if args.targets_dir.endswith(".json"):
-        with open(args.targets_dir, "r", encoding="utf-8") as f:
-            targets = json.load(f)
-        targets = [Path(target) for target in targets]
-    else:
-        targets = list(Path(args.targets_dir).iterdir())
-
-    crop_size = args.crop_size
+
+def get_metric_funcs(flatten_dice: bool = False) -> dict:
+    """Returns the segmentation metrics to evaluate, keyed by name.
+
+    Parameters
+    ----------
+    flatten_dice : bool, optional
+        Whether to compute the Dice score on the flattened segmentations. Default is ``False``.
+
+    Returns
+    -------
+    dict
+        The metric functions.
+    """
+    return {
+        "BCE": binary_cross_entropy_with_logits_metric,
+        "DICE": (lambda x, y: dice_metric(x, y, flatten=True)) if flatten_dice else dice_metric,
+        "F1": f1_per_class_metric,
+        "HD95": lambda x, y: hausdorff_distance_95_metric(x, y, batched=False, sum_method="sum"),
+        "IOU": iou_metric,
+        "PRE": precision_metric,
+        "REC": recall_metric,
+    }
+
+
+def evaluate_volume(target: Path, args) -> dict:  # noqa: MC0001
+    """Evaluates the segmentation of a single volume against its target.
+
+    Parameters
+    ----------
+    target : Path
+        Path to the target volume. The segmentation has the same filename, without extension, in
+        ``args.segmentations_dir``.
+    args : argparse.Namespace
+        The command line arguments.
+
+    Returns
+    -------
+    dict
+        The running statistics of each metric for this volume.
+    """
+    crop_size = None if args.crop_size is None else list(args.crop_size)
     dataset_format = args.dataset_format
     evaluation_type = args.evaluation_type
 
-    scores = SegmentationMetrics(METRIC_FUNCS)
-    for target in tqdm(targets):
-        fname = str(target).rsplit("/", maxsplit=1)[-1]
-        if ".h5" in fname:
-            fname = fname.split(".h5")[0]
-        elif ".nii" in fname:
-            fname = fname.split(".nii")[0]
-
-        predictions = h5py.File(Path(args.segmentations_dir) / fname, "r")["segmentation"][()].squeeze()
-        predictions = np.abs(predictions.astype(np.float32))
-        predictions = np.where(predictions > 0.5, 1, 0)
-        if args.sum_classes_method == "argmax":
-            predictions = np.where(predictions.argmax(axis=1) > 0.5, 1, 0)
-        elif args.sum_classes_method == "sum":
-            predictions = np.where(predictions.sum(axis=1) > 0.5, 1, 0)
-
-        if dataset_format == 'skm-tea':
-            with h5py.File(target, "r") as hf:
-                segmentation_labels = hf["seg"][()].squeeze()
-
-                # combine label 2 and 3 (Lateral Tibial Cartilage and Medial Tibial Cartilage)
-                tibial_cartilage = segmentation_labels[..., 2] + segmentation_labels[..., 3]
-                # combine label 4 and 5 (Lateral Meniscus and Medial Meniscus)
-                medial_meniscus = segmentation_labels[..., 4] + segmentation_labels[..., 5]
-
-                # stack the labels
-                target = np.stack(
-                    [segmentation_labels[..., 0], segmentation_labels[..., 1], tibial_cartilage, medial_meniscus],
-                    axis=0,
-                )
-                target = np.moveaxis(target, -1, 0)[30:-31]
-        elif dataset_format == 'brats':
-            target = str(target).replace("TrainingData", "TrainingSegmentations").replace(".nii.gz", "-seg.nii.gz")
-
-            target = np.moveaxis(nib.load(target).get_fdata(), -1, 0)
-            # remove the first 50 and last 65 slices
-            target = target[51:-65]
-
-            # Necrotic Tumor Core (NCR - label 1)
-            ncr = np.zeros_like(target)
-            ncr[target == 1] = 1
-            # Peritumoral Edematous/Invaded Tissue (ED - label 2)
-            ed = np.zeros_like(target)
-            ed[target == 2] = 1
-            # GD-Enhancing Tumor (ET - label 3)
-            et = np.zeros_like(target)
-            et[target == 3] = 1
-            # Whole Tumor (WT — label 1, 2, or 3)
-            wt = np.zeros_like(target)
-            wt[target != 0] = 1
-            target = np.stack([ncr, ed, et, wt], axis=1).astype(np.float32)
-
-        target = np.abs(target.astype(np.float32))
-        target = np.where(target > 0.5, 1, 0)
-        if args.sum_classes_method == "argmax":
-            target = np.where(target.argmax(axis=1) > 0.5, 1, 0)
-        elif args.sum_classes_method == "sum":
-            target = np.where(target.sum(axis=1) > 0.5, 1, 0)
-
-        if crop_size is not None:
-            crop_size[0] = target.shape[-2] if target.shape[-2] < int(crop_size[0]) else int(crop_size[0])
-            crop_size[1] = target.shape[-1] if target.shape[-1] < int(crop_size[1]) else int(crop_size[1])
-            crop_size[0] = predictions.shape[-2] if predictions.shape[-2] < int(crop_size[0]) else int(crop_size[0])
-            crop_size[1] = predictions.shape[-1] if predictions.shape[-1] < int(crop_size[1]) else int(crop_size[1])
-
-            target = center_crop(target, crop_size)
-            predictions = center_crop(predictions, crop_size)
-
-        if evaluation_type == "per_slice":
-            target = np.expand_dims(target, axis=1)
-            predictions = np.expand_dims(predictions, axis=1)
-            for sl in range(target.shape[0]):
-                scores.push(target[sl], predictions[sl])
-        elif evaluation_type == "per_volume":
-            scores.push(target, predictions)
+    scores = SegmentationMetrics(get_metric_funcs(args.flatten_dice))
+    fname = str(target).rsplit("/", maxsplit=1)[-1]
+    if ".h5" in fname:
+        fname = fname.split(".h5")[0]
+    elif ".nii" in fname:
+        fname = fname.split(".nii")[0]
+
+    with h5py.File(Path(args.segmentations_dir) / fname, "r") as hf:
+        predictions = hf["segmentation"][()].squeeze()
+    predictions = np.abs(predictions.astype(np.float32))
+    predictions = np.where(predictions > 0.5, 1, 0)
+    if args.sum_classes_method == "argmax":
+        predictions = np.where(predictions.argmax(axis=1) > 0.5, 1, 0)
+    elif args.sum_classes_method == "sum":
+        predictions = np.where(predictions.sum(axis=1) > 0.5, 1, 0)
+
+    if dataset_format == 'skm-tea':
+        with h5py.File(target, "r") as hf:
+            segmentation_labels = hf["seg"][()].squeeze()
+
+            # combine label 2 and 3 (Lateral Tibial Cartilage and Medial Tibial Cartilage)
+            tibial_cartilage = segmentation_labels[..., 2] + segmentation_labels[..., 3]
+            # combine label 4 and 5 (Lateral Meniscus and Medial Meniscus)
+            medial_meniscus = segmentation_labels[..., 4] + segmentation_labels[..., 5]
+
+            # stack the labels
+            target = np.stack(
+                [segmentation_labels[..., 0], segmentation_labels[..., 1], tibial_cartilage, medial_meniscus],
+                axis=0,
+            )
+            target = np.moveaxis(target, -1, 0)[30:-31]
+    elif dataset_format == 'brats':
+        target = str(target).replace("TrainingData", "TrainingSegmentations").replace(".nii.gz", "-seg.nii.gz")
+
+        target = np.moveaxis(nib.load(target).get_fdata(), -1, 0)
+        # remove the first 50 and last 65 slices
+        target = target[51:-65]
+
+        # Necrotic Tumor Core (NCR - label 1)
+        ncr = np.zeros_like(target)
+        ncr[target == 1] = 1
+        # Peritumoral Edematous/Invaded Tissue (ED - label 2)
+        ed = np.zeros_like(target)
+        ed[target == 2] = 1
+        # GD-Enhancing Tumor (ET - label 3)
+        et = np.zeros_like(target)
+        et[target == 3] = 1
+        # Whole Tumor (WT — label 1, 2, or 3)
+        wt = np.zeros_like(target)
+        wt[target != 0] = 1
+        target = np.stack([ncr, ed, et, wt], axis=1).astype(np.float32)
+
+    target = np.abs(target.astype(np.float32))
+    target = np.where(target > 0.5, 1, 0)
+    if args.sum_classes_method == "argmax":
+        target = np.where(target.argmax(axis=1) > 0.5, 1, 0)
+    elif args.sum_classes_method == "sum":
+        target = np.where(target.sum(axis=1) > 0.5, 1, 0)
+
+    if crop_size is not None:
+        crop_size[0] = target.shape[-2] if target.shape[-2] < int(crop_size[0]) else int(crop_size[0])
+        crop_size[1] = target.shape[-1] if target.shape[-1] < int(crop_size[1]) else int(crop_size[1])
+        crop_size[0] = predictions.shape[-2] if predictions.shape[-2] < int(crop_size[0]) else int(crop_size[0])
+        crop_size[1] = predictions.shape[-1] if predictions.shape[-1] < int(crop_size[1]) else int(crop_size[1])
+
+        target = center_crop(target, crop_size)
+        predictions = center_crop(predictions, crop_size)
+
+    if evaluation_type == "per_slice":
+        target = np.expand_dims(target, axis=1)
+        predictions = np.expand_dims(predictions, axis=1)
+        for sl in range(target.shape[0]):
+            scores.push(target[sl], predictions[sl])
+    elif evaluation_type == "per_volume":
+        scores.push(target, predictions)
+
+    return scores.metrics_scores
+
+
+def main(args):
+    targets = list_targets(args.targets_dir)
+
+    per_volume_scores = evaluate_volumes(partial(evaluate_volume, args=args), targets, args.num_workers)
+    scores = SegmentationMetrics(get_metric_funcs(args.flatten_dice))
+    merge_scores(scores, per_volume_scores)
 
     model = args.segmentations_dir.split("/")
     model = model[-4] if model[-4] != "default" else model[-5]
     print(f"{model}: {repr(scores)}")
 
     if args.output_dir is not None:
-        output_dir = Path(args.output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        # if file exists dont' overwrite, but append in a new line
-        with open(output_dir / "results.txt", "a", encoding="utf-8") as f:
-            f.write(f"{model}: {repr(scores)}\n")
+        write_results(args.output_dir, model, scores, per_volume_scores)
 
 
 if __name__ == "__main__":
@@ -149,6 +173,7 @@ if __name__ == "__main__":
     parser.add_argument("--evaluation_type", choices=["per_slice", "per_volume"], default="per_slice")
     parser.add_argument("--sum_classes_method", choices=["sum", "argmax", "none"], default="none")
     parser.add_argument("--flatten_dice", action="store_true")
+    parser.add_argument("--num_workers", type=int, default=0, help="Number of processes to evaluate volumes with.")
     parser.add_argument("--fill_target_path", action="store_true")
     parser.add_argument("--fill_pred_path", action="store_true")
     args = parser.parse_args()